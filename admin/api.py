@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+REST API модератора: /api/ads, /api/users, /api/swaps, /api/reports, /api/leaderboard/{board}.
+
+Списки — keyset-пагинация: ответ {"items": [...], "next_cursor": "..."}, следующая
+страница — ?cursor=<next_cursor>. Глубокие страницы стоят столько же, сколько первая
+(никаких OFFSET). Запросы идут через пул только для чтения (ReadOnlyPool), отдельный
+от соединений бота, поэтому нагрузка модераторов не блокирует запись.
+
+Ответы кешируются на ADMIN_CACHE_TTL секунд по URL и отдаются с ETag: повтор с
+If-None-Match получает 304 без тела, одинаковые параллельные запросы выполняются один раз.
+"""
+import asyncio
+import base64
+import binascii
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
+
+from admin.auth import ADMIN_ONLY
+from app.config import settings
+from app.database.pool import ReadOnlyPool
+from app.services.leaderboard import METRICS, leaderboard_service
+
+router = APIRouter(prefix="/api", tags=["api"], dependencies=ADMIN_ONLY)
+pool = ReadOnlyPool(size=settings.ADMIN_DB_POOL_SIZE)
+
+MAX_LIMIT = 200
+
+
+# ==================== КЕШ ОТВЕТОВ ====================
+
+class ResponseCache:
+    """LRU-кеш тел ответов с ETag и коротким TTL"""
+
+    def __init__(self, ttl: float, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, key: str, produce: Callable[[], Awaitable[Any]]) -> Tuple[bytes, str]:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+        # Заполнение идёт отдельной задачей: отмена первого запроса (клиент ушёл)
+        # не отменяет его для остальных ожидающих
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fill(key, produce))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # ожидающих может не быть — не логировать «never retrieved»
+
+    async def _fill(self, key: str, produce: Callable[[], Awaitable[Any]]) -> Tuple[bytes, str]:
+        body = json.dumps(await produce(), ensure_ascii=False, default=str).encode("utf-8")
+        etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self._entries[key] = (time.monotonic() + self.ttl, body, etag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return body, etag
+
+
+cache = ResponseCache(ttl=settings.ADMIN_CACHE_TTL)
+
+
+async def cached(request: Request, produce: Callable[[], Awaitable[Any]]) -> Response:
+    """JSON-ответ из кеша; 304, если ETag совпал с If-None-Match"""
+    key = request.url.path + "?" + "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    body, etag = await cache.get(key, produce)
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={int(cache.ttl)}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# ==================== KEYSET-ПАГИНАЦИЯ ====================
+
+@dataclass(frozen=True)
+class Resource:
+    table: str
+    columns: str
+    key: Tuple[str, ...]  # уникальный ключ сортировки, по убыванию
+    nullable: Tuple[str, ...] = ()  # столбцы ключа с NULL: сравниваются как COALESCE(столбец, '')
+
+    def key_sql(self) -> List[str]:
+        """Выражения ключа для WHERE/ORDER BY (NULL в сравнении кортежей выпал бы из выборки)"""
+        return [f"COALESCE({column}, '')" if column in self.nullable else column for column in self.key]
+
+    def key_of(self, row) -> List[Any]:
+        """Значения ключа строки для курсора"""
+        return [("" if row[column] is None and column in self.nullable else row[column]) for column in self.key]
+
+
+ADS = Resource(
+    "ads",
+    "id, user_tg_id, category, title, description, price, photo_file_id, latitude, longitude, "
+    "location_name, views, is_active, created_at, updated_at",
+    ("id",),
+)
+USERS = Resource(
+    "users",
+    "tg_id, username, name, phone, latitude, longitude, location_name, rating, total_swaps, created_at, last_active",
+    ("created_at", "tg_id"),
+    nullable=("created_at",),
+)
+SWAPS = Resource(
+    "swap_proposals",
+    "id, liked_ad_id, proposer_ad_id, proposer_user_id, target_user_id, status, message, proposed_at, responded_at",
+    ("id",),
+)
+REPORTS = Resource(
+    "reports",
+    "id, reporter_id, reported_user_id, reported_ad_id, reason, description, is_processed, moderator_id, "
+    "resolution, created_at, processed_at",
+    ("id",),
+)
+
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+    return values
+
+
+def like(text: str) -> str:
+    """Шаблон LIKE по подстроке (с ESCAPE '\\')"""
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+async def fetch_page(resource: Resource, where: List[str], params: List[Any],
+                     cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    """Страница resource по фильтрам where, начиная после cursor"""
+    key = resource.key_sql()
+    if cursor:
+        where = where + [f"({', '.join(key)}) < ({', '.join('?' * len(key))})"]
+        params = params + decode_cursor(cursor, len(key))
+    sql = (f"SELECT {resource.columns} FROM {resource.table}"
+           + (f" WHERE {' AND '.join(where)}" if where else "")
+           + f" ORDER BY {', '.join(f'{column} DESC' for column in key)} LIMIT ?")
+
+    async with pool.acquire() as db:
+        async with db.execute(sql, params + [limit + 1]) as rows:
+            items = [dict(row) for row in await rows.fetchall()]
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(resource.key_of(items[-1]))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def fetch_one(resource: Resource, column: str, value: Any) -> Dict[str, Any]:
+    async with pool.acquire() as db:
+        async with db.execute(f"SELECT {resource.columns} FROM {resource.table} WHERE {column}=?", (value,)) as rows:
+            row = await rows.fetchone()
+    if row is None:
+        raise HTTPException(status_code=404)
+    return dict(row)
+
+
+# ==================== ЭНДПОИНТЫ ====================
+
+@router.get("/ads")
+async def list_ads(
+        request: Request,
+        category: Optional[str] = None,
+        active: Optional[bool] = None,
+        user_id: Optional[int] = None,
+        q: Optional[str] = Query(default=None, description="подстрока заголовка"),
+        cursor: Optional[str] = None,
+        limit: int = Query(default=50, ge=1, le=MAX_LIMIT),
+):
+    where, params = [], []
+    if category:
+        where.append("category=?")
+        params.append(category)
+    if active is not None:
+        where.append("is_active=?")
+        params.append(int(active))
+    if user_id:
+        where.append("user_tg_id=?")
+        params.append(user_id)
+    if q:
+        where.append("title LIKE ? ESCAPE '\\'")
+        params.append(like(q))
+    return await cached(request, lambda: fetch_page(ADS, where, params, cursor, limit))
+
+
+@router.get("/ads/{ad_id}")
+async def get_ad(request: Request, ad_id: int):
+    return await cached(request, lambda: fetch_one(ADS, "id", ad_id))
+
+
+@router.get("/users")
+async def list_users(
+        request: Request,
+        q: Optional[str] = Query(default=None, description="подстрока username или имени"),
+        cursor: Optional[str] = None,
+        limit: int = Query(default=50, ge=1, le=MAX_LIMIT),
+):
+    where, params = [], []
+    if q:
+        where.append("(username LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\')")
+        params += [like(q), like(q)]
+    return await cached(request, lambda: fetch_page(USERS, where, params, cursor, limit))
+
+
+@router.get("/users/{tg_id}")
+async def get_user(request: Request, tg_id: int):
+    return await cached(request, lambda: fetch_one(USERS, "tg_id", tg_id))
+
+
+@router.get("/swaps")
+async def list_swaps(
+        request: Request,
+        status: Optional[str] = None,
+        user_id: Optional[int] = Query(default=None, description="автор или получатель предложения"),
+        cursor: Optional[str] = None,
+        limit: int = Query(default=50, ge=1, le=MAX_LIMIT),
+):
+    where, params = [], []
+    if status:
+        where.append("status=?")
+        params.append(status)
+    if user_id:
+        where.append("(proposer_user_id=? OR target_user_id=?)")
+        params += [user_id, user_id]
+    return await cached(request, lambda: fetch_page(SWAPS, where, params, cursor, limit))
+
+
+@router.get("/reports")
+async def list_reports(
+        request: Request,
+        processed: Optional[bool] = None,
+        reported_user_id: Optional[int] = None,
+        reported_ad_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(default=50, ge=1, le=MAX_LIMIT),
+):
+    where, params = [], []
+    if processed is not None:
+        where.append("is_processed=?")
+        params.append(int(processed))
+    if reported_user_id:
+        where.append("reported_user_id=?")
+        params.append(reported_user_id)
+    if reported_ad_id:
+        where.append("reported_ad_id=?")
+        params.append(reported_ad_id)
+    return await cached(request, lambda: fetch_page(REPORTS, where, params, cursor, limit))
+
+
+@router.get("/leaderboard/{board}")
+async def get_leaderboard(
+        request: Request,
+        board: str,
+        limit: int = Query(default=50, ge=1, le=MAX_LIMIT),
+        user_id: Optional[int] = Query(default=None, description="вернуть и место этого пользователя"),
+):
+    """Таблица лидеров: swaps, rating, xp, <они же>:cell:<ячейка>, swaps:cat:<категория>"""
+    if board.split(":", 1)[0] not in METRICS:
+        raise HTTPException(status_code=404, detail=f"Таблицы: {', '.join(METRICS)} и их :cell:/:cat: варианты")
+
+    async def produce():
+        result = {"board": board, "items": await leaderboard_service.top(board, limit)}
+        if user_id:
+            result["position"] = await leaderboard_service.position(board, user_id)
+        return result
+
+    return await cached(request, produce)
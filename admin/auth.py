@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Доступ к админке: заголовок Authorization: Bearer <ADMIN_TOKEN>.
+
+Подключается зависимостью на уровне роутеров (dependencies=[Depends(require_admin)]).
+Без ADMIN_TOKEN закрытые эндпоинты не работают вовсе (503), а не открываются всем.
+"""
+import secrets
+from typing import Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.config import settings
+
+_bearer = HTTPBearer(auto_error=False)
+
+
+async def require_admin(credentials: Optional[HTTPAuthorizationCredentials] = Depends(_bearer)) -> None:
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="ADMIN_TOKEN не задан — админка закрыта")
+    if credentials is None or not secrets.compare_digest(credentials.credentials.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Нужен заголовок Authorization: Bearer <ADMIN_TOKEN>",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+# Для dependencies= роутеров и отдельных эндпоинтов
+ADMIN_ONLY = [Depends(require_admin)]
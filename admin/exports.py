@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковые выгрузки: GET /export/{ads|users|swaps|reports}.{csv|jsonl}[?gzip=true]
+
+Строки читаются кусками по ADMIN_EXPORT_CHUNK через keyset (каждый кусок — короткий
+запрос «после последнего ключа»), форматируются и сразу отдаются клиенту, так что
+память не зависит от размера таблицы. Короткие запросы вместо одного курсора на всю
+выгрузку не держат снимок WAL минутами и не мешают контрольным точкам бота.
+
+Одновременно идёт не больше ADMIN_EXPORT_CONCURRENCY выгрузок, остальным — 429.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+import anyio
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from admin.api import ADS, REPORTS, SWAPS, USERS, Resource, pool
+from admin.auth import ADMIN_ONLY
+from app.config import settings
+
+router = APIRouter(prefix="/export", tags=["export"], dependencies=ADMIN_ONLY)
+
+RESOURCES: Dict[str, Resource] = {"ads": ADS, "users": USERS, "swaps": SWAPS, "reports": REPORTS}
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+
+class ExportSlots:
+    """Ограничение числа одновременных выгрузок"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+
+    def reserve(self) -> Optional["ExportLease"]:
+        """Место выгрузки или None, если мест нет"""
+        if self.active >= self.limit:
+            return None
+        self.active += 1
+        return ExportLease(self)
+
+
+class ExportLease:
+    """
+    Занятое место выгрузки.
+
+    release вызывают и finally генератора ответа, и фоновая задача ответа — она
+    выполняется и после отключения клиента, в том числе если генератор так и не
+    запустился. Повторный вызов ничего не делает.
+    """
+
+    def __init__(self, slots: ExportSlots):
+        self._slots = slots
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._slots.active -= 1
+
+
+slots = ExportSlots(settings.ADMIN_EXPORT_CONCURRENCY)
+
+
+async def iter_rows(db: aiosqlite.Connection, resource: Resource, chunk: int) -> AsyncIterator[List[aiosqlite.Row]]:
+    """Вся таблица кусками по chunk строк в порядке ключа"""
+    key = ", ".join(resource.key_sql())
+    base = f"SELECT {resource.columns} FROM {resource.table}"
+    after: Optional[list] = None
+    while True:
+        if after is None:
+            sql, params = f"{base} ORDER BY {key} LIMIT ?", [chunk]
+        else:
+            sql = f"{base} WHERE ({key}) > ({', '.join('?' * len(after))}) ORDER BY {key} LIMIT ?"
+            params = after + [chunk]
+        async with db.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk:
+            return
+        after = resource.key_of(rows[-1])
+
+
+def _format_csv(rows: List[aiosqlite.Row], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(rows[0].keys())
+    writer.writerows(tuple(row) for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _format_jsonl(rows: List[aiosqlite.Row], header: bool) -> bytes:
+    return "".join(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+
+FORMATTERS = {"csv": _format_csv, "jsonl": _format_jsonl}
+
+
+async def stream(resource: Resource, fmt: str, gzip: bool, lease: ExportLease) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31) if gzip else None  # 31 — формат gzip
+    formatter = FORMATTERS[fmt]
+    db = await pool.connect()
+    try:
+        first = True
+        async for rows in iter_rows(db, resource, settings.ADMIN_EXPORT_CHUNK):
+            data = formatter(rows, first)
+            first = False
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor:
+            yield compressor.flush()
+    finally:
+        lease.release()
+        # При отключении клиента генератор отменён — закрытие не должно прерываться
+        with anyio.CancelScope(shield=True):
+            await db.close()
+
+
+@router.get("/{name}.{fmt}")
+async def export(name: str, fmt: str, gzip: bool = False):
+    resource = RESOURCES.get(name)
+    if resource is None or fmt not in FORMATTERS:
+        raise HTTPException(status_code=404, detail=f"Выгрузки: {', '.join(RESOURCES)}; форматы: csv, jsonl")
+    lease = slots.reserve()
+    if lease is None:
+        raise HTTPException(status_code=429, detail="Слишком много одновременных выгрузок, повторите позже")
+
+    filename = f"{name}.{fmt}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        stream(resource, fmt, gzip, lease),
+        media_type="application/gzip" if gzip else MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(lease.release),
+    )
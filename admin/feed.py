@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Живая лента для дашбордов модераторов: GET /events/stream (Server-Sent Events).
+
+    ?types=ad_created,report_filed   — только нужные типы (по умолчанию все)
+    ?cursor=<id> или Last-Event-ID   — сначала события журнала после id, затем живые
+
+События приходят из одной общей шины (app.services.events.EventBus), поэтому открытые
+дашборды не опрашивают БД каждый сам по себе. Браузерный EventSource переподключается
+сам и присылает Last-Event-ID — пропущенное за время разрыва дочитывается из журнала.
+Клиент, который не успевает читать, получает event: overflow и отключается; при
+переподключении он продолжит с последнего полученного id.
+"""
+import asyncio
+import json
+from typing import AsyncIterator, FrozenSet, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from admin.api import pool
+from admin.auth import ADMIN_ONLY
+from app.config import settings
+from app.services.events import BATCH, EVENT_TYPES, OVERFLOW, EventBus
+
+router = APIRouter(prefix="/events", tags=["events"], dependencies=ADMIN_ONLY)
+bus = EventBus(pool)
+
+RETRY_MS = 3000
+
+
+def _parse_types(types: Optional[str]) -> Optional[FrozenSet[str]]:
+    if not types:
+        return None
+    wanted = frozenset(t.strip() for t in types.split(",") if t.strip())
+    unknown = wanted - set(EVENT_TYPES)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные типы: {', '.join(sorted(unknown))}; "
+                                                    f"доступны: {', '.join(EVENT_TYPES)}")
+    return wanted or None
+
+
+async def stream(request: Request, types: Optional[FrozenSet[str]], cursor: Optional[int]) -> AsyncIterator[str]:
+    # Подписка до чтения журнала: всё, что придёт во время догонки, ляжет в очередь,
+    # а повторы отсекаются по id
+    subscription = bus.subscribe(types)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        last = cursor
+        if cursor is not None:
+            while True:
+                events = await bus.replay(last, types)
+                for event in events:
+                    yield event.sse()
+                    last = event.id
+                if len(events) < BATCH:
+                    break
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), settings.EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            if event is OVERFLOW:
+                yield f"event: overflow\ndata: {json.dumps({'last_event_id': last})}\n\n"
+                return
+            if last is not None and event.id <= last:
+                continue
+            yield event.sse()
+            last = event.id
+    finally:
+        bus.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def event_stream(
+        request: Request,
+        types: Optional[str] = Query(default=None, description=f"через запятую: {', '.join(EVENT_TYPES)}"),
+        cursor: Optional[int] = Query(default=None, ge=0, description="продолжить после этого id"),
+        last_event_id: Optional[str] = Header(default=None),
+):
+    if cursor is None and last_event_id:
+        try:
+            cursor = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректный Last-Event-ID")
+    return StreamingResponse(
+        stream(request, _parse_types(types), cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
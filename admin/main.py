@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 """
-Админ-панель (FastAPI). Запуск: uvicorn admin.main:app --host 0.0.0.0 --port 8000
+Админ-панель (FastAPI). Запуск: python -m admin.main (ADMIN_PANEL_HOST, по умолчанию 127.0.0.1)
+или uvicorn admin.main:app --host 127.0.0.1 --port 8000.
+
+Всё, кроме / и /health, требует Authorization: Bearer <ADMIN_TOKEN> (admin/auth.py).
 """
+import asyncio
 from pathlib import Path
+import re
 import sys
 
 # Корень проекта в path
@@ -10,10 +15,48 @@ _root = Path(__file__).resolve().parent.parent
 if str(_root) not in sys.path:
     sys.path.insert(0, str(_root))
 
-from fastapi import FastAPI
-from fastapi.responses import PlainTextResponse
+from fastapi import APIRouter, FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse, Response
+
+from admin import api, exports, feed
+from admin.auth import ADMIN_ONLY
+from app.config import settings
+from app.database.crud import require_sqlite
+from app.database.db import init_db
+from app.database.models import StatsModel
+from app.services import analytics
+from app.services.media import media_service, content_type
+from app.utils.metrics import collect
+from app.utils import profiler
 
 app = FastAPI(title="SwapBot Admin")
+app.include_router(api.router)
+app.include_router(exports.router)
+app.include_router(feed.router)
+# /stats, /analytics, /metrics, /profile, /media — подключается в конце модуля
+panel = APIRouter(dependencies=ADMIN_ONLY)
+
+_MEDIA_KEY_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{64}_\w+\.(?:webp|jpg)$")
+
+
+@app.on_event("startup")
+async def startup():
+    # Пул, выгрузки, лента событий и свёртки читают файл SQLite: с Postgres панель была бы пустой
+    require_sqlite("Админ-панель")
+    await init_db()
+    settings.MEDIA_PATH.mkdir(parents=True, exist_ok=True)
+    await api.pool.open()
+    app.state.feed = asyncio.create_task(feed.bus.run())
+    if analytics.analytics_enabled():
+        app.state.rollup = asyncio.create_task(analytics.rollup_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.feed.cancel()
+    if getattr(app.state, "rollup", None):
+        app.state.rollup.cancel()
+    await api.pool.close()
 
 
 @app.get("/")
@@ -24,3 +67,88 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@panel.get("/stats")
+async def get_stats(days: int = 7):
+    """Текущие счётчики и дневные значения за days дней (чтение пары десятков строк)"""
+    return {
+        "counters": await StatsModel.counters(),
+        "daily": await StatsModel.daily(max(1, min(days, 90))),
+    }
+
+
+@panel.get("/analytics")
+async def get_analytics(days: int = 30):
+    """Дневные строки analytics, новые первыми (свёртку пишет rollup_loop)"""
+    return await StatsModel.history(max(1, min(days, 366)))
+
+
+@panel.get("/metrics")
+async def get_metrics():
+    """Метрики бота и админки в формате Prometheus (при METRICS_ENABLED)"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404)
+    return PlainTextResponse(collect(), media_type="text/plain; version=0.0.4")
+
+
+@panel.post("/profile")
+async def profile(seconds: int = 10, format: str = "collapsed"):
+    """
+    Профиль всех процессов бота за seconds секунд.
+
+    format=collapsed — collapsed stacks (корневой кадр — pid процесса),
+    format=summary — текстовые отчёты процессов.
+    """
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404)
+    if format not in ("collapsed", "summary"):
+        raise HTTPException(status_code=400, detail="format: collapsed или summary")
+    seconds = max(1, min(seconds, settings.PROFILER_MAX_SECONDS))
+
+    request_id = profiler.request_profile(seconds)
+    try:
+        # Процессы бота проверяют запросы раз в секунду и пишут результат по окончании
+        await asyncio.sleep(seconds + profiler.REQUEST_POLL_INTERVAL * 2 + 1)
+        results = profiler.read_results(request_id, ".collapsed" if format == "collapsed" else ".txt")
+    finally:
+        profiler.cleanup_request(request_id)
+    if not results:
+        raise HTTPException(status_code=504, detail="Ни один процесс бота не ответил (PROFILER_ENABLED у бота?)")
+    if format == "collapsed":
+        return PlainTextResponse("".join(text for _, text in results))
+    return PlainTextResponse("\n\n".join(f"pid {pid}\n{text}" for pid, text in results))
+
+
+@panel.get("/media/{key:path}")
+async def get_media(key: str):
+    """Обработанное изображение из кеша (ключи неизменяемы — браузер кеширует надолго)"""
+    if not _MEDIA_KEY_RE.match(key):
+        raise HTTPException(status_code=404)
+    data = await media_service.get(key)
+    if data is None:
+        raise HTTPException(status_code=404)
+    return Response(
+        data,
+        media_type=content_type(key),
+        headers={"Cache-Control": "private, max-age=31536000, immutable"},
+    )
+
+
+@panel.post("/media")
+async def upload_media(file: UploadFile = File(...)):
+    """Загрузка изображения: возвращает ключи всех размеров"""
+    data = await file.read()
+    try:
+        return await media_service.process(data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Не удалось обработать изображение: {e}")
+
+
+app.include_router(panel)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=settings.ADMIN_PANEL_HOST, port=settings.ADMIN_PANEL_PORT)
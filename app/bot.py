@@ -1,50 +1,118 @@
 # -*- coding: utf-8 -*-
 """
 Точка входа бота. Запуск: python -m app.bot (из корня swap_bot).
+Режим webhook — python -m app.webhook.
 """
 import asyncio
 import logging
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from app.config import settings
+from app.database import crud
 from app.database.db import init_db
-from app.handlers import start, profile, ads, browse, chat, admin, payments
+from app.handlers import start, profile, ads, browse, favorites, chat, admin, payments, leaderboard, saved_searches
+from app.middlewares.metrics import HandlerMetricsMiddleware, TelegramMetricsMiddleware
+from app.middlewares.ordering import UpdateScheduler, ChatOrderingMiddleware
+from app.utils.metrics import metrics, start_exporter
+from app.utils.profiler import start_profiler
 
 
-async def main() -> None:
-    if not settings.BOT_TOKEN:
-        raise SystemExit("BOT_TOKEN не задан. Создайте .env в корне проекта и укажите BOT_TOKEN=...")
-
+def setup_logging() -> None:
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
 
-    await init_db()
-    settings.MEDIA_PATH.mkdir(parents=True, exist_ok=True)
 
+def create_bot() -> Bot:
+    """Bot с настройками проекта (TELEGRAM_API_URL — свой Bot API сервер или тестовый стенд)"""
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
     bot = Bot(
         token=settings.BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    if metrics.enabled:
+        bot.session.middleware(TelegramMetricsMiddleware())
+    return bot
+
+
+def create_storage() -> BaseStorage:
+    """Хранилище FSM по FSM_STORAGE"""
+    if settings.FSM_STORAGE == "redis":
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(settings.REDIS_URL)
+    return MemoryStorage()
+
+
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher со всеми роутерами и упорядоченной обработкой обновлений"""
+    # FSM подключаем вручную после планировщика: состояние должно читаться,
+    # когда подошла очередь обновления, а не в момент постановки в очередь
+    dp = Dispatcher(storage=create_storage(), disable_fsm=True)
+
+    scheduler = UpdateScheduler(settings.UPDATE_CONCURRENCY, settings.UPDATE_MAX_PENDING)
+    dp.update.outer_middleware(ChatOrderingMiddleware(scheduler, dp))
+    dp.update.outer_middleware(dp.fsm)
+    dp["update_scheduler"] = scheduler
+
+    if metrics.enabled:
+        dp.message.middleware(HandlerMetricsMiddleware())
+        dp.callback_query.middleware(HandlerMetricsMiddleware())
 
     dp.include_router(start.router)
     dp.include_router(profile.router)
     dp.include_router(ads.router)
     dp.include_router(browse.router)
+    dp.include_router(favorites.router)  # после browse: «⭐ Избранное» в ленте — добавление
     dp.include_router(chat.router)
     dp.include_router(admin.router)
     dp.include_router(payments.router)
+    dp.include_router(leaderboard.router)
+    dp.include_router(saved_searches.router)
+
+    return dp
+
+
+async def prepare() -> None:
+    """Общая подготовка перед запуском в любом режиме"""
+    if not settings.BOT_TOKEN:
+        raise SystemExit("BOT_TOKEN не задан. Создайте .env в корне проекта и укажите BOT_TOKEN=...")
+
+    setup_logging()
+
+    await init_db()
+    await crud.init()
+    settings.MEDIA_PATH.mkdir(parents=True, exist_ok=True)
+
+
+async def main() -> None:
+    await prepare()
+
+    bot = create_bot()
+    dp = create_dispatcher()
 
     logging.info("🤖 SwapBot запущен")
+    exporter = start_exporter()
+    profiler = start_profiler()
     try:
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await bot.delete_webhook()
+        # Параллельность и порядок обеспечивает UpdateScheduler, приём — последовательный
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types(), handle_as_tasks=False)
+        await dp["update_scheduler"].join(settings.WEBHOOK_DRAIN_TIMEOUT)
     finally:
+        for task in (exporter, profiler):
+            if task:
+                task.cancel()
         await bot.session.close()
 
 
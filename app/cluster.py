@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Многопроцессный режим: python -m app.cluster [--workers N] [--webhook]
+
+Фронт-процесс получает обновления (long polling или webhook) и раскладывает их по
+N воркер-процессам по user_id % N через локальные unix-сокеты. Каждый воркер держит
+свой Dispatcher со всеми роутерами, поэтому форматирование объявлений, модерация и
+FSM считаются на всех ядрах. Все обновления пользователя попадают в один воркер и
+в нём обрабатываются по порядку (UpdateScheduler).
+
+Общее состояние: БД (SQLite в режиме WAL) и FSM — FSM_STORAGE=redis, чтобы
+состояние диалогов пережило перезапуск и смену числа воркеров.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from typing import List, Optional
+
+from aiogram import Bot
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+from aiohttp import web
+
+from app.bot import create_bot, create_dispatcher, prepare, setup_logging
+from app.config import settings
+from app.utils.metrics import start_exporter
+from app.utils.profiler import start_profiler
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(update: Update, shards: int) -> int:
+    """Номер воркера для обновления: по пользователю, иначе по чату"""
+    context = UserContextMiddleware.resolve_event_context(update)
+    if context.user:
+        key = context.user.id
+    elif context.chat:
+        key = context.chat.id
+    else:
+        key = update.update_id
+    return key % shards
+
+
+def _worker_process(index: int, sock: socket.socket):
+    """Точка входа воркер-процесса"""
+    try:
+        asyncio.run(_worker(index, sock))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker(index: int, sock: socket.socket):
+    setup_logging()
+    # Останавливает фронт: воркер дорабатывает очередь до EOF в сокете
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    reader, writer = await asyncio.open_connection(sock=sock, limit=2 ** 20)
+    logger.info(f"Воркер {index} запущен (pid {os.getpid()})")
+    exporter = start_exporter()
+    profiler = start_profiler()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                update = Update.model_validate_json(line, context={"bot": bot})
+                # Возвращается после постановки в очередь; при переполнении ждёт —
+                # чтение из сокета останавливается, и фронт упирается в drain()
+                await dp.feed_update(bot, update)
+            except Exception as e:
+                logger.exception(f"Воркер {index}: ошибка обработки обновления: {e}")
+
+        await dp["update_scheduler"].join(settings.WEBHOOK_DRAIN_TIMEOUT)
+    finally:
+        for task in (exporter, profiler):
+            if task:
+                task.cancel()
+        writer.close()
+        await bot.session.close()
+        await dp.storage.close()
+        logger.info(f"Воркер {index} остановлен")
+
+
+class Cluster:
+    """Фронт: запуск воркеров и маршрутизация обновлений"""
+
+    def __init__(self, workers: int):
+        self.size = workers
+        self.processes: List[multiprocessing.Process] = []
+        self.writers: List[asyncio.StreamWriter] = []
+        self.routed = [0] * workers
+
+    async def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        for index in range(self.size):
+            front, child = socket.socketpair()
+            process = ctx.Process(target=_worker_process, args=(index, child), name=f"swapbot-worker-{index}")
+            process.start()
+            child.close()
+            _, writer = await asyncio.open_connection(sock=front)
+            self.processes.append(process)
+            self.writers.append(writer)
+
+    async def feed(self, update: Update):
+        """Отправка обновления своему воркеру (ждёт, если воркер не успевает)"""
+        index = shard_of(update, self.size)
+        writer = self.writers[index]
+        writer.write(update.model_dump_json(exclude_unset=True).encode() + b"\n")
+        await writer.drain()
+        self.routed[index] += 1
+
+    async def stop(self, timeout: float):
+        """EOF воркерам и ожидание их завершения"""
+        for writer in self.writers:
+            writer.close()
+        await asyncio.gather(*(w.wait_closed() for w in self.writers), return_exceptions=True)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, max(deadline - loop.time(), 0) + 1)
+            if process.is_alive():
+                logger.warning(f"{process.name} не завершился за {timeout} с — останавливаем")
+                process.terminate()
+        logger.info(f"Обновлений по воркерам: {self.routed}")
+
+
+async def _poll(bot: Bot, cluster: Cluster, allowed_updates: List[str], stop: asyncio.Event):
+    """Long polling во фронте: getUpdates → воркеры; пачка всегда раздаётся целиком"""
+    await bot.delete_webhook()
+    offset: Optional[int] = None
+    stopped = asyncio.create_task(stop.wait())
+    try:
+        while not stop.is_set():
+            request = asyncio.create_task(
+                bot.get_updates(offset=offset, timeout=25, allowed_updates=allowed_updates)
+            )
+            await asyncio.wait({request, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            if not request.done():
+                request.cancel()
+                await asyncio.gather(request, return_exceptions=True)
+                break
+            try:
+                updates = request.result()
+            except Exception as e:
+                logger.warning(f"getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                await cluster.feed(update)
+                offset = update.update_id + 1
+
+        if offset is not None:
+            # Подтверждаем розданные обновления, чтобы после перезапуска они не пришли снова
+            await bot.get_updates(offset=offset, timeout=0, limit=1)
+    finally:
+        stopped.cancel()
+
+
+async def main(workers: Optional[int] = None, webhook: bool = False) -> None:
+    await prepare()
+
+    size = workers or settings.CLUSTER_WORKERS or os.cpu_count() or 1
+    if size > 1 and settings.FSM_STORAGE != "redis":
+        logger.warning("FSM_STORAGE=memory: состояние диалогов потеряется при перезапуске или смене числа воркеров")
+
+    bot = create_bot()
+    # Диспетчер фронта сам ничего не обрабатывает: нужен для списка типов обновлений и webhook
+    dp = create_dispatcher()
+    allowed_updates = dp.resolve_used_update_types()
+
+    cluster = Cluster(size)
+    await cluster.start()
+    logging.info(f"🤖 SwapBot запущен ({'webhook' if webhook else 'polling'}, {size} воркеров)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    runner: Optional[web.AppRunner] = None
+    try:
+        if webhook:
+            from app.webhook import WebhookServer
+
+            server = WebhookServer(
+                bot, dp,
+                secret=settings.WEBHOOK_SECRET,
+                path=settings.WEBHOOK_PATH,
+                queue_size=settings.WEBHOOK_QUEUE_SIZE,
+                feed=cluster.feed,
+            )
+            if settings.WEBHOOK_SET_ON_STARTUP:
+                if not settings.WEBHOOK_URL:
+                    raise SystemExit("WEBHOOK_URL не задан. Укажите публичный адрес бота или WEBHOOK_SET_ON_STARTUP=false")
+                await bot.set_webhook(
+                    settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+                    secret_token=settings.WEBHOOK_SECRET or None,
+                    allowed_updates=allowed_updates,
+                    max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                )
+            runner = web.AppRunner(server.app, handle_signals=False)
+            await runner.setup()
+            await web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT).start()
+            await stop.wait()
+            await server.drain(settings.WEBHOOK_DRAIN_TIMEOUT)
+        else:
+            await _poll(bot, cluster, allowed_updates, stop)
+
+        logging.info("Остановка: дожидаемся воркеров")
+    finally:
+        await cluster.stop(settings.WEBHOOK_DRAIN_TIMEOUT)
+        if runner:
+            await runner.cleanup()
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SwapBot в несколько процессов")
+    parser.add_argument("--workers", type=int, help="число воркеров (по умолчанию CLUSTER_WORKERS или число ядер)")
+    parser.add_argument("--webhook", action="store_true", help="принимать обновления через webhook")
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.webhook))
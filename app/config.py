@@ -15,6 +15,28 @@ class Settings(BaseSettings):
     # Telegram
     BOT_TOKEN: str = Field(default="", env="BOT_TOKEN")
     ADMIN_IDS: str = Field(default="", env="ADMIN_IDS")
+    TELEGRAM_API_URL: Optional[str] = Field(default=None, env="TELEGRAM_API_URL")  # Свой Bot API сервер / тестовый стенд
+
+    # Webhook (python -m app.webhook)
+    WEBHOOK_URL: Optional[str] = Field(default=None, env="WEBHOOK_URL")  # Публичный адрес, например https://bot.example.com
+    WEBHOOK_PATH: str = Field(default="/webhook", env="WEBHOOK_PATH")
+    WEBHOOK_SECRET: str = Field(default="", env="WEBHOOK_SECRET")
+    WEBHOOK_HOST: str = Field(default="0.0.0.0", env="WEBHOOK_HOST")
+    WEBHOOK_PORT: int = Field(default=8080, env="WEBHOOK_PORT")
+    WEBHOOK_SET_ON_STARTUP: bool = Field(default=True, env="WEBHOOK_SET_ON_STARTUP")
+    WEBHOOK_MAX_CONNECTIONS: int = Field(default=40, env="WEBHOOK_MAX_CONNECTIONS")
+    WEBHOOK_QUEUE_SIZE: int = Field(default=1000, env="WEBHOOK_QUEUE_SIZE")
+    WEBHOOK_DRAIN_TIMEOUT: int = Field(default=25, env="WEBHOOK_DRAIN_TIMEOUT")
+
+    # Обработка обновлений: по порядку внутри чата, параллельно между чатами
+    UPDATE_CONCURRENCY: int = Field(default=64, env="UPDATE_CONCURRENCY")
+    UPDATE_MAX_PENDING: int = Field(default=1000, env="UPDATE_MAX_PENDING")
+
+    # FSM: memory — в процессе, redis — общее хранилище (REDIS_URL), переживает перезапуск
+    FSM_STORAGE: str = Field(default="memory", env="FSM_STORAGE")
+
+    # Кластер (python -m app.cluster): число воркер-процессов, 0 — по числу ядер
+    CLUSTER_WORKERS: int = Field(default=0, env="CLUSTER_WORKERS")
 
     # Database
     DATABASE_URL: str = Field(
@@ -22,20 +44,33 @@ class Settings(BaseSettings):
         env="DATABASE_URL"
     )
     DB_PATH: str = Field(default="bot.db", env="DB_PATH")
+    # Модели бота: sqlite — aiosqlite и DB_PATH, sqlalchemy — ORM и DATABASE_URL (Postgres)
+    DB_BACKEND: str = Field(default="sqlite", env="DB_BACKEND")
+    # Пул соединений процесса для DATABASE_URL (postgresql+asyncpg)
+    DB_POOL_SIZE: int = Field(default=5, env="DB_POOL_SIZE")
+    DB_MAX_OVERFLOW: int = Field(default=5, env="DB_MAX_OVERFLOW")
+    DB_POOL_TIMEOUT: float = Field(default=10.0, env="DB_POOL_TIMEOUT")
+    DB_POOL_RECYCLE: int = Field(default=1800, env="DB_POOL_RECYCLE")
+    DB_STATEMENT_TIMEOUT_MS: int = Field(default=5000, env="DB_STATEMENT_TIMEOUT_MS")
 
     # Redis
     REDIS_URL: str = Field(default="redis://localhost:6379/0", env="REDIS_URL")
 
     # Storage
     MEDIA_PATH: Path = Field(default=Path("media"))
+    MEDIA_CACHE_MAX_MB: int = Field(default=1024, env="MEDIA_CACHE_MAX_MB")
+    MEDIA_WORKERS: int = Field(default=4, env="MEDIA_WORKERS")
     USE_S3: bool = Field(default=False, env="USE_S3")
     S3_BUCKET: Optional[str] = Field(default=None, env="S3_BUCKET")
     S3_REGION: Optional[str] = Field(default=None, env="S3_REGION")
     S3_ACCESS_KEY: Optional[str] = Field(default=None, env="S3_ACCESS_KEY")
     S3_SECRET_KEY: Optional[str] = Field(default=None, env="S3_SECRET_KEY")
+    S3_ENDPOINT_URL: Optional[str] = Field(default=None, env="S3_ENDPOINT_URL")  # MinIO и другие S3-совместимые
+    MEDIA_UPLOAD_CHAT_ID: Optional[int] = Field(default=None, env="MEDIA_UPLOAD_CHAT_ID")  # Чат для загрузки фото импорта
 
     # AI & ML
     USE_AI_RECOMMENDATIONS: bool = Field(default=False, env="USE_AI_RECOMMENDATIONS")
+    AI_SIMILAR_CANDIDATES: int = Field(default=200, env="AI_SIMILAR_CANDIDATES")  # объявлений категории на «Похожие»
     OPENAI_API_KEY: Optional[str] = Field(default=None, env="OPENAI_API_KEY")
 
     # SMS API (для верификации)
@@ -64,6 +99,9 @@ class Settings(BaseSettings):
     # Геймификация
     GAMIFICATION_ENABLED: bool = Field(default=True, env="GAMIFICATION_ENABLED")
     REFERRAL_BONUS: int = Field(default=10, env="REFERRAL_BONUS")
+    REFERRAL_BATCH_SIZE: int = Field(default=200, env="REFERRAL_BATCH_SIZE")  # приглашений за транзакцию
+    REFERRAL_FLUSH_INTERVAL: float = Field(default=1.0, env="REFERRAL_FLUSH_INTERVAL")  # секунды
+    REFERRAL_QUEUE_SIZE: int = Field(default=10000, env="REFERRAL_QUEUE_SIZE")
 
     # Модерация
     AUTO_MODERATION: bool = Field(default=True, env="AUTO_MODERATION")
@@ -71,6 +109,29 @@ class Settings(BaseSettings):
 
     # Аналитика
     ANALYTICS_ENABLED: bool = Field(default=True, env="ANALYTICS_ENABLED")
+    ANALYTICS_ROLLUP_INTERVAL: int = Field(default=300, env="ANALYTICS_ROLLUP_INTERVAL")
+    ANALYTICS_EXPORT_DIR: Path = Field(default=Path("analytics_export"), env="ANALYTICS_EXPORT_DIR")
+    ANALYTICS_CELL_DEG: float = Field(default=0.1, env="ANALYTICS_CELL_DEG")
+
+    # Таблицы лидеров (app/services/leaderboard.py)
+    LEADERBOARD_TOP: int = Field(default=10, env="LEADERBOARD_TOP")
+    LEADERBOARD_REFRESH: float = Field(default=5, env="LEADERBOARD_REFRESH")  # секунды между подгрузками изменений
+    LEADERBOARD_CACHED_BOARDS: int = Field(default=256, env="LEADERBOARD_CACHED_BOARDS")
+
+    # Избранное (app/services/favorites.py)
+    FAVORITES_CACHED_USERS: int = Field(default=10000, env="FAVORITES_CACHED_USERS")  # наборов в памяти процесса
+    FAVORITES_CACHE_TTL: float = Field(default=300, env="FAVORITES_CACHE_TTL")  # секунды до перечитывания набора
+    FAVORITES_NOTIFY_BATCH: int = Field(default=100, env="FAVORITES_NOTIFY_BATCH")  # изменений объявлений за выборку
+    FAVORITES_NOTIFY_INTERVAL: float = Field(default=1.0, env="FAVORITES_NOTIFY_INTERVAL")  # секунды сбора пачки
+    FAVORITES_NOTIFY_RATE: int = Field(default=25, env="FAVORITES_NOTIFY_RATE")  # сообщений в секунду
+    FAVORITES_QUEUE_SIZE: int = Field(default=10000, env="FAVORITES_QUEUE_SIZE")
+
+    # Сохранённые поиски (app/services/saved_searches.py)
+    SAVED_SEARCH_REFRESH: float = Field(default=30, env="SAVED_SEARCH_REFRESH")  # секунды между догрузками индекса
+    SAVED_SEARCH_NOTIFY_BATCH: int = Field(default=200, env="SAVED_SEARCH_NOTIFY_BATCH")  # новых объявлений за пачку
+    SAVED_SEARCH_NOTIFY_INTERVAL: float = Field(default=2.0, env="SAVED_SEARCH_NOTIFY_INTERVAL")  # секунды сбора пачки
+    SAVED_SEARCH_NOTIFY_RATE: int = Field(default=25, env="SAVED_SEARCH_NOTIFY_RATE")  # сообщений в секунду
+    SAVED_SEARCH_QUEUE_SIZE: int = Field(default=10000, env="SAVED_SEARCH_QUEUE_SIZE")
 
     # Локализация
     DEFAULT_LANGUAGE: str = Field(default="ru", env="DEFAULT_LANGUAGE")
@@ -99,7 +160,19 @@ class Settings(BaseSettings):
 
     # Админка
     ADMIN_PANEL_ENABLED: bool = Field(default=True, env="ADMIN_PANEL_ENABLED")
+    ADMIN_PANEL_HOST: str = Field(default="127.0.0.1", env="ADMIN_PANEL_HOST")  # 0.0.0.0 — только за прокси/в контейнере
     ADMIN_PANEL_PORT: int = Field(default=8000, env="ADMIN_PANEL_PORT")
+    ADMIN_TOKEN: str = Field(default="", env="ADMIN_TOKEN")  # Authorization: Bearer <ADMIN_TOKEN>; пусто — админка закрыта
+    ADMIN_DB_POOL_SIZE: int = Field(default=4, env="ADMIN_DB_POOL_SIZE")  # соединений только для чтения
+    ADMIN_CACHE_TTL: int = Field(default=5, env="ADMIN_CACHE_TTL")  # секунд
+    ADMIN_EXPORT_CONCURRENCY: int = Field(default=2, env="ADMIN_EXPORT_CONCURRENCY")
+    ADMIN_EXPORT_CHUNK: int = Field(default=5000, env="ADMIN_EXPORT_CHUNK")  # строк за запрос
+
+    # Живая лента админки (SSE, admin/feed.py)
+    EVENTS_POLL_INTERVAL: float = Field(default=0.5, env="EVENTS_POLL_INTERVAL")  # секунды между чтениями журнала
+    EVENTS_SUBSCRIBER_QUEUE: int = Field(default=256, env="EVENTS_SUBSCRIBER_QUEUE")  # событий на клиента
+    EVENTS_KEEPALIVE: int = Field(default=15, env="EVENTS_KEEPALIVE")
+    EVENTS_RETENTION_DAYS: int = Field(default=7, env="EVENTS_RETENTION_DAYS")
 
     # Celery
     CELERY_BROKER_URL: str = Field(
@@ -107,6 +180,19 @@ class Settings(BaseSettings):
         env="CELERY_BROKER_URL"
     )
 
+    # Метрики (Prometheus на /metrics админки); выключены — без накладных расходов
+    METRICS_ENABLED: bool = Field(default=False, env="METRICS_ENABLED")
+    METRICS_DIR: Path = Field(default=Path("metrics"), env="METRICS_DIR")
+    METRICS_EXPORT_INTERVAL: int = Field(default=15, env="METRICS_EXPORT_INTERVAL")
+    METRICS_SLOW_QUERY_MS: int = Field(default=200, env="METRICS_SLOW_QUERY_MS")
+
+    # Профилирование живого процесса (/profile в боте, POST /profile в админке)
+    PROFILER_ENABLED: bool = Field(default=False, env="PROFILER_ENABLED")
+    PROFILER_DIR: Path = Field(default=Path("profiles"), env="PROFILER_DIR")
+    PROFILER_MAX_SECONDS: int = Field(default=60, env="PROFILER_MAX_SECONDS")
+    # Лог колбэков, держащих event loop дольше, мс (0 — выключено)
+    LOOP_SLOW_CALLBACK_MS: int = Field(default=0, env="LOOP_SLOW_CALLBACK_MS")
+
     # Логирование
     LOG_LEVEL: str = Field(default="INFO", env="LOG_LEVEL")
     LOG_FILE: Optional[Path] = Field(default=None, env="LOG_FILE")
@@ -126,6 +212,10 @@ class Constants:
     MIN_RATING = 1
     MAX_RATING = 5
 
+    # Таблицы лидеров (зашиты в триггеры БД — после изменения нужен LEADERBOARD_REBUILD)
+    LEADERBOARD_CELL_DEG = 0.5  # гео-ячейка «города», градусы
+    LEADERBOARD_MIN_RATINGS = 3  # отзывов, чтобы попасть в таблицу по рейтингу
+
     # Категории
     CATEGORIES = {
         "electronics": {
@@ -200,6 +290,25 @@ class Constants:
     MAX_TITLE_LEN = 150
     MAX_DESC_LEN = 500
 
+    # Размер страницы личных списков («Мои объявления», предложения обмена)
+    MY_ADS_PAGE_SIZE = 10
+    SWAPS_PAGE_SIZE = 5
+    FAVORITES_PAGE_SIZE = 5
+
+    # Сохранённые поиски: не больше SAVED_SEARCHES_PER_USER на пользователя; индекс делит
+    # карту на ячейки SAVED_SEARCH_CELL_DEG°, у одного поиска — не больше SAVED_SEARCH_MAX_KEYS
+    # ключей (ячейки × ценовые полосы), иначе условие проверяется только при сверке
+    SAVED_SEARCHES_PER_USER = 10
+    SAVED_SEARCH_CELL_DEG = 0.2
+    SAVED_SEARCH_MAX_KEYS = 64
+
+    # Размеры фото: имя → (длинная сторона, формат)
+    MEDIA_SIZES = {
+        "thumb": (160, "webp"),
+        "medium": (640, "webp"),
+        "telegram": (1280, "jpeg"),
+    }
+
     # Сообщения
     MESSAGES = {}
     CATEGORY_BUTTONS = {}
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from .db import init_db
-from .models import UserModel, AdModel, SwapModel, RatingModel, FavoriteModel
+from .models import UserModel, AdModel, SwapModel, RatingModel, FavoriteModel, MediaModel, MediaRegistryModel
 from . import crud
 
-__all__ = ["init_db", "UserModel", "AdModel", "SwapModel", "RatingModel", "FavoriteModel", "crud"]
+__all__ = ["init_db", "UserModel", "AdModel", "SwapModel", "RatingModel", "FavoriteModel", "MediaModel", "MediaRegistryModel", "crud"]
@@ -1,7 +1,47 @@
 # -*- coding: utf-8 -*-
 """
-CRUD-операции. Сейчас — обёртка над models (aiosqlite).
+Слой доступа к данным для обработчиков и сервисов.
+
+DB_BACKEND=sqlite — модели aiosqlite (models.py), DB_BACKEND=sqlalchemy — те же классы
+поверх ORM и DATABASE_URL (repository.py). Оба возвращают одни и те же записи
+(records.py); медиа, статистика /stats, таблицы лидеров, уровни и достижения
+(правила — gamification_service) и приглашения — тоже у обоих.
+
+Админка (пул только для чтения, выгрузки, живая лента событий, свёртки analytics) и
+пакетная дедупликация читают файл SQLite напрямую: с DB_BACKEND=sqlalchemy они
+не запускаются (require_sqlite), а не показывают пустые данные.
 """
-from app.database.models import UserModel, AdModel, SwapModel, RatingModel, FavoriteModel
+from app.config import settings
+
+ORM_BACKEND = settings.DB_BACKEND == "sqlalchemy"
+
+if ORM_BACKEND:
+    from app.database.repository import (
+        UserModel, AdModel, SwapModel, RatingModel, ReferralModel, FavoriteModel, UserCounterModel,
+        SavedSearchModel, LeaderboardModel, StatsModel, MediaModel, MediaRegistryModel,
+    )
+else:
+    from app.database.models import (
+        UserModel, AdModel, SwapModel, RatingModel, ReferralModel, FavoriteModel, UserCounterModel,
+        SavedSearchModel, LeaderboardModel, StatsModel, MediaModel, MediaRegistryModel,
+    )
+
+
+async def init():
+    """Подготовка выбранного бэкенда при старте (таблицы ORM создаются, если их нет)"""
+    if ORM_BACKEND:
+        from app.database.repository import init_models
+        await init_models()
+
+
+def require_sqlite(component: str):
+    """Для частей, что читают файл SQLite напрямую: с DB_BACKEND=sqlalchemy — отказ при запуске"""
+    if ORM_BACKEND:
+        raise RuntimeError(f"{component} работает только с DB_BACKEND=sqlite: данные бота в DATABASE_URL")
+
 
-__all__ = ["UserModel", "AdModel", "SwapModel", "RatingModel", "FavoriteModel"]
+__all__ = [
+    "ORM_BACKEND", "require_sqlite", "UserModel", "AdModel", "SwapModel", "RatingModel", "ReferralModel",
+    "FavoriteModel", "UserCounterModel", "SavedSearchModel", "LeaderboardModel", "StatsModel", "MediaModel",
+    "MediaRegistryModel",
+]
@@ -7,6 +7,353 @@ from app.config import constants, get_db_path
 logger = logging.getLogger(__name__)
 
 
+# ==================== СЧЁТЧИКИ СТАТИСТИКИ ====================
+# stats_counters — текущие значения (пользователи, объявления, активные по категориям,
+# обмены по статусам, просмотры); stats_daily — приращения тех же счётчиков за день
+# (UTC) и дневные события (new_users, active_users, new_ads, new_swaps, status:<статус>).
+# Их ведут триггеры, поэтому любой путь записи (бот, админка, ручной SQL) учитывается,
+# а /stats читает пару десятков строк вместо COUNT(*) по большим таблицам.
+# Итог счётчика на конец дня D = текущее значение − сумма приращений после D.
+
+def _bump(name: str, delta: str = "1", day: str = "date('now')", when: str = "1") -> str:
+    """Счётчик name += delta: итог в stats_counters, приращение за day в stats_daily"""
+    return f"""
+    INSERT INTO stats_counters (name, value) SELECT {name}, {delta} WHERE {when}
+        ON CONFLICT(name) DO UPDATE SET value=value+excluded.value;
+    INSERT INTO stats_daily (day, name, value) SELECT {day}, {name}, {delta} WHERE {when}
+        ON CONFLICT(day, name) DO UPDATE SET value=value+excluded.value;"""
+
+
+def _event(name: str, day: str, when: str = "1") -> str:
+    """Дневное событие (без итогового счётчика)"""
+    return f"""
+    INSERT INTO stats_daily (day, name, value) SELECT {day}, {name}, 1 WHERE {when}
+        ON CONFLICT(day, name) DO UPDATE SET value=value+1;"""
+
+
+def _touch(user_id: str, at: str) -> str:
+    """Отметить активность пользователя (не чаще раза в день — срабатывает stats_users_active)"""
+    return f"""
+    UPDATE users SET last_active={at}
+        WHERE tg_id={user_id} AND (last_active IS NULL OR date(last_active) < date({at}));"""
+
+
+def _day(column: str) -> str:
+    return f"date(COALESCE({column}, 'now'))"
+
+
+STATS_TRIGGERS = {
+    "stats_users_insert": "AFTER INSERT ON users BEGIN"
+        + _bump("'users'", day=_day("NEW.created_at"))
+        + _event("'new_users'", _day("NEW.created_at"))
+        + _event("'active_users'", _day("NEW.last_active")) + "\nEND",
+    "stats_users_delete": "AFTER DELETE ON users BEGIN" + _bump("'users'", "-1") + "\nEND",
+    "stats_users_active": "AFTER UPDATE OF last_active ON users "
+        "WHEN NEW.last_active IS NOT NULL AND date(NEW.last_active) IS NOT date(OLD.last_active) BEGIN"
+        + _event("'active_users'", "date(NEW.last_active)") + "\nEND",
+
+    "stats_ads_insert": "AFTER INSERT ON ads BEGIN"
+        + _bump("'ads'", day=_day("NEW.created_at"))
+        + _bump("'ads_active:' || NEW.category", day=_day("NEW.created_at"), when="NEW.is_active = 1")
+        + _event("'new_ads'", _day("NEW.created_at"))
+        + _touch("NEW.user_tg_id", "COALESCE(NEW.created_at, CURRENT_TIMESTAMP)") + "\nEND",
+    "stats_ads_update": "AFTER UPDATE OF is_active, category ON ads "
+        "WHEN OLD.is_active IS NOT NEW.is_active OR OLD.category IS NOT NEW.category BEGIN"
+        + _bump("'ads_active:' || OLD.category", "-1", when="OLD.is_active = 1")
+        + _bump("'ads_active:' || NEW.category", when="NEW.is_active = 1") + "\nEND",
+    "stats_ads_delete": "AFTER DELETE ON ads BEGIN"
+        + _bump("'ads'", "-1")
+        + _bump("'ads_active:' || OLD.category", "-1", when="OLD.is_active = 1") + "\nEND",
+
+    "stats_swaps_insert": "AFTER INSERT ON swap_proposals BEGIN"
+        + _bump("'swaps'", day=_day("NEW.proposed_at"))
+        + _bump("'swaps:' || NEW.status", day=_day("NEW.proposed_at"))
+        + _event("'new_swaps'", _day("NEW.proposed_at"))
+        + _touch("NEW.proposer_user_id", "COALESCE(NEW.proposed_at, CURRENT_TIMESTAMP)") + "\nEND",
+    "stats_swaps_update": "AFTER UPDATE OF status ON swap_proposals WHEN OLD.status IS NOT NEW.status BEGIN"
+        + _bump("'swaps:' || OLD.status", "-1")
+        + _bump("'swaps:' || NEW.status")
+        + _event("'status:' || NEW.status", _day("NEW.responded_at")) + "\nEND",
+    "stats_swaps_delete": "AFTER DELETE ON swap_proposals BEGIN"
+        + _bump("'swaps'", "-1")
+        + _bump("'swaps:' || OLD.status", "-1") + "\nEND",
+
+    "stats_views_insert": "AFTER INSERT ON ad_views BEGIN"
+        + _bump("'views'", day=_day("NEW.viewed_at"))
+        + _touch("NEW.viewer_id", "COALESCE(NEW.viewed_at, CURRENT_TIMESTAMP)") + "\nEND",
+}
+
+# Пересчёт с нуля: для существующих БД и после массовой загрузки без триггеров.
+# Время деактиваций и смен статуса неизвестно — приращения относятся ко дню
+# создания (или ответа), так что суммы по дням сходятся с итогами.
+STATS_REBUILD = """
+DELETE FROM stats_counters;
+DELETE FROM stats_daily;
+
+INSERT INTO stats_counters (name, value) SELECT 'users', COUNT(*) FROM users;
+INSERT INTO stats_counters (name, value) SELECT 'ads', COUNT(*) FROM ads;
+INSERT INTO stats_counters (name, value)
+    SELECT 'ads_active:' || category, COUNT(*) FROM ads WHERE is_active = 1 GROUP BY category;
+INSERT INTO stats_counters (name, value) SELECT 'swaps', COUNT(*) FROM swap_proposals;
+INSERT INTO stats_counters (name, value) SELECT 'swaps:' || status, COUNT(*) FROM swap_proposals GROUP BY status;
+INSERT INTO stats_counters (name, value) SELECT 'views', COUNT(*) FROM ad_views;
+
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(created_at, 'now')), 'users', COUNT(*) FROM users GROUP BY 1;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(created_at, 'now')), 'new_users', COUNT(*) FROM users GROUP BY 1;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(created_at, 'now')), 'ads', COUNT(*) FROM ads GROUP BY 1;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(created_at, 'now')), 'new_ads', COUNT(*) FROM ads GROUP BY 1;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(created_at, 'now')), 'ads_active:' || category, COUNT(*)
+    FROM ads WHERE is_active = 1 GROUP BY 1, 2;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(proposed_at, 'now')), 'swaps', COUNT(*) FROM swap_proposals GROUP BY 1;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(proposed_at, 'now')), 'new_swaps', COUNT(*) FROM swap_proposals GROUP BY 1;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(responded_at, proposed_at, 'now')), 'swaps:' || status, COUNT(*)
+    FROM swap_proposals GROUP BY 1, 2;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(responded_at), 'status:' || status, COUNT(*)
+    FROM swap_proposals WHERE responded_at IS NOT NULL GROUP BY 1, 2;
+INSERT INTO stats_daily (day, name, value)
+    SELECT date(COALESCE(viewed_at, 'now')), 'views', COUNT(*) FROM ad_views GROUP BY 1;
+INSERT INTO stats_daily (day, name, value)
+    SELECT day, 'active_users', COUNT(*) FROM (
+        SELECT date(last_active) AS day, tg_id AS uid FROM users WHERE last_active IS NOT NULL
+        UNION SELECT date(created_at), user_tg_id FROM ads WHERE created_at IS NOT NULL
+        UNION SELECT date(proposed_at), proposer_user_id FROM swap_proposals WHERE proposed_at IS NOT NULL
+        UNION SELECT date(viewed_at), viewer_id FROM ad_views WHERE viewed_at IS NOT NULL
+    ) GROUP BY day;
+
+DELETE FROM analytics;
+"""
+
+
+# ==================== ЛЕНТА СОБЫТИЙ ====================
+# Журнал событий для живой ленты админки (app.services.events): бот и админка —
+# разные процессы, поэтому события пишут триггеры, а админка читает журнал по id.
+
+def _log_event(kind: str, payload: str) -> str:
+    return f"""
+    INSERT INTO events (type, payload) VALUES ('{kind}', json_object({payload}));"""
+
+
+EVENT_TRIGGERS = {
+    "events_ad_created": "AFTER INSERT ON ads BEGIN" + _log_event(
+        "ad_created",
+        "'ad_id', NEW.id, 'user_id', NEW.user_tg_id, 'category', NEW.category, 'title', NEW.title",
+    ) + "\nEND",
+    "events_swap_proposed": "AFTER INSERT ON swap_proposals BEGIN" + _log_event(
+        "swap_proposed",
+        "'swap_id', NEW.id, 'liked_ad_id', NEW.liked_ad_id, 'proposer_ad_id', NEW.proposer_ad_id, "
+        "'proposer_user_id', NEW.proposer_user_id, 'target_user_id', NEW.target_user_id",
+    ) + "\nEND",
+    "events_swap_status": "AFTER UPDATE OF status ON swap_proposals WHEN OLD.status IS NOT NEW.status BEGIN" + _log_event(
+        "swap_status",
+        "'swap_id', NEW.id, 'status', NEW.status, 'previous', OLD.status, "
+        "'proposer_user_id', NEW.proposer_user_id, 'target_user_id', NEW.target_user_id",
+    ) + "\nEND",
+    "events_report_filed": "AFTER INSERT ON reports BEGIN" + _log_event(
+        "report_filed",
+        "'report_id', NEW.id, 'reporter_id', NEW.reporter_id, 'reported_user_id', NEW.reported_user_id, "
+        "'reported_ad_id', NEW.reported_ad_id, 'reason', NEW.reason",
+    ) + "\nEND",
+}
+
+# ==================== ТАБЛИЦЫ ЛИДЕРОВ ====================
+# leaderboard(board, user_id, score) — материализованные таблицы лидеров:
+#   swaps, swaps:cell:<ячейка>, swaps:cat:<категория> — завершённые обмены,
+#   rating, rating:cell:<ячейка> — рейтинг (от LEADERBOARD_MIN_RATINGS отзывов),
+#   xp, xp:cell:<ячейка> — опыт (users.experience_points, от первого очка).
+# Строки обновляют триггеры; seq растёт с каждой записью, чтобы app.services.leaderboard
+# подгружал в память только изменения. score IS NULL — пользователь выбыл из таблицы
+# (строка остаётся, чтобы выбывание тоже дошло до кеша; LEADERBOARD_REBUILD их убирает).
+# Ячейка «города» — целые floor(lat / LEADERBOARD_CELL_DEG):floor(lon / LEADERBOARD_CELL_DEG),
+# см. leaderboard.cell_key.
+
+_LB_SEQ = "(SELECT COALESCE(MAX(seq), 0) + 1 FROM leaderboard)"
+
+
+def _floor(value: str) -> str:
+    return f"(CAST({value} AS INTEGER) - ({value} < CAST({value} AS INTEGER)))"
+
+
+def _cell(lat: str, lon: str) -> str:
+    """Ключ ячейки; NULL, если координат нет"""
+    size = constants.LEADERBOARD_CELL_DEG
+    return f"({_floor(f'{lat} / {size}')} || ':' || {_floor(f'{lon} / {size}')})"
+
+
+def _user_cell(user_id: str) -> str:
+    return f"(SELECT {_cell('latitude', 'longitude')} FROM users WHERE tg_id={user_id})"
+
+
+def _lb_write(board: str, user_id: str, score: str, update: str, when: str = "1") -> str:
+    """Запись строки board; update — новое значение при конфликте (score — старое, excluded.score — новое)"""
+    return f"""
+    INSERT INTO leaderboard (board, user_id, score, seq)
+        SELECT board, {user_id}, {score}, {_LB_SEQ} FROM (SELECT {board} AS board)
+        WHERE board IS NOT NULL AND {when}
+        ON CONFLICT(board, user_id) DO UPDATE SET score={update}, seq=excluded.seq;"""
+
+
+def _lb_swaps(delta: str) -> str:
+    """Обмен завершён (+1) или отменён после завершения (-1) — для обоих участников"""
+    sql = ""
+    for user_id, ad_id in (("NEW.proposer_user_id", "NEW.proposer_ad_id"), ("NEW.target_user_id", "NEW.liked_ad_id")):
+        for board in ("'swaps'", f"'swaps:cell:' || {_user_cell(user_id)}",
+                      f"'swaps:cat:' || (SELECT category FROM ads WHERE id={ad_id})"):
+            sql += _lb_write(board, user_id, delta, f"NULLIF(COALESCE(score, 0) + {delta}, 0)")
+    return sql
+
+
+def _lb_retire(user_id: str, boards: str = None) -> str:
+    """Убрать пользователя из таблиц boards (все таблицы — полный просмотр, только для удаления)"""
+    where = f"board IN ({boards}) AND " if boards else ""
+    return f"""
+    UPDATE leaderboard SET score=NULL, seq={_LB_SEQ}
+        WHERE {where}user_id={user_id} AND score IS NOT NULL;"""
+
+
+_COMPLETED = f"'{constants.SWAP_STATUS_COMPLETED}'"
+# Средняя оценка — то же значение, что RatingModel.add_rating пишет в users.rating
+_AVG_RATING = "(SELECT AVG(rating) FROM ratings WHERE to_user_id=NEW.to_user_id)"
+_OLD_CELL = _cell("OLD.latitude", "OLD.longitude")
+_NEW_CELL = _cell("NEW.latitude", "NEW.longitude")
+# Глобальные таблицы, у которых есть варианты по ячейкам
+_CELL_METRICS = ("swaps", "rating", "xp")
+_CELL_BOARDS = ", ".join(f"'{metric}'" for metric in _CELL_METRICS)
+
+LEADERBOARD_TRIGGERS = {
+    "leaderboard_swaps_completed": f"AFTER UPDATE OF status ON swap_proposals "
+        f"WHEN NEW.status = {_COMPLETED} AND OLD.status IS NOT {_COMPLETED} BEGIN" + _lb_swaps("1") + "\nEND",
+    "leaderboard_swaps_reverted": f"AFTER UPDATE OF status ON swap_proposals "
+        f"WHEN OLD.status = {_COMPLETED} AND NEW.status IS NOT {_COMPLETED} BEGIN" + _lb_swaps("-1") + "\nEND",
+    # От каждого нового отзыва, а не от изменения users.rating: отзыв, не сдвинувший
+    # среднее (третья пятёрка при рейтинге по умолчанию 5.0), тоже вводит в таблицу
+    "leaderboard_ratings_insert": "AFTER INSERT ON ratings "
+        f"WHEN (SELECT COUNT(*) FROM ratings WHERE to_user_id=NEW.to_user_id) >= {constants.LEADERBOARD_MIN_RATINGS} BEGIN"
+        + _lb_write("'rating'", "NEW.to_user_id", _AVG_RATING, "excluded.score")
+        + _lb_write(f"'rating:cell:' || {_user_cell('NEW.to_user_id')}", "NEW.to_user_id", _AVG_RATING,
+                    "excluded.score") + "\nEND",
+    # Опыт: при любом изменении users.experience_points (достижения, обмены, приглашения)
+    "leaderboard_users_xp": "AFTER UPDATE OF experience_points ON users "
+        "WHEN NEW.experience_points IS NOT OLD.experience_points BEGIN"
+        + _lb_write("'xp'", "NEW.tg_id", "NULLIF(NEW.experience_points, 0)", "excluded.score")
+        + _lb_write(f"'xp:cell:' || {_NEW_CELL}", "NEW.tg_id", "NULLIF(NEW.experience_points, 0)",
+                    "excluded.score") + "\nEND",
+    # Переезд: строки ячеек переносятся из старой в новую с текущими значениями
+    "leaderboard_users_move": "AFTER UPDATE OF latitude, longitude ON users "
+        f"WHEN {_OLD_CELL} IS NOT {_NEW_CELL} BEGIN"
+        + _lb_retire("OLD.tg_id", ", ".join(f"'{metric}:cell:' || {_OLD_CELL}" for metric in _CELL_METRICS))
+        + f"""
+    INSERT INTO leaderboard (board, user_id, score, seq)
+        SELECT board || ':cell:' || {_NEW_CELL}, user_id, score, {_LB_SEQ} FROM leaderboard
+        WHERE board IN ({_CELL_BOARDS}) AND user_id=NEW.tg_id AND score IS NOT NULL AND {_NEW_CELL} IS NOT NULL
+        ON CONFLICT(board, user_id) DO UPDATE SET score=excluded.score, seq=excluded.seq;""" + "\nEND",
+    "leaderboard_users_delete": "AFTER DELETE ON users BEGIN" + _lb_retire("OLD.tg_id") + "\nEND",
+}
+
+# Пересчёт с нуля (существующие БД, массовая загрузка, смена констант ячейки/порога)
+LEADERBOARD_REBUILD = f"""
+DELETE FROM leaderboard;
+
+INSERT INTO leaderboard (board, user_id, score, seq)
+    SELECT 'swaps', user_id, COUNT(*), 0 FROM (
+        SELECT proposer_user_id AS user_id FROM swap_proposals WHERE status = {_COMPLETED}
+        UNION ALL SELECT target_user_id FROM swap_proposals WHERE status = {_COMPLETED}
+    ) GROUP BY user_id;
+INSERT INTO leaderboard (board, user_id, score, seq)
+    SELECT 'swaps:cat:' || ads.category, done.user_id, COUNT(*), 0 FROM (
+        SELECT proposer_user_id AS user_id, proposer_ad_id AS ad_id FROM swap_proposals WHERE status = {_COMPLETED}
+        UNION ALL SELECT target_user_id, liked_ad_id FROM swap_proposals WHERE status = {_COMPLETED}
+    ) AS done JOIN ads ON ads.id = done.ad_id GROUP BY ads.category, done.user_id;
+INSERT INTO leaderboard (board, user_id, score, seq)
+    SELECT 'rating', to_user_id, users.rating, 0 FROM ratings JOIN users ON users.tg_id = ratings.to_user_id
+    GROUP BY to_user_id HAVING COUNT(*) >= {constants.LEADERBOARD_MIN_RATINGS};
+INSERT INTO leaderboard (board, user_id, score, seq)
+    SELECT 'xp', tg_id, experience_points, 0 FROM users WHERE experience_points > 0;
+INSERT INTO leaderboard (board, user_id, score, seq)
+    SELECT leaderboard.board || ':cell:' || {_cell('users.latitude', 'users.longitude')}, user_id, score, 0
+    FROM leaderboard JOIN users ON users.tg_id = leaderboard.user_id
+    WHERE leaderboard.board IN ({_CELL_BOARDS}) AND users.latitude IS NOT NULL AND users.longitude IS NOT NULL;
+"""
+
+# ==================== СЧЁТЧИКИ ПОЛЬЗОВАТЕЛЯ ====================
+# user_counters — размеры личных списков для заголовков и навигации по страницам
+# («Мои объявления», входящие и исходящие предложения, избранное) и сумма просмотров
+# объявлений: ads, ads_active, views, swaps_out, swaps_in:<статус>, favorites. Ведут
+# триггеры, списки выводятся постранично и COUNT(*) по ним не нужен.
+
+def _uc(user_id: str, name: str, delta: str, when: str = "1") -> str:
+    """Счётчик пользователя name += delta"""
+    return f"""
+    INSERT INTO user_counters (user_id, name, value) SELECT {user_id}, {name}, {delta} WHERE {when}
+        ON CONFLICT(user_id, name) DO UPDATE SET value=value+excluded.value;"""
+
+
+USER_COUNTER_TRIGGERS = {
+    "user_counters_ads_insert": "AFTER INSERT ON ads BEGIN"
+        + _uc("NEW.user_tg_id", "'ads'", "1")
+        + _uc("NEW.user_tg_id", "'ads_active'", "1", when="NEW.is_active = 1")
+        + _uc("NEW.user_tg_id", "'views'", "NEW.views", when="NEW.views > 0") + "\nEND",
+    "user_counters_ads_active": "AFTER UPDATE OF is_active ON ads "
+        "WHEN (OLD.is_active = 1) IS NOT (NEW.is_active = 1) BEGIN"
+        + _uc("NEW.user_tg_id", "'ads_active'", "CASE WHEN NEW.is_active = 1 THEN 1 ELSE -1 END") + "\nEND",
+    "user_counters_ads_views": "AFTER UPDATE OF views ON ads WHEN OLD.views IS NOT NEW.views BEGIN"
+        + _uc("NEW.user_tg_id", "'views'", "COALESCE(NEW.views, 0) - COALESCE(OLD.views, 0)") + "\nEND",
+    "user_counters_ads_delete": "AFTER DELETE ON ads BEGIN"
+        + _uc("OLD.user_tg_id", "'ads'", "-1")
+        + _uc("OLD.user_tg_id", "'ads_active'", "-1", when="OLD.is_active = 1")
+        + _uc("OLD.user_tg_id", "'views'", "-OLD.views", when="OLD.views > 0") + "\nEND",
+    "user_counters_swaps_insert": "AFTER INSERT ON swap_proposals BEGIN"
+        + _uc("NEW.proposer_user_id", "'swaps_out'", "1")
+        + _uc("NEW.target_user_id", "'swaps_in:' || NEW.status", "1") + "\nEND",
+    "user_counters_swaps_status": "AFTER UPDATE OF status ON swap_proposals WHEN OLD.status IS NOT NEW.status BEGIN"
+        + _uc("OLD.target_user_id", "'swaps_in:' || OLD.status", "-1")
+        + _uc("NEW.target_user_id", "'swaps_in:' || NEW.status", "1") + "\nEND",
+    "user_counters_swaps_delete": "AFTER DELETE ON swap_proposals BEGIN"
+        + _uc("OLD.proposer_user_id", "'swaps_out'", "-1")
+        + _uc("OLD.target_user_id", "'swaps_in:' || OLD.status", "-1") + "\nEND",
+    "user_counters_favorites_insert": "AFTER INSERT ON favorites BEGIN"
+        + _uc("NEW.user_id", "'favorites'", "1") + "\nEND",
+    "user_counters_favorites_delete": "AFTER DELETE ON favorites BEGIN"
+        + _uc("OLD.user_id", "'favorites'", "-1") + "\nEND",
+}
+
+USER_COUNTERS_REBUILD = """
+DELETE FROM user_counters;
+INSERT INTO user_counters (user_id, name, value)
+    SELECT user_tg_id, 'ads', COUNT(*) FROM ads GROUP BY user_tg_id;
+INSERT INTO user_counters (user_id, name, value)
+    SELECT user_tg_id, 'ads_active', COUNT(*) FROM ads WHERE is_active = 1 GROUP BY user_tg_id;
+INSERT INTO user_counters (user_id, name, value)
+    SELECT user_tg_id, 'views', SUM(views) FROM ads WHERE views > 0 GROUP BY user_tg_id;
+INSERT INTO user_counters (user_id, name, value)
+    SELECT proposer_user_id, 'swaps_out', COUNT(*) FROM swap_proposals GROUP BY proposer_user_id;
+INSERT INTO user_counters (user_id, name, value)
+    SELECT target_user_id, 'swaps_in:' || status, COUNT(*) FROM swap_proposals GROUP BY target_user_id, status;
+INSERT INTO user_counters (user_id, name, value)
+    SELECT user_id, 'favorites', COUNT(*) FROM favorites GROUP BY user_id;
+"""
+
+TRIGGERS = {**STATS_TRIGGERS, **EVENT_TRIGGERS, **LEADERBOARD_TRIGGERS, **USER_COUNTER_TRIGGERS}
+# Заменённые триггеры: удаляются из существующих БД при старте
+RETIRED_TRIGGERS = ("leaderboard_rating", "leaderboard_users_location")
+
+
+async def _ensure_column(db: aiosqlite.Connection, table: str, column: str, ddl: str):
+    """Добавление колонки в существующую таблицу (миграция без Alembic)"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    columns = {row[1] for row in await cursor.fetchall()}
+    if column not in columns:
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
 async def init_db():
     """Инициализация базы данных"""
     path = get_db_path()
@@ -14,6 +361,9 @@ async def init_db():
     
     try:
         async with aiosqlite.connect(path) as db:
+            # WAL: читатели не блокируют писателя (несколько процессов бота, админка)
+            await db.execute("PRAGMA journal_mode=WAL")
+
             # Таблица пользователей
             await db.execute(f"""
             CREATE TABLE IF NOT EXISTS users (
@@ -26,11 +376,51 @@ async def init_db():
                 location_name TEXT,
                 rating REAL DEFAULT {constants.DEFAULT_RATING},
                 total_swaps INTEGER DEFAULT 0,
+                successful_swaps INTEGER DEFAULT 0,
+                level INTEGER DEFAULT 1,
+                experience_points INTEGER DEFAULT 0,
+                phone_verified INTEGER DEFAULT 0,
+                referred_by INTEGER,
+                referral_count INTEGER DEFAULT 0,
+                bonus_points INTEGER DEFAULT 0,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 last_active DATETIME DEFAULT CURRENT_TIMESTAMP
             )
             """)
 
+            # Уровень, достижения и приглашения для старых БД (до геймификации в SQLite-схеме)
+            for column, ddl in (
+                ("successful_swaps", "INTEGER DEFAULT 0"),
+                ("level", "INTEGER DEFAULT 1"),
+                ("experience_points", "INTEGER DEFAULT 0"),
+                ("phone_verified", "INTEGER DEFAULT 0"),
+                ("referred_by", "INTEGER"),
+                ("referral_count", "INTEGER DEFAULT 0"),
+                ("bonus_points", "INTEGER DEFAULT 0"),
+            ):
+                await _ensure_column(db, "users", column, ddl)
+
+            # Прогресс и полученные достижения (как achievement_progress и user_achievements
+            # ORM-схемы; ведёт models._record_event по правилам gamification_service)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS achievement_progress (
+                user_id INTEGER NOT NULL,
+                counter TEXT NOT NULL,
+                value INTEGER NOT NULL DEFAULT 0,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, counter)
+            ) WITHOUT ROWID
+            """)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS user_achievements (
+                user_id INTEGER NOT NULL,
+                achievement_id TEXT NOT NULL,
+                points INTEGER NOT NULL DEFAULT 0,
+                unlocked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, achievement_id)
+            ) WITHOUT ROWID
+            """)
+
             # Таблица объявлений
             await db.execute("""
             CREATE TABLE IF NOT EXISTS ads (
@@ -46,18 +436,32 @@ async def init_db():
                 location_name TEXT,
                 views INTEGER DEFAULT 0,
                 is_active INTEGER NOT NULL DEFAULT 1,
+                text_hash INTEGER,
+                photo_hash INTEGER,
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_tg_id) REFERENCES users (tg_id)
             )
             """)
 
+            # Сигнатуры для старых БД (до появления поиска дубликатов)
+            await _ensure_column(db, "ads", "text_hash", "INTEGER")
+            await _ensure_column(db, "ads", "photo_hash", "INTEGER")
+
             # Индекс для быстрого поиска активных объявлений
             await db.execute("""
             CREATE INDEX IF NOT EXISTS idx_ads_active 
             ON ads(is_active, category, created_at DESC)
             """)
 
+            # Список пользователей в админке: новые первыми; ключ тот же, что в admin.api.USERS
+            # (created_at может быть NULL у старых строк)
+            await db.execute("DROP INDEX IF EXISTS idx_users_created")
+            await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_users_created_key
+            ON users(COALESCE(created_at, ''), tg_id)
+            """)
+
             # Таблица предложений обмена
             await db.execute("""
             CREATE TABLE IF NOT EXISTS swap_proposals (
@@ -108,6 +512,20 @@ async def init_db():
             )
             """)
 
+            # Сохранённые поиски (поля как у models_orm.SavedSearch; filters — JSON,
+            # см. app.services.saved_searches)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS saved_searches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                filters TEXT NOT NULL,
+                notify_on_new INTEGER DEFAULT 1,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (tg_id)
+            )
+            """)
+
             # Таблица просмотров
             await db.execute("""
             CREATE TABLE IF NOT EXISTS ad_views (
@@ -120,9 +538,207 @@ async def init_db():
             )
             """)
 
+            # Жалобы на пользователей и объявления (поля как у models_orm.Report)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reporter_id INTEGER NOT NULL,
+                reported_user_id INTEGER,
+                reported_ad_id INTEGER,
+                reason TEXT NOT NULL,
+                description TEXT NOT NULL DEFAULT '',
+                is_processed INTEGER NOT NULL DEFAULT 0,
+                moderator_id INTEGER,
+                resolution TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                processed_at DATETIME,
+                FOREIGN KEY (reporter_id) REFERENCES users (tg_id),
+                FOREIGN KEY (reported_user_id) REFERENCES users (tg_id),
+                FOREIGN KEY (reported_ad_id) REFERENCES ads (id)
+            )
+            """)
+
+            await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_reports_unprocessed
+            ON reports(is_processed, id)
+            """)
+
+            # LSH-корзины сигнатур объявлений (kind: 't' — текст, 'p' — фото)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS ad_signatures (
+                ad_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                PRIMARY KEY (kind, band, bucket, ad_id),
+                FOREIGN KEY (ad_id) REFERENCES ads (id)
+            ) WITHOUT ROWID
+            """)
+
+            # Обработанные изображения (content-addressed по sha256 исходника)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS media_files (
+                digest TEXT PRIMARY KEY,
+                source_url TEXT,
+                width INTEGER,
+                height INTEGER,
+                size_bytes INTEGER,
+                photo_hash INTEGER,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+            await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_media_source_url
+            ON media_files(source_url)
+            """)
+
+            # Telegram file_id загруженных фото по хешу содержимого
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS media_registry (
+                digest TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                file_unique_id TEXT,
+                uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+            # Счётчики статистики и дневные итоги (ведутся триггерами, см. STATS_TRIGGERS)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS stats_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+            """)
+
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS stats_daily (
+                day TEXT NOT NULL,
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, name)
+            ) WITHOUT ROWID
+            """)
+
+            # Дневные строки аналитики (поля как у models_orm.Analytics)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS analytics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL UNIQUE,
+                total_users INTEGER DEFAULT 0,
+                new_users INTEGER DEFAULT 0,
+                active_users INTEGER DEFAULT 0,
+                total_ads INTEGER DEFAULT 0,
+                new_ads INTEGER DEFAULT 0,
+                total_swaps INTEGER DEFAULT 0,
+                completed_swaps INTEGER DEFAULT 0,
+                total_revenue INTEGER DEFAULT 0,
+                data TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+            # Детализация по дню, категории и гео-ячейке (пишет app.services.rollup)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS analytics_cells (
+                day TEXT NOT NULL,
+                category TEXT NOT NULL DEFAULT '',
+                cell TEXT NOT NULL DEFAULT '',
+                new_users INTEGER DEFAULT 0,
+                active_users INTEGER DEFAULT 0,
+                new_ads INTEGER DEFAULT 0,
+                views INTEGER DEFAULT 0,
+                swaps_proposed INTEGER DEFAULT 0,
+                swaps_completed INTEGER DEFAULT 0,
+                PRIMARY KEY (day, category, cell)
+            ) WITHOUT ROWID
+            """)
+
+            # Журнал событий живой ленты (пишут EVENT_TRIGGERS, чистит EventModel.prune)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+            # Таблицы лидеров (ведут LEADERBOARD_TRIGGERS)
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS leaderboard (
+                board TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                score REAL,
+                seq INTEGER NOT NULL,
+                PRIMARY KEY (board, user_id)
+            ) WITHOUT ROWID
+            """)
+            await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_leaderboard_rank
+            ON leaderboard(board, score DESC, user_id)
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_leaderboard_seq ON leaderboard(seq)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_ratings_to_user ON ratings(to_user_id)")
+
+            # Счётчики пользователя (ведут USER_COUNTER_TRIGGERS) и индексы постраничных
+            # списков: курсор — (created_at, id) последней строки страницы
+            await db.execute("""
+            CREATE TABLE IF NOT EXISTS user_counters (
+                user_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, name)
+            ) WITHOUT ROWID
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_ads_user_created ON ads(user_tg_id, created_at, id)")
+            # Избранное: список пользователя по дате и рассылка всем, кто добавил объявление
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_favorites_user ON favorites(user_id)")  # + rowid = id
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_favorites_ad ON favorites(ad_id, user_id)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_saved_searches_user ON saved_searches(user_id)")
+            await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_swaps_target_page
+            ON swap_proposals(target_user_id, status, proposed_at, id)
+            """)
+            await db.execute("""
+            CREATE INDEX IF NOT EXISTS idx_swaps_proposer_page
+            ON swap_proposals(proposer_user_id, proposed_at, id)
+            """)
+
+            cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name='stats_users_insert'")
+            backfill = await cursor.fetchone() is None
+            # Пересчёт, если не хватает хотя бы одного триггера (в том числе добавленного позже)
+            cursor = await db.execute(
+                f"SELECT COUNT(*) FROM sqlite_master WHERE type='trigger' "
+                f"AND name IN ({', '.join('?' * len(LEADERBOARD_TRIGGERS))})",
+                tuple(LEADERBOARD_TRIGGERS),
+            )
+            backfill_leaderboard = (await cursor.fetchone())[0] < len(LEADERBOARD_TRIGGERS)
+            cursor = await db.execute(
+                f"SELECT COUNT(*) FROM sqlite_master WHERE type='trigger' "
+                f"AND name IN ({', '.join('?' * len(USER_COUNTER_TRIGGERS))})",
+                tuple(USER_COUNTER_TRIGGERS),
+            )
+            backfill_user_counters = (await cursor.fetchone())[0] < len(USER_COUNTER_TRIGGERS)
+            await create_triggers(db)
+            if backfill:
+                # БД до появления счётчиков: один раз считаем по таблицам
+                await db.executescript(STATS_REBUILD)
+            if backfill_leaderboard:
+                await db.executescript(LEADERBOARD_REBUILD)
+            if backfill_user_counters:
+                await db.executescript(USER_COUNTERS_REBUILD)
+
             await db.commit()
             logger.info("✅ База данных инициализирована успешно")
             
     except Exception as e:
         logger.error(f"❌ Ошибка инициализации БД: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+async def create_triggers(db: aiosqlite.Connection):
+    for name in RETIRED_TRIGGERS:
+        await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for name, body in TRIGGERS.items():
+        await db.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
@@ -1,33 +1,203 @@
 # -*- coding: utf-8 -*-
 """Модели для бота (aiosqlite). ORM — в models_orm.py."""
+import json
+from datetime import date, timedelta
+
 import aiosqlite
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, NamedTuple, Tuple
+
+from app.config import constants, get_db_path, settings
+from app.database.records import (
+    AdRecord, Page, SavedSearchRecord, SwapRecord, UserRecord, row_factory,
+    USER_FIELDS, PROFILE_FIELDS, AD_FIELDS, USER_AD_FIELDS, FEED_FIELDS, SWAP_FIELDS, SAVED_SEARCH_FIELDS,
+)
+from app.utils.metrics import instrument
+from app.utils.hashing import (
+    ad_text_hash, hamming, lsh_bands, to_sqlite_int, from_sqlite_int,
+    TEXT_MAX_DISTANCE, PHOTO_MAX_DISTANCE,
+)
+
+
+async def write_ad_signatures(db: aiosqlite.Connection, ad_id: int, text_hash: Optional[int], photo_hash: Optional[int]):
+    """Запись LSH-корзин сигнатур объявления"""
+    rows = []
+    for kind, signature in (("t", text_hash), ("p", photo_hash)):
+        if signature is not None:
+            rows.extend((ad_id, kind, band, bucket) for band, bucket in lsh_bands(signature))
+    if rows:
+        await db.executemany(
+            "INSERT OR IGNORE INTO ad_signatures (ad_id, kind, band, bucket) VALUES (?,?,?,?)", rows
+        )
+
+
+async def _find_similar(db: aiosqlite.Connection, kind: str, signature: int, max_distance: int,
+                        user_tg_id: Optional[int] = None, exclude_ad_id: Optional[int] = None,
+                        category: Optional[str] = None, inactive_only: bool = False,
+                        active_only: bool = False) -> Optional[int]:
+    """Поиск самого старого объявления с близкой сигнатурой через LSH-корзины"""
+    column = "text_hash" if kind == "t" else "photo_hash"
+    bands = lsh_bands(signature)
+    q = f"""SELECT DISTINCT a.id, a.{column} FROM ad_signatures s JOIN ads a ON a.id=s.ad_id
+            WHERE s.kind=? AND ({" OR ".join(["(s.band=? AND s.bucket=?)"] * len(bands))})"""
+    params: List[Any] = [kind]
+    for band, bucket in bands:
+        params += [band, bucket]
+    if user_tg_id is not None:
+        q += " AND a.user_tg_id=?"
+        params.append(user_tg_id)
+    if exclude_ad_id is not None:
+        q += " AND a.id!=?"
+        params.append(exclude_ad_id)
+    if category is not None:
+        q += " AND a.category=?"
+        params.append(category)
+    if inactive_only:
+        q += " AND a.is_active=0"
+    if active_only:
+        q += " AND a.is_active=1"
+    cursor = await db.execute(q + " ORDER BY a.id ASC", params)
+    for ad_id, stored in await cursor.fetchall():
+        if stored is not None and hamming(from_sqlite_int(stored), signature) <= max_distance:
+            return ad_id
+    return None
+
+
+# row_factory под колонки запросов (наборы полей — в records)
+_SWAP_SELECT = ", ".join(f"sp.{column}" for column in SWAP_FIELDS)
+
+_user_row = row_factory(UserRecord, USER_FIELDS)
+_profile_row = row_factory(UserRecord, PROFILE_FIELDS)
+_PROFILE_SELECT = ", ".join(PROFILE_FIELDS[:-1]) + \
+    ", (SELECT COUNT(*) FROM user_achievements WHERE user_id=users.tg_id)"
+_ad_row = row_factory(AdRecord, AD_FIELDS)
+_user_ad_row = row_factory(AdRecord, USER_AD_FIELDS)
+_feed_row = row_factory(AdRecord, FEED_FIELDS)
+_geo_feed_row = row_factory(AdRecord, FEED_FIELDS + ("distance",))
+_incoming_row = row_factory(SwapRecord, SWAP_FIELDS + ("proposer_user_id", "my_ad_title", "their_ad_title"))
+_outgoing_row = row_factory(SwapRecord, SWAP_FIELDS + ("target_user_id", "their_ad_title", "my_ad_title"))
+
+_INCOMING_SELECT = f"""
+    SELECT {_SWAP_SELECT}, sp.proposer_user_id, a1.title, a2.title
+    FROM swap_proposals sp JOIN ads a1 ON sp.liked_ad_id=a1.id JOIN ads a2 ON sp.proposer_ad_id=a2.id"""
+_OUTGOING_SELECT = f"""
+    SELECT {_SWAP_SELECT}, sp.target_user_id, a1.title, a2.title
+    FROM swap_proposals sp JOIN ads a1 ON sp.liked_ad_id=a1.id JOIN ads a2 ON sp.proposer_ad_id=a2.id"""
+
+
+def _gamification():
+    """Правила достижений (импорт при вызове: пакет app.services сам импортирует crud)"""
+    from app.services import gamification
+    return gamification
+
+
+# Обновление счётчика прогресса по режиму gamification.EVENT_COUNTERS
+_PROGRESS_UPDATE = {"add": "value+excluded.value", "max": "MAX(value, excluded.value)", "set": "excluded.value"}
+
 
-from app.config import constants, get_db_path
+class _Achiever(NamedTuple):
+    """Поля пользователя, которые читают условия достижений (requirement(user, value))"""
+    rating: float
+    phone_verified: bool
 
 
+async def _record_event(db: aiosqlite.Connection, user_id: int, event: str, amount: int = 1,
+                        value: Optional[int] = None, xp: int = 0):
+    """
+    Событие достижений по правилам gamification_service, как у repository: счётчик
+    achievement_progress, новые user_achievements и их очки, затем уровень по опыту
+    (xp — опыт за само событие). Коммит — на вызывающем.
+    """
+    game = _gamification()
+    cursor = await db.execute("SELECT rating, phone_verified, experience_points, level FROM users WHERE tg_id=?",
+                              (user_id,))
+    row = await cursor.fetchone()
+    if row is None:
+        return
+    rating, phone_verified, experience_points, level = row
+
+    progress = 0
+    if event in game.EVENT_COUNTERS:
+        counter, mode = game.EVENT_COUNTERS[event]
+        if event == "registered" and value is None:
+            # Важен только порог — считаем не больше EARLY_ADOPTERS + 1 строк
+            cursor = await db.execute("SELECT COUNT(*) FROM (SELECT 1 FROM users LIMIT ?)", (game.EARLY_ADOPTERS + 1,))
+            value, = await cursor.fetchone()
+        await db.execute(
+            f"""INSERT INTO achievement_progress (user_id, counter, value) VALUES (?,?,?)
+                ON CONFLICT(user_id, counter) DO UPDATE SET value={_PROGRESS_UPDATE[mode]}, updated_at=CURRENT_TIMESTAMP""",
+            (user_id, counter, amount if value is None else value),
+        )
+        cursor = await db.execute("SELECT value FROM achievement_progress WHERE user_id=? AND counter=?", (user_id, counter))
+        progress, = await cursor.fetchone()
+
+    cursor = await db.execute("SELECT achievement_id FROM user_achievements WHERE user_id=?", (user_id,))
+    unlocked = {achievement_id for achievement_id, in await cursor.fetchall()}
+    earned = game.gamification_service.earned(_Achiever(rating, bool(phone_verified)), event, progress, unlocked)
+    points = [game.GamificationService.ACHIEVEMENTS[achievement_id]["points"] for achievement_id in earned]
+    await db.executemany(
+        "INSERT INTO user_achievements (user_id, achievement_id, points) VALUES (?,?,?)",
+        [(user_id, achievement_id, award) for achievement_id, award in zip(earned, points)],
+    )
+    if xp or points:
+        experience_points += xp + sum(points)
+        await db.execute(
+            "UPDATE users SET experience_points=?, level=MAX(level, ?) WHERE tg_id=?",
+            (experience_points, game.level_for_xp(experience_points), user_id),
+        )
+
+
+async def _fetch_page(db: aiosqlite.Connection, select: str, where: str, params: Tuple, table: str, alias: str,
+                      ts: str, after: Optional[int], before: Optional[int], limit: int,
+                      id_column: str = "id", scope: str = "", scope_params: Tuple = ()) -> Page:
+    """Страница списка по убыванию (ts, id), keyset: after/before — id крайней строки соседней страницы.
+
+    Граница берётся подзапросом по id (scope — доп. условие, если id не уникален в table),
+    поэтому страница — один проход по индексу (…, ts, id) без OFFSET; лишняя строка
+    сверх limit говорит, есть ли страница дальше.
+    """
+    order = "DESC"
+    key = f"({alias}{ts}, {alias}{id_column})"
+    boundary = f"(SELECT {ts}, {id_column} FROM {table} WHERE {scope + ' AND ' if scope else ''}{id_column}=?)"
+    if after is not None:
+        where += f" AND {key} < {boundary}"
+        params += scope_params + (after,)
+    elif before is not None:
+        where += f" AND {key} > {boundary}"
+        params += scope_params + (before,)
+        order = "ASC"
+    cursor = await db.execute(
+        f"{select} WHERE {where} ORDER BY {alias}{ts} {order}, {alias}{id_column} {order} LIMIT ?",
+        params + (limit + 1,),
+    )
+    rows = await cursor.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if order == "ASC":
+        rows.reverse()
+        return Page(rows, rows[0].id if more else None, rows[-1].id if rows else None)
+    return Page(rows, rows[0].id if after is not None and rows else None, rows[-1].id if more else None)
+
+
+@instrument
 class UserModel:
     @staticmethod
-    async def get_or_create(tg_id: int, username: str = None, name: str = "Пользователь") -> Dict[str, Any]:
+    async def get_or_create(tg_id: int, username: str = None, name: str = "Пользователь") -> UserRecord:
         async with aiosqlite.connect(get_db_path()) as db:
-            cursor = await db.execute(
-                "SELECT tg_id, username, name, phone, latitude, longitude, location_name, rating, total_swaps FROM users WHERE tg_id = ?",
-                (tg_id,),
-            )
-            row = await cursor.fetchone()
-            if row:
-                return {
-                    "tg_id": row[0], "username": row[1], "name": row[2], "phone": row[3],
-                    "latitude": row[4], "longitude": row[5], "location_name": row[6],
-                    "rating": row[7], "total_swaps": row[8],
-                }
-            await db.execute("INSERT INTO users (tg_id, username, name) VALUES (?, ?, ?)", (tg_id, username, name))
+            db.row_factory = _user_row
+            cursor = await db.execute(f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE tg_id = ?", (tg_id,))
+            user = await cursor.fetchone()
+            if user:
+                return user
+            try:
+                await db.execute("INSERT INTO users (tg_id, username, name) VALUES (?, ?, ?)", (tg_id, username, name))
+                await db.commit()
+            except aiosqlite.IntegrityError:
+                # Тот же пользователь создан параллельно другим процессом
+                cursor = await db.execute(f"SELECT {', '.join(USER_FIELDS)} FROM users WHERE tg_id = ?", (tg_id,))
+                return await cursor.fetchone()
+            await _record_event(db, tg_id, "registered")
             await db.commit()
-            return {
-                "tg_id": tg_id, "username": username, "name": name, "phone": None,
-                "latitude": None, "longitude": None, "location_name": None,
-                "rating": constants.DEFAULT_RATING, "total_swaps": 0,
-            }
+            return UserRecord(tg_id=tg_id, username=username, name=name)
 
     @staticmethod
     async def update_location(tg_id: int, latitude: float, longitude: float, location_name: str = ""):
@@ -39,9 +209,13 @@ class UserModel:
             await db.commit()
 
     @staticmethod
-    async def update_phone(tg_id: int, phone: str):
+    async def update_phone(tg_id: int, phone: str, verified: bool = False):
+        """verified — номер пришёл контактом самого пользователя (подтверждён Telegram)"""
         async with aiosqlite.connect(get_db_path()) as db:
-            await db.execute("UPDATE users SET phone=?, last_active=CURRENT_TIMESTAMP WHERE tg_id=?", (phone, tg_id))
+            await db.execute("UPDATE users SET phone=?, phone_verified=?, last_active=CURRENT_TIMESTAMP WHERE tg_id=?",
+                             (phone, int(verified), tg_id))
+            if verified:
+                await _record_event(db, tg_id, "phone_verified")
             await db.commit()
 
     @staticmethod
@@ -53,95 +227,115 @@ class UserModel:
             await db.commit()
 
     @staticmethod
-    async def get_profile(tg_id: int) -> Optional[Dict[str, Any]]:
+    async def get_profile(tg_id: int) -> Optional[UserRecord]:
         async with aiosqlite.connect(get_db_path()) as db:
-            cursor = await db.execute(
-                "SELECT tg_id, username, name, phone, latitude, longitude, location_name, rating, total_swaps, created_at FROM users WHERE tg_id=?",
-                (tg_id,),
-            )
-            row = await cursor.fetchone()
-            if not row:
-                return None
-            return {
-                "tg_id": row[0], "username": row[1], "name": row[2], "phone": row[3],
-                "latitude": row[4], "longitude": row[5], "location_name": row[6],
-                "rating": row[7], "total_swaps": row[8], "created_at": row[9],
-            }
+            db.row_factory = _profile_row
+            cursor = await db.execute(f"SELECT {_PROFILE_SELECT} FROM users WHERE tg_id=?", (tg_id,))
+            return await cursor.fetchone()
 
 
+@instrument
 class AdModel:
     @staticmethod
     async def create(user_tg_id: int, category: str, title: str, description: str, price: Optional[str],
-                     photo_file_id: Optional[str], latitude=None, longitude=None, location_name=None) -> int:
+                     photo_file_id: Optional[str], latitude=None, longitude=None, location_name=None,
+                     photo_hash: Optional[int] = None) -> int:
+        text_hash = ad_text_hash(title, description)
         async with aiosqlite.connect(get_db_path()) as db:
             cursor = await db.execute(
                 """INSERT INTO ads (user_tg_id, category, title, description, price, photo_file_id,
-                   latitude, longitude, location_name, is_active) VALUES (?,?,?,?,?,?,?,?,?,?)""",
+                   latitude, longitude, location_name, is_active, text_hash, photo_hash) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)""",
                 (user_tg_id, category, title, description, price, photo_file_id,
-                 latitude, longitude, location_name, constants.AD_STATUS_ACTIVE),
+                 latitude, longitude, location_name, constants.AD_STATUS_ACTIVE,
+                 to_sqlite_int(text_hash), to_sqlite_int(photo_hash)),
             )
+            await write_ad_signatures(db, cursor.lastrowid, text_hash, photo_hash)
             await db.commit()
             return cursor.lastrowid
 
     @staticmethod
-    async def get_by_id(ad_id: int) -> Optional[Dict[str, Any]]:
+    async def find_duplicate(title: str, description: Optional[str], photo_hash: Optional[int] = None,
+                             user_tg_id: Optional[int] = None, category: Optional[str] = None,
+                             inactive_only: bool = False, active_only: bool = False) -> Optional[int]:
+        """ID уже существующего почти-дубликата (по тексту или фото) или None"""
+        filters = dict(category=category, inactive_only=inactive_only, active_only=active_only)
         async with aiosqlite.connect(get_db_path()) as db:
-            cursor = await db.execute(
-                "SELECT id, user_tg_id, category, title, description, price, photo_file_id, latitude, longitude, location_name, views, is_active, created_at FROM ads WHERE id=?",
-                (ad_id,),
-            )
-            row = await cursor.fetchone()
-            if not row:
-                return None
-            return {
-                "id": row[0], "user_tg_id": row[1], "category": row[2], "title": row[3], "description": row[4],
-                "price": row[5], "photo_file_id": row[6], "latitude": row[7], "longitude": row[8],
-                "location_name": row[9], "views": row[10], "is_active": row[11], "created_at": row[12],
-            }
+            ad_id = await _find_similar(db, "t", ad_text_hash(title, description), TEXT_MAX_DISTANCE, user_tg_id, **filters)
+            if ad_id is None and photo_hash is not None:
+                ad_id = await _find_similar(db, "p", photo_hash, PHOTO_MAX_DISTANCE, user_tg_id, **filters)
+            return ad_id
+
+    @staticmethod
+    async def get_by_id(ad_id: int) -> Optional[AdRecord]:
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _ad_row
+            cursor = await db.execute(f"SELECT {', '.join(AD_FIELDS)} FROM ads WHERE id=?", (ad_id,))
+            return await cursor.fetchone()
 
     @staticmethod
-    async def get_user_ads(user_tg_id: int, active_only: bool = True) -> List[Dict[str, Any]]:
-        q = "SELECT id, category, title, description, price, photo_file_id, views, is_active, created_at FROM ads WHERE user_tg_id=?"
+    async def get_user_ads(user_tg_id: int, active_only: bool = True) -> List[AdRecord]:
+        q = f"SELECT {', '.join(USER_AD_FIELDS)} FROM ads WHERE user_tg_id=?"
         if active_only:
             q += " AND is_active=1"
-        q += " ORDER BY created_at DESC"
+        q += " ORDER BY created_at DESC, id DESC"
         async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _user_ad_row
             cursor = await db.execute(q, (user_tg_id,))
-            rows = await cursor.fetchall()
-        return [
-            {"id": r[0], "category": r[1], "title": r[2], "description": r[3], "price": r[4],
-             "photo_file_id": r[5], "views": r[6], "is_active": r[7], "created_at": r[8]}
-            for r in rows
-        ]
+            return await cursor.fetchall()
 
     @staticmethod
-    async def get_next_ad(category: str, viewer_tg_id: int, last_ad_id: int = 0, user_lat=None, user_lon=None, max_distance_km: int = 100) -> Optional[Dict[str, Any]]:
+    async def get_user_ads_page(user_tg_id: int, after: Optional[int] = None, before: Optional[int] = None,
+                                limit: int = constants.MY_ADS_PAGE_SIZE) -> Page:
+        """Страница «Моих объявлений» (все, новые сначала)"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _user_ad_row
+            return await _fetch_page(
+                db, f"SELECT {', '.join(USER_AD_FIELDS)} FROM ads", "user_tg_id=?", (user_tg_id,),
+                "ads", "", "created_at", after, before, limit,
+            )
+
+    @staticmethod
+    async def get_next_ad(category: str, viewer_tg_id: int, last_ad_id: int = 0, user_lat=None, user_lon=None, max_distance_km: int = 100) -> Optional[AdRecord]:
         async with aiosqlite.connect(get_db_path()) as db:
             if user_lat and user_lon:
-                q = """SELECT id, user_tg_id, title, description, price, photo_file_id, latitude, longitude, location_name, created_at,
+                db.row_factory = _geo_feed_row
+                q = f"""SELECT * FROM (
+                        SELECT {', '.join(FEED_FIELDS)},
                         (6371*acos(cos(radians(?))*cos(radians(latitude))*cos(radians(longitude)-radians(?))+sin(radians(?))*sin(radians(latitude)))) AS distance
                         FROM ads WHERE is_active=1 AND category=? AND user_tg_id!=? AND id>?
-                        HAVING distance<=? OR latitude IS NULL ORDER BY distance ASC, id ASC LIMIT 1"""
+                        ) WHERE distance<=? OR latitude IS NULL ORDER BY distance ASC, id ASC LIMIT 1"""
                 params = (user_lat, user_lon, user_lat, category, viewer_tg_id, last_ad_id, max_distance_km)
             else:
-                q = "SELECT id, user_tg_id, title, description, price, photo_file_id, latitude, longitude, location_name, created_at FROM ads WHERE is_active=1 AND category=? AND user_tg_id!=? AND id>? ORDER BY id ASC LIMIT 1"
+                db.row_factory = _feed_row
+                q = f"SELECT {', '.join(FEED_FIELDS)} FROM ads WHERE is_active=1 AND category=? AND user_tg_id!=? AND id>? ORDER BY id ASC LIMIT 1"
                 params = (category, viewer_tg_id, last_ad_id)
             cursor = await db.execute(q, params)
-            row = await cursor.fetchone()
-        if not row:
-            if last_ad_id > 0:
-                return await AdModel.get_next_ad(category, viewer_tg_id, 0, user_lat, user_lon, max_distance_km)
-            return None
-        out = {"id": row[0], "user_tg_id": row[1], "title": row[2], "description": row[3], "price": row[4], "photo_file_id": row[5], "latitude": row[6], "longitude": row[7], "location_name": row[8], "created_at": row[9]}
-        if user_lat and user_lon and len(row) > 10:
-            out["distance"] = row[10]
-        return out
+            ad = await cursor.fetchone()
+        if not ad and last_ad_id > 0:
+            return await AdModel.get_next_ad(category, viewer_tg_id, 0, user_lat, user_lon, max_distance_km)
+        return ad
+
+    @staticmethod
+    async def get_category_ads(category: str, viewer_tg_id: int, limit: int = 200) -> List[AdRecord]:
+        """Активные чужие объявления категории, новые сначала (кандидаты похожих объявлений)"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _feed_row
+            cursor = await db.execute(
+                f"SELECT {', '.join(FEED_FIELDS)} FROM ads WHERE is_active=1 AND category=? AND user_tg_id!=? "
+                f"ORDER BY id DESC LIMIT ?", (category, viewer_tg_id, limit),
+            )
+            return await cursor.fetchall()
 
     @staticmethod
     async def increment_views(ad_id: int, viewer_id: int):
         async with aiosqlite.connect(get_db_path()) as db:
             await db.execute("UPDATE ads SET views=views+1 WHERE id=?", (ad_id,))
             await db.execute("INSERT OR IGNORE INTO ad_views (ad_id, viewer_id) VALUES (?,?)", (ad_id, viewer_id))
+            cursor = await db.execute("SELECT user_tg_id, views FROM ads WHERE id=?", (ad_id,))
+            row = await cursor.fetchone()
+            # Счётчик достижения трогаем только на пороге
+            if row is not None and row[1] in _gamification().AD_VIEW_MILESTONES:
+                await _record_event(db, row[0], "ad_viewed", value=row[1])
             await db.commit()
 
     @staticmethod
@@ -150,13 +344,49 @@ class AdModel:
             await db.execute("UPDATE ads SET is_active=0 WHERE id=?", (ad_id,))
             await db.commit()
 
+    @staticmethod
+    async def update_price(ad_id: int, price: Optional[str]):
+        async with aiosqlite.connect(get_db_path()) as db:
+            await db.execute("UPDATE ads SET price=?, updated_at=CURRENT_TIMESTAMP WHERE id=?", (price, ad_id))
+            await db.commit()
+
     @staticmethod
     async def activate(ad_id: int):
         async with aiosqlite.connect(get_db_path()) as db:
             await db.execute("UPDATE ads SET is_active=1, updated_at=CURRENT_TIMESTAMP WHERE id=?", (ad_id,))
             await db.commit()
 
+    @staticmethod
+    async def republish(ad_id: int, title: str, description: str, price: Optional[str],
+                        photo_file_id: Optional[str] = None, latitude=None, longitude=None, location_name=None):
+        """Снова опубликовать снятое объявление с текстом, ценой и (если заданы) фото и местом из новой анкеты"""
+        text_hash = ad_text_hash(title, description)
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT text_hash FROM ads WHERE id=?", (ad_id,))
+            row = await cursor.fetchone()
+            if row is None:
+                return
+            old_hash = from_sqlite_int(row[0])
+            if old_hash != text_hash:
+                # Корзины старого текста снимаем точечно по первичному ключу
+                if old_hash is not None:
+                    await db.executemany(
+                        "DELETE FROM ad_signatures WHERE kind='t' AND band=? AND bucket=? AND ad_id=?",
+                        [(band, bucket, ad_id) for band, bucket in lsh_bands(old_hash)],
+                    )
+                await write_ad_signatures(db, ad_id, text_hash, None)
+            await db.execute(
+                """UPDATE ads SET is_active=1, title=?, description=?, text_hash=?, price=?,
+                   photo_file_id=COALESCE(?, photo_file_id),
+                   latitude=COALESCE(?, latitude), longitude=COALESCE(?, longitude),
+                   location_name=COALESCE(?, location_name), updated_at=CURRENT_TIMESTAMP WHERE id=?""",
+                (title, description, to_sqlite_int(text_hash), price, photo_file_id,
+                 latitude, longitude, location_name, ad_id),
+            )
+            await db.commit()
+
 
+@instrument
 class SwapModel:
     @staticmethod
     async def create(liked_ad_id: int, proposer_ad_id: int, proposer_user_id: int, target_user_id: int, message: str = "") -> Tuple[bool, Optional[int]]:
@@ -172,36 +402,69 @@ class SwapModel:
             return False, None
 
     @staticmethod
-    async def get_incoming(user_id: int, status: str = "pending") -> List[Dict[str, Any]]:
+    async def get_incoming(user_id: int, status: str = "pending") -> List[SwapRecord]:
         async with aiosqlite.connect(get_db_path()) as db:
-            cursor = await db.execute("""
-                SELECT sp.id, sp.liked_ad_id, sp.proposer_ad_id, sp.proposer_user_id, sp.status, sp.message, sp.proposed_at,
-                       a1.title, a2.title
-                FROM swap_proposals sp JOIN ads a1 ON sp.liked_ad_id=a1.id JOIN ads a2 ON sp.proposer_ad_id=a2.id
-                WHERE sp.target_user_id=? AND sp.status=? ORDER BY sp.proposed_at DESC
-            """, (user_id, status))
-            rows = await cursor.fetchall()
-        return [{"id": r[0], "liked_ad_id": r[1], "proposer_ad_id": r[2], "proposer_user_id": r[3], "status": r[4], "message": r[5], "proposed_at": r[6], "my_ad_title": r[7], "their_ad_title": r[8]} for r in rows]
+            db.row_factory = _incoming_row
+            cursor = await db.execute(
+                f"{_INCOMING_SELECT} WHERE sp.target_user_id=? AND sp.status=? ORDER BY sp.proposed_at DESC, sp.id DESC",
+                (user_id, status),
+            )
+            return await cursor.fetchall()
+
+    @staticmethod
+    async def get_incoming_page(user_id: int, status: str = "pending", after: Optional[int] = None,
+                                before: Optional[int] = None, limit: int = constants.SWAPS_PAGE_SIZE) -> Page:
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _incoming_row
+            return await _fetch_page(
+                db, _INCOMING_SELECT, "sp.target_user_id=? AND sp.status=?", (user_id, status),
+                "swap_proposals", "sp.", "proposed_at", after, before, limit,
+            )
 
     @staticmethod
-    async def get_outgoing(user_id: int) -> List[Dict[str, Any]]:
+    async def get_outgoing(user_id: int) -> List[SwapRecord]:
         async with aiosqlite.connect(get_db_path()) as db:
-            cursor = await db.execute("""
-                SELECT sp.id, sp.liked_ad_id, sp.proposer_ad_id, sp.target_user_id, sp.status, sp.message, sp.proposed_at,
-                       a1.title, a2.title
-                FROM swap_proposals sp JOIN ads a1 ON sp.liked_ad_id=a1.id JOIN ads a2 ON sp.proposer_ad_id=a2.id
-                WHERE sp.proposer_user_id=? ORDER BY sp.proposed_at DESC
-            """, (user_id,))
-            rows = await cursor.fetchall()
-        return [{"id": r[0], "liked_ad_id": r[1], "proposer_ad_id": r[2], "target_user_id": r[3], "status": r[4], "message": r[5], "proposed_at": r[6], "their_ad_title": r[7], "my_ad_title": r[8]} for r in rows]
+            db.row_factory = _outgoing_row
+            cursor = await db.execute(
+                f"{_OUTGOING_SELECT} WHERE sp.proposer_user_id=? ORDER BY sp.proposed_at DESC, sp.id DESC", (user_id,)
+            )
+            return await cursor.fetchall()
+
+    @staticmethod
+    async def get_outgoing_page(user_id: int, after: Optional[int] = None, before: Optional[int] = None,
+                                limit: int = constants.SWAPS_PAGE_SIZE) -> Page:
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _outgoing_row
+            return await _fetch_page(
+                db, _OUTGOING_SELECT, "sp.proposer_user_id=?", (user_id,),
+                "swap_proposals", "sp.", "proposed_at", after, before, limit,
+            )
 
     @staticmethod
     async def update_status(swap_id: int, status: str):
+        completed = status == constants.SWAP_STATUS_COMPLETED
+        q = "UPDATE swap_proposals SET status=?, responded_at=CURRENT_TIMESTAMP WHERE id=?"
+        params: Tuple = (status, swap_id)
+        if completed:
+            q += " AND status IS NOT ?"  # награда — один раз за обмен
+            params += (status,)
         async with aiosqlite.connect(get_db_path()) as db:
-            await db.execute("UPDATE swap_proposals SET status=?, responded_at=CURRENT_TIMESTAMP WHERE id=?", (status, swap_id))
+            cursor = await db.execute(q, params)
+            if completed and cursor.rowcount:
+                cursor = await db.execute(
+                    "SELECT proposer_user_id, target_user_id FROM swap_proposals WHERE id=?", (swap_id,))
+                user_ids = await cursor.fetchone()
+                await db.execute("UPDATE users SET successful_swaps=successful_swaps+1 WHERE tg_id IN (?,?)", user_ids)
+                for user_id in user_ids:
+                    cursor = await db.execute("SELECT rating, successful_swaps FROM users WHERE tg_id=?", (user_id,))
+                    row = await cursor.fetchone()
+                    if row is not None:
+                        await _record_event(db, user_id, "swap_completed",
+                                            xp=_gamification().swap_completion_xp(*row))
             await db.commit()
 
 
+@instrument
 class RatingModel:
     @staticmethod
     async def add_rating(from_user_id: int, to_user_id: int, rating: int, comment: str = "", swap_id: Optional[int] = None) -> bool:
@@ -213,6 +476,7 @@ class RatingModel:
                 avg, = (await cursor.fetchone())
                 avg = avg or constants.DEFAULT_RATING
                 await db.execute("UPDATE users SET rating=? WHERE tg_id=?", (avg, to_user_id))
+                await _record_event(db, to_user_id, "rating_received")
                 await db.commit()
             return True
         except aiosqlite.IntegrityError:
@@ -226,6 +490,49 @@ class RatingModel:
             return (avg or constants.DEFAULT_RATING, cnt or 0)
 
 
+@instrument
+class ReferralModel:
+    """Приглашения по реферальным кодам (коды и очередь — app.services.referrals)"""
+
+    @staticmethod
+    async def legacy_referrers(codes: List[str]) -> Dict[str, int]:
+        """{старый код: пригласивший}; SQLite-схема кодов без подписи не выдавала — их нет"""
+        return {}
+
+    @staticmethod
+    async def apply(invites: Dict[int, int]) -> Dict[int, List[int]]:
+        """
+        Бонусы за приглашения {новый пользователь: пригласивший} одной транзакцией.
+        Засчитываются только существующие и ещё никем не приглашённые; возвращает
+        {пригласивший: [приглашённые]}.
+        """
+        user_ids = tuple(set(invites) | set(invites.values()))
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                f"SELECT tg_id, referred_by FROM users WHERE tg_id IN ({', '.join('?' * len(user_ids))})", user_ids
+            )
+            referred_by = dict(await cursor.fetchall())
+            applied: Dict[int, List[int]] = {}
+            for new_user_id, referrer_id in invites.items():
+                if new_user_id in referred_by and referrer_id in referred_by and referred_by[new_user_id] is None:
+                    applied.setdefault(referrer_id, []).append(new_user_id)
+            await db.executemany(
+                "UPDATE users SET referred_by=?, bonus_points=bonus_points+? WHERE tg_id=?",
+                [(referrer_id, settings.REFERRAL_BONUS, new_user_id)
+                 for referrer_id, invited in applied.items() for new_user_id in invited],
+            )
+            for referrer_id, invited in applied.items():
+                bonus = settings.REFERRAL_BONUS * len(invited)
+                await db.execute(
+                    "UPDATE users SET referral_count=referral_count+?, bonus_points=bonus_points+? WHERE tg_id=?",
+                    (len(invited), bonus, referrer_id),
+                )
+                await _record_event(db, referrer_id, "referral", amount=len(invited), xp=bonus)
+            await db.commit()
+        return applied
+
+
+@instrument
 class FavoriteModel:
     @staticmethod
     async def add(user_id: int, ad_id: int) -> bool:
@@ -236,3 +543,350 @@ class FavoriteModel:
             return True
         except aiosqlite.IntegrityError:
             return False
+
+    @staticmethod
+    async def remove(user_id: int, ad_id: int) -> bool:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("DELETE FROM favorites WHERE user_id=? AND ad_id=?", (user_id, ad_id))
+            await db.commit()
+            return cursor.rowcount > 0
+
+    @staticmethod
+    async def ad_ids(user_id: int) -> List[int]:
+        """Все избранные объявления пользователя (для кеша в app.services.favorites)"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT ad_id FROM favorites WHERE user_id=?", (user_id,))
+            return [ad_id for ad_id, in await cursor.fetchall()]
+
+    @staticmethod
+    async def get_page(user_id: int, after: Optional[int] = None, before: Optional[int] = None,
+                       limit: int = constants.FAVORITES_PAGE_SIZE) -> Page:
+        """Страница избранного (последние добавленные сначала — по id записи); курсор — id объявления"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _user_ad_row
+            return await _fetch_page(
+                db, f"SELECT {', '.join('a.' + field for field in USER_AD_FIELDS)} "
+                    "FROM favorites f JOIN ads a ON a.id=f.ad_id",
+                "f.user_id=?", (user_id,), "favorites", "f.", "id", after, before, limit,
+                id_column="ad_id", scope="user_id=?", scope_params=(user_id,),
+            )
+
+    @staticmethod
+    async def subscribers(ad_ids: List[int]) -> List[Tuple[int, int]]:
+        """(ad_id, user_id) всех, кто добавил в избранное любое из ad_ids — одним запросом"""
+        if not ad_ids:
+            return []
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                f"SELECT ad_id, user_id FROM favorites WHERE ad_id IN ({', '.join('?' * len(ad_ids))})", ad_ids
+            )
+            return await cursor.fetchall()
+
+
+def _saved_search_row(cursor, row) -> SavedSearchRecord:
+    """filters хранится JSON-строкой"""
+    search_id, user_id, name, filters, notify_on_new, created_at = row
+    return SavedSearchRecord(id=search_id, user_id=user_id, name=name, filters=json.loads(filters),
+                             notify_on_new=bool(notify_on_new), created_at=created_at)
+
+
+@instrument
+class SavedSearchModel:
+    @staticmethod
+    async def create(user_id: int, name: str, filters: Dict[str, Any], notify_on_new: bool = True) -> int:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "INSERT INTO saved_searches (user_id, name, filters, notify_on_new) VALUES (?,?,?,?)",
+                (user_id, name, json.dumps(filters, ensure_ascii=False), int(notify_on_new)),
+            )
+            await db.commit()
+            return cursor.lastrowid
+
+    @staticmethod
+    async def delete(user_id: int, search_id: int) -> bool:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("DELETE FROM saved_searches WHERE id=? AND user_id=?", (search_id, user_id))
+            await db.commit()
+            return cursor.rowcount > 0
+
+    @staticmethod
+    async def get_user_searches(user_id: int) -> List[SavedSearchRecord]:
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _saved_search_row
+            cursor = await db.execute(
+                f"SELECT {', '.join(SAVED_SEARCH_FIELDS)} FROM saved_searches WHERE user_id=? ORDER BY id", (user_id,)
+            )
+            return await cursor.fetchall()
+
+    @staticmethod
+    async def load(after_id: int = 0, limit: int = 1000) -> List[SavedSearchRecord]:
+        """Поиски с уведомлениями, id > after_id, по возрастанию id (загрузка индекса кусками)"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = _saved_search_row
+            cursor = await db.execute(
+                f"SELECT {', '.join(SAVED_SEARCH_FIELDS)} FROM saved_searches "
+                "WHERE notify_on_new=1 AND id>? ORDER BY id LIMIT ?", (after_id, limit),
+            )
+            return await cursor.fetchall()
+
+    @staticmethod
+    async def existing(search_ids: List[int]) -> List[int]:
+        """Какие из search_ids ещё не удалены — одним запросом"""
+        if not search_ids:
+            return []
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                f"SELECT id FROM saved_searches WHERE id IN ({', '.join('?' * len(search_ids))})", search_ids
+            )
+            return [search_id for search_id, in await cursor.fetchall()]
+
+
+@instrument
+class ReportModel:
+    @staticmethod
+    async def create(reporter_id: int, reason: str, description: str = "",
+                     reported_user_id: Optional[int] = None, reported_ad_id: Optional[int] = None) -> int:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "INSERT INTO reports (reporter_id, reported_user_id, reported_ad_id, reason, description) VALUES (?,?,?,?,?)",
+                (reporter_id, reported_user_id, reported_ad_id, reason, description),
+            )
+            await db.commit()
+            return cursor.lastrowid
+
+
+@instrument
+class EventModel:
+    """Журнал событий живой ленты админки (пишут db.EVENT_TRIGGERS)"""
+
+    @staticmethod
+    async def prune(days: int) -> int:
+        """Удалить события старше days дней; возвращает число удалённых"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events WHERE created_at < datetime('now', ?))",
+                (f"-{days} days",),
+            )
+            await db.commit()
+            return cursor.rowcount
+
+
+@instrument
+class LeaderboardModel:
+    """Строки таблиц лидеров (ведут db.LEADERBOARD_TRIGGERS)"""
+
+    @staticmethod
+    async def board(board: str) -> List[Tuple[int, float]]:
+        """Вся таблица board по убыванию score: [(user_id, score)]"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "SELECT user_id, score FROM leaderboard WHERE board=? AND score IS NOT NULL "
+                "ORDER BY score DESC, user_id",
+                (board,),
+            )
+            return await cursor.fetchall()
+
+    @staticmethod
+    async def max_seq() -> int:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT COALESCE(MAX(seq), 0) FROM leaderboard")
+            return (await cursor.fetchone())[0]
+
+    @staticmethod
+    async def changes(after_seq: int) -> List[Tuple[str, int, Optional[float], int]]:
+        """Изменения после after_seq: [(board, user_id, score или None, seq)]"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "SELECT board, user_id, score, seq FROM leaderboard WHERE seq > ? ORDER BY seq",
+                (after_seq,),
+            )
+            return await cursor.fetchall()
+
+    @staticmethod
+    async def names(user_ids: List[int]) -> Dict[int, str]:
+        if not user_ids:
+            return {}
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                f"SELECT tg_id, COALESCE(name, username) FROM users WHERE tg_id IN ({','.join('?' * len(user_ids))})",
+                user_ids,
+            )
+            return dict(await cursor.fetchall())
+
+
+@instrument
+class UserCounterModel:
+    """Размеры личных списков пользователя (ведут триггеры, см. db.USER_COUNTER_TRIGGERS)"""
+
+    @staticmethod
+    async def get(user_id: int) -> Dict[str, int]:
+        """ads, ads_active, views, swaps_out, swaps_in:<статус>, favorites; нулевых нет"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT name, value FROM user_counters WHERE user_id=? AND value != 0", (user_id,))
+            return dict(await cursor.fetchall())
+
+
+@instrument
+class StatsModel:
+    """Статистика из счётчиков, которые ведут триггеры (см. db.STATS_TRIGGERS)"""
+
+    @staticmethod
+    async def counters() -> Dict[str, int]:
+        """Текущие итоги: users, ads, ads_active:<категория>, swaps, swaps:<статус>, views"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT name, value FROM stats_counters")
+            return dict(await cursor.fetchall())
+
+    @staticmethod
+    async def daily(days: int = 7) -> Dict[str, Dict[str, int]]:
+        """Дневные значения за последние days дней (UTC): {день: {имя: значение}}"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "SELECT day, name, value FROM stats_daily WHERE day > date('now', ?) ORDER BY day",
+                (f"-{days} days",),
+            )
+            result: Dict[str, Dict[str, int]] = {}
+            for day, name, value in await cursor.fetchall():
+                result.setdefault(day, {})[name] = value
+            return result
+
+    @staticmethod
+    async def rollup() -> int:
+        """
+        Дневные строки analytics с последнего свёрнутого дня (он мог быть неполным) по сегодня.
+
+        Итоги на конец дня восстанавливаются от текущих значений вычитанием приращений
+        более поздних дней, поэтому пропущенные дни сворачиваются так же точно.
+        """
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "SELECT COALESCE((SELECT MAX(date) FROM analytics), (SELECT MIN(day) FROM stats_daily)), date('now')"
+            )
+            start, today = await cursor.fetchone()
+            start = min(start or today, today)
+            cursor = await db.execute("SELECT name, value FROM stats_counters")
+            running = dict(await cursor.fetchall())
+            cursor = await db.execute("SELECT day, name, value FROM stats_daily WHERE day >= ?", (start,))
+            by_day: Dict[str, Dict[str, int]] = {}
+            for day, name, value in await cursor.fetchall():
+                by_day.setdefault(day, {})[name] = value
+
+            last = date.fromisoformat(max([today, *by_day]))
+            first = date.fromisoformat(start)
+            rows = []
+            for offset in range((last - first).days, -1, -1):
+                day = (first + timedelta(days=offset)).isoformat()
+                values = by_day.get(day, {})
+                if day <= today:
+                    rows.append(_analytics_row(day, running, values))
+                for name, value in values.items():
+                    if name in running:  # приращение счётчика, а не событие
+                        running[name] -= value
+
+            await db.executemany(
+                """INSERT INTO analytics (date, total_users, new_users, active_users, total_ads, new_ads,
+                                          total_swaps, completed_swaps, total_revenue, data)
+                   VALUES (?,?,?,?,?,?,?,?,?,?)
+                   ON CONFLICT(date) DO UPDATE SET
+                       total_users=excluded.total_users, new_users=excluded.new_users,
+                       active_users=excluded.active_users, total_ads=excluded.total_ads,
+                       new_ads=excluded.new_ads, total_swaps=excluded.total_swaps,
+                       completed_swaps=excluded.completed_swaps, total_revenue=excluded.total_revenue,
+                       data=excluded.data""",
+                rows,
+            )
+            await db.commit()
+            return len(rows)
+
+    @staticmethod
+    async def history(days: int = 30) -> List[Dict[str, Any]]:
+        """Строки analytics за последние days дней, новые первыми"""
+        async with aiosqlite.connect(get_db_path()) as db:
+            db.row_factory = aiosqlite.Row
+            cursor = await db.execute(
+                "SELECT * FROM analytics WHERE date > date('now', ?) ORDER BY date DESC", (f"-{days} days",)
+            )
+            rows = [dict(row) for row in await cursor.fetchall()]
+        for row in rows:
+            row["data"] = json.loads(row["data"]) if row["data"] else {}
+        return rows
+
+
+def _analytics_row(day: str, totals: Dict[str, int], values: Dict[str, int]) -> Tuple:
+    def group(prefix: str, source: Dict[str, int]) -> Dict[str, int]:
+        return {name[len(prefix):]: value for name, value in source.items() if name.startswith(prefix)}
+
+    data = {
+        "views": values.get("views", 0),
+        "new_swaps": values.get("new_swaps", 0),
+        "ads_active": group("ads_active:", totals),
+        "swaps": group("swaps:", totals),
+        "status_changes": group("status:", values),
+    }
+    return (
+        day, totals.get("users", 0), values.get("new_users", 0), values.get("active_users", 0),
+        totals.get("ads", 0), values.get("new_ads", 0), totals.get("swaps", 0),
+        values.get(f"status:{constants.SWAP_STATUS_COMPLETED}", 0), 0,
+        json.dumps(data, ensure_ascii=False),
+    )
+
+
+@instrument
+class MediaModel:
+    @staticmethod
+    async def get(digest: str) -> Optional[Dict[str, Any]]:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute(
+                "SELECT digest, source_url, width, height, size_bytes, photo_hash FROM media_files WHERE digest=?",
+                (digest,),
+            )
+            row = await cursor.fetchone()
+        if not row:
+            return None
+        return {"digest": row[0], "source_url": row[1], "width": row[2], "height": row[3],
+                "size_bytes": row[4], "photo_hash": from_sqlite_int(row[5])}
+
+    @staticmethod
+    async def get_by_url(source_url: str) -> Optional[Dict[str, Any]]:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT digest FROM media_files WHERE source_url=? LIMIT 1", (source_url,))
+            row = await cursor.fetchone()
+        return await MediaModel.get(row[0]) if row else None
+
+    @staticmethod
+    async def save(digest: str, width: int, height: int, size_bytes: int,
+                   photo_hash: Optional[int] = None, source_url: Optional[str] = None):
+        async with aiosqlite.connect(get_db_path()) as db:
+            await db.execute(
+                """INSERT INTO media_files (digest, source_url, width, height, size_bytes, photo_hash) VALUES (?,?,?,?,?,?)
+                   ON CONFLICT(digest) DO UPDATE SET source_url=COALESCE(excluded.source_url, media_files.source_url)""",
+                (digest, source_url, width, height, size_bytes, to_sqlite_int(photo_hash)),
+            )
+            await db.commit()
+
+
+@instrument
+class MediaRegistryModel:
+    @staticmethod
+    async def get_file_id(digest: str) -> Optional[str]:
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT file_id FROM media_registry WHERE digest=?", (digest,))
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    async def save(digest: str, file_id: str, file_unique_id: Optional[str] = None):
+        async with aiosqlite.connect(get_db_path()) as db:
+            await db.execute(
+                """INSERT INTO media_registry (digest, file_id, file_unique_id) VALUES (?,?,?)
+                   ON CONFLICT(digest) DO UPDATE SET file_id=excluded.file_id, file_unique_id=excluded.file_unique_id,
+                   uploaded_at=CURRENT_TIMESTAMP""",
+                (digest, file_id, file_unique_id),
+            )
+            await db.commit()
+
+    @staticmethod
+    async def forget(digest: str):
+        async with aiosqlite.connect(get_db_path()) as db:
+            await db.execute("DELETE FROM media_registry WHERE digest=?", (digest,))
+            await db.commit()
@@ -82,6 +82,7 @@ class User(Base):
     successful_swaps: Mapped[int] = mapped_column(Integer, default=0)
     level: Mapped[int] = mapped_column(Integer, default=1)
     experience_points: Mapped[int] = mapped_column(Integer, default=0)
+    total_views: Mapped[int] = mapped_column(Integer, default=0)  # просмотры всех объявлений (ведёт repository.AdModel.increment_views)
 
     # Верификация (Идея #2)
     is_verified: Mapped[bool] = mapped_column(Boolean, default=False)
@@ -162,6 +163,10 @@ class Ad(Base):
     moderation_status: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
     rejection_reason: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
+    # Почти-дубликаты (app.utils.hashing): 64-битные сигнатуры текста и фото
+    text_hash: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    photo_hash: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+
     # Статистика (Идея #8: Аналитика)
     views: Mapped[int] = mapped_column(Integer, default=0)
     likes_count: Mapped[int] = mapped_column(Integer, default=0)
@@ -199,13 +204,24 @@ class Ad(Base):
     __table_args__ = (
         Index("idx_ad_category", "category"),
         Index("idx_ad_status", "status"),
-        Index("idx_ad_user", "user_id"),
+        Index("idx_ad_user", "user_id", "created_at", "id"),
         Index("idx_ad_location", "latitude", "longitude"),
         Index("idx_ad_created", "created_at"),
         Index("idx_ad_boosted", "is_boosted", "boost_until"),
     )
 
 
+class AdSignature(Base):
+    """LSH-корзины сигнатур объявлений (поиск почти-дубликатов)"""
+    __tablename__ = "ad_signatures"
+
+    # Первичный ключ в порядке поиска: (kind, band, bucket) → ad_id
+    kind: Mapped[str] = mapped_column(String(1), primary_key=True)  # t — текст, p — фото
+    band: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bucket: Mapped[int] = mapped_column(Integer, primary_key=True)
+    ad_id: Mapped[int] = mapped_column(Integer, ForeignKey("ads.id"), primary_key=True)
+
+
 class Like(Base):
     """Модель лайков (упрощённая система обмена)"""
     __tablename__ = "likes"
@@ -247,6 +263,7 @@ class Swap(Base):
 
     # Статус
     status: Mapped[SwapStatus] = mapped_column(SQLEnum(SwapStatus), default=SwapStatus.PROPOSED)
+    message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     # Обмен + доплата (Идея #20)
     money_addition: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -276,7 +293,10 @@ class Swap(Base):
     user2: Mapped["User"] = relationship("User", foreign_keys=[user2_id])
 
     __table_args__ = (
+        UniqueConstraint("ad2_id", "ad1_id", name="uq_swap_ads"),  # одно предложение на пару объявлений
         Index("idx_swap_users", "user1_id", "user2_id"),
+        Index("idx_swap_target", "user2_id", "status", "created_at", "id"),
+        Index("idx_swap_proposer", "user1_id", "created_at", "id"),
         Index("idx_swap_status", "status"),
     )
 
@@ -381,7 +401,8 @@ class Favorite(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "ad_id", name="uq_favorite_user_ad"),
-        Index("idx_favorite_user", "user_id"),
+        Index("idx_favorite_user", "user_id", "id"),
+        Index("idx_favorite_ad", "ad_id", "user_id"),
     )
 
 
@@ -475,6 +496,113 @@ class Report(Base):
     )
 
 
+class AchievementProgress(Base):
+    """Счётчики прогресса достижений (Идея #6): обмены, отзывы, приглашения..."""
+    __tablename__ = "achievement_progress"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    counter: Mapped[str] = mapped_column(String(50), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserAchievement(Base):
+    """Полученные достижения (Идея #6)"""
+    __tablename__ = "user_achievements"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.id"), primary_key=True)
+    achievement_id: Mapped[str] = mapped_column(String(50), primary_key=True)
+    points: Mapped[int] = mapped_column(Integer, default=0)
+
+    unlocked_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class UserCounter(Base):
+    """Размеры личных списков пользователя (как user_counters SQLite-схемы): ads, ads_active,
+    views, swaps_out, swaps_in:<статус>, favorites. Ведёт repository в транзакциях записи"""
+    __tablename__ = "user_counters"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class StatsCounter(Base):
+    """Итоги статистики (как stats_counters SQLite-схемы): users, ads, ads_active:<категория>,
+    swaps, swaps:<статус>, views. Ведёт repository в транзакциях записи"""
+    __tablename__ = "stats_counters"
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
+class StatsDaily(Base):
+    """Дневные приращения итогов и дневные события (new_users, active_users, new_ads,
+    new_swaps, status:<статус>) — как stats_daily SQLite-схемы; day — «YYYY-MM-DD» (UTC)"""
+    __tablename__ = "stats_daily"
+
+    day: Mapped[str] = mapped_column(String(10), primary_key=True)
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
+class LeaderboardEntry(Base):
+    """Строка таблицы лидеров (как leaderboard SQLite-схемы); score = NULL — выбыл из таблицы"""
+    __tablename__ = "leaderboard"
+
+    board: Mapped[str] = mapped_column(String(100), primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    seq: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index("idx_leaderboard_rank", "board", "score", "user_id"),
+        Index("idx_leaderboard_seq", "seq"),
+    )
+
+
+class LeaderboardClock(Base):
+    """
+    Последний seq таблиц лидеров (одна строка). Запись берёт строку под блокировку
+    до коммита, поэтому seq растут в порядке коммитов и опрос changes(после seq)
+    не пропускает изменений параллельных процессов
+    """
+    __tablename__ = "leaderboard_clock"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seq: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+
+
+class MediaFile(Base):
+    """Сохранённые фото по хешу содержимого (как media_files SQLite-схемы)"""
+    __tablename__ = "media_files"
+
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    source_url: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    width: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    height: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    size_bytes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    photo_hash: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("idx_media_source_url", "source_url"),
+    )
+
+
+class MediaRegistryEntry(Base):
+    """Telegram file_id загруженных фото по хешу содержимого (как media_registry SQLite-схемы)"""
+    __tablename__ = "media_registry"
+
+    digest: Mapped[str] = mapped_column(String(64), primary_key=True)
+    file_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    file_unique_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+
+    uploaded_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 class Payment(Base):
     """Платежи (Идея #10: Монетизация)"""
     __tablename__ = "payments"
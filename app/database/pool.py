@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Пул соединений только для чтения (админка, выгрузки).
+
+Соединения открываются в режиме mode=ro и с query_only: случайный UPDATE из
+админки невозможен, а в WAL читатели не блокируют писателя-бота. Размер пула
+ограничивает, сколько запросов модераторов выполняется одновременно.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+
+import aiosqlite
+
+from app.config import get_db_path
+
+
+class ReadOnlyPool:
+    """Фиксированный пул aiosqlite-соединений только для чтения"""
+
+    def __init__(self, size: int = 4, path: Optional[str] = None, busy_timeout_ms: int = 5000):
+        self.size = size
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle: Optional[asyncio.Queue] = None
+        self._all: List[aiosqlite.Connection] = []
+        self._opening = asyncio.Lock()
+
+    async def connect(self) -> aiosqlite.Connection:
+        """Отдельное соединение только для чтения вне пула (долгие выгрузки)"""
+        uri = f"{Path(self.path or get_db_path()).resolve().as_uri()}?mode=ro"
+        db = await aiosqlite.connect(uri, uri=True)
+        db.row_factory = aiosqlite.Row
+        await db.execute("PRAGMA query_only=1")
+        await db.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        return db
+
+    async def open(self):
+        async with self._opening:
+            if self._idle is not None:
+                return
+            idle = asyncio.Queue()
+            for _ in range(self.size):
+                db = await self.connect()
+                self._all.append(db)
+                idle.put_nowait(db)
+            self._idle = idle
+
+    async def close(self):
+        for db in self._all:
+            await db.close()
+        self._all.clear()
+        self._idle = None
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Соединение из пула; ждёт, пока освободится, если все заняты.
+
+        Курсоры нужно закрывать до возврата соединения: открытый курсор держит снимок WAL.
+        """
+        if self._idle is None:
+            await self.open()
+        idle = self._idle
+        db = await idle.get()
+        try:
+            yield db
+        finally:
+            idle.put_nowait(db)
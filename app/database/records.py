@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Записи, которые возвращают модели бота (models.py и repository.py).
+
+Поля названы так, как их видят обработчики (tg_id, user_tg_id, is_active, …), независимо
+от схемы: aiosqlite-модели собирают записи прямо из строк курсора через row_factory,
+repository — из объектов ORM. Запрос выбирает только нужные колонки, остальные поля
+получают значения по умолчанию.
+
+Запись — это сама строка курсора (tuple) под классом, собранным для набора колонок
+запроса (row_class): поле — property над индексом, не выбранное запросом поле —
+значение по умолчанию из класса. Сборка строки — один tuple.__new__ без копирования
+значений в dict или слоты; колонка читается только при обращении к полю.
+Сравнение: python -m app.devtools.rowbench.
+
+Порядок значений в tuple — это порядок колонок конкретного запроса, поэтому записи
+читаются только по именам полей: индексы и распаковка не поддерживаются. == и hash
+тоже идут по полям: записи равны, если совпадают тип (AdRecord, SwapRecord, …) и
+значения всех FIELDS, каким бы запросом они ни были собраны; с кортежем или записью
+другого типа запись не равна.
+"""
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app.config import constants
+
+
+class Record(tuple):
+    """База записей; FIELDS — все поля, атрибуты класса — значения по умолчанию"""
+
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+    RECORD: type = None  # класс записи (у классов row_class — их база)
+
+    def __new__(cls, **values):
+        return tuple.__new__(row_class(cls, tuple(values)), values.values())
+
+    def _asdict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def _key(self) -> Tuple:
+        return (self.RECORD, tuple(getattr(self, field) for field in self.FIELDS))
+
+    # Не NotImplemented: иначе Python сравнит с кортежем через tuple.__eq__
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Record) and self._key() == other._key()
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS)
+        return f"{type(self).__name__}({values})"
+
+
+class UserRecord(Record):
+    """Пользователь; level, experience_points и achievements (число полученных) — только в профиле"""
+    __slots__ = ()
+    FIELDS = ("tg_id", "username", "name", "phone", "latitude", "longitude", "location_name",
+              "rating", "total_swaps", "created_at", "level", "experience_points", "achievements")
+    tg_id: int = None
+    username: Optional[str] = None
+    name: str = "Пользователь"
+    phone: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    location_name: Optional[str] = None
+    rating: float = constants.DEFAULT_RATING
+    total_swaps: int = 0
+    created_at: Optional[str] = None
+    level: int = 1
+    experience_points: int = 0
+    achievements: int = 0
+
+
+class AdRecord(Record):
+    __slots__ = ()
+    FIELDS = ("id", "user_tg_id", "category", "title", "description", "price", "photo_file_id",
+              "latitude", "longitude", "location_name", "views", "is_active", "created_at", "distance")
+    id: int = None
+    user_tg_id: Optional[int] = None
+    category: Optional[str] = None
+    title: str = ""
+    description: Optional[str] = None
+    price: Optional[str] = None
+    photo_file_id: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    location_name: Optional[str] = None
+    views: int = 0
+    is_active: int = constants.AD_STATUS_ACTIVE
+    created_at: Optional[str] = None
+    distance: Optional[float] = None  # км от пользователя — только в ленте с геопоиском
+
+
+class SwapRecord(Record):
+    """Предложение обмена глазами пользователя: my_ad — его объявление, their_ad — чужое"""
+    __slots__ = ()
+    FIELDS = ("id", "liked_ad_id", "proposer_ad_id", "status", "message", "proposed_at",
+              "my_ad_title", "their_ad_title", "proposer_user_id", "target_user_id")
+    id: int = None
+    liked_ad_id: int = None
+    proposer_ad_id: int = None
+    status: str = None
+    message: Optional[str] = None
+    proposed_at: Optional[str] = None
+    my_ad_title: str = ""
+    their_ad_title: str = ""
+    proposer_user_id: Optional[int] = None
+    target_user_id: Optional[int] = None
+
+
+class SavedSearchRecord(Record):
+    """Сохранённый поиск; filters — словарь условий (app.services.saved_searches)"""
+    __slots__ = ()
+    FIELDS = ("id", "user_id", "name", "filters", "notify_on_new", "created_at")
+    id: int = None
+    user_id: int = None
+    name: str = ""
+    filters: Dict[str, Any] = None
+    notify_on_new: bool = True
+    created_at: Optional[str] = None
+
+
+class Page(NamedTuple):
+    """Страница списка в порядке вывода; before/after — курсоры (id крайних строк) соседних страниц, None — их нет"""
+    items: List[Record]
+    before: Optional[int] = None
+    after: Optional[int] = None
+
+
+# Наборы полей, которые заполняют запросы моделей
+USER_FIELDS = ("tg_id", "username", "name", "phone", "latitude", "longitude", "location_name", "rating", "total_swaps")
+PROFILE_FIELDS = USER_FIELDS + ("created_at", "level", "experience_points", "achievements")
+AD_FIELDS = ("id", "user_tg_id", "category", "title", "description", "price", "photo_file_id",
+             "latitude", "longitude", "location_name", "views", "is_active", "created_at")
+USER_AD_FIELDS = ("id", "category", "title", "description", "price", "photo_file_id", "views", "is_active", "created_at")
+FEED_FIELDS = ("id", "user_tg_id", "title", "description", "price", "photo_file_id",
+               "latitude", "longitude", "location_name", "created_at")
+SWAP_FIELDS = ("id", "liked_ad_id", "proposer_ad_id", "status", "message", "proposed_at")
+SAVED_SEARCH_FIELDS = ("id", "user_id", "name", "filters", "notify_on_new", "created_at")
+
+
+@lru_cache(maxsize=None)
+def row_class(record: type, columns: Tuple[str, ...]) -> type:
+    """Класс записи record над строкой с колонками columns (один на пару)"""
+    unknown = set(columns) - set(record.FIELDS)
+    if unknown:
+        raise ValueError(f"{record.__name__}: нет полей {sorted(unknown)}")
+    namespace = {field: property(itemgetter(index)) for index, field in enumerate(columns)}
+    namespace["__slots__"] = ()
+    namespace["RECORD"] = record
+    return type(record.__name__, (record,), namespace)
+
+
+@lru_cache(maxsize=None)
+def row_factory(record: type, columns: Sequence[str]) -> Callable:
+    """row_factory для sqlite3/aiosqlite: строка с колонками columns → запись record"""
+    cls, new = row_class(record, tuple(columns)), tuple.__new__
+
+    def factory(cursor, row):
+        return new(cls, row)
+
+    return factory
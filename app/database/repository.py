@@ -0,0 +1,1217 @@
+# -*- coding: utf-8 -*-
+"""
+Модели бота поверх SQLAlchemy (models_orm) — для DB_BACKEND=sqlalchemy.
+
+Тот же API, что у aiosqlite-моделей в models.py (UserModel, AdModel, SwapModel,
+RatingModel, FavoriteModel): те же аргументы и записи (records) в ответах, даты — строками
+«YYYY-MM-DD HH:MM:SS», как их отдаёт SQLite. Какие классы получают обработчики,
+решает app.database.crud.
+
+Основной сценарий — Postgres (postgresql+asyncpg://…) с несколькими процессами бота:
+у каждого процесса свой пул (DB_POOL_SIZE + DB_MAX_OVERFLOW соединений), движок
+создаётся лениво — уже после fork в кластере. Для проверки годится и
+sqlite+aiosqlite:///файл.
+
+Счётчики личных списков (user_counters), статистика (stats_counters, stats_daily) и
+таблицы лидеров (leaderboard) ведутся здесь же, в транзакциях записи объявлений,
+обменов, отзывов и избранного, — как их ведут триггеры SQLite-схемы. Лента событий
+и админка читают файл SQLite и работают только с DB_BACKEND=sqlite.
+"""
+import math
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    and_, delete, func, insert, inspect, literal, or_, select, text, tuple_, union, union_all, update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import aliased
+
+from app.config import constants, settings
+from app.database.models_orm import (
+    AchievementProgress, Ad, AdSignature, AdStatus, AdView, Base, Favorite, LeaderboardClock, LeaderboardEntry,
+    MediaFile, MediaRegistryEntry, Rating, SavedSearch, StatsCounter, StatsDaily, Swap, SwapStatus, User,
+    UserCounter,
+)
+from app.database.records import (
+    AdRecord, Page, SavedSearchRecord, SwapRecord, UserRecord,
+    USER_FIELDS, PROFILE_FIELDS, AD_FIELDS, USER_AD_FIELDS, FEED_FIELDS, SAVED_SEARCH_FIELDS,
+)
+from app.utils.hashing import (
+    ad_text_hash, hamming, lsh_bands, to_sqlite_int, from_sqlite_int,
+    TEXT_MAX_DISTANCE, PHOTO_MAX_DISTANCE,
+)
+from app.utils.metrics import instrument
+
+_engine: Optional[AsyncEngine] = None
+_sessions: Optional[async_sessionmaker] = None
+
+# Статусы обменов бота ↔ SwapStatus (в боте «предложен» — pending)
+SWAP_STATUSES = {
+    constants.SWAP_STATUS_PENDING: SwapStatus.PROPOSED,
+    constants.SWAP_STATUS_PROPOSED: SwapStatus.PROPOSED,
+    constants.SWAP_STATUS_ACCEPTED: SwapStatus.ACCEPTED,
+    constants.SWAP_STATUS_MEETING_SCHEDULED: SwapStatus.MEETING_SCHEDULED,
+    constants.SWAP_STATUS_COMPLETED: SwapStatus.COMPLETED,
+    constants.SWAP_STATUS_CANCELLED: SwapStatus.CANCELLED,
+}
+_BOT_SWAP_STATUS = {SwapStatus.PROPOSED: constants.SWAP_STATUS_PENDING}
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """Параметры пула: для Postgres — ограниченный пул с проверкой и переоткрытием соединений"""
+    if not url.startswith("postgresql"):
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+        "connect_args": {
+            "command_timeout": settings.DB_STATEMENT_TIMEOUT_MS / 1000,
+            "server_settings": {
+                "application_name": "swapbot",
+                "statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS),
+            },
+        },
+    }
+
+
+def get_engine() -> AsyncEngine:
+    global _engine, _sessions
+    if _engine is None:
+        _engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+        _sessions = async_sessionmaker(_engine, expire_on_commit=False)
+    return _engine
+
+
+def session() -> AsyncSession:
+    """Новая сессия (async with repository.session() as s: ...)"""
+    get_engine()
+    return _sessions()
+
+
+async def init_models():
+    """Создать недостающие таблицы и закрыть соединения (до fork процессов кластера)"""
+    engine = get_engine()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        if await _ensure_column(conn, "users", "total_views", "INTEGER NOT NULL DEFAULT 0"):
+            users = User.__table__
+            await conn.execute(users.update().values(total_views=(
+                select(func.coalesce(func.sum(Ad.views), 0)).where(Ad.user_id == users.c.id).scalar_subquery()
+            )))
+        await _backfill_progress(conn)
+        await _backfill_user_counters(conn)
+        await _backfill_stats(conn)
+        await _backfill_leaderboard(conn)
+        await _backfill_leaderboard_xp(conn)
+    await dispose()
+
+
+async def _ensure_column(conn, table: str, column: str, ddl: str) -> bool:
+    """
+    Добавление колонки в существующую таблицу (миграция без Alembic, как db._ensure_column):
+    create_all не меняет уже созданные таблицы. True — колонка добавлена.
+    """
+    columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns(table)})
+    if column in columns:
+        return False
+    await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return True
+
+
+async def _backfill_progress(conn):
+    """
+    Счётчики achievement_progress по данным, накопленным до них, — один раз, пока
+    таблица пуста. Имена — как в gamification.EVENT_COUNTERS; сами достижения по
+    счётчикам выдаёт gamification_service.check_and_award_achievements.
+    """
+    if await conn.scalar(select(AchievementProgress.user_id).limit(1)) is not None:
+        return
+    now = literal(datetime.utcnow())
+    sources = (
+        select(User.id, literal("swaps_completed"), User.successful_swaps, now).where(User.successful_swaps > 0),
+        select(User.id, literal("referrals"), User.referral_count, now).where(User.referral_count > 0),
+        select(Rating.to_user_id, literal("ratings_received"), func.count(), now).group_by(Rating.to_user_id),
+        select(Ad.user_id, literal("max_ad_views"), func.max(Ad.views), now)
+        .group_by(Ad.user_id).having(func.max(Ad.views) > 0),
+        select(User.id, literal("registration_rank"), func.row_number().over(order_by=(User.created_at, User.id)), now),
+    )
+    columns = ["user_id", "counter", "value", "updated_at"]
+    for source in sources:
+        await conn.execute(insert(AchievementProgress).from_select(columns, source))
+
+
+async def _backfill_user_counters(conn):
+    """Счётчики user_counters по накопленным данным — один раз, пока таблица пуста (как db.USER_COUNTERS_REBUILD)"""
+    if await conn.scalar(select(UserCounter.user_id).limit(1)) is not None:
+        return
+    sources = (
+        select(Ad.user_id, literal("ads"), func.count()).group_by(Ad.user_id),
+        select(Ad.user_id, literal("ads_active"), func.count()).where(Ad.status == AdStatus.ACTIVE).group_by(Ad.user_id),
+        select(Ad.user_id, literal("views"), func.sum(Ad.views)).where(Ad.views > 0).group_by(Ad.user_id),
+        select(Swap.user1_id, literal("swaps_out"), func.count()).group_by(Swap.user1_id),
+        select(Favorite.user_id, literal("favorites"), func.count()).group_by(Favorite.user_id),
+    )
+    columns = ["user_id", "name", "value"]
+    for source in sources:
+        await conn.execute(insert(UserCounter).from_select(columns, source))
+    # Входящие — по статусам бота (PROPOSED → pending), как в именах счётчиков
+    incoming: Dict[Tuple[int, str], int] = {}
+    for user_id, status, count in (await conn.execute(
+        select(Swap.user2_id, Swap.status, func.count()).group_by(Swap.user2_id, Swap.status)
+    )).all():
+        key = (user_id, f"swaps_in:{_bot_swap_status(status)}")
+        incoming[key] = incoming.get(key, 0) + count
+    if incoming:
+        await conn.execute(insert(UserCounter), [
+            {"user_id": user_id, "name": name, "value": value} for (user_id, name), value in incoming.items()
+        ])
+
+
+def _day(value) -> str:
+    """День «YYYY-MM-DD» из date() любого диалекта (строка в SQLite, date в Postgres)"""
+    return str(value)[:10]
+
+
+async def _backfill_stats(conn):
+    """
+    Итоги и дневные значения статистики по накопленным данным — один раз, пока
+    stats_counters пуста (как db.STATS_REBUILD): приращения относятся ко дню создания
+    (или ответа), так что суммы по дням сходятся с итогами
+    """
+    if await conn.scalar(select(StatsCounter.name).limit(1)) is not None:
+        return
+    totals: Dict[Tuple[str], int] = {}
+    daily: Dict[Tuple[str, str], int] = {}
+
+    async def add(query, name: Callable[[Any], str], names: Tuple[str, ...] = ()):
+        """Строки (день, ключ, число) → приращения дня name(ключ) и events names; итог — по name"""
+        for day, key, value in (await conn.execute(query)).all():
+            totals[name(key),] = totals.get((name(key),), 0) + value
+            for event in (name(key), *names):
+                daily[_day(day), event] = daily.get((_day(day), event), 0) + value
+
+    async def event(query, name: str):
+        for day, value in (await conn.execute(query)).all():
+            if day is not None:
+                daily[_day(day), name] = daily.get((_day(day), name), 0) + value
+
+    created = func.date(func.coalesce(User.created_at, func.current_timestamp()))
+    await add(select(created, literal(""), func.count()).group_by(created), lambda _: "users", ("new_users",))
+    created = func.date(func.coalesce(Ad.created_at, func.current_timestamp()))
+    await add(select(created, literal(""), func.count()).group_by(created), lambda _: "ads", ("new_ads",))
+    await add(select(created, Ad.category, func.count()).where(Ad.status == AdStatus.ACTIVE)
+              .group_by(created, Ad.category), lambda category: f"ads_active:{category}")
+    created = func.date(func.coalesce(Swap.created_at, func.current_timestamp()))
+    await add(select(created, literal(""), func.count()).group_by(created), lambda _: "swaps", ("new_swaps",))
+    responded = func.date(func.coalesce(Swap.completed_at, Swap.accepted_at, Swap.created_at, func.current_timestamp()))
+    await add(select(responded, Swap.status, func.count()).group_by(responded, Swap.status),
+              lambda status: f"swaps:{_bot_swap_status(status)}")
+    for column, status in ((Swap.accepted_at, constants.SWAP_STATUS_ACCEPTED),
+                           (Swap.completed_at, constants.SWAP_STATUS_COMPLETED)):
+        await event(select(func.date(column), func.count()).where(column.is_not(None))
+                    .group_by(func.date(column)), f"status:{status}")
+    viewed = func.date(func.coalesce(AdView.created_at, func.current_timestamp()))
+    await add(select(viewed, literal(""), func.count()).group_by(viewed), lambda _: "views")
+    active = union(
+        select(func.date(User.last_active).label("day"), User.id.label("user_id")).where(User.last_active.is_not(None)),
+        select(func.date(Ad.created_at), Ad.user_id).where(Ad.created_at.is_not(None)),
+        select(func.date(Swap.created_at), Swap.user1_id).where(Swap.created_at.is_not(None)),
+        select(func.date(AdView.created_at), AdView.viewer_id).where(AdView.created_at.is_not(None)),
+    ).subquery()
+    await event(select(active.c.day, func.count()).group_by(active.c.day), "active_users")
+
+    for table, keys, deltas in ((StatsCounter.__table__, ("name",), totals),
+                                (StatsDaily.__table__, ("day", "name"), daily)):
+        rows = [{**dict(zip(keys, key)), "value": value} for key, value in deltas.items() if value]
+        if rows:
+            await conn.execute(insert(table), rows)
+
+
+async def _backfill_leaderboard(conn):
+    """Таблицы лидеров по накопленным данным — один раз, пока таблица пуста (как db.LEADERBOARD_REBUILD)"""
+    if await conn.scalar(select(LeaderboardEntry.user_id).limit(1)) is not None:
+        return
+    done = union_all(
+        select(Swap.user1_id.label("user_id"), Swap.ad1_id.label("ad_id")).where(Swap.status == SwapStatus.COMPLETED),
+        select(Swap.user2_id, Swap.ad2_id).where(Swap.status == SwapStatus.COMPLETED),
+    ).subquery()
+    scores: Dict[Tuple[str, int], float] = {}
+    for user_id, count in (await conn.execute(select(done.c.user_id, func.count()).group_by(done.c.user_id))).all():
+        scores["swaps", user_id] = count
+    for category, user_id, count in (await conn.execute(
+        select(Ad.category, done.c.user_id, func.count()).join(Ad, Ad.id == done.c.ad_id)
+        .group_by(Ad.category, done.c.user_id)
+    )).all():
+        scores[f"swaps:cat:{category}", user_id] = count
+    for user_id, rating in (await conn.execute(
+        select(Rating.to_user_id, User.rating).join(User, User.id == Rating.to_user_id)
+        .group_by(Rating.to_user_id, User.rating).having(func.count() >= constants.LEADERBOARD_MIN_RATINGS)
+    )).all():
+        scores["rating", user_id] = rating
+    user_ids = {user_id for board, user_id in scores if board in _CELL_METRICS}
+    if user_ids:
+        cells = {
+            user_id: _cell(latitude, longitude) for user_id, latitude, longitude in (await conn.execute(
+                select(User.id, User.latitude, User.longitude).where(User.id.in_(user_ids))
+            )).all()
+        }
+        for (board, user_id), score in list(scores.items()):
+            if board in _CELL_METRICS and cells.get(user_id):
+                scores[f"{board}:cell:{cells[user_id]}", user_id] = score
+    if scores:
+        await conn.execute(insert(LeaderboardEntry), [
+            {"board": board, "user_id": user_id, "score": score, "seq": 0} for (board, user_id), score in scores.items()
+        ])
+
+
+async def _backfill_leaderboard_xp(conn):
+    """Таблицы xp и xp:cell:<ячейка> по users.experience_points — один раз, пока строк xp нет"""
+    if await conn.scalar(select(LeaderboardEntry.user_id).where(LeaderboardEntry.board == "xp").limit(1)) is not None:
+        return
+    rows = []
+    for user_id, experience_points, latitude, longitude in (await conn.execute(
+        select(User.id, User.experience_points, User.latitude, User.longitude).where(User.experience_points > 0)
+    )).all():
+        cell = _cell(latitude, longitude)
+        rows.append({"board": "xp", "user_id": user_id, "score": experience_points, "seq": 0})
+        if cell:
+            rows.append({"board": f"xp:cell:{cell}", "user_id": user_id, "score": experience_points, "seq": 0})
+    if rows:
+        await conn.execute(insert(LeaderboardEntry), rows)
+
+
+async def dispose():
+    global _engine, _sessions
+    if _engine is not None:
+        await _engine.dispose()
+    _engine = _sessions = None
+
+
+def _ts(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+
+def _price(value: Optional[str]) -> Optional[int]:
+    """Цена в боте — строка из цифр (validate_price), в ORM — целое"""
+    digits = re.sub(r"\D", "", str(value or ""))
+    return int(digits) if digits else None
+
+
+def _bot_price(value: Optional[int]) -> Optional[str]:
+    return str(value) if value else None
+
+
+def _bot_swap_status(status: SwapStatus) -> str:
+    return _BOT_SWAP_STATUS.get(status, status.value)
+
+
+# Поля записей из объектов ORM (имена — как в схеме бота)
+_USER_GETTERS = {
+    "tg_id": lambda user: user.id,
+    "created_at": lambda user: _ts(user.created_at),
+    "achievements": lambda user: len(user.achievements or {}),
+}
+_AD_GETTERS = {
+    "user_tg_id": lambda ad: ad.user_id,
+    "price": lambda ad: _bot_price(ad.price),
+    "photo_file_id": lambda ad: (ad.photos or {}).get("main"),
+    "is_active": lambda ad: constants.AD_STATUS_ACTIVE if ad.status == AdStatus.ACTIVE else constants.AD_STATUS_INACTIVE,
+    "created_at": lambda ad: _ts(ad.created_at),
+}
+
+
+def _record(record: type, getters: Dict[str, Callable], obj: Any, fields: Tuple[str, ...], **extra):
+    values = {field: getters[field](obj) if field in getters else getattr(obj, field) for field in fields}
+    return record(**values, **extra)
+
+
+def _page_query(q, ts, id_column, after: Optional[int], before: Optional[int], limit: int, *scope):
+    """Keyset-страница по убыванию (ts, id), как models._fetch_page: граница — строка с id after/before
+    (scope — доп. условия, если id не уникален в таблице)"""
+    def bound(cursor: int):
+        return tuple_(select(ts).where(id_column == cursor, *scope).correlate(None).scalar_subquery(), cursor)
+
+    key = tuple_(ts, id_column)
+    if after is not None:
+        q = q.where(key < bound(after))
+    elif before is not None:
+        return q.where(key > bound(before)).order_by(ts.asc(), id_column.asc()).limit(limit + 1)
+    return q.order_by(ts.desc(), id_column.desc()).limit(limit + 1)
+
+
+def _page(rows: List, after: Optional[int], before: Optional[int], limit: int) -> Page:
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if after is None and before is not None:  # шли назад по возрастанию
+        rows.reverse()
+        return Page(rows, rows[0].id if more else None, rows[-1].id if rows else None)
+    return Page(rows, rows[0].id if after is not None and rows else None, rows[-1].id if more else None)
+
+
+def _gamification():
+    """Сервис достижений (импорт при вызове: пакет app.services сам импортирует crud)"""
+    from app.services.gamification import gamification_service
+    return gamification_service
+
+
+def _is_view_milestone(views: int) -> bool:
+    from app.services.gamification import AD_VIEW_MILESTONES
+    return views in AD_VIEW_MILESTONES
+
+
+async def _record_event(s: AsyncSession, user_id: int, event: str, **kwargs):
+    """Событие достижений пользователя в транзакции s (коммит — на вызывающем)"""
+    user = await s.get(User, user_id)
+    if user is not None:
+        experience_points = user.experience_points
+        await _gamification().record_event(user, event, s, **kwargs)
+        await _leaderboard_xp(s, user, experience_points)
+
+
+def _upsert(s: AsyncSession):
+    """insert с ON CONFLICT для диалекта сессии (Postgres или SQLite)"""
+    if s.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    return upsert
+
+
+async def _add(s: AsyncSession, table, keys: Tuple[str, ...], deltas: Dict[Tuple, int]):
+    """value += приращение для строк table с ключами keys — одна вставка с ON CONFLICT; нулевые пропускаются"""
+    rows = [{**dict(zip(keys, key)), "value": delta} for key, delta in deltas.items() if delta]
+    if not rows:
+        return
+    stmt = _upsert(s)(table).values(rows)
+    await s.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c[key] for key in keys],
+        set_={"value": table.c.value + stmt.excluded.value},
+    ))
+
+
+async def _count(s: AsyncSession, *changes: Tuple[int, str, int]):
+    """
+    Счётчики пользователей (user_id, имя, приращение) в транзакции s — то же, что
+    USER_COUNTER_TRIGGERS SQLite-схемы; одна вставка с ON CONFLICT на все изменения
+    """
+    deltas: Dict[Tuple[int, str], int] = {}
+    for user_id, name, delta in changes:
+        deltas[user_id, name] = deltas.get((user_id, name), 0) + delta
+    await _add(s, UserCounter.__table__, ("user_id", "name"), deltas)
+
+
+async def _stat(s: AsyncSession, *changes: Tuple[str, int], events: Tuple[str, ...] = ()):
+    """
+    Итоги статистики (имя, приращение) и их приращения за сегодня, плюс дневные
+    события events — в транзакции s, как db.STATS_TRIGGERS SQLite-схемы
+    """
+    totals: Dict[Tuple[str], int] = {}
+    for name, delta in changes:
+        totals[name,] = totals.get((name,), 0) + delta
+    day = datetime.utcnow().date().isoformat()
+    daily = {(day, name): delta for (name,), delta in totals.items()}
+    for name in events:
+        daily[day, name] = daily.get((day, name), 0) + 1
+    await _add(s, StatsCounter.__table__, ("name",), totals)
+    await _add(s, StatsDaily.__table__, ("day", "name"), daily)
+
+
+async def _touch(s: AsyncSession, user_id: int):
+    """Активность пользователя: дневное событие active_users — не чаще раза в день (как db._touch)"""
+    now = datetime.utcnow()
+    today = datetime(now.year, now.month, now.day)
+    row = (await s.execute(
+        update(User).where(User.id == user_id, or_(User.last_active.is_(None), User.last_active < today))
+        .values(last_active=now).returning(User.id)
+    )).first()
+    if row is not None:
+        await _stat(s, events=("active_users",))
+
+
+def _cell(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    """Гео-ячейка таблиц лидеров (как db._cell); None без координат"""
+    if latitude is None or longitude is None:
+        return None
+    size = constants.LEADERBOARD_CELL_DEG
+    return f"{math.floor(latitude / size)}:{math.floor(longitude / size)}"
+
+
+# Глобальные таблицы лидеров, у которых есть варианты по ячейкам (как db._CELL_METRICS)
+_CELL_METRICS = ("swaps", "rating", "xp")
+
+
+async def _leaderboard_seq(s: AsyncSession) -> int:
+    """Следующий seq таблиц лидеров; строка часов заблокирована до коммита s"""
+    table = LeaderboardClock.__table__
+    stmt = _upsert(s)(table).values(id=1, seq=1)
+    return await s.scalar(stmt.on_conflict_do_update(
+        index_elements=[table.c.id], set_={"seq": table.c.seq + 1},
+    ).returning(table.c.seq))
+
+
+async def _leaderboard(s: AsyncSession, rows: List[Tuple[Optional[str], int, Optional[float]]], delta: bool = False):
+    """
+    Строки (таблица, user_id, score) таблиц лидеров в транзакции s — как db.LEADERBOARD_TRIGGERS.
+    Таблица None (нет ячейки или категории) пропускается. delta — score прибавляется
+    к текущему, нулевой итог — NULL (выбыл из таблицы)
+    """
+    rows = [(board, user_id, score) for board, user_id, score in rows if board is not None]
+    if not rows:
+        return
+    seq = await _leaderboard_seq(s)
+    table = LeaderboardEntry.__table__
+    stmt = _upsert(s)(table).values([
+        {"board": board, "user_id": user_id, "score": score, "seq": seq} for board, user_id, score in rows
+    ])
+    score = stmt.excluded.score
+    if delta:
+        score = func.nullif(func.coalesce(table.c.score, 0) + stmt.excluded.score, 0)
+    await s.execute(stmt.on_conflict_do_update(
+        index_elements=[table.c.board, table.c.user_id], set_={"score": score, "seq": stmt.excluded.seq},
+    ))
+
+
+async def _move_leaderboard_cell(s: AsyncSession, user_id: int, old_cell: Optional[str], new_cell: Optional[str]):
+    """Переезд: строки ячеек переносятся из старой в новую с текущими значениями (как leaderboard_users_location)"""
+    seq = await _leaderboard_seq(s)
+    await s.execute(update(LeaderboardEntry).where(
+        LeaderboardEntry.board.in_([f"{metric}:cell:{old_cell}" for metric in _CELL_METRICS]),
+        LeaderboardEntry.user_id == user_id, LeaderboardEntry.score.is_not(None),
+    ).values(score=None, seq=seq))
+    if new_cell is None:
+        return
+    rows = (await s.execute(select(LeaderboardEntry.board, LeaderboardEntry.score).where(
+        LeaderboardEntry.board.in_(_CELL_METRICS), LeaderboardEntry.user_id == user_id,
+        LeaderboardEntry.score.is_not(None),
+    ))).all()
+    await _leaderboard(s, [(f"{board}:cell:{new_cell}", user_id, score) for board, score in rows])
+
+
+async def _leaderboard_swaps(s: AsyncSession, participants: List[Tuple[int, Optional[int]]], delta: int):
+    """Обмен завершён (+1) или отменён после завершения (-1): участники (user_id, его объявление)"""
+    user_ids = [user_id for user_id, _ in participants]
+    ad_ids = [ad_id for _, ad_id in participants if ad_id is not None]
+    cells = {
+        user_id: _cell(latitude, longitude) for user_id, latitude, longitude in (await s.execute(
+            select(User.id, User.latitude, User.longitude).where(User.id.in_(user_ids))
+        )).all()
+    }
+    categories = dict((await s.execute(select(Ad.id, Ad.category).where(Ad.id.in_(ad_ids)))).all()) if ad_ids else {}
+    rows = []
+    for user_id, ad_id in participants:
+        cell, category = cells.get(user_id), categories.get(ad_id)
+        rows += [
+            ("swaps", user_id, delta),
+            (f"swaps:cell:{cell}" if cell else None, user_id, delta),
+            (f"swaps:cat:{category}" if category else None, user_id, delta),
+        ]
+    await _leaderboard(s, rows, delta=True)
+
+
+async def _leaderboard_xp(s: AsyncSession, user: User, before: int):
+    """Опыт user изменился (был before) — строки xp и xp:cell:<ячейка>, как leaderboard_users_xp"""
+    if user.experience_points == before:
+        return
+    cell, score = _cell(user.latitude, user.longitude), float(user.experience_points) or None
+    await _leaderboard(s, [("xp", user.id, score), (f"xp:cell:{cell}" if cell else None, user.id, score)])
+
+
+@instrument
+class UserModel:
+    @staticmethod
+    async def get_or_create(tg_id: int, username: str = None, name: str = "Пользователь") -> UserRecord:
+        async with session() as s:
+            user = await s.get(User, tg_id)
+            if user is None:
+                user = User(id=tg_id, username=username, name=name, rating=constants.DEFAULT_RATING, total_swaps=0)
+                s.add(user)
+                await _stat(s, ("users", 1), events=("new_users", "active_users"))
+                try:
+                    await s.commit()
+                except IntegrityError:
+                    # Тот же пользователь создан параллельно другим процессом
+                    await s.rollback()
+                    user = await s.get(User, tg_id)
+                else:
+                    await _gamification().record_event(user, "registered", s)
+                    await _leaderboard_xp(s, user, 0)
+                    await s.commit()
+            return _record(UserRecord, _USER_GETTERS, user, USER_FIELDS)
+
+    @staticmethod
+    async def _update(tg_id: int, **values):
+        async with session() as s:
+            await s.execute(update(User).where(User.id == tg_id).values(**values, last_active=datetime.utcnow()))
+            await s.commit()
+
+    @staticmethod
+    async def update_location(tg_id: int, latitude: float, longitude: float, location_name: str = ""):
+        async with session() as s:
+            old = (await s.execute(select(User.latitude, User.longitude).where(User.id == tg_id))).first()
+            await s.execute(update(User).where(User.id == tg_id).values(
+                latitude=latitude, longitude=longitude, location_name=location_name, last_active=datetime.utcnow()))
+            old_cell, new_cell = _cell(*old) if old else None, _cell(latitude, longitude)
+            if old is not None and old_cell != new_cell:
+                await _move_leaderboard_cell(s, tg_id, old_cell, new_cell)
+            await s.commit()
+
+    @staticmethod
+    async def update_phone(tg_id: int, phone: str, verified: bool = False):
+        """verified — номер пришёл контактом самого пользователя (подтверждён Telegram)"""
+        async with session() as s:
+            await s.execute(update(User).where(User.id == tg_id).values(
+                phone=phone, phone_verified=verified, last_active=datetime.utcnow()))
+            if verified:
+                await _record_event(s, tg_id, "phone_verified")
+            await s.commit()
+
+    @staticmethod
+    async def update_field(tg_id: int, field: str, value: Any):
+        if field not in ("name", "phone", "location_name"):
+            return
+        await UserModel._update(tg_id, **{field: value})
+
+    @staticmethod
+    async def get_profile(tg_id: int) -> Optional[UserRecord]:
+        async with session() as s:
+            user = await s.get(User, tg_id)
+            if user is None:
+                return None
+            return _record(UserRecord, _USER_GETTERS, user, PROFILE_FIELDS)
+
+
+async def write_ad_signatures(s: AsyncSession, ad_id: int, text_hash: Optional[int], photo_hash: Optional[int]):
+    """Запись LSH-корзин сигнатур объявления"""
+    for kind, signature in (("t", text_hash), ("p", photo_hash)):
+        if signature is not None:
+            s.add_all(AdSignature(ad_id=ad_id, kind=kind, band=band, bucket=bucket)
+                      for band, bucket in set(lsh_bands(signature)))
+
+
+async def _find_similar(s: AsyncSession, kind: str, signature: int, max_distance: int,
+                        user_tg_id: Optional[int] = None, category: Optional[str] = None,
+                        inactive_only: bool = False, active_only: bool = False) -> Optional[int]:
+    """Поиск самого старого объявления с близкой сигнатурой через LSH-корзины"""
+    column = Ad.text_hash if kind == "t" else Ad.photo_hash
+    q = (
+        select(Ad.id, column).distinct()
+        .join(AdSignature, AdSignature.ad_id == Ad.id)
+        .where(AdSignature.kind == kind)
+        .where(or_(*(and_(AdSignature.band == band, AdSignature.bucket == bucket)
+                     for band, bucket in lsh_bands(signature))))
+    )
+    if user_tg_id is not None:
+        q = q.where(Ad.user_id == user_tg_id)
+    if category is not None:
+        q = q.where(Ad.category == category)
+    if inactive_only:
+        q = q.where(Ad.status != AdStatus.ACTIVE)
+    if active_only:
+        q = q.where(Ad.status == AdStatus.ACTIVE)
+    for ad_id, stored in (await s.execute(q.order_by(Ad.id))).all():
+        if stored is not None and hamming(from_sqlite_int(stored), signature) <= max_distance:
+            return ad_id
+    return None
+
+
+@instrument
+class AdModel:
+    @staticmethod
+    async def create(user_tg_id: int, category: str, title: str, description: str, price: Optional[str],
+                     photo_file_id: Optional[str], latitude=None, longitude=None, location_name=None,
+                     photo_hash: Optional[int] = None) -> int:
+        text_hash = ad_text_hash(title, description)
+        async with session() as s:
+            ad = Ad(
+                user_id=user_tg_id, category=category, title=title, description=description or "",
+                price=_price(price), photos={"main": photo_file_id} if photo_file_id else {},
+                latitude=latitude, longitude=longitude, location_name=location_name, status=AdStatus.ACTIVE,
+                text_hash=to_sqlite_int(text_hash), photo_hash=to_sqlite_int(photo_hash),
+            )
+            s.add(ad)
+            await s.flush()
+            await write_ad_signatures(s, ad.id, text_hash, photo_hash)
+            await _count(s, (user_tg_id, "ads", 1), (user_tg_id, "ads_active", 1))
+            await _stat(s, ("ads", 1), (f"ads_active:{category}", 1), events=("new_ads",))
+            await _touch(s, user_tg_id)
+            await s.commit()
+            return ad.id
+
+    @staticmethod
+    async def find_duplicate(title: str, description: Optional[str], photo_hash: Optional[int] = None,
+                             user_tg_id: Optional[int] = None, category: Optional[str] = None,
+                             inactive_only: bool = False, active_only: bool = False) -> Optional[int]:
+        """ID уже существующего почти-дубликата (по тексту или фото) или None"""
+        filters = dict(category=category, inactive_only=inactive_only, active_only=active_only)
+        async with session() as s:
+            ad_id = await _find_similar(s, "t", ad_text_hash(title, description), TEXT_MAX_DISTANCE, user_tg_id, **filters)
+            if ad_id is None and photo_hash is not None:
+                ad_id = await _find_similar(s, "p", photo_hash, PHOTO_MAX_DISTANCE, user_tg_id, **filters)
+            return ad_id
+
+    @staticmethod
+    async def get_by_id(ad_id: int) -> Optional[AdRecord]:
+        async with session() as s:
+            ad = await s.get(Ad, ad_id)
+            return _record(AdRecord, _AD_GETTERS, ad, AD_FIELDS) if ad else None
+
+    @staticmethod
+    async def get_user_ads(user_tg_id: int, active_only: bool = True) -> List[AdRecord]:
+        q = select(Ad).where(Ad.user_id == user_tg_id)
+        if active_only:
+            q = q.where(Ad.status == AdStatus.ACTIVE)
+        async with session() as s:
+            ads = (await s.execute(q.order_by(Ad.created_at.desc(), Ad.id.desc()))).scalars().all()
+        return [_record(AdRecord, _AD_GETTERS, ad, USER_AD_FIELDS) for ad in ads]
+
+    @staticmethod
+    async def get_user_ads_page(user_tg_id: int, after: Optional[int] = None, before: Optional[int] = None,
+                                limit: int = constants.MY_ADS_PAGE_SIZE) -> Page:
+        q = _page_query(select(Ad).where(Ad.user_id == user_tg_id), Ad.created_at, Ad.id, after, before, limit)
+        async with session() as s:
+            ads = (await s.execute(q)).scalars().all()
+        return _page([_record(AdRecord, _AD_GETTERS, ad, USER_AD_FIELDS) for ad in ads], after, before, limit)
+
+    @staticmethod
+    async def get_next_ad(category: str, viewer_tg_id: int, last_ad_id: int = 0, user_lat=None, user_lon=None, max_distance_km: int = 100) -> Optional[AdRecord]:
+        q = select(Ad).where(
+            Ad.status == AdStatus.ACTIVE, Ad.category == category, Ad.user_id != viewer_tg_id, Ad.id > last_ad_id,
+        )
+        distance = None
+        async with session() as s:
+            if user_lat and user_lon:
+                # Postgres не прощает acos(1.0000000000000002) на совпадающих координатах
+                least = func.least if s.get_bind().dialect.name == "postgresql" else func.min
+                distance = 6371 * func.acos(least(1.0,
+                    func.cos(func.radians(user_lat)) * func.cos(func.radians(Ad.latitude))
+                    * func.cos(func.radians(Ad.longitude) - func.radians(user_lon))
+                    + func.sin(func.radians(user_lat)) * func.sin(func.radians(Ad.latitude))
+                ))
+                # Как в SQLite: объявления без координат — первыми
+                q = (q.add_columns(distance.label("distance"))
+                     .where(or_(Ad.latitude.is_(None), distance <= max_distance_km))
+                     .order_by(distance.asc().nulls_first(), Ad.id.asc()))
+            else:
+                q = q.order_by(Ad.id.asc())
+            row = (await s.execute(q.limit(1))).first()
+        if not row:
+            if last_ad_id > 0:
+                return await AdModel.get_next_ad(category, viewer_tg_id, 0, user_lat, user_lon, max_distance_km)
+            return None
+        if distance is None:
+            return _record(AdRecord, _AD_GETTERS, row[0], FEED_FIELDS)
+        return _record(AdRecord, _AD_GETTERS, row[0], FEED_FIELDS, distance=row[1])
+
+    @staticmethod
+    async def get_category_ads(category: str, viewer_tg_id: int, limit: int = 200) -> List[AdRecord]:
+        """Активные чужие объявления категории, новые сначала (кандидаты похожих объявлений)"""
+        q = (select(Ad).where(Ad.status == AdStatus.ACTIVE, Ad.category == category, Ad.user_id != viewer_tg_id)
+             .order_by(Ad.id.desc()).limit(limit))
+        async with session() as s:
+            ads = (await s.execute(q)).scalars().all()
+        return [_record(AdRecord, _AD_GETTERS, ad, FEED_FIELDS) for ad in ads]
+
+    @staticmethod
+    async def increment_views(ad_id: int, viewer_id: int):
+        async with session() as s:
+            row = (await s.execute(
+                update(Ad).where(Ad.id == ad_id).values(views=Ad.views + 1).returning(Ad.user_id, Ad.views)
+            )).first()
+            s.add(AdView(ad_id=ad_id, viewer_id=viewer_id))
+            await _stat(s, ("views", 1))
+            await _touch(s, viewer_id)
+            if row is not None:
+                await s.execute(update(User).where(User.id == row.user_id).values(total_views=User.total_views + 1))
+                await _count(s, (row.user_id, "views", 1))
+                # Пользователя и счётчик достижения трогаем только на пороге
+                if _is_view_milestone(row.views):
+                    await _record_event(s, row.user_id, "ad_viewed", value=row.views)
+            await s.commit()
+
+    @staticmethod
+    async def deactivate(ad_id: int):
+        async with session() as s:
+            row = (await s.execute(
+                update(Ad).where(Ad.id == ad_id, Ad.status == AdStatus.ACTIVE)
+                .values(status=AdStatus.INACTIVE).returning(Ad.user_id, Ad.category)
+            )).first()
+            if row is not None:
+                await _count(s, (row.user_id, "ads_active", -1))
+                await _stat(s, (f"ads_active:{row.category}", -1))
+            await s.commit()
+
+    @staticmethod
+    async def update_price(ad_id: int, price: Optional[str]):
+        async with session() as s:
+            await s.execute(update(Ad).where(Ad.id == ad_id).values(price=_price(price), updated_at=datetime.utcnow()))
+            await s.commit()
+
+    @staticmethod
+    async def activate(ad_id: int):
+        async with session() as s:
+            row = (await s.execute(
+                update(Ad).where(Ad.id == ad_id, Ad.status != AdStatus.ACTIVE)
+                .values(status=AdStatus.ACTIVE, updated_at=datetime.utcnow()).returning(Ad.user_id, Ad.category)
+            )).first()
+            if row is not None:
+                await _count(s, (row.user_id, "ads_active", 1))
+                await _stat(s, (f"ads_active:{row.category}", 1))
+            await s.commit()
+
+    @staticmethod
+    async def republish(ad_id: int, title: str, description: str, price: Optional[str],
+                        photo_file_id: Optional[str] = None, latitude=None, longitude=None, location_name=None):
+        text_hash = ad_text_hash(title, description)
+        async with session() as s:
+            ad = await s.get(Ad, ad_id)
+            if ad is None:
+                return
+            old_hash = from_sqlite_int(ad.text_hash)
+            if old_hash != text_hash:
+                if old_hash is not None:
+                    await s.execute(delete(AdSignature).where(
+                        AdSignature.kind == "t", AdSignature.ad_id == ad_id,
+                        tuple_(AdSignature.band, AdSignature.bucket).in_(list(set(lsh_bands(old_hash)))),
+                    ))
+                await write_ad_signatures(s, ad_id, text_hash, None)
+            if ad.status != AdStatus.ACTIVE:
+                await _count(s, (ad.user_id, "ads_active", 1))
+                await _stat(s, (f"ads_active:{ad.category}", 1))
+            ad.title, ad.description, ad.text_hash = title, description or "", to_sqlite_int(text_hash)
+            ad.status, ad.price, ad.updated_at = AdStatus.ACTIVE, _price(price), datetime.utcnow()
+            if photo_file_id:
+                ad.photos = {**(ad.photos or {}), "main": photo_file_id}
+            if latitude is not None and longitude is not None:
+                ad.latitude, ad.longitude = latitude, longitude
+            if location_name is not None:
+                ad.location_name = location_name
+            await s.commit()
+
+
+async def _swaps(where, counterpart, titles: Tuple[str, str], page: Optional[Tuple] = None) -> List[SwapRecord]:
+    """Предложения обмена с заголовками обоих объявлений (titles — поля для liked и proposer).
+
+    page — (after, before, limit): одна keyset-страница вместо всего списка.
+    """
+    liked, offered = aliased(Ad), aliased(Ad)
+    q = (
+        select(Swap.id, Swap.ad2_id, Swap.ad1_id, counterpart, Swap.status, Swap.message, Swap.created_at,
+               liked.title, offered.title)
+        .join(liked, liked.id == Swap.ad2_id).join(offered, offered.id == Swap.ad1_id)
+        .where(*where)
+    )
+    if page:
+        q = _page_query(q, Swap.created_at, Swap.id, *page)
+    else:
+        q = q.order_by(Swap.created_at.desc(), Swap.id.desc())
+    async with session() as s:
+        rows = (await s.execute(q)).all()
+    user_field = "proposer_user_id" if counterpart is Swap.user1_id else "target_user_id"
+    return [
+        SwapRecord(id=r[0], liked_ad_id=r[1], proposer_ad_id=r[2], status=_bot_swap_status(r[4]), message=r[5],
+                   proposed_at=_ts(r[6]), **{user_field: r[3], titles[0]: r[7], titles[1]: r[8]})
+        for r in rows
+    ]
+
+
+@instrument
+class SwapModel:
+    @staticmethod
+    async def create(liked_ad_id: int, proposer_ad_id: int, proposer_user_id: int, target_user_id: int, message: str = "") -> Tuple[bool, Optional[int]]:
+        async with session() as s:
+            swap = Swap(user1_id=proposer_user_id, user2_id=target_user_id, ad1_id=proposer_ad_id,
+                        ad2_id=liked_ad_id, message=message, status=SwapStatus.PROPOSED)
+            s.add(swap)
+            try:
+                await s.flush()
+            except IntegrityError:
+                return False, None
+            status = _bot_swap_status(swap.status)
+            await _count(s, (proposer_user_id, "swaps_out", 1), (target_user_id, f"swaps_in:{status}", 1))
+            await _stat(s, ("swaps", 1), (f"swaps:{status}", 1), events=("new_swaps",))
+            await _touch(s, proposer_user_id)
+            await s.commit()
+            return True, swap.id
+
+    @staticmethod
+    async def get_incoming(user_id: int, status: str = "pending") -> List[SwapRecord]:
+        where = (Swap.user2_id == user_id, Swap.status == SWAP_STATUSES.get(status, status))
+        return await _swaps(where, Swap.user1_id, ("my_ad_title", "their_ad_title"))
+
+    @staticmethod
+    async def get_incoming_page(user_id: int, status: str = "pending", after: Optional[int] = None,
+                                before: Optional[int] = None, limit: int = constants.SWAPS_PAGE_SIZE) -> Page:
+        where = (Swap.user2_id == user_id, Swap.status == SWAP_STATUSES.get(status, status))
+        rows = await _swaps(where, Swap.user1_id, ("my_ad_title", "their_ad_title"), (after, before, limit))
+        return _page(rows, after, before, limit)
+
+    @staticmethod
+    async def get_outgoing(user_id: int) -> List[SwapRecord]:
+        return await _swaps((Swap.user1_id == user_id,), Swap.user2_id, ("their_ad_title", "my_ad_title"))
+
+    @staticmethod
+    async def get_outgoing_page(user_id: int, after: Optional[int] = None, before: Optional[int] = None,
+                                limit: int = constants.SWAPS_PAGE_SIZE) -> Page:
+        rows = await _swaps((Swap.user1_id == user_id,), Swap.user2_id, ("their_ad_title", "my_ad_title"),
+                            (after, before, limit))
+        return _page(rows, after, before, limit)
+
+    @staticmethod
+    async def update_status(swap_id: int, status: str):
+        values: Dict[str, Any] = {"status": SWAP_STATUSES[status]}
+        if status == constants.SWAP_STATUS_ACCEPTED:
+            values["accepted_at"] = datetime.utcnow()
+        elif status == constants.SWAP_STATUS_COMPLETED:
+            values["completed_at"] = datetime.utcnow()
+        async with session() as s:
+            # Прежний статус под блокировкой строки: параллельная смена статуса
+            # не собьёт счётчики входящих по статусам
+            previous = await s.scalar(select(Swap.status).where(Swap.id == swap_id).with_for_update())
+            if previous is None:
+                return
+            q = update(Swap).where(Swap.id == swap_id)
+            if status == constants.SWAP_STATUS_COMPLETED:
+                q = q.where(Swap.status != SwapStatus.COMPLETED)  # награда — один раз за обмен
+            row = (await s.execute(q.values(**values).returning(
+                Swap.user1_id, Swap.user2_id, Swap.ad1_id, Swap.ad2_id))).first()
+            if row is not None and previous != values["status"]:
+                old, new = _bot_swap_status(previous), _bot_swap_status(values["status"])
+                await _count(s, (row.user2_id, f"swaps_in:{old}", -1), (row.user2_id, f"swaps_in:{new}", 1))
+                await _stat(s, (f"swaps:{old}", -1), (f"swaps:{new}", 1), events=(f"status:{new}",))
+                if SwapStatus.COMPLETED in (previous, values["status"]):
+                    await _leaderboard_swaps(s, [(row.user1_id, row.ad1_id), (row.user2_id, row.ad2_id)],
+                                             1 if values["status"] == SwapStatus.COMPLETED else -1)
+            if row is not None and status == constants.SWAP_STATUS_COMPLETED:
+                user_ids = [row.user1_id, row.user2_id]
+                await s.execute(update(User).where(User.id.in_(user_ids))
+                                .values(successful_swaps=User.successful_swaps + 1))
+                for user_id in user_ids:
+                    user = await s.get(User, user_id)
+                    if user is not None:
+                        experience_points = user.experience_points
+                        await _gamification().award_swap_completion(user, s)
+                        await _leaderboard_xp(s, user, experience_points)
+            await s.commit()
+
+
+@instrument
+class UserCounterModel:
+    """Те же счётчики, что у models.UserCounterModel; ведут записи repository (_count), как триггеры в SQLite"""
+
+    @staticmethod
+    async def get(user_id: int) -> Dict[str, int]:
+        """ads, ads_active, views, swaps_out, swaps_in:<статус>, favorites; нулевых нет"""
+        async with session() as s:
+            rows = await s.execute(
+                select(UserCounter.name, UserCounter.value).where(UserCounter.user_id == user_id, UserCounter.value != 0)
+            )
+            return dict(rows.all())
+
+
+@instrument
+class RatingModel:
+    @staticmethod
+    async def add_rating(from_user_id: int, to_user_id: int, rating: int, comment: str = "", swap_id: Optional[int] = None) -> bool:
+        async with session() as s:
+            s.add(Rating(from_user_id=from_user_id, to_user_id=to_user_id, rating=rating, comment=comment, swap_id=swap_id))
+            try:
+                await s.flush()
+            except IntegrityError:
+                return False
+            avg, count = (await s.execute(
+                select(func.avg(Rating.rating), func.count()).where(Rating.to_user_id == to_user_id)
+            )).one()
+            await s.execute(update(User).where(User.id == to_user_id).values(rating=float(avg or constants.DEFAULT_RATING)))
+            # От каждого нового отзыва, начиная с порога (как leaderboard_ratings_insert)
+            if count >= constants.LEADERBOARD_MIN_RATINGS:
+                cell = _cell(*(await s.execute(
+                    select(User.latitude, User.longitude).where(User.id == to_user_id)
+                )).one())
+                await _leaderboard(s, [("rating", to_user_id, float(avg)),
+                                       (f"rating:cell:{cell}" if cell else None, to_user_id, float(avg))])
+            await _record_event(s, to_user_id, "rating_received")
+            await s.commit()
+        return True
+
+    @staticmethod
+    async def get_user_ratings(user_id: int) -> Tuple[float, int]:
+        async with session() as s:
+            avg, cnt = (await s.execute(
+                select(func.avg(Rating.rating), func.count()).where(Rating.to_user_id == user_id)
+            )).one()
+        return (float(avg) if avg is not None else constants.DEFAULT_RATING, cnt or 0)
+
+
+@instrument
+class ReferralModel:
+    """Приглашения по реферальным кодам (коды и очередь — app.services.referrals)"""
+
+    @staticmethod
+    async def legacy_referrers(codes: List[str]) -> Dict[str, int]:
+        """{старый код без подписи: пригласивший} по уникальному индексу users.referral_code"""
+        async with session() as s:
+            result = await s.execute(select(User.referral_code, User.id).where(User.referral_code.in_(codes)))
+            return dict(result.all())
+
+    @staticmethod
+    async def apply(invites: Dict[int, int]) -> Dict[int, List[int]]:
+        """
+        Бонусы за приглашения {новый пользователь: пригласивший} одной транзакцией.
+        Засчитываются только существующие и ещё никем не приглашённые; возвращает
+        {пригласивший: [приглашённые]}.
+        """
+        async with session() as s:
+            result = await s.execute(select(User).where(User.id.in_(set(invites) | set(invites.values()))))
+            users = {user.id: user for user in result.scalars()}
+
+            applied: Dict[int, List[int]] = {}
+            for new_user_id, referrer_id in invites.items():
+                new_user, referrer = users.get(new_user_id), users.get(referrer_id)
+                if new_user is None or referrer is None or new_user.referred_by_id is not None:
+                    continue
+                new_user.referred_by_id = referrer_id
+                new_user.bonus_points += settings.REFERRAL_BONUS
+                applied.setdefault(referrer_id, []).append(new_user_id)
+
+            for referrer_id, invited in applied.items():
+                referrer = users[referrer_id]
+                experience_points = referrer.experience_points
+                bonus = settings.REFERRAL_BONUS * len(invited)
+                referrer.referral_count += len(invited)
+                referrer.bonus_points += bonus
+                referrer.experience_points += bonus
+                await _gamification().record_event(referrer, "referral", s, amount=len(invited))
+                await _leaderboard_xp(s, referrer, experience_points)
+            await s.commit()
+        return applied
+
+
+@instrument
+class FavoriteModel:
+    @staticmethod
+    async def add(user_id: int, ad_id: int) -> bool:
+        async with session() as s:
+            s.add(Favorite(user_id=user_id, ad_id=ad_id))
+            try:
+                await s.flush()
+            except IntegrityError:
+                return False
+            await _count(s, (user_id, "favorites", 1))
+            await s.commit()
+        return True
+
+    @staticmethod
+    async def remove(user_id: int, ad_id: int) -> bool:
+        async with session() as s:
+            result = await s.execute(delete(Favorite).where(Favorite.user_id == user_id, Favorite.ad_id == ad_id))
+            if result.rowcount > 0:
+                await _count(s, (user_id, "favorites", -1))
+            await s.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def ad_ids(user_id: int) -> List[int]:
+        async with session() as s:
+            return list((await s.scalars(select(Favorite.ad_id).where(Favorite.user_id == user_id))).all())
+
+    @staticmethod
+    async def get_page(user_id: int, after: Optional[int] = None, before: Optional[int] = None,
+                       limit: int = constants.FAVORITES_PAGE_SIZE) -> Page:
+        q = _page_query(
+            select(Ad).join(Favorite, Favorite.ad_id == Ad.id).where(Favorite.user_id == user_id),
+            Favorite.id, Favorite.ad_id, after, before, limit, Favorite.user_id == user_id,
+        )
+        async with session() as s:
+            ads = (await s.execute(q)).scalars().all()
+        return _page([_record(AdRecord, _AD_GETTERS, ad, USER_AD_FIELDS) for ad in ads], after, before, limit)
+
+    @staticmethod
+    async def subscribers(ad_ids: List[int]) -> List[Tuple[int, int]]:
+        if not ad_ids:
+            return []
+        async with session() as s:
+            rows = await s.execute(select(Favorite.ad_id, Favorite.user_id).where(Favorite.ad_id.in_(ad_ids)))
+            return [tuple(row) for row in rows.all()]
+
+
+_SAVED_SEARCH_GETTERS = {
+    "created_at": lambda search: _ts(search.created_at),
+}
+
+
+@instrument
+class SavedSearchModel:
+    @staticmethod
+    async def create(user_id: int, name: str, filters: Dict[str, Any], notify_on_new: bool = True) -> int:
+        async with session() as s:
+            search = SavedSearch(user_id=user_id, name=name, filters=filters, notify_on_new=notify_on_new)
+            s.add(search)
+            await s.commit()
+            return search.id
+
+    @staticmethod
+    async def delete(user_id: int, search_id: int) -> bool:
+        async with session() as s:
+            result = await s.execute(
+                delete(SavedSearch).where(SavedSearch.id == search_id, SavedSearch.user_id == user_id)
+            )
+            await s.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def get_user_searches(user_id: int) -> List[SavedSearchRecord]:
+        async with session() as s:
+            searches = (await s.scalars(
+                select(SavedSearch).where(SavedSearch.user_id == user_id).order_by(SavedSearch.id)
+            )).all()
+        return [_record(SavedSearchRecord, _SAVED_SEARCH_GETTERS, search, SAVED_SEARCH_FIELDS) for search in searches]
+
+    @staticmethod
+    async def load(after_id: int = 0, limit: int = 1000) -> List[SavedSearchRecord]:
+        async with session() as s:
+            searches = (await s.scalars(
+                select(SavedSearch).where(SavedSearch.notify_on_new.is_(True), SavedSearch.id > after_id)
+                .order_by(SavedSearch.id).limit(limit)
+            )).all()
+        return [_record(SavedSearchRecord, _SAVED_SEARCH_GETTERS, search, SAVED_SEARCH_FIELDS) for search in searches]
+
+    @staticmethod
+    async def existing(search_ids: List[int]) -> List[int]:
+        if not search_ids:
+            return []
+        async with session() as s:
+            return list((await s.scalars(select(SavedSearch.id).where(SavedSearch.id.in_(search_ids)))).all())
+
+
+@instrument
+class LeaderboardModel:
+    """Строки таблиц лидеров (ведут записи repository — _leaderboard, как триггеры в SQLite)"""
+
+    @staticmethod
+    async def board(board: str) -> List[Tuple[int, float]]:
+        """Вся таблица board по убыванию score: [(user_id, score)]"""
+        async with session() as s:
+            rows = await s.execute(
+                select(LeaderboardEntry.user_id, LeaderboardEntry.score)
+                .where(LeaderboardEntry.board == board, LeaderboardEntry.score.is_not(None))
+                .order_by(LeaderboardEntry.score.desc(), LeaderboardEntry.user_id)
+            )
+            return [tuple(row) for row in rows.all()]
+
+    @staticmethod
+    async def max_seq() -> int:
+        async with session() as s:
+            return await s.scalar(select(func.coalesce(func.max(LeaderboardEntry.seq), 0)))
+
+    @staticmethod
+    async def changes(after_seq: int) -> List[Tuple[str, int, Optional[float], int]]:
+        """Изменения после after_seq: [(board, user_id, score или None, seq)]"""
+        async with session() as s:
+            rows = await s.execute(
+                select(LeaderboardEntry.board, LeaderboardEntry.user_id, LeaderboardEntry.score, LeaderboardEntry.seq)
+                .where(LeaderboardEntry.seq > after_seq).order_by(LeaderboardEntry.seq)
+            )
+            return [tuple(row) for row in rows.all()]
+
+    @staticmethod
+    async def names(user_ids: List[int]) -> Dict[int, str]:
+        if not user_ids:
+            return {}
+        async with session() as s:
+            rows = await s.execute(select(User.id, func.coalesce(User.name, User.username)).where(User.id.in_(user_ids)))
+            return dict(rows.all())
+
+
+@instrument
+class StatsModel:
+    """
+    Итоги и дневные значения для /stats (ведут записи repository — _stat, как триггеры в SQLite).
+    Свёртки analytics (rollup, history) — у админки, она работает только с DB_BACKEND=sqlite
+    """
+
+    @staticmethod
+    async def counters() -> Dict[str, int]:
+        """Текущие итоги: users, ads, ads_active:<категория>, swaps, swaps:<статус>, views"""
+        async with session() as s:
+            return dict((await s.execute(select(StatsCounter.name, StatsCounter.value))).all())
+
+    @staticmethod
+    async def daily(days: int = 7) -> Dict[str, Dict[str, int]]:
+        """Дневные значения за последние days дней (UTC): {день: {имя: значение}}"""
+        since = (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+        async with session() as s:
+            rows = await s.execute(
+                select(StatsDaily.day, StatsDaily.name, StatsDaily.value)
+                .where(StatsDaily.day > since).order_by(StatsDaily.day)
+            )
+            result: Dict[str, Dict[str, int]] = {}
+            for day, name, value in rows.all():
+                result.setdefault(day, {})[name] = value
+            return result
+
+
+def _media(media: Optional[MediaFile]) -> Optional[Dict[str, Any]]:
+    if media is None:
+        return None
+    return {"digest": media.digest, "source_url": media.source_url, "width": media.width, "height": media.height,
+            "size_bytes": media.size_bytes, "photo_hash": from_sqlite_int(media.photo_hash)}
+
+
+@instrument
+class MediaModel:
+    @staticmethod
+    async def get(digest: str) -> Optional[Dict[str, Any]]:
+        async with session() as s:
+            return _media(await s.get(MediaFile, digest))
+
+    @staticmethod
+    async def get_by_url(source_url: str) -> Optional[Dict[str, Any]]:
+        async with session() as s:
+            return _media(await s.scalar(select(MediaFile).where(MediaFile.source_url == source_url).limit(1)))
+
+    @staticmethod
+    async def save(digest: str, width: int, height: int, size_bytes: int,
+                   photo_hash: Optional[int] = None, source_url: Optional[str] = None):
+        table = MediaFile.__table__
+        async with session() as s:
+            stmt = _upsert(s)(table).values(digest=digest, source_url=source_url, width=width, height=height,
+                                            size_bytes=size_bytes, photo_hash=to_sqlite_int(photo_hash),
+                                            created_at=datetime.utcnow())
+            await s.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.digest],
+                set_={"source_url": func.coalesce(stmt.excluded.source_url, table.c.source_url)},
+            ))
+            await s.commit()
+
+
+@instrument
+class MediaRegistryModel:
+    @staticmethod
+    async def get_file_id(digest: str) -> Optional[str]:
+        async with session() as s:
+            return await s.scalar(select(MediaRegistryEntry.file_id).where(MediaRegistryEntry.digest == digest))
+
+    @staticmethod
+    async def save(digest: str, file_id: str, file_unique_id: Optional[str] = None):
+        table = MediaRegistryEntry.__table__
+        async with session() as s:
+            stmt = _upsert(s)(table).values(digest=digest, file_id=file_id, file_unique_id=file_unique_id,
+                                            uploaded_at=datetime.utcnow())
+            await s.execute(stmt.on_conflict_do_update(
+                index_elements=[table.c.digest],
+                set_={"file_id": stmt.excluded.file_id, "file_unique_id": stmt.excluded.file_unique_id,
+                      "uploaded_at": stmt.excluded.uploaded_at},
+            ))
+            await s.commit()
+
+    @staticmethod
+    async def forget(digest: str):
+        async with session() as s:
+            await s.execute(delete(MediaRegistryEntry).where(MediaRegistryEntry.digest == digest))
+            await s.commit()
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Инструменты разработки: тестовый Bot API, нагрузочные прогоны."""
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Нагрузочный прогон бота: python -m app.devtools.bench [--users 300] [--sessions 200]
+
+Поднимает поддельный Bot API, создаёт отдельную БД с пользователями, объявлениями
+и обменами, затем прогоняет сценарии через настоящие роутеры и Dispatcher:
+регистрация, создание объявления, просмотр ленты со свайпами, предложение обмена.
+В конце печатает пропускную способность и p50/p95/p99 по каждому хендлеру.
+
+Сценарии разных пользователей перемешиваются, как в живом трафике, порядок
+внутри пользователя сохраняется. --polling — доставка через getUpdates,
+иначе обновления передаются в Dispatcher напрямую.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from itertools import zip_longest
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.enums import ParseMode
+from aiogram.types import TelegramObject, Update
+
+from app.config import constants
+from app.devtools import datagen
+from app.devtools.fake_telegram import FakeTelegramServer, make_callback_update, make_message_update
+
+# Новые пользователи регистрируются в самом крупном городе генератора
+CENTER = datagen.CITIES[0][1:3]
+USER_ID_BASE = datagen.USER_ID_BASE
+
+
+class HandlerTimer(BaseMiddleware):
+    """Inner-middleware: время выполнения каждого хендлера"""
+
+    def __init__(self):
+        self.timings: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            self.timings.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def _near_center(rnd: random.Random, km: float = 5.0):
+    # ~111 км на градус широты, долгота на этой широте ~ в 1.8 раза короче
+    return (
+        CENTER[0] + rnd.uniform(-km, km) / 111.0,
+        CENTER[1] + rnd.uniform(-km, km) / 61.0,
+    )
+
+
+def seed(path: str, users: int, ads_per_user: float = 2.0, swaps_per_user: float = 1.0,
+         seed_value: int = 1) -> Dict[int, Dict[str, int]]:
+    """
+    Наполнение БД генератором datagen.
+
+    Returns:
+        {user_id: {category: ad_id}} — активные объявления пользователей для сценария обмена
+    """
+    ds = datagen.generate(users, ads_per_user, swaps_per_user, seed=seed_value)
+    datagen.write_bot_db(ds, path)
+
+    owned: Dict[int, Dict[str, int]] = {}
+    categories = ds.categories
+    for index in np.flatnonzero(ds.ad_active).tolist():
+        uid = int(ds.user_id[ds.ad_user[index]])
+        owned.setdefault(uid, {})[categories[ds.ad_category[index]]] = index + 1
+    return owned
+
+
+# ==================== СЦЕНАРИИ ====================
+
+def onboarding_session(uid: int, rnd: random.Random) -> List[Dict]:
+    """Новый пользователь: /start → геолокация → пропуск телефона"""
+    lat, lon = _near_center(rnd)
+    return [
+        make_message_update(uid, "/start"),
+        make_message_update(uid, location={"latitude": lat, "longitude": lon}),
+        make_message_update(uid, "⏭️ Пропустить"),
+    ]
+
+
+def create_ad_session(uid: int, category: str) -> List[Dict]:
+    """Создание объявления с фото (местоположение берётся из профиля)"""
+    updates = [
+        make_message_update(uid, "➕ Создать объявление"),
+        make_callback_update(uid, f"cat:{category}"),
+        make_message_update(uid, f"Новый товар {uid}"),
+        make_message_update(uid, "Почти не использовался, всё работает"),
+    ]
+    if constants.CATEGORIES[category]["requires_price"]:
+        updates.append(make_message_update(uid, "1500"))
+    updates += [
+        make_message_update(uid, photo=[{"file_id": f"upload_{uid}", "file_unique_id": f"u{uid}",
+                                         "width": 1280, "height": 960}]),
+        make_callback_update(uid, "confirm_yes"),
+    ]
+    return updates
+
+
+def browse_session(uid: int, category: str, swipes: int, my_ad_id: Optional[int]) -> List[Dict]:
+    """Лента: сохранённый поиск, свайпы, предложение обмена своим объявлением, ещё свайпы,
+    профиль и личные списки, выход"""
+    updates = [
+        make_message_update(uid, "/start"),
+        make_message_update(uid, f"/search {category} товар 25 км"),
+        make_message_update(uid, "🔥 Смотреть объявления"),
+        make_callback_update(uid, f"cat:{category}"),
+    ]
+    updates += [make_message_update(uid, "👎 Далее") for _ in range(swipes // 2)]
+    updates.append(make_message_update(uid, "⭐ Избранное"))
+    if my_ad_id:
+        updates += [make_message_update(uid, "❤️ Обмен"), make_callback_update(uid, f"select_ad:{my_ad_id}")]
+    updates += [make_message_update(uid, "👎 Далее") for _ in range(swipes - swipes // 2)]
+    updates += [make_message_update(uid, "🏠 Главная"), make_message_update(uid, "👤 Профиль"),
+                make_message_update(uid, "1"), make_message_update(uid, "💬 Мои предложения"),
+                make_message_update(uid, "⭐ Избранное")]
+    return updates
+
+
+def build_workload(owned: Dict[int, Dict[str, int]], new_users: int, sessions: int, swipes: int,
+                   seed_value: int = 1) -> List[Dict]:
+    """Сценарии всех пользователей, перемешанные по одному обновлению"""
+    rnd = random.Random(seed_value + 1)
+    categories = list(constants.CATEGORIES)
+    scripts = []
+
+    for i in range(new_users):
+        uid = USER_ID_BASE * 2 + i
+        scripts.append(onboarding_session(uid, rnd) + create_ad_session(uid, rnd.choice(categories)))
+
+    existing = list(owned)
+    for uid in rnd.sample(existing, min(sessions, len(existing))):
+        category = rnd.choice(list(owned[uid]))
+        scripts.append(browse_session(uid, category, swipes, owned[uid][category]))
+
+    rnd.shuffle(scripts)
+    return [update for step in zip_longest(*scripts) for update in step if update]
+
+
+# ==================== ПРОГОН ====================
+
+async def run(args, workload: List[Dict]) -> Dict[str, Any]:
+    from app.bot import create_dispatcher
+
+    fake = FakeTelegramServer()
+    fake_runner = await fake.start(port=args.port)
+    bot = Bot(
+        token="42:BENCH",
+        session=AiohttpSession(api=TelegramAPIServer.from_base(fake.base_url)),
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    dp = create_dispatcher()
+    timer = HandlerTimer()
+    dp.message.middleware(timer)
+    dp.callback_query.middleware(timer)
+    scheduler = dp["update_scheduler"]
+
+    started = time.perf_counter()
+    try:
+        if args.polling:
+            for update in workload:
+                fake.push_update(update)
+            polling = asyncio.create_task(dp.start_polling(
+                bot, polling_timeout=1, handle_as_tasks=False, handle_signals=False, close_bot_session=False,
+            ))
+            while fake.pending_updates or scheduler.pending:
+                await asyncio.sleep(0.01)
+            await dp.stop_polling()
+            await polling
+        else:
+            for update in workload:
+                await dp.feed_update(bot, Update.model_validate(update, context={"bot": bot}))
+            await scheduler.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        await bot.session.close()
+        await fake_runner.cleanup()
+
+    handlers = {}
+    for name, values in sorted(timer.timings.items()):
+        values.sort()
+        handlers[name] = {
+            "count": len(values),
+            "errors": timer.errors.get(name, 0),
+            "mean_ms": sum(values) / len(values) * 1000,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+
+    return {
+        "updates": len(workload),
+        "handled": sum(h["count"] for h in handlers.values()),
+        "seconds": elapsed,
+        "updates_per_sec": len(workload) / elapsed if elapsed else 0.0,
+        "api_calls": len(fake.calls),
+        "handlers": handlers,
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\nОбновлений: {report['updates']} (обработано хендлерами: {report['handled']}), "
+          f"{report['seconds']:.2f} с, {report['updates_per_sec']:.0f} обн/с, вызовов Bot API: {report['api_calls']}\n")
+    print(f"{'хендлер':<32}{'кол-во':>8}{'ошибки':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}  (мс)")
+    for name, h in report["handlers"].items():
+        print(f"{name:<32}{h['count']:>8}{h['errors']:>8}{h['mean_ms']:>9.2f}{h['p50_ms']:>9.2f}"
+              f"{h['p95_ms']:>9.2f}{h['p99_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота на поддельном Bot API")
+    parser.add_argument("--users", type=int, default=300, help="пользователей в БД")
+    parser.add_argument("--ads-per-user", type=float, default=2.0)
+    parser.add_argument("--swaps-per-user", type=float, default=1.0, help="предложений обмена в БД на пользователя")
+    parser.add_argument("--new-users", type=int, default=50, help="сценариев регистрация + создание объявления")
+    parser.add_argument("--sessions", type=int, default=200, help="сценариев просмотра ленты с обменом")
+    parser.add_argument("--swipes", type=int, default=10, help="свайпов в одном сценарии просмотра")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--polling", action="store_true", help="доставлять обновления через getUpdates")
+    parser.add_argument("--port", type=int, default=8099, help="порт поддельного Bot API")
+    parser.add_argument("--db", help="файл БД (по умолчанию временный)")
+    parser.add_argument("--json", dest="json_path", help="сохранить отчёт в JSON для сравнения прогонов")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    tmpdir = None
+    if not args.db:
+        tmpdir = tempfile.TemporaryDirectory(prefix="swapbot-bench-")
+        args.db = os.path.join(tmpdir.name, "bench.db")
+    elif os.path.exists(args.db):
+        raise SystemExit(f"{args.db} уже существует — укажите новый файл")
+
+    try:
+        owned = seed(args.db, args.users, args.ads_per_user, args.swaps_per_user, args.seed)
+        workload = build_workload(owned, args.new_users, args.sessions, args.swipes, args.seed)
+        report = asyncio.run(run(args, workload))
+    finally:
+        if tmpdir:
+            tmpdir.cleanup()
+
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка совместимости бэкендов: python -m app.devtools.conformance [--url postgresql+asyncpg://…]
+
+Один и тот же сценарий (пользователи, объявления, дубликаты, лента, обмены, отзывы,
+избранное, приглашения, уровни и достижения, сохранённые поиски, постраничные списки,
+счётчики пользователя, статистика, таблицы лидеров и медиа) прогоняется через aiosqlite-модели (models.py, временная БД) и через
+repository.py на --url (по умолчанию — временный sqlite+aiosqlite; для Postgres укажите
+пустую базу). Ответы каждого шага сравниваются; отметки времени сравниваются только
+по наличию, расстояния — с точностью до метра. Код возврата 1 — есть расхождения.
+Тот же сценарий проверяет tests/test_conformance.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Tuple
+
+from app.config import constants, settings
+from app.database.records import Record
+
+CATEGORY = "electronics"
+RIGA = (56.9496, 24.1052)
+JURMALA = (56.9680, 23.7704)
+
+
+def _normalize(value: Any, key: str = "") -> Any:
+    if isinstance(value, Record):
+        return {"record": type(value).__name__, **_normalize(value._asdict())}
+    if isinstance(value, dict):
+        return {k: _normalize(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if key.endswith("_at"):
+        return value is not None
+    if isinstance(value, float):
+        return round(value, 3)
+    return value
+
+
+async def _sorted(call) -> list:
+    """Ответ без гарантированного порядка"""
+    return sorted(await call)
+
+
+async def _board_rows(call) -> list:
+    """Изменения таблиц лидеров без seq: нумерация у бэкендов своя, сравниваются строки"""
+    return sorted((board, user_id, score) for board, user_id, score, _ in await call)
+
+
+async def scenario(models) -> List[Tuple[str, Any]]:
+    """Шаги сценария по модулю моделей (models или repository): [(название, нормализованный ответ)]"""
+    users, ads, swaps, ratings = models.UserModel, models.AdModel, models.SwapModel, models.RatingModel
+    favorites, counters, searches = models.FavoriteModel, models.UserCounterModel, models.SavedSearchModel
+    leaderboard, stats = models.LeaderboardModel, models.StatsModel
+    media, registry, referrals = models.MediaModel, models.MediaRegistryModel, models.ReferralModel
+    steps: List[Tuple[str, Any]] = []
+
+    async def step(name: str, call):
+        steps.append((name, _normalize(await call)))
+
+    alice, bob, carol = 1001, 1002, 1003
+    await step("user.create", users.get_or_create(alice, "alice", "Алиса"))
+    await step("user.create.bob", users.get_or_create(bob, None, "Боб"))
+    await step("user.create.carol", users.get_or_create(carol, "carol"))
+    await step("user.existing", users.get_or_create(alice, "other", "Другое"))
+    await step("user.location", users.update_location(alice, *RIGA, "Рига"))
+    await step("user.location.bob", users.update_location(bob, *JURMALA, "Юрмала"))
+    await step("user.phone", users.update_phone(bob, "+37120000000"))
+    await step("user.phone.verified", users.update_phone(carol, "+37120000001", verified=True))
+    await step("user.field", users.update_field(carol, "name", "Кэрол"))
+    await step("user.field.forbidden", users.update_field(carol, "rating", 1))
+    await step("user.profile", users.get_profile(alice))
+    await step("user.profile.bob", users.get_profile(bob))
+    await step("user.profile.missing", users.get_profile(999))
+    await step("user.profile.verified", users.get_profile(carol))
+
+    ad_ids = []
+    for owner, title, price, photo, location in (
+        (bob, "iPhone 12 в отличном состоянии", "30000", "photo-1", JURMALA),
+        (bob, "Наушники Sony WH-1000XM4", None, None, JURMALA),
+        (carol, "Ноутбук Lenovo ThinkPad", "45000", "photo-2", None),
+        (carol, "Монитор Dell 27 дюймов", "12000", None, RIGA),
+    ):
+        lat, lon = location or (None, None)
+        ad_id = await ads.create(owner, CATEGORY, title, f"{title}, торг уместен", price, photo, lat, lon,
+                                 "Юрмала" if location == JURMALA else None)
+        ad_ids.append(ad_id)
+    steps.append(("ad.create", len(set(ad_ids))))
+    alice_ad = await ads.create(alice, CATEGORY, "Планшет Samsung Tab", "Почти новый", "20000", "photo-3")
+
+    await step("ad.duplicate", ads.find_duplicate("iPhone 12 в отличном состоянии", "iPhone 12 в отличном состоянии, торг уместен"))
+    await step("ad.duplicate.owner", ads.find_duplicate("iPhone 12 в отличном состоянии", "iPhone 12 в отличном состоянии, торг уместен", user_tg_id=carol))
+    await step("ad.duplicate.none", ads.find_duplicate("Палатка трёхместная", "Для походов"))
+    await step("ad.get", ads.get_by_id(ad_ids[0]))
+    await step("ad.get.missing", ads.get_by_id(10 ** 6))
+    await step("ad.user_ads", ads.get_user_ads(bob))
+    await step("ad.deactivate", ads.deactivate(ad_ids[1]))
+    await step("ad.user_ads.active", ads.get_user_ads(bob))
+    await step("ad.user_ads.all", ads.get_user_ads(bob, active_only=False))
+    await step("ad.deactivate.counters", counters.get(bob))
+    await step("ad.activate", ads.activate(ad_ids[1]))
+    await step("ad.activate.again", ads.activate(ad_ids[1]))
+    await step("ad.activate.counters", counters.get(bob))
+
+    # Страницы по 1: вперёд до конца и обратно от последней
+    page = await ads.get_user_ads_page(carol, limit=1)
+    steps.append(("ad.page.0", _normalize(page)))
+    page = await ads.get_user_ads_page(carol, after=page.after, limit=1)
+    steps.append(("ad.page.1", _normalize(page)))
+    await step("ad.page.back", ads.get_user_ads_page(carol, before=page.before, limit=1))
+    await step("ad.page.end", ads.get_user_ads_page(carol, after=page.items[-1].id, limit=1))
+
+    last = 0
+    for index in range(5):
+        ad = await ads.get_next_ad(CATEGORY, alice, last)
+        steps.append((f"feed.{index}", _normalize(ad)))
+        last = ad.id if ad else 0
+    last = 0
+    for index in range(5):
+        ad = await ads.get_next_ad(CATEGORY, alice, last, *RIGA, max_distance_km=20)
+        steps.append((f"feed.near.{index}", _normalize(ad)))
+        last = ad.id if ad else 0
+    await step("feed.empty", ads.get_next_ad("free", alice))
+    await step("ad.category", ads.get_category_ads(CATEGORY, alice))
+    await step("ad.category.limit", ads.get_category_ads(CATEGORY, bob, limit=1))
+
+    await step("ad.views", ads.increment_views(ad_ids[0], alice))
+    await step("ad.views.again", ads.increment_views(ad_ids[0], alice))
+    await step("ad.views.get", ads.get_by_id(ad_ids[0]))
+
+    created, swap_id = await swaps.create(ad_ids[0], alice_ad, alice, bob, "Меняю планшет")
+    steps.append(("swap.create", [created, swap_id]))
+    await step("swap.duplicate", swaps.create(ad_ids[0], alice_ad, alice, bob, "Ещё раз"))
+    await step("swap.create.carol", swaps.create(ad_ids[2], alice_ad, alice, carol))
+    await step("swap.incoming", swaps.get_incoming(bob))
+    await step("swap.outgoing", swaps.get_outgoing(alice))
+    page = await swaps.get_outgoing_page(alice, limit=1)
+    steps.append(("swap.outgoing.page", _normalize(page)))
+    await step("swap.outgoing.page.next", swaps.get_outgoing_page(alice, after=page.after, limit=1))
+    await step("swap.incoming.page", swaps.get_incoming_page(bob))
+    await step("swap.accept", swaps.update_status(swap_id, constants.SWAP_STATUS_ACCEPTED))
+    await step("swap.incoming.pending", swaps.get_incoming(bob))
+    await step("swap.incoming.accepted", swaps.get_incoming(bob, constants.SWAP_STATUS_ACCEPTED))
+    await step("swap.complete", swaps.update_status(swap_id, constants.SWAP_STATUS_COMPLETED))
+    await step("swap.outgoing.after", swaps.get_outgoing(alice))
+    await step("counters.alice", counters.get(alice))
+    await step("counters.bob", counters.get(bob))
+    await step("swap.complete.again", swaps.update_status(swap_id, constants.SWAP_STATUS_COMPLETED))
+    await step("swap.complete.profile", users.get_profile(alice))
+
+    await step("rating.add", ratings.add_rating(alice, bob, 4, "Всё честно", swap_id))
+    await step("rating.duplicate", ratings.add_rating(alice, bob, 1, "", swap_id))
+    await step("rating.add.back", ratings.add_rating(bob, alice, 5, "", swap_id))
+    await step("rating.get", ratings.get_user_ratings(bob))
+    await step("rating.get.none", ratings.get_user_ratings(carol))
+    await step("rating.profile", users.get_profile(bob))
+    await step("rating.more", ratings.add_rating(carol, bob, 5))
+    await step("rating.threshold", ratings.add_rating(carol, bob, 3))
+    await step("leaderboard.rating", leaderboard.board("rating"))
+    await step("leaderboard.swaps", leaderboard.board("swaps"))
+    await step("leaderboard.swaps.category", leaderboard.board(f"swaps:cat:{CATEGORY}"))
+    await step("leaderboard.xp", leaderboard.board("xp"))
+    await step("leaderboard.move", users.update_location(bob, *RIGA, "Рига"))
+    await step("leaderboard.rows", _board_rows(leaderboard.changes(0)))
+    steps.append(("leaderboard.names", sorted((await leaderboard.names([alice, bob, 10 ** 6])).items())))
+
+    await step("referral.apply", referrals.apply({carol: alice, 10 ** 6: alice, bob: 10 ** 6}))
+    await step("referral.apply.again", referrals.apply({carol: bob}))
+    await step("referral.legacy", referrals.legacy_referrers(["OLDCODE"]))
+    await step("referral.leaderboard.xp", leaderboard.board("xp"))
+    await step("referral.profile", users.get_profile(alice))
+
+    await step("favorite.add", favorites.add(alice, ad_ids[3]))
+    await step("favorite.duplicate", favorites.add(alice, ad_ids[3]))
+    await step("favorite.add.more", favorites.add(alice, ad_ids[0]))
+    await step("favorite.add.carol", favorites.add(carol, ad_ids[0]))
+    await step("favorite.ids", _sorted(favorites.ad_ids(alice)))
+    page = await favorites.get_page(alice, limit=1)
+    steps.append(("favorite.page", _normalize(page)))
+    await step("favorite.page.next", favorites.get_page(alice, after=page.after, limit=1))
+    await step("favorite.subscribers", _sorted(favorites.subscribers([ad_ids[0], ad_ids[3], 10 ** 6])))
+    await step("favorite.counters", counters.get(alice))
+    await step("favorite.remove", favorites.remove(alice, ad_ids[3]))
+    await step("favorite.remove.missing", favorites.remove(alice, ad_ids[3]))
+    await step("favorite.ids.after", _sorted(favorites.ad_ids(alice)))
+    await step("favorite.counters.after", counters.get(alice))
+    await step("ad.price", ads.update_price(ad_ids[0], "25000"))
+    await step("ad.price.free", ads.update_price(ad_ids[2], None))
+    await step("ad.price.get", ads.get_by_id(ad_ids[0]))
+    await step("ad.price.get.free", ads.get_by_id(ad_ids[2]))
+
+    monitor = ("Монитор Dell 27 дюймов", "Монитор Dell 27 дюймов, торг уместен")
+    await step("ad.duplicate.inactive.none", ads.find_duplicate(*monitor, user_tg_id=carol, inactive_only=True))
+    await ads.deactivate(ad_ids[3])
+    await step("ad.duplicate.inactive", ads.find_duplicate(*monitor, user_tg_id=carol, category=CATEGORY,
+                                                           inactive_only=True))
+    await step("ad.duplicate.other_category", ads.find_duplicate(*monitor, user_tg_id=carol, category="home",
+                                                                 inactive_only=True))
+    await step("ad.duplicate.active", ads.find_duplicate(*monitor, user_tg_id=carol, active_only=True))
+    await step("ad.republish", ads.republish(ad_ids[3], "Монитор Dell 27 дюймов IPS", monitor[1] + ", с кабелем",
+                                             "9000", "photo-9"))
+    await step("ad.republish.get", ads.get_by_id(ad_ids[3]))
+    await step("ad.republish.counters", counters.get(carol))
+    await step("ad.republish.duplicate", ads.find_duplicate("Монитор Dell 27 дюймов IPS", monitor[1] + ", с кабелем",
+                                                            user_tg_id=carol, active_only=True))
+
+    filters = {"category": CATEGORY, "keywords": ["iphone"], "price_max": 30000}
+    first = await searches.create(alice, "iphone до 30000", filters)
+    second = await searches.create(alice, "рядом", {"lat": RIGA[0], "lon": RIGA[1], "radius_km": 10})
+    await searches.create(carol, "бесплатно", {"price_max": 0}, notify_on_new=False)
+    await step("search.user", searches.get_user_searches(alice))
+    await step("search.load", searches.load())
+    await step("search.load.after", searches.load(first, limit=1))
+    await step("search.delete.foreign", searches.delete(bob, second))
+    await step("search.delete", searches.delete(alice, second))
+    await step("search.existing", _sorted(searches.existing([first, second, 10 ** 6])))
+
+    await step("stats.counters", stats.counters())
+    steps.append(("stats.daily", list((await stats.daily(1)).values())))
+
+    digest = "ab" * 32
+    await step("media.missing", media.get(digest))
+    await step("media.save", media.save(digest, 800, 600, 12345, 2 ** 63 + 5, "https://example.com/1.jpg"))
+    await step("media.save.again", media.save(digest, 800, 600, 12345, 2 ** 63 + 5))
+    await step("media.get", media.get(digest))
+    await step("media.by_url", media.get_by_url("https://example.com/1.jpg"))
+    await step("media.by_url.missing", media.get_by_url("https://example.com/2.jpg"))
+    await step("registry.save", registry.save(digest, "file-1", "unique-1"))
+    await step("registry.save.again", registry.save(digest, "file-2"))
+    await step("registry.get", registry.get_file_id(digest))
+    await step("registry.forget", registry.forget(digest))
+    await step("registry.get.forgotten", registry.get_file_id(digest))
+    return steps
+
+
+async def run_sqlite(path: str) -> List[Tuple[str, Any]]:
+    from app.database import models
+    from app.database.db import init_db
+
+    settings.DB_PATH = path
+    await init_db()
+    return await scenario(models)
+
+
+async def run_repository(url: str) -> List[Tuple[str, Any]]:
+    from app.database import repository
+
+    settings.DATABASE_URL = url
+    await repository.init_models()
+    try:
+        return await scenario(repository)
+    finally:
+        await repository.dispose()
+
+
+def compare(expected: List[Tuple[str, Any]], actual: List[Tuple[str, Any]]) -> List[Dict[str, Any]]:
+    diffs = []
+    for (name, want), (_, got) in zip(expected, actual):
+        if want != got:
+            diffs.append({"step": name, "sqlite": want, "repository": got})
+    return diffs
+
+
+async def run(url: str = None) -> List[Dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        expected = await run_sqlite(os.path.join(tmp, "bot.db"))
+        actual = await run_repository(url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'orm.db')}")
+    return compare(expected, actual)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка aiosqlite-моделей и репозитория SQLAlchemy")
+    parser.add_argument("--url", default=None, help="DATABASE_URL пустой базы (по умолчанию временный SQLite)")
+    args = parser.parse_args()
+
+    diffs = asyncio.run(run(args.url))
+    for diff in diffs:
+        print(json.dumps(diff, ensure_ascii=False, default=str))
+    print(f"Расхождений: {len(diffs)}")
+    raise SystemExit(1 if diffs else 0)
+
+
+if __name__ == "__main__":
+    main()
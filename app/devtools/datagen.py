@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+Генератор синтетических данных: python -m app.devtools.datagen big.db --users 1000000
+
+Пользователи и объявления скапливаются вокруг городов (вес по населению, разброс
+по нормальному закону), обмены заключаются внутри города и категории, избранное
+и просмотры — от соседей по городу, рейтинг пользователя считается по выставленным
+оценкам. Всё генерируется векторно (numpy) и пишется executemany большими
+транзакциями. Один и тот же --seed (и --until) всегда даёт одинаковую БД.
+
+--schema bot — схема aiosqlite-моделей (init_db), --schema orm — models_orm.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings, constants
+
+logger = logging.getLogger(__name__)
+
+# (город, широта, долгота, вес, разброс в км)
+CITIES = [
+    ("Рига", 56.9496, 24.1052, 0.40, 6.0),
+    ("Даугавпилс", 55.8747, 26.5362, 0.10, 3.0),
+    ("Лиепая", 56.5047, 21.0108, 0.08, 3.0),
+    ("Елгава", 56.6511, 23.7214, 0.07, 2.5),
+    ("Юрмала", 56.9680, 23.7704, 0.06, 4.0),
+    ("Вентспилс", 57.3894, 21.5606, 0.05, 2.5),
+    ("Резекне", 56.5099, 27.3331, 0.04, 2.0),
+    ("Валмиера", 57.5385, 25.4264, 0.04, 2.0),
+    ("Таллин", 59.4370, 24.7536, 0.10, 5.0),
+    ("Вильнюс", 54.6872, 25.2797, 0.06, 5.0),
+]
+
+# Доля объявлений по категориям (порядок — constants.CATEGORIES)
+CATEGORY_WEIGHTS = {"electronics": 0.30, "clothing": 0.25, "home": 0.20, "hobbies": 0.15, "free": 0.10}
+
+TITLES = {
+    "electronics": ["iPhone 12", "Ноутбук Lenovo", "Наушники Sony", "Планшет Samsung", "Монитор Dell", "PlayStation 4"],
+    "clothing": ["Куртка зимняя", "Кроссовки Nike", "Платье летнее", "Джинсы Levi's", "Пальто шерстяное"],
+    "home": ["Кофемашина", "Стол обеденный", "Пылесос", "Набор посуды", "Торшер", "Кресло"],
+    "hobbies": ["Велосипед", "Гитара акустическая", "Набор Lego", "Палатка", "Сноуборд", "Книги фэнтези"],
+    "free": ["Отдам книги", "Отдам горшки для цветов", "Отдам детские вещи", "Отдам журналы"],
+}
+
+SWAP_STATUSES = [
+    constants.SWAP_STATUS_PENDING, constants.SWAP_STATUS_ACCEPTED,
+    constants.SWAP_STATUS_COMPLETED, constants.SWAP_STATUS_CANCELLED,
+]
+SWAP_STATUS_WEIGHTS = [0.45, 0.15, 0.25, 0.15]
+RATING_WEIGHTS = [0.03, 0.04, 0.10, 0.28, 0.55]
+
+USER_ID_BASE = 1_000_000
+CHUNK = 100_000
+
+
+@dataclass
+class Dataset:
+    """Сгенерированные данные: по массиву numpy на колонку"""
+    until: int
+
+    user_id: np.ndarray
+    user_city: np.ndarray
+    user_lat: np.ndarray
+    user_lon: np.ndarray
+    user_rating: np.ndarray
+    user_swaps: np.ndarray
+    user_created: np.ndarray
+
+    ad_user: np.ndarray          # индекс пользователя
+    ad_category: np.ndarray      # индекс категории
+    ad_title: np.ndarray         # индекс в TITLES[категория]
+    ad_price: np.ndarray         # 0 — без цены
+    ad_photo: np.ndarray
+    ad_lat: np.ndarray
+    ad_lon: np.ndarray
+    ad_active: np.ndarray
+    ad_views: np.ndarray
+    ad_created: np.ndarray
+
+    swap_liked: np.ndarray       # индексы объявлений
+    swap_proposer: np.ndarray
+    swap_status: np.ndarray
+    swap_created: np.ndarray
+
+    rating_from: np.ndarray      # индексы пользователей
+    rating_to: np.ndarray
+    rating_swap: np.ndarray
+    rating_value: np.ndarray
+
+    favorite_user: np.ndarray
+    favorite_ad: np.ndarray
+    favorite_created: np.ndarray
+
+    view_ad: np.ndarray
+    view_user: np.ndarray
+    view_created: np.ndarray
+
+    @property
+    def categories(self) -> List[str]:
+        return list(constants.CATEGORIES)
+
+
+def _pick_neighbours(rng: np.random.Generator, group_of_items: np.ndarray, groups: np.ndarray,
+                     n_groups: int) -> np.ndarray:
+    """Для каждого значения groups — случайный элемент из той же группы (-1, если группа пуста)"""
+    order = np.argsort(group_of_items, kind="stable")
+    sizes = np.bincount(group_of_items, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    size = sizes[groups]
+    offset = (rng.random(len(groups)) * np.maximum(size, 1)).astype(np.int64)
+    picked = order[np.minimum(starts[groups] + offset, len(order) - 1)] if len(order) else np.zeros(len(groups), np.int64)
+    return np.where(size > 0, picked, -1)
+
+
+def generate(users: int, ads_per_user: float = 2.0, swaps_per_user: float = 1.0,
+             favorites_per_user: float = 3.0, views_per_ad: float = 8.0,
+             days: int = 365, seed: int = 1, until: Optional[int] = None) -> Dataset:
+    """Генерация набора данных (детерминирована при одинаковых параметрах)"""
+    if until is None:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        until = int(today.timestamp())
+    span = days * 86400
+    categories = list(constants.CATEGORIES)
+    n_cat = len(categories)
+
+    # Отдельный поток на сущность: изменение числа просмотров не меняет пользователей
+    rngs = [np.random.default_rng([seed, stream]) for stream in range(8)]
+
+    # Пользователи
+    rng = rngs[0]
+    weights = np.array([c[3] for c in CITIES])
+    user_city = rng.choice(len(CITIES), size=users, p=weights / weights.sum())
+    city_lat = np.array([c[1] for c in CITIES])
+    city_lon = np.array([c[2] for c in CITIES])
+    sigma_km = np.array([c[4] for c in CITIES])[user_city]
+    user_lat = city_lat[user_city] + rng.normal(0, 1, users) * sigma_km / 111.0
+    user_lon = city_lon[user_city] + rng.normal(0, 1, users) * sigma_km / (111.0 * np.cos(np.radians(city_lat[user_city])))
+    user_created = until - (rng.random(users) ** 0.7 * span).astype(np.int64)
+
+    # Объявления
+    rng = rngs[1]
+    counts = rng.poisson(ads_per_user, users)
+    ad_user = np.repeat(np.arange(users), counts)
+    n_ads = len(ad_user)
+    cat_weights = np.array([CATEGORY_WEIGHTS.get(c, 0.1) for c in categories])
+    ad_category = rng.choice(n_cat, size=n_ads, p=cat_weights / cat_weights.sum())
+    title_sizes = np.array([len(TITLES.get(c, ["Товар"])) for c in categories])
+    ad_title = (rng.random(n_ads) * title_sizes[ad_category]).astype(np.int64)
+    requires_price = np.array([constants.CATEGORIES[c]["requires_price"] for c in categories])
+    ad_price = np.where(
+        requires_price[ad_category],
+        np.round(rng.lognormal(7.5, 1.0, n_ads) / 100) * 100,
+        0,
+    ).astype(np.int64)
+    ad_photo = rng.random(n_ads) < 0.7
+    ad_lat = user_lat[ad_user] + rng.normal(0, 1.0 / 111.0, n_ads)
+    ad_lon = user_lon[ad_user] + rng.normal(0, 1.0 / 65.0, n_ads)
+    ad_active = rng.random(n_ads) < 0.85
+    ad_created = user_created[ad_user] + (rng.random(n_ads) * (until - user_created[ad_user])).astype(np.int64)
+
+    ad_city = user_city[ad_user]
+
+    # Просмотры: соседи по городу, свои объявления не смотрят
+    rng = rngs[2]
+    ad_views = rng.poisson(views_per_ad, n_ads) * (1 + ad_photo)
+    view_ad = np.repeat(np.arange(n_ads), ad_views)
+    view_user = _pick_neighbours(rng, user_city, ad_city[view_ad], len(CITIES))
+    view_keep = (view_user >= 0) & (view_user != ad_user[view_ad])
+    view_ad, view_user = view_ad[view_keep], view_user[view_keep]
+    ad_views = np.bincount(view_ad, minlength=n_ads)
+    view_created = ad_created[view_ad] + (rng.random(len(view_ad)) * (until - ad_created[view_ad])).astype(np.int64)
+
+    # Избранное
+    rng = rngs[3]
+    n_fav = int(users * favorites_per_user)
+    favorite_user = rng.integers(0, users, n_fav)
+    favorite_ad = _pick_neighbours(rng, ad_city, user_city[favorite_user], len(CITIES))
+    keep = (favorite_ad >= 0)
+    keep[keep] &= ad_user[favorite_ad[keep]] != favorite_user[keep]
+    _, unique = np.unique(favorite_user[keep] * np.int64(max(n_ads, 1)) + favorite_ad[keep], return_index=True)
+    favorite_user, favorite_ad = favorite_user[keep][unique], favorite_ad[keep][unique]
+    favorite_created = np.maximum(ad_created[favorite_ad], user_created[favorite_user])
+    favorite_created += (rng.random(len(favorite_ad)) * (until - favorite_created)).astype(np.int64)
+
+    # Обмены: внутри города и категории, своё объявление против чужого
+    rng = rngs[4]
+    n_swaps = int(users * swaps_per_user)
+    swap_proposer = rng.integers(0, max(n_ads, 1), n_swaps) if n_ads else np.zeros(0, np.int64)
+    group = ad_city * n_cat + ad_category
+    swap_liked = _pick_neighbours(rng, group, group[swap_proposer], len(CITIES) * n_cat)
+    keep = (swap_liked >= 0)
+    keep[keep] &= ad_user[swap_liked[keep]] != ad_user[swap_proposer[keep]]
+    _, unique = np.unique(swap_liked[keep] * np.int64(max(n_ads, 1)) + swap_proposer[keep], return_index=True)
+    swap_liked, swap_proposer = swap_liked[keep][unique], swap_proposer[keep][unique]
+    n_swaps = len(swap_liked)
+    swap_status = rng.choice(len(SWAP_STATUSES), size=n_swaps, p=SWAP_STATUS_WEIGHTS)
+    swap_created = np.maximum(ad_created[swap_liked], ad_created[swap_proposer])
+    swap_created += (rng.random(n_swaps) * (until - swap_created)).astype(np.int64)
+
+    # Оценки после завершённых обменов (в обе стороны, не всегда)
+    rng = rngs[5]
+    completed = np.flatnonzero(np.array(SWAP_STATUSES)[swap_status] == constants.SWAP_STATUS_COMPLETED)
+    proposer_user, target_user = ad_user[swap_proposer], ad_user[swap_liked]
+    forward = completed[rng.random(len(completed)) < 0.7]
+    backward = completed[rng.random(len(completed)) < 0.5]
+    rating_swap = np.concatenate((forward, backward))
+    rating_from = np.concatenate((proposer_user[forward], target_user[backward]))
+    rating_to = np.concatenate((target_user[forward], proposer_user[backward]))
+    rating_value = rng.choice(5, size=len(rating_swap), p=RATING_WEIGHTS) + 1
+
+    received = np.bincount(rating_to, minlength=users)
+    total = np.bincount(rating_to, weights=rating_value, minlength=users)
+    user_rating = np.where(received > 0, np.round(total / np.maximum(received, 1), 2), constants.DEFAULT_RATING)
+    user_swaps = (np.bincount(proposer_user[completed], minlength=users)
+                  + np.bincount(target_user[completed], minlength=users))
+
+    return Dataset(
+        until=until,
+        user_id=USER_ID_BASE + np.arange(users), user_city=user_city, user_lat=user_lat, user_lon=user_lon,
+        user_rating=user_rating, user_swaps=user_swaps, user_created=user_created,
+        ad_user=ad_user, ad_category=ad_category, ad_title=ad_title, ad_price=ad_price, ad_photo=ad_photo,
+        ad_lat=ad_lat, ad_lon=ad_lon, ad_active=ad_active, ad_views=ad_views, ad_created=ad_created,
+        swap_liked=swap_liked, swap_proposer=swap_proposer, swap_status=swap_status, swap_created=swap_created,
+        rating_from=rating_from, rating_to=rating_to, rating_swap=rating_swap, rating_value=rating_value,
+        favorite_user=favorite_user, favorite_ad=favorite_ad, favorite_created=favorite_created,
+        view_ad=view_ad, view_user=view_user, view_created=view_created,
+    )
+
+
+def _timestamps(seconds: np.ndarray) -> List[str]:
+    """Unix-время → текст в формате CURRENT_TIMESTAMP SQLite"""
+    return np.char.replace(seconds.astype("datetime64[s]").astype(str), "T", " ").tolist()
+
+
+def _chunks(n: int) -> Iterator[slice]:
+    for start in range(0, n, CHUNK):
+        yield slice(start, min(start + CHUNK, n))
+
+
+def _ad_rows(ds: Dataset, part: slice) -> Iterator[Tuple]:
+    """Объявления в нейтральном виде: (id, user_tg_id, category, title, description, price,
+    photo_file_id, latitude, longitude, location_name, views, is_active, created_at)"""
+    categories = ds.categories
+    cities = ds.user_city[ds.ad_user[part]].tolist()
+    for ad_id, user, category, title, price, photo, lat, lon, views, active, created, city in zip(
+            (np.arange(len(ds.ad_user))[part] + 1).tolist(), ds.user_id[ds.ad_user[part]].tolist(),
+            ds.ad_category[part].tolist(), ds.ad_title[part].tolist(), ds.ad_price[part].tolist(),
+            ds.ad_photo[part].tolist(), ds.ad_lat[part].tolist(), ds.ad_lon[part].tolist(),
+            ds.ad_views[part].tolist(), ds.ad_active[part].tolist(), _timestamps(ds.ad_created[part]), cities,
+    ):
+        category = categories[category]
+        title = TITLES.get(category, ["Товар"])[title]
+        city_name = CITIES[city][0]
+        yield (
+            ad_id, user, category, title, f"{title}, состояние хорошее. Обмен в городе {city_name}",
+            price or None, f"gen_photo_{ad_id}" if photo else None,
+            lat, lon, city_name, views, active, created,
+        )
+
+
+def write_bot_db(ds: Dataset, path: str):
+    """Запись в схему aiosqlite-моделей (таблицы создаёт init_db)"""
+    from app.database.db import LEADERBOARD_REBUILD, STATS_REBUILD, TRIGGERS, USER_COUNTERS_REBUILD, init_db
+
+    settings.DB_PATH = os.path.abspath(path)
+    asyncio.run(init_db())
+
+    # Файл новый: на время загрузки журнал не нужен, WAL включается обратно в конце
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")
+    try:
+        # Счётчики и таблицы лидеров пересчитываются одним проходом в конце, а не триггером на строку;
+        # исторические данные в журнал событий ленты не попадают
+        for name in TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+        with conn:
+            created = _timestamps(ds.user_created)
+            conn.executemany(
+                "INSERT INTO users (tg_id, username, name, latitude, longitude, location_name, rating, total_swaps, "
+                "created_at, last_active) VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (
+                    (uid, f"user{uid}", f"User{uid}", lat, lon, CITIES[city][0], rating, swaps, created[i], created[i])
+                    for i, (uid, lat, lon, city, rating, swaps) in enumerate(zip(
+                        ds.user_id.tolist(), ds.user_lat.tolist(), ds.user_lon.tolist(), ds.user_city.tolist(),
+                        ds.user_rating.tolist(), ds.user_swaps.tolist(),
+                    ))
+                ),
+            )
+            for part in _chunks(len(ds.ad_user)):
+                conn.executemany(
+                    "INSERT INTO ads (id, user_tg_id, category, title, description, price, photo_file_id, latitude, "
+                    "longitude, location_name, views, is_active, created_at, updated_at) "
+                    "VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                    (row[:5] + (None if row[5] is None else str(row[5]),) + row[6:11]
+                     + (constants.AD_STATUS_ACTIVE if row[11] else constants.AD_STATUS_INACTIVE, row[12], row[12])
+                     for row in _ad_rows(ds, part)),
+                )
+
+        with conn:
+            user_ids = ds.user_id
+            conn.executemany(
+                "INSERT INTO swap_proposals (id, liked_ad_id, proposer_ad_id, proposer_user_id, target_user_id, status, "
+                "proposed_at, responded_at) VALUES (?,?,?,?,?,?,?,?)",
+                (
+                    (i + 1, liked + 1, proposer + 1, proposer_user, target_user, SWAP_STATUSES[status], created,
+                     None if SWAP_STATUSES[status] == constants.SWAP_STATUS_PENDING else created)
+                    for i, (liked, proposer, proposer_user, target_user, status, created) in enumerate(zip(
+                        ds.swap_liked.tolist(), ds.swap_proposer.tolist(),
+                        user_ids[ds.ad_user[ds.swap_proposer]].tolist(), user_ids[ds.ad_user[ds.swap_liked]].tolist(),
+                        ds.swap_status.tolist(), _timestamps(ds.swap_created),
+                    ))
+                ),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO ratings (from_user_id, to_user_id, swap_id, rating, rated_at) VALUES (?,?,?,?,?)",
+                zip(user_ids[ds.rating_from].tolist(), user_ids[ds.rating_to].tolist(),
+                    (ds.rating_swap + 1).tolist(), ds.rating_value.tolist(),
+                    _timestamps(ds.swap_created[ds.rating_swap])),
+            )
+            conn.executemany(
+                "INSERT INTO favorites (user_id, ad_id, added_at) VALUES (?,?,?)",
+                zip(user_ids[ds.favorite_user].tolist(), (ds.favorite_ad + 1).tolist(),
+                    _timestamps(ds.favorite_created)),
+            )
+
+        for part in _chunks(len(ds.view_ad)):
+            with conn:
+                conn.executemany(
+                    "INSERT INTO ad_views (ad_id, viewer_id, viewed_at) VALUES (?,?,?)",
+                    zip((ds.view_ad[part] + 1).tolist(), ds.user_id[ds.view_user[part]].tolist(),
+                        _timestamps(ds.view_created[part])),
+                )
+
+        conn.executescript(STATS_REBUILD)
+        conn.executescript(LEADERBOARD_REBUILD)
+        conn.executescript(USER_COUNTERS_REBUILD)
+        for name, body in TRIGGERS.items():
+            conn.execute(f"CREATE TRIGGER {name} {body}")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+def write_orm_db(ds: Dataset, path: str):
+    """Запись в схему models_orm (SQLAlchemy Core: executemany с Python-умолчаниями колонок)"""
+    from sqlalchemy import create_engine
+    from app.database.models_orm import Base, AdStatus, SwapStatus
+
+    swap_status = {
+        constants.SWAP_STATUS_PENDING: SwapStatus.PROPOSED,
+        constants.SWAP_STATUS_ACCEPTED: SwapStatus.ACCEPTED,
+        constants.SWAP_STATUS_COMPLETED: SwapStatus.COMPLETED,
+        constants.SWAP_STATUS_CANCELLED: SwapStatus.CANCELLED,
+    }
+    tables = Base.metadata.tables
+
+    def dt(seconds: np.ndarray) -> List[datetime]:
+        return seconds.astype("datetime64[s]").tolist()
+
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    try:
+        with engine.begin() as conn:
+            created = dt(ds.user_created)
+            user_views = np.bincount(ds.ad_user, weights=ds.ad_views, minlength=len(ds.user_id)).astype(np.int64)
+            conn.execute(tables["users"].insert(), [
+                {"id": uid, "username": f"user{uid}", "name": f"User{uid}", "latitude": lat, "longitude": lon,
+                 "location_name": CITIES[city][0], "rating": rating, "total_swaps": swaps, "successful_swaps": swaps,
+                 "total_views": views, "created_at": created[i], "last_active": created[i]}
+                for i, (uid, lat, lon, city, rating, swaps, views) in enumerate(zip(
+                    ds.user_id.tolist(), ds.user_lat.tolist(), ds.user_lon.tolist(), ds.user_city.tolist(),
+                    ds.user_rating.tolist(), ds.user_swaps.tolist(), user_views.tolist(),
+                ))
+            ])
+            for part in _chunks(len(ds.ad_user)):
+                conn.execute(tables["ads"].insert(), [
+                    {"id": row[0], "user_id": row[1], "category": row[2], "title": row[3], "description": row[4],
+                     "price": row[5], "photos": {"main": row[6]} if row[6] else {}, "latitude": row[7],
+                     "longitude": row[8], "location_name": row[9], "views": row[10],
+                     "status": AdStatus.ACTIVE if row[11] else AdStatus.INACTIVE,
+                     "created_at": datetime.fromisoformat(row[12]), "updated_at": datetime.fromisoformat(row[12])}
+                    for row in _ad_rows(ds, part)
+                ])
+
+        with engine.begin() as conn:
+            user_ids = ds.user_id
+            created = dt(ds.swap_created)
+            if len(ds.swap_liked):
+                conn.execute(tables["swaps"].insert(), [
+                    {"id": i + 1, "user1_id": proposer_user, "user2_id": target_user, "ad1_id": proposer + 1,
+                     "ad2_id": liked + 1, "status": swap_status[SWAP_STATUSES[status]], "created_at": created[i],
+                     "accepted_at": created[i] if SWAP_STATUSES[status] in (constants.SWAP_STATUS_ACCEPTED,
+                                                                           constants.SWAP_STATUS_COMPLETED) else None,
+                     "completed_at": created[i] if SWAP_STATUSES[status] == constants.SWAP_STATUS_COMPLETED else None}
+                    for i, (liked, proposer, proposer_user, target_user, status) in enumerate(zip(
+                        ds.swap_liked.tolist(), ds.swap_proposer.tolist(),
+                        user_ids[ds.ad_user[ds.swap_proposer]].tolist(), user_ids[ds.ad_user[ds.swap_liked]].tolist(),
+                        ds.swap_status.tolist(),
+                    ))
+                ])
+            if len(ds.rating_swap):
+                conn.execute(tables["ratings"].insert(), [
+                    {"from_user_id": f, "to_user_id": t, "swap_id": s + 1, "rating": r, "created_at": c}
+                    for f, t, s, r, c in zip(user_ids[ds.rating_from].tolist(), user_ids[ds.rating_to].tolist(),
+                                             ds.rating_swap.tolist(), ds.rating_value.tolist(),
+                                             dt(ds.swap_created[ds.rating_swap]))
+                ])
+            if len(ds.favorite_ad):
+                conn.execute(tables["favorites"].insert(), [
+                    {"user_id": u, "ad_id": a + 1, "created_at": c}
+                    for u, a, c in zip(user_ids[ds.favorite_user].tolist(), ds.favorite_ad.tolist(),
+                                       dt(ds.favorite_created))
+                ])
+
+        for part in _chunks(len(ds.view_ad)):
+            with engine.begin() as conn:
+                conn.execute(tables["ad_views"].insert(), [
+                    {"ad_id": a + 1, "viewer_id": u, "created_at": c}
+                    for a, u, c in zip(ds.view_ad[part].tolist(), ds.user_id[ds.view_user[part]].tolist(),
+                                       dt(ds.view_created[part]))
+                ])
+    finally:
+        engine.dispose()
+
+
+def summary(ds: Dataset) -> Dict[str, int]:
+    return {
+        "users": len(ds.user_id), "ads": len(ds.ad_user), "swaps": len(ds.swap_liked),
+        "ratings": len(ds.rating_swap), "favorites": len(ds.favorite_ad), "views": len(ds.view_ad),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетической БД SwapBot")
+    parser.add_argument("path", help="новый файл БД")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--ads-per-user", type=float, default=2.0)
+    parser.add_argument("--swaps-per-user", type=float, default=1.0)
+    parser.add_argument("--favorites-per-user", type=float, default=3.0)
+    parser.add_argument("--views-per-ad", type=float, default=8.0)
+    parser.add_argument("--days", type=int, default=365, help="глубина истории")
+    parser.add_argument("--until", help="конец истории YYYY-MM-DD (по умолчанию — сегодня, UTC)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--schema", choices=("bot", "orm"), default="bot")
+    parser.add_argument("--force", action="store_true", help="перезаписать существующий файл")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if os.path.exists(args.path):
+        if not args.force:
+            raise SystemExit(f"{args.path} уже существует (--force для перезаписи)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+
+    until = None
+    if args.until:
+        until = int(datetime.strptime(args.until, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+
+    started = time.perf_counter()
+    ds = generate(args.users, args.ads_per_user, args.swaps_per_user, args.favorites_per_user,
+                  args.views_per_ad, args.days, args.seed, until)
+    generated = time.perf_counter()
+    (write_orm_db if args.schema == "orm" else write_bot_db)(ds, args.path)
+    finished = time.perf_counter()
+
+    counts = ", ".join(f"{name}: {count:,}" for name, count in summary(ds).items())
+    print(f"{args.path} ({args.schema}): {counts}")
+    print(f"Генерация {generated - started:.1f} с, запись {finished - generated:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
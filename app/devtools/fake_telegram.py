@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный стенд Telegram Bot API для тестов без сети.
+
+Сервер отвечает на методы бота (/bot{token}/{method}) правдоподобными объектами и
+записывает все вызовы, а также умеет отправлять обновления в webhook бота.
+
+Пример (бот в режиме webhook уже запущен с TELEGRAM_API_URL=http://127.0.0.1:8081):
+    python -m app.devtools.fake_telegram --webhook http://127.0.0.1:8080/webhook --secret S --updates 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from aiohttp import web
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+
+def _chat(chat_id: int) -> Dict[str, Any]:
+    return {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"}
+
+
+def make_message_update(user_id: int, text: Optional[str] = None, **extra) -> Dict[str, Any]:
+    """Обновление с сообщением пользователя (text, location, contact, photo — через extra)"""
+    message = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": _chat(user_id),
+        "from": _user(user_id),
+        **extra,
+    }
+    if text is not None:
+        message["text"] = text
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(_update_ids), "message": message}
+
+
+def make_callback_update(user_id: int, data: str, message_id: int = 1) -> Dict[str, Any]:
+    """Обновление с нажатием inline-кнопки"""
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": _chat(user_id),
+                "from": {"id": 1, "is_bot": True, "first_name": "SwapBot"},
+                "text": "...",
+            },
+        },
+    }
+
+
+class FakeTelegramServer:
+    """Поддельный Bot API: отвечает на вызовы бота и копит их в self.calls"""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self.pending_updates: List[Dict[str, Any]] = []
+        self.webhook: Optional[Dict[str, Any]] = None
+        self.base_url = ""
+        self._updates_event = asyncio.Event()
+        self.app = web.Application()
+        self.app.router.add_route("*", "/bot{token}/{method}", self.handle)
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        post = await request.post()
+        for key, value in post.items():
+            params[key] = value if isinstance(value, str) else getattr(value, "filename", "file")
+        return params
+
+    def _message(self, params: Dict[str, Any], **content) -> Dict[str, Any]:
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": next(_message_ids),
+            "date": int(time.time()),
+            "chat": _chat(chat_id),
+            "from": {"id": 1, "is_bot": True, "first_name": "SwapBot"},
+            **content,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls.append({"method": method, "params": params, "at": time.monotonic()})
+
+        result: Any = True
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "SwapBot", "username": "swap_test_bot"}
+        elif method == "sendMessage":
+            result = self._message(params, text=params.get("text", ""))
+        elif method == "sendPhoto":
+            photo = params.get("photo")
+            file_id = photo if isinstance(photo, str) and not photo.startswith("attach://") else f"file{next(_message_ids)}"
+            result = self._message(params, caption=params.get("caption"), photo=[
+                {"file_id": file_id, "file_unique_id": file_id[-16:], "width": 1280, "height": 960},
+            ])
+        elif method in ("editMessageText", "editMessageReplyMarkup", "editMessageCaption"):
+            result = self._message(params, text=params.get("text", "..."))
+        elif method == "setWebhook":
+            self.webhook = params
+        elif method == "deleteWebhook":
+            self.webhook = None
+        elif method == "getUpdates":
+            result = await self._get_updates(params)
+
+        return web.json_response({"ok": True, "result": result})
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        self.pending_updates = [u for u in self.pending_updates if u["update_id"] >= offset]
+        if not self.pending_updates:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(self._updates_event.wait(), min(float(params.get("timeout") or 0), 1.0))
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get("limit") or 100)
+        return self.pending_updates[:limit]
+
+    def push_update(self, update: Dict[str, Any]):
+        """Обновление для getUpdates (режим polling)"""
+        self.pending_updates.append(update)
+        self._updates_event.set()
+
+    def calls_of(self, method: str) -> List[Dict[str, Any]]:
+        return [c for c in self.calls if c["method"] == method]
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        self.base_url = f"http://{host}:{port}"
+        return runner
+
+
+async def post_updates(webhook_url: str, updates: List[Dict[str, Any]], secret: str = "",
+                       concurrency: int = 20) -> Dict[int, int]:
+    """Отправка обновлений в webhook; возвращает счётчик HTTP-статусов"""
+    statuses: Dict[int, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {SECRET_HEADER: secret} if secret else {}
+
+    async with aiohttp.ClientSession() as session:
+        async def send(update):
+            async with semaphore:
+                async with session.post(webhook_url, data=json.dumps(update), headers={
+                    **headers, "Content-Type": "application/json",
+                }) as response:
+                    statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        await asyncio.gather(*(send(u) for u in updates))
+    return statuses
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--webhook", help="URL webhook бота для отправки обновлений")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+
+    server = FakeTelegramServer()
+    runner = await server.start(args.host, args.port)
+    print(f"Bot API: http://{args.host}:{args.port} (TELEGRAM_API_URL)")
+
+    try:
+        if args.webhook:
+            updates = [make_message_update(1000 + i % args.users, "/start") for i in range(args.updates)]
+            started = time.perf_counter()
+            statuses = await post_updates(args.webhook, updates, args.secret)
+            elapsed = time.perf_counter() - started
+            print(f"Отправлено {len(updates)} обновлений за {elapsed:.2f} с: {statuses}")
+            await asyncio.sleep(1)
+            print(f"Вызовов Bot API: {len(server.calls)}")
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк материализации строк: python -m app.devtools.rowbench --rows 10000
+
+Выборка «Мои объявления» (колонки AdModel.get_user_ads) из временной SQLite-таблицы
+собирается разными способами: голые кортежи, dict на строку (как раньше в моделях),
+sqlite3.Row, dataclass(slots) с keyword-конструктором и записи records (row_factory).
+Для каждого — лучшее время fetchall из --repeat прогонов, время fetchall с чтением
+трёх полей каждой строки (как при выводе списка) и память под результат (tracemalloc).
+"""
+import argparse
+import gc
+import json
+import sqlite3
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from app.database.records import AdRecord, USER_AD_FIELDS, row_factory
+
+
+@dataclass(slots=True)
+class _SlotsAd:
+    id: int
+    category: Optional[str] = None
+    title: str = ""
+    description: Optional[str] = None
+    price: Optional[str] = None
+    photo_file_id: Optional[str] = None
+    views: int = 0
+    is_active: int = 1
+    created_at: Optional[str] = None
+
+
+def _dict_row(cursor, r):
+    return {"id": r[0], "category": r[1], "title": r[2], "description": r[3], "price": r[4],
+            "photo_file_id": r[5], "views": r[6], "is_active": r[7], "created_at": r[8]}
+
+
+def _slots_row(cursor, r):
+    return _SlotsAd(id=r[0], category=r[1], title=r[2], description=r[3], price=r[4],
+                    photo_file_id=r[5], views=r[6], is_active=r[7], created_at=r[8])
+
+
+# (row_factory, чтение трёх полей строки)
+VARIANTS: Dict[str, tuple] = {
+    "tuple": (None, lambda row: (row[0], row[2], row[6])),
+    "dict": (_dict_row, lambda row: (row["id"], row["title"], row["views"])),
+    "sqlite3.Row": (sqlite3.Row, lambda row: (row["id"], row["title"], row["views"])),
+    "dataclass(slots)": (_slots_row, lambda row: (row.id, row.title, row.views)),
+    "records": (row_factory(AdRecord, USER_AD_FIELDS), lambda row: (row.id, row.title, row.views)),
+}
+
+
+def make_db(rows: int) -> sqlite3.Connection:
+    db = sqlite3.connect(":memory:")
+    db.execute(f"CREATE TABLE ads ({', '.join(USER_AD_FIELDS)})")
+    db.executemany(
+        f"INSERT INTO ads VALUES ({', '.join('?' * len(USER_AD_FIELDS))})",
+        ((i, "electronics", f"Объявление {i}", "Описание " * 8, str(100 + i), None, i % 50, 1,
+          "2026-01-01 12:00:00") for i in range(rows)),
+    )
+    return db
+
+
+def _best(repeat: int, run: Callable) -> float:
+    """Лучшее время из repeat прогонов; сборщик мусора выключен, как в timeit"""
+    best = float("inf")
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+    finally:
+        gc.enable()
+    return best
+
+
+def measure(db: sqlite3.Connection, factory, read: Callable, repeat: int) -> Dict[str, float]:
+    query = f"SELECT {', '.join(USER_AD_FIELDS)} FROM ads"
+    db.row_factory = factory
+
+    def fetch():
+        return db.execute(query).fetchall()
+
+    def fetch_and_read():
+        for row in db.execute(query).fetchall():
+            read(row)
+
+    fetch_s = _best(repeat, fetch)
+    read_s = _best(repeat, fetch_and_read)
+    tracemalloc.start()
+    rows = fetch()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return {"fetch_ms": fetch_s * 1000, "fetch_read_ms": read_s * 1000, "kib": allocated / 1024}
+
+
+def run(rows: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    db = make_db(rows)
+    try:
+        return {name: measure(db, factory, read, repeat) for name, (factory, read) in VARIANTS.items()}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение способов материализации строк")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--json", default=None, help="Сохранить результат в файл")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.repeat)
+    base = report["dict"]
+    print(f"Строк: {args.rows}, лучший из {args.repeat}\n")
+    print(f"{'способ':18s} {'fetch, мс':>10s} {'+чтение, мс':>12s} {'память, КиБ':>12s} {'vs dict':>8s}")
+    for name, result in report.items():
+        print(f"{name:18s} {result['fetch_ms']:10.2f} {result['fetch_read_ms']:12.2f} {result['kib']:12.0f} "
+              f"{result['fetch_read_ms'] / base['fetch_read_ms']:7.2f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,14 @@
 """
 Админ-команды (заглушка). Только для пользователей из ADMIN_IDS.
 """
+from datetime import datetime
+
 from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile, Message
 
-from app.config import settings
+from app.config import constants, settings
+from app.utils.formatters import escape_html
 
 router = Router()
 
@@ -26,7 +29,7 @@ async def cmd_admin(message: Message):
         return
     await message.answer(
         "⚙️ <b>Админ-панель</b>\n\n"
-        "Веб-панель: включите ADMIN_PANEL_ENABLED и запустите uvicorn admin.main:app. "
+        "Веб-панель: задайте ADMIN_TOKEN и запустите python -m admin.main. "
         "Пока доступны только команды бота."
     )
 
@@ -35,18 +38,91 @@ async def cmd_admin(message: Message):
 async def cmd_stats(message: Message):
     if not _is_admin(message.from_user.id):
         return
-    
+
     try:
-        from app.database.models import UserModel, AdModel
-        
-        # Получаем статистику из БД
-        # Простая реализация без подсчёта
-        await message.answer(
-            "📊 <b>Статистика</b>\n\n"
-            "Для полной статистики включите аналитику в настройках.\n\n"
-            "Доступные команды:\n"
-            "/admin - админ-панель\n"
-            "/stats - статистика"
-        )
+        from app.database.crud import StatsModel
+
+        counters = await StatsModel.counters()
+        days = await StatsModel.daily(7)
     except Exception as e:
-        await message.answer(f"❌ Ошибка получения статистики: {e}")
\ No newline at end of file
+        await message.answer(f"❌ Ошибка получения статистики: {e}")
+        return
+
+    today = days.get(datetime.utcnow().date().isoformat(), {})
+    week = {}
+    for values in days.values():
+        for name in ("new_users", "new_ads", "new_swaps", "views"):
+            week[name] = week.get(name, 0) + values.get(name, 0)
+
+    categories = "\n".join(
+        f"  {info['title']}: {counters.get(f'ads_active:{key}', 0)}"
+        for key, info in constants.CATEGORIES.items()
+    )
+    await message.answer(
+        "📊 <b>Статистика</b>\n\n"
+        f"👥 Пользователей: {counters.get('users', 0)} "
+        f"(+{today.get('new_users', 0)} сегодня, +{week.get('new_users', 0)} за 7 дней)\n"
+        f"🟢 Активны сегодня: {today.get('active_users', 0)}\n\n"
+        f"📦 Объявлений: {counters.get('ads', 0)} "
+        f"(+{today.get('new_ads', 0)} сегодня, +{week.get('new_ads', 0)} за 7 дней)\n"
+        f"Активные по категориям:\n{categories}\n\n"
+        f"🔄 Обмены: ожидают {counters.get(f'swaps:{constants.SWAP_STATUS_PENDING}', 0)}, "
+        f"приняты {counters.get(f'swaps:{constants.SWAP_STATUS_ACCEPTED}', 0)}, "
+        f"завершены {counters.get(f'swaps:{constants.SWAP_STATUS_COMPLETED}', 0)} "
+        f"(+{today.get('new_swaps', 0)} сегодня)\n"
+        f"👁 Просмотров сегодня: {today.get('views', 0)} (за 7 дней: {week.get('views', 0)})"
+    )
+
+
+@router.message(Command("import"))
+async def cmd_import(message: Message, command: CommandObject):
+    """/import <категория> <запрос> — импорт объявлений с Avito от имени админа"""
+    if not _is_admin(message.from_user.id):
+        return
+
+    from app.services.avito_parser import avito_parser
+
+    if not avito_parser.enabled:
+        await message.answer("❌ Импорт выключен (AVITO_PARSER_ENABLED).")
+        return
+    category, _, query = (command.args or "").partition(" ")
+    if category not in constants.CATEGORIES or not query.strip():
+        await message.answer("Использование: /import <категория> <запрос>\n"
+                             f"Категории: {', '.join(constants.CATEGORIES)}")
+        return
+
+    await message.answer(f"⏳ Импорт «{escape_html(query.strip())}»…")
+    stats = await avito_parser.import_search(message.bot, query.strip(), message.from_user.id, category)
+    text = (f"📥 Найдено: {stats['found']}, создано: {stats['created']}, "
+            f"уже были: {stats['duplicates']}")
+    if stats["without_photo"]:
+        text += (f"\n⚠️ Без фото: {stats['without_photo']}"
+                 + (" — не задан MEDIA_UPLOAD_CHAT_ID" if not settings.MEDIA_UPLOAD_CHAT_ID else ""))
+    await message.answer(text)
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """/profile [секунд] — профиль процесса бота в формате collapsed stacks"""
+    if not _is_admin(message.from_user.id):
+        return
+    if not settings.PROFILER_ENABLED:
+        await message.answer("Профилировщик выключен (PROFILER_ENABLED).")
+        return
+
+    from app.utils.profiler import SamplingProfiler
+
+    try:
+        seconds = int(command.args or 10)
+    except ValueError:
+        await message.answer("Использование: /profile [секунд]")
+        return
+    seconds = max(1, min(seconds, settings.PROFILER_MAX_SECONDS))
+
+    await message.answer(f"⏱ Снимаю профиль {seconds} с…")
+    profile = await SamplingProfiler().run(seconds)
+    await message.answer_document(
+        BufferedInputFile(profile.collapsed().encode("utf-8"), filename=f"profile-{seconds}s.collapsed"),
+        caption="Collapsed stacks: flamegraph.pl или speedscope.app",
+    )
+    await message.answer(f"<pre>{escape_html(profile.summary()[:3500])}</pre>")
@@ -3,13 +3,15 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
-from app.database.models import AdModel, UserModel
+from app.database.crud import AdModel, UserModel
 from app.keyboards.main_menu import (
     get_categories_inline, get_create_menu, get_main_menu,
     get_location_request_kb, get_confirmation_kb, get_create_back_only
 )
 from app.states.user_states import CreateAdStates
 from app.config import constants
+from app.services.saved_searches import ad_published
+from app.services.security import security_service
 from app.utils.validators import validate_title, validate_description, validate_price
 from app.utils.formatters import format_ad_text
 
@@ -224,11 +226,11 @@ async def process_photo(message: Message, state: FSMContext):
         print(f"Ошибка get_profile: {e}")
         user = None
 
-    if user and user.get("latitude"):
+    if user and user.latitude:
         await state.update_data(
-            latitude=user["latitude"],
-            longitude=user["longitude"],
-            location_name=user.get("location_name") or "",
+            latitude=user.latitude,
+            longitude=user.longitude,
+            location_name=user.location_name or "",
         )
         await state.set_state(CreateAdStates.confirmation)
         await show_confirmation(message, state)
@@ -279,11 +281,11 @@ async def skip_ad_location(message: Message, state: FSMContext):
     try:
         user = await UserModel.get_profile(message.from_user.id)
 
-        if user and user.get('latitude'):
+        if user and user.latitude:
             await state.update_data(
-                latitude=user['latitude'],
-                longitude=user['longitude'],
-                location_name=user.get('location_name')
+                latitude=user.latitude,
+                longitude=user.longitude,
+                location_name=user.location_name
             )
     except Exception as e:
         print(f"Ошибка get_profile: {e}")
@@ -324,6 +326,81 @@ async def confirm_ad_creation(callback: CallbackQuery, state: FSMContext):
     """Подтверждение создания объявления"""
     data = await state.get_data()
 
+    # Модерация текста и частоты публикаций — до создания и до повторной публикации
+    try:
+        approved, reason = await security_service.moderate_ad(
+            data['title'], data['description'], callback.from_user.id
+        )
+    except Exception as e:
+        print(f"Ошибка moderate_ad: {e}")
+        approved, reason = True, None
+
+    if not approved:
+        await state.clear()
+
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.message.answer(
+            f"🚫 Объявление не опубликовано.\n{reason}",
+            reply_markup=get_main_menu()
+        )
+        await callback.answer()
+        return
+
+    # Такое же активное объявление у пользователя уже есть — копию не создаём
+    try:
+        active_id = await AdModel.find_duplicate(
+            data['title'], data['description'], user_tg_id=callback.from_user.id, active_only=True,
+        )
+    except Exception as e:
+        print(f"Ошибка find_duplicate: {e}")
+        active_id = None
+
+    if active_id:
+        await state.clear()
+
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.message.answer(
+            f"⚠️ У вас уже опубликовано такое объявление (#{active_id}).\n"
+            f"Измените его в «Моих объявлениях» вместо создания копии.",
+            reply_markup=get_main_menu()
+        )
+        await callback.answer()
+        return
+
+    # Повторная публикация снятого объявления (тот же товар в той же категории) —
+    # возвращаем старое с текстом, ценой, фото и местом из новой анкеты
+    try:
+        duplicate_id = await AdModel.find_duplicate(
+            data['title'], data['description'], user_tg_id=callback.from_user.id,
+            category=data['category'], inactive_only=True,
+        )
+    except Exception as e:
+        print(f"Ошибка find_duplicate: {e}")
+        duplicate_id = None
+
+    if duplicate_id:
+        await AdModel.republish(
+            duplicate_id,
+            title=data['title'],
+            description=data['description'],
+            price=data.get('price'),
+            photo_file_id=data.get('photo_file_id'),
+            latitude=data.get('latitude'),
+            longitude=data.get('longitude'),
+            location_name=data.get('location_name'),
+        )
+        await state.clear()
+        await ad_published(callback.bot, duplicate_id)
+
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.message.answer(
+            f"♻️ У вас уже было такое объявление (#{duplicate_id}).\n"
+            f"Мы снова опубликовали его с новым текстом, ценой и фото вместо создания копии.",
+            reply_markup=get_main_menu()
+        )
+        await callback.answer()
+        return
+
     # Создаём объявление
     try:
         ad_id = await AdModel.create(
@@ -346,6 +423,9 @@ async def confirm_ad_creation(callback: CallbackQuery, state: FSMContext):
 
     await state.clear()
 
+    # Сверка с сохранёнными поисками — в фоне, пачками
+    await ad_published(callback.bot, ad_id)
+
     await callback.message.edit_reply_markup(reply_markup=None)
     await callback.message.answer(
         f"✅ {MESSAGES['ad_created']}\n\n"
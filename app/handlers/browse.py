@@ -5,12 +5,16 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
-from app.database.models import AdModel, UserModel, SwapModel, FavoriteModel
+from app.database.crud import AdModel, UserModel, SwapModel, UserCounterModel
 from app.keyboards.main_menu import get_categories_inline, get_main_menu, get_browse_menu, get_filters_kb
-from app.keyboards.inline_kb import get_ad_actions_kb, get_my_ads_selection_kb
+from app.keyboards.inline_kb import (
+    get_ad_actions_kb, get_my_ads_selection_kb, get_keyset_pagination_kb, parse_page_callback
+)
 from app.states.user_states import BrowseAdStates
 from app.config import constants
-from app.utils.formatters import format_ad_text, escape_html
+from app.services.ai_recommendations import ai_service
+from app.services.favorites import favorites_service
+from app.utils.formatters import format_ad_text, escape_html, format_price
 
 CATEGORIES = constants.CATEGORIES
 MESSAGES = constants.MESSAGES
@@ -56,8 +60,8 @@ async def process_browse_category(callback: CallbackQuery, state: FSMContext):
     await state.update_data(
         category=category_key,
         last_ad_id=0,
-        user_lat=user.get('latitude') if user else None,
-        user_lon=user.get('longitude') if user else None,
+        user_lat=user.latitude if user else None,
+        user_lon=user.longitude if user else None,
         radius_filter=10,  # По умолчанию 10 км
         price_filter="any",  # Любая цена
         photo_only=False  # Показывать все
@@ -108,61 +112,67 @@ async def show_next_ad(message: Message, state: FSMContext, user_id: Optional[in
 
     # Фильтр по цене
     if price_filter != "any":
-        if price_filter == "free" and ad.get('price'):
+        if price_filter == "free" and ad.price:
             # Пропускаем платные если выбрано "бесплатно"
-            await state.update_data(last_ad_id=ad["id"])
+            await state.update_data(last_ad_id=ad.id)
             return await show_next_ad(message, state, user_id=uid)
         elif price_filter.endswith("+"):
             max_price = int(price_filter.replace("+", ""))
-            if ad.get('price') and int(ad['price']) <= max_price:
-                await state.update_data(last_ad_id=ad["id"])
+            if ad.price and int(ad.price) <= max_price:
+                await state.update_data(last_ad_id=ad.id)
                 return await show_next_ad(message, state, user_id=uid)
         elif price_filter.isdigit():
             max_price = int(price_filter)
-            if ad.get('price') and int(ad['price']) > max_price:
-                await state.update_data(last_ad_id=ad["id"])
+            if ad.price and int(ad.price) > max_price:
+                await state.update_data(last_ad_id=ad.id)
                 return await show_next_ad(message, state, user_id=uid)
 
     # Фильтр по фото
-    if photo_only and not ad.get('photo_file_id'):
-        await state.update_data(last_ad_id=ad["id"])
+    if photo_only and not ad.photo_file_id:
+        await state.update_data(last_ad_id=ad.id)
         return await show_next_ad(message, state, user_id=uid)
 
     # Увеличиваем просмотры
     try:
-        await AdModel.increment_views(ad["id"], uid)
+        await AdModel.increment_views(ad.id, uid)
     except Exception as e:
         print(f"Ошибка increment_views: {e}")
 
     await state.update_data(
-        last_ad_id=ad["id"],
-        current_ad_id=ad["id"],
-        current_ad_owner_id=ad["user_tg_id"],
+        last_ad_id=ad.id,
+        current_ad_id=ad.id,
+        current_ad_owner_id=ad.user_tg_id,
     )
 
     # Получаем информацию о владельце
     try:
-        owner = await UserModel.get_profile(ad['user_tg_id'])
+        owner = await UserModel.get_profile(ad.user_tg_id)
     except Exception as e:
         print(f"Ошибка get_profile: {e}")
         owner = None
 
     # Формируем текст объявления
     text = format_ad_text(
-        ad['title'],
-        ad['description'],
-        ad['price'],
-        ad.get('location_name'),
-        ad.get('distance'),
-        owner['name'] if owner else None,
-        owner['rating'] if owner else None
+        ad.title,
+        ad.description,
+        ad.price,
+        ad.location_name,
+        ad.distance,
+        owner.name if owner else None,
+        owner.rating if owner else None
     )
+    # Набор избранного берётся из памяти процесса — без запроса на карточку
+    try:
+        if await favorites_service.contains(uid, ad.id):
+            text += "\n\n⭐ В избранном"
+    except Exception as e:
+        print(f"Ошибка favorites: {e}")
 
     # Отправляем объявление с меню просмотра
     try:
-        if ad.get('photo_file_id'):
+        if ad.photo_file_id:
             await message.answer_photo(
-                ad['photo_file_id'],
+                ad.photo_file_id,
                 caption=text,
                 reply_markup=get_browse_menu()
             )
@@ -208,7 +218,7 @@ async def add_to_favorites_text(message: Message, state: FSMContext):
         return
     
     try:
-        success = await FavoriteModel.add(message.from_user.id, ad_id)
+        success = await favorites_service.add(message.from_user.id, ad_id)
         if success:
             await message.answer("⭐ Добавлено в избранное!")
         else:
@@ -243,15 +253,41 @@ async def show_author_text(message: Message, state: FSMContext):
     profile_text = f"""
 👤 <b>Профиль пользователя</b>
 
-<b>Имя:</b> {escape_html(owner['name'])}
-<b>Рейтинг:</b> {format_rating(owner['rating'])}
-<b>Обменов:</b> {owner['total_swaps']}
-<b>Телефон:</b> {format_phone(owner['phone'])}
+<b>Имя:</b> {escape_html(owner.name)}
+<b>Рейтинг:</b> {format_rating(owner.rating)}
+<b>Обменов:</b> {owner.total_swaps}
+<b>Телефон:</b> {format_phone(owner.phone)}
 """
 
     await message.answer(profile_text)
 
 
+@router.message(BrowseAdStates.showing_ads, F.text == "🔎 Похожие")
+async def similar_ads_text(message: Message, state: FSMContext):
+    """Похожие объявления той же категории (ai_recommendations)"""
+    data = await state.get_data()
+    ad_id = data.get('current_ad_id')
+
+    if not ad_id:
+        await message.answer("❌ Объявление не найдено")
+        return
+
+    try:
+        ad = await AdModel.get_by_id(ad_id)
+        similar = await ai_service.get_similar_ads(ad, message.from_user.id) if ad else []
+    except Exception as e:
+        print(f"Ошибка get_similar_ads: {e}")
+        await message.answer(f"❌ Ошибка: {str(e)}")
+        return
+
+    if not similar:
+        await message.answer("🔎 Похожих объявлений пока нет")
+        return
+
+    lines = [f"• #{item.id} {escape_html(item.title)} — {format_price(item.price)}" for item in similar]
+    await message.answer("🔎 <b>Похожие объявления</b>\n\n" + "\n".join(lines))
+
+
 @router.message(BrowseAdStates.showing_ads, F.text == "🏠 Главная")
 async def exit_browse_text(message: Message, state: FSMContext):
     """Выйти в главное меню"""
@@ -267,7 +303,7 @@ async def start_propose_swap_internal(message: Message, state: FSMContext, ad_id
     # Получаем объявления пользователя
     try:
         my_ads = await AdModel.get_user_ads(user_id, active_only=True)
-        category_ads = [(ad['id'], ad['title'], ad['category']) for ad in my_ads if ad['category'] == category]
+        category_ads = [(ad.id, ad.title, ad.category) for ad in my_ads if ad.category == category]
     except Exception as e:
         print(f"Ошибка get_user_ads: {e}")
         await message.answer(f"❌ Ошибка: {str(e)}")
@@ -327,27 +363,16 @@ async def select_my_ad_for_swap(callback: CallbackQuery, state: FSMContext):
 
     # Отправляем уведомление владельцу
     try:
-        from aiogram import Bot
-        from aiogram.client.default import DefaultBotProperties
-        from aiogram.enums import ParseMode
-        from app.config import settings as app_settings
-
-        bot = Bot(
-            token=app_settings.BOT_TOKEN,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-        )
-
         notification = (
             f"🔔 <b>Новое предложение обмена!</b>\n\n"
-            f"Пользователь <b>{escape_html(proposer['name'])}</b> предлагает обменять:\n\n"
-            f"<b>{escape_html(my_ad['title'])}</b>\n"
+            f"Пользователь <b>{escape_html(proposer.name)}</b> предлагает обменять:\n\n"
+            f"<b>{escape_html(my_ad.title)}</b>\n"
             f"на ваш товар:\n"
-            f"<b>{escape_html(liked_ad['title'])}</b>\n\n"
+            f"<b>{escape_html(liked_ad.title)}</b>\n\n"
             f"Посмотрите в разделе «💬 Мои предложения»"
         )
 
-        await bot.send_message(data['target_owner_id'], notification)
-        await bot.session.close()
+        await callback.bot.send_message(data['target_owner_id'], notification)
     except Exception as e:
         print(f"Не удалось отправить уведомление: {e}")
 
@@ -371,20 +396,53 @@ async def cancel_swap_proposal(callback: CallbackQuery, state: FSMContext):
     await show_next_ad(callback.message, state, user_id=callback.from_user.id)
 
 
+def _swaps_page_text(kind: str, page, total: int) -> str:
+    """Страница входящих (kind="in", ждут ответа) или исходящих (kind="out") предложений"""
+    if kind == "in":
+        text = f"<b>📥 Входящие</b> ({total}):\n"
+        for swap in page.items:
+            text += f"• {escape_html(swap.their_ad_title)} → {escape_html(swap.my_ad_title)}\n"
+        return text
+
+    text = f"<b>📤 Исходящие</b> ({total}):\n"
+    for swap in page.items:
+        status_emoji = {"pending": "⏳", "accepted": "✅", "declined": "❌"}.get(swap.status, "❓")
+        text += f"{status_emoji} {escape_html(swap.my_ad_title)} → {escape_html(swap.their_ad_title)}\n"
+    return text
+
+
+async def _swaps_page(kind: str, user_id: int, after: Optional[int] = None, before: Optional[int] = None):
+    if kind == "in":
+        return await SwapModel.get_incoming_page(user_id, SWAP_STATUS_PENDING, after=after, before=before)
+    return await SwapModel.get_outgoing_page(user_id, after=after, before=before)
+
+
+def _swaps_total(kind: str, counters) -> int:
+    return counters.get(f"swaps_in:{SWAP_STATUS_PENDING}" if kind == "in" else "swaps_out", 0)
+
+
+def _swaps_kb(kind: str, page, number: int, total: int):
+    pages = max(1, -(-total // constants.SWAPS_PAGE_SIZE))
+    return get_keyset_pagination_kb(page, number, pages, f"swaps:{kind}")
+
+
 @router.message(F.text == "💬 Мои предложения")
 async def show_my_proposals(message: Message, state: FSMContext):
-    """Показать мои предложения обмена"""
+    """Показать мои предложения обмена: входящие и исходящие — по странице, листание кнопками (swaps:…)"""
     await state.clear()
 
     try:
-        incoming = await SwapModel.get_incoming(message.from_user.id, SWAP_STATUS_PENDING)
-        outgoing = await SwapModel.get_outgoing(message.from_user.id)
+        counters = await UserCounterModel.get(message.from_user.id)
+        pages = {
+            kind: await _swaps_page(kind, message.from_user.id)
+            for kind in ("in", "out") if _swaps_total(kind, counters)
+        }
     except Exception as e:
         print(f"Ошибка get proposals: {e}")
         await message.answer(f"❌ {MESSAGES['error']}\n\n{str(e)}")
         return
 
-    if not incoming and not outgoing:
+    if not any(page.items for page in pages.values()):
         await message.answer(
             "📭 У вас пока нет предложений обмена.\n\n"
             "Начните просматривать объявления и предлагайте обмен!",
@@ -392,18 +450,40 @@ async def show_my_proposals(message: Message, state: FSMContext):
         )
         return
 
-    text = "<b>💬 Ваши предложения</b>\n\n"
+    await message.answer("<b>💬 Ваши предложения</b>", reply_markup=get_main_menu())
+    for kind, page in pages.items():
+        if page.items:
+            total = _swaps_total(kind, counters)
+            await message.answer(_swaps_page_text(kind, page, total), reply_markup=_swaps_kb(kind, page, 1, total))
+
 
-    if incoming:
-        text += "<b>📥 Входящие:</b>\n"
-        for swap in incoming[:5]:
-            text += f"• {escape_html(swap['their_ad_title'])} → {escape_html(swap['my_ad_title'])}\n"
-        text += "\n"
+@router.callback_query(F.data.startswith("swaps:"))
+async def swaps_page(callback: CallbackQuery):
+    """Листание предложений: страница по курсору, сообщение редактируется на месте"""
+    kind = callback.data.split(":")[1]
+    after, before, number = parse_page_callback(callback.data)
+    try:
+        page = await _swaps_page(kind, callback.from_user.id, after, before)
+        if not page.items:
+            # Страница опустела (на предложения ответили, список сократился) — с начала
+            page, number = await _swaps_page(kind, callback.from_user.id), 1
+        counters = await UserCounterModel.get(callback.from_user.id)
+    except Exception as e:
+        print(f"Ошибка get proposals: {e}")
+        await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+        return
+
+    total = _swaps_total(kind, counters)
+    try:
+        await callback.message.edit_text(
+            _swaps_page_text(kind, page, total), reply_markup=_swaps_kb(kind, page, number, total)
+        )
+    except TelegramBadRequest:
+        pass  # страница не изменилась
+    await callback.answer()
 
-    if outgoing:
-        text += "<b>📤 Исходящие:</b>\n"
-        for swap in outgoing[:5]:
-            status_emoji = {"pending": "⏳", "accepted": "✅", "declined": "❌"}.get(swap['status'], "❓")
-            text += f"{status_emoji} {escape_html(swap['my_ad_title'])} → {escape_html(swap['their_ad_title'])}\n"
 
-    await message.answer(text, reply_markup=get_main_menu())
\ No newline at end of file
+@router.callback_query(F.data == "ignore")
+async def ignore_callback(callback: CallbackQuery):
+    """Кнопки-подписи (номер страницы)"""
+    await callback.answer()
\ No newline at end of file
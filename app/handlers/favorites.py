@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+⭐ Избранное — список по странице (последние добавленные сначала), листание кнопками
+(favs:…) и удаление кнопкой с номером (unfav:…). Добавление — «⭐ Избранное» в ленте
+(browse.add_to_favorites_text); в состоянии ленты та же кнопка добавляет, а не открывает список.
+"""
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, InlineKeyboardButton, Message
+
+from app.config import constants
+from app.database.crud import FavoriteModel, UserCounterModel
+from app.keyboards.inline_kb import get_keyset_pagination_kb, page_origin, parse_page_callback
+from app.services.favorites import favorites_service
+from app.utils.formatters import escape_html, format_price
+
+CATEGORIES = constants.CATEGORIES
+
+router = Router()
+
+
+async def _render(user_id: int, after=None, before=None, number: int = 1):
+    """Текст и клавиатура страницы; None — избранное пусто"""
+    page = await FavoriteModel.get_page(user_id, after=after, before=before)
+    if not page.items and (after is not None or before is not None):
+        # Страница опустела (объявления удалены из избранного) — с начала
+        page, after, before, number = await FavoriteModel.get_page(user_id), None, None, 1
+    if not page.items:
+        return None
+    counters = await UserCounterModel.get(user_id)
+    total = counters.get("favorites", 0)
+
+    text = f"<b>⭐ Избранное</b> ({total}):\n\n"
+    first = (number - 1) * constants.FAVORITES_PAGE_SIZE + 1
+    buttons = []
+    origin = page_origin(after, before, number)
+    for idx, ad in enumerate(page.items, first):
+        status = "🟢" if ad.is_active else "🔴"
+        cat_emoji = CATEGORIES[ad.category]['emoji'] if ad.category in CATEGORIES else ""
+
+        text += f"{idx}. {status} <b>{escape_html(ad.title)}</b>\n"
+        text += f"   {cat_emoji} {format_price(ad.price)}\n\n"
+        buttons.append(InlineKeyboardButton(text=f"❌ {idx}", callback_data=f"unfav:{ad.id}:{origin}"))
+    text += "<i>❌ — убрать из избранного</i>"
+
+    pages = max(1, -(-total // constants.FAVORITES_PAGE_SIZE))
+    return text, get_keyset_pagination_kb(page, number, pages, "favs", buttons)
+
+
+@router.message(F.text == "⭐ Избранное")
+async def show_favorites(message: Message):
+    """Список избранного — первая страница"""
+    try:
+        rendered = await _render(message.from_user.id)
+    except Exception as e:
+        print(f"Ошибка get favorites: {e}")
+        await message.answer(f"❌ Ошибка: {str(e)}")
+        return
+
+    if not rendered:
+        await message.answer("⭐ В избранном пока пусто.\n\nДобавляйте объявления кнопкой «⭐ Избранное» в ленте!")
+        return
+
+    text, kb = rendered
+    await message.answer(text, reply_markup=kb)
+
+
+async def _edit(callback: CallbackQuery, after, before, number: int):
+    try:
+        rendered = await _render(callback.from_user.id, after, before, number)
+    except Exception as e:
+        print(f"Ошибка get favorites: {e}")
+        await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+        return False
+
+    try:
+        if rendered:
+            await callback.message.edit_text(rendered[0], reply_markup=rendered[1])
+        else:
+            await callback.message.edit_text("⭐ В избранном пока пусто.")
+    except TelegramBadRequest:
+        pass  # страница не изменилась
+    return True
+
+
+@router.callback_query(F.data.startswith("favs:"))
+async def favorites_page(callback: CallbackQuery):
+    """Листание избранного: страница по курсору, сообщение редактируется на месте"""
+    if await _edit(callback, *parse_page_callback(callback.data)):
+        await callback.answer()
+
+
+@router.callback_query(F.data.startswith("unfav:"))
+async def remove_favorite(callback: CallbackQuery):
+    """Убрать из избранного и перерисовать ту же страницу"""
+    ad_id = int(callback.data.split(":")[1])
+    try:
+        removed = await favorites_service.remove(callback.from_user.id, ad_id)
+    except Exception as e:
+        print(f"Ошибка remove favorite: {e}")
+        await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+        return
+
+    if await _edit(callback, *parse_page_callback(callback.data)):
+        await callback.answer("Убрано из избранного" if removed else "Уже убрано")
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+/top [rating|xp] [город|<категория>] — таблица лидеров и место пользователя.
+
+    /top              — по завершённым обменам, все пользователи
+    /top rating       — по рейтингу
+    /top xp           — по опыту (уровни и достижения)
+    /top город        — по обменам среди соседей (гео-ячейка пользователя)
+    /top electronics  — по обменам в категории (ключ или название категории)
+"""
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+from app.config import constants
+from app.database.crud import UserModel
+from app.services.leaderboard import board_name, cell_key, leaderboard_service
+from app.utils.formatters import escape_html
+
+CITY_WORDS = {"город", "city", "рядом"}
+MEDALS = {1: "🥇", 2: "🥈", 3: "🥉"}
+
+router = Router()
+
+
+def _category(word: str):
+    word = word.lower()
+    for key, info in constants.CATEGORIES.items():
+        if word in (key, info["title_ru"].lower()):
+            return key
+    return None
+
+
+METRIC_WORDS = {"rating": "rating", "рейтинг": "rating", "xp": "xp", "опыт": "xp"}
+METRIC_TITLES = {"swaps": "по обменам", "rating": "по рейтингу", "xp": "по опыту"}
+
+
+def _score(metric: str, score: float) -> str:
+    if metric == "rating":
+        return f"{score:.2f} ⭐"
+    if metric == "xp":
+        return f"{int(score)} XP"
+    return f"{int(score)} 🔄"
+
+
+@router.message(Command("top"))
+async def cmd_top(message: Message, command: CommandObject):
+    metric, cell, category, scope = "swaps", None, None, "все пользователи"
+    for word in (command.args or "").split():
+        if word.lower() in METRIC_WORDS:
+            metric = METRIC_WORDS[word.lower()]
+        elif word.lower() in CITY_WORDS:
+            user = await UserModel.get_profile(message.from_user.id)
+            cell = cell_key(user.latitude, user.longitude) if user else None
+            if cell is None:
+                await message.answer("📍 Укажите местоположение в профиле, чтобы увидеть лидеров рядом.")
+                return
+            scope = "рядом с вами"
+        elif _category(word):
+            category = _category(word)
+            scope = constants.CATEGORIES[category]["title"]
+        else:
+            await message.answer("Использование: /top [rating|xp] [город|категория]")
+            return
+    if metric != "swaps" and category:
+        await message.answer("По категориям таблица ведётся только по обменам: /top " + category)
+        return
+
+    name = board_name(metric, cell, category)
+    top = await leaderboard_service.top(name)
+    position = await leaderboard_service.position(name, message.from_user.id)
+
+    lines = [f"🏆 <b>Лидеры {METRIC_TITLES[metric]}</b> — {escape_html(scope)}\n"]
+    if not top:
+        lines.append("Пока пусто — станьте первым!")
+    for entry in top:
+        place = MEDALS.get(entry["rank"], f"{entry['rank']}.")
+        lines.append(f"{place} {escape_html(entry['name'])} — {_score(metric, entry['score'])}")
+
+    if position:
+        lines.append(f"\nВаше место: <b>{position['rank']}</b> из {position['total']} "
+                     f"({_score(metric, position['score'])})")
+    elif metric == "rating":
+        lines.append(f"\nВ таблицу попадают пользователи с {constants.LEADERBOARD_MIN_RATINGS}+ отзывами.")
+    elif metric == "xp":
+        lines.append("\nОпыт дают достижения, обмены и приглашения друзей.")
+    else:
+        lines.append("\nЗавершите первый обмен, чтобы попасть в таблицу.")
+    await message.answer("\n".join(lines))
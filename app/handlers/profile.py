@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
+from typing import Dict, Optional
+
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
 
-from app.database.models import UserModel, AdModel, RatingModel
+from app.database.crud import UserModel, AdModel, RatingModel, UserCounterModel
 from app.keyboards.main_menu import (
     get_main_menu, get_profile_menu, get_settings_menu,
     get_phone_request_kb, get_location_request_kb,
     get_create_back_only, get_my_ads_menu
 )
-from app.keyboards.inline_kb import get_my_ad_actions_kb
+from app.keyboards.inline_kb import get_my_ad_actions_kb, get_keyset_pagination_kb, parse_page_callback
 from app.states.user_states import ProfileStates
-from app.utils.formatters import format_rating, escape_html, format_phone, format_price, format_date
-from app.utils.validators import validate_name, validate_phone
+from app.utils.formatters import format_rating, escape_html, format_phone, format_price, format_date, format_ad_text
+from app.utils.validators import validate_name, validate_phone, validate_price
+from app.services.favorites import deactivated, favorite_notifier, price_changed
+from app.services.gamification import gamification_service
 from app.config import constants
 
 CATEGORIES = constants.CATEGORIES
@@ -31,7 +36,7 @@ async def view_profile(message: Message, state: FSMContext):
             await message.answer("❌ Профиль не найден. Нажмите /start")
             return
 
-        ads = await AdModel.get_user_ads(message.from_user.id, active_only=False)
+        counters = await UserCounterModel.get(message.from_user.id)
         rating, reviews_count = await RatingModel.get_user_ratings(message.from_user.id)
     except Exception as e:
         print(f"Ошибка view_profile: {e}")
@@ -39,23 +44,27 @@ async def view_profile(message: Message, state: FSMContext):
         return
 
     # Сообщение 1: Профиль со статистикой
-    active_ads = sum(1 for ad in ads if ad['is_active'])
-    total_views = sum(ad['views'] for ad in ads)
-
     profile_text = f"""
 👤 <b>Ваш профиль</b>
 
-<b>Имя:</b> {escape_html(user['name'])}
-<b>Телефон:</b> {format_phone(user['phone'])}
-<b>Локация:</b> {escape_html(user['location_name']) if user.get('location_name') else 'не указана'}
+<b>Имя:</b> {escape_html(user.name)}
+<b>Телефон:</b> {format_phone(user.phone)}
+<b>Локация:</b> {escape_html(user.location_name) if user.location_name else 'не указана'}
 
 📊 <b>Статистика:</b>
 • Рейтинг: {format_rating(rating)} ({reviews_count} отзывов)
-• Обменов: {user['total_swaps']}
-• Объявлений: {len(ads)} (активных: {active_ads})
-• Всего просмотров: {total_views}
+• Обменов: {user.total_swaps}
+• Объявлений: {counters.get('ads', 0)} (активных: {counters.get('ads_active', 0)})
+• Всего просмотров: {counters.get('views', 0)}
 """
 
+    stats = gamification_service.level_progress(user.level, user.experience_points)
+    profile_text += (
+        f"• Уровень: {stats['level']} ({stats['experience_points']} XP, "
+        f"{stats['progress_to_next_level']}% до следующего)\n"
+        f"• Достижений: {user.achievements}\n"
+    )
+
     await message.answer(profile_text)
 
     # Сообщение 2: Выбор действий с меню внизу
@@ -71,10 +80,86 @@ async def view_profile(message: Message, state: FSMContext):
     await message.answer(menu_text, reply_markup=get_profile_menu())
 
 
-@router.message(F.text == "1", ProfileStates.viewing_profile | F.state is None)
+def _my_ads_text(page, counters: Dict[str, int], number: int) -> str:
+    """Текст страницы «Моих объявлений»; нумерация сквозная по всем страницам"""
+    text = (f"<b>📋 Ваши объявления</b> ({counters.get('ads', 0)}, "
+            f"активных: {counters.get('ads_active', 0)}):\n\n")
+    first = (number - 1) * constants.MY_ADS_PAGE_SIZE + 1
+    for idx, ad in enumerate(page.items, first):
+        status = "🟢" if ad.is_active else "🔴"
+        cat_emoji = CATEGORIES[ad.category]['emoji']
+
+        text += f"{idx}. {status} <b>{escape_html(ad.title)}</b>\n"
+        text += f"   {cat_emoji} {format_price(ad.price)} | 👁 {ad.views}\n"
+        text += f"   <small>{format_date(ad.created_at)}</small>\n\n"
+    return text
+
+
+def _total_pages(count: int, size: int) -> int:
+    return max(1, -(-count // size))
+
+
+def _my_ads_kb(page, number: int, pages: int):
+    """Навигация и кнопки с номерами объявлений страницы (myad:<id> — карточка с действиями)"""
+    first = (number - 1) * constants.MY_ADS_PAGE_SIZE + 1
+    buttons = [
+        InlineKeyboardButton(text=str(idx), callback_data=f"myad:{ad.id}")
+        for idx, ad in enumerate(page.items, first)
+    ]
+    return get_keyset_pagination_kb(page, number, pages, "myads", buttons)
+
+
+async def _own_ad(user_id: int, ad_id: int):
+    """Объявление пользователя или None (чужое, не найдено)"""
+    ad = await AdModel.get_by_id(ad_id) if ad_id else None
+    return ad if ad and ad.user_tg_id == user_id else None
+
+
+def _my_ad_text(ad) -> str:
+    status = "🟢 Активно" if ad.is_active else "🔴 Снято с публикации"
+    return format_ad_text(ad.title, ad.description, ad.price, ad.location_name) + f"\n\n{status} | 👁 {ad.views}"
+
+
+# ==================== ЦЕНА ОБЪЯВЛЕНИЯ ====================
+# Выше обработчиков цифр меню: «1» здесь — цена, а не пункт меню
+
+@router.message(ProfileStates.editing_price, F.text == "◀️ Назад")
+async def cancel_edit_price(message: Message, state: FSMContext):
+    """Отмена изменения цены"""
+    await profile_action_1(message, state)
+
+
+@router.message(ProfileStates.editing_price)
+async def process_new_price(message: Message, state: FSMContext):
+    """Новая цена; подписчикам избранного уходит уведомление"""
+    text = (message.text or "").strip()
+    price = validate_price(text)
+    if price is None and text != "0":
+        await message.answer("❌ Неверный формат. Введите число в рублях (0 — бесплатно):")
+        return
+
+    data = await state.get_data()
+    try:
+        ad = await _own_ad(message.from_user.id, data.get("editing_ad_id"))
+        if ad and price != ad.price:
+            await AdModel.update_price(ad.id, price)
+            if ad.is_active:
+                favorite_notifier.submit(message.bot, price_changed(ad.id, ad.title, ad.price, price, ad.user_tg_id))
+    except Exception as e:
+        print(f"Ошибка update_price: {e}")
+        await message.answer(f"❌ Ошибка: {str(e)}")
+        return
+
+    if not ad:
+        await message.answer("❌ Объявление не найдено")
+    else:
+        await message.answer(f"✅ Цена: {format_price(price)}")
+    await profile_action_1(message, state)
+
+
 @router.message(F.text == "1")
 async def profile_action_1(message: Message, state: FSMContext):
-    """1️⃣ Мои объявления"""
+    """1️⃣ Мои объявления — первая страница, дальше листание кнопками (myads:…)"""
     # Проверяем контекст - если мы в профиле
     current_state = await state.get_state()
     
@@ -82,37 +167,157 @@ async def profile_action_1(message: Message, state: FSMContext):
     # Это нужно чтобы цифра "1" работала только в нужных местах
     
     try:
-        ads = await AdModel.get_user_ads(message.from_user.id, active_only=False)
+        page = await AdModel.get_user_ads_page(message.from_user.id)
+        counters = await UserCounterModel.get(message.from_user.id)
     except Exception as e:
-        print(f"Ошибка get_user_ads: {e}")
+        print(f"Ошибка get_user_ads_page: {e}")
         await message.answer(f"❌ Ошибка: {str(e)}")
         return
 
-    if not ads:
+    if not page.items:
         await message.answer("У вас пока нет объявлений", reply_markup=get_profile_menu())
         return
 
-    text = "<b>📋 Ваши объявления:</b>\n\n"
-
-    for idx, ad in enumerate(ads[:10], 1):
-        status = "🟢" if ad['is_active'] else "🔴"
-        cat_emoji = CATEGORIES[ad['category']]['emoji']
-
-        text += f"{idx}. {status} <b>{escape_html(ad['title'])}</b>\n"
-        text += f"   {cat_emoji} {format_price(ad['price'])} | 👁 {ad['views']}\n"
-        text += f"   <small>{format_date(ad['created_at'])}</small>\n\n"
-
-    if len(ads) > 10:
-        text += f"<i>...и ещё {len(ads) - 10}</i>\n\n"
+    pages = _total_pages(counters.get("ads", 0), constants.MY_ADS_PAGE_SIZE)
+    await message.answer(
+        _my_ads_text(page, counters, 1),
+        reply_markup=_my_ads_kb(page, 1, pages),
+    )
 
-    text += "\n<b>Что хотите сделать?</b>\n\n"
-    text += "1️⃣ Посмотреть детали (введите номер объявления)\n"
+    text = "<b>Что хотите сделать?</b>\n\n"
+    text += "1️⃣ Посмотреть детали — кнопка с номером под списком\n"
     text += "2️⃣ Создать новое\n"
     text += "3️⃣ Назад"
 
     await message.answer(text, reply_markup=get_my_ads_menu())
     await state.set_state(ProfileStates.viewing_ads)
-    await state.update_data(ads_list=[(ad['id'], ad['title']) for ad in ads])
+    await state.update_data(ads_list=[(ad.id, ad.title) for ad in page.items], ads_first=1)
+
+
+@router.callback_query(F.data.startswith("myads:"))
+async def my_ads_page(callback: CallbackQuery, state: FSMContext):
+    """Листание «Моих объявлений»: страница по курсору, сообщение редактируется на месте"""
+    after, before, number = parse_page_callback(callback.data)
+    try:
+        page = await AdModel.get_user_ads_page(callback.from_user.id, after=after, before=before)
+        if not page.items:
+            # Страница опустела (объявления удалены) — с начала
+            page, number = await AdModel.get_user_ads_page(callback.from_user.id), 1
+        counters = await UserCounterModel.get(callback.from_user.id)
+    except Exception as e:
+        print(f"Ошибка get_user_ads_page: {e}")
+        await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+        return
+
+    if not page.items:
+        await callback.message.edit_text("У вас пока нет объявлений")
+        await callback.answer()
+        return
+
+    pages = _total_pages(counters.get("ads", 0), constants.MY_ADS_PAGE_SIZE)
+    try:
+        await callback.message.edit_text(
+            _my_ads_text(page, counters, number),
+            reply_markup=_my_ads_kb(page, number, pages),
+        )
+    except TelegramBadRequest:
+        pass  # страница не изменилась
+    await callback.answer()
+    if await state.get_state() == ProfileStates.viewing_ads.state:
+        first = (number - 1) * constants.MY_ADS_PAGE_SIZE + 1
+        await state.update_data(ads_list=[(ad.id, ad.title) for ad in page.items], ads_first=first)
+
+
+# ==================== МОЁ ОБЪЯВЛЕНИЕ ====================
+
+@router.callback_query(F.data.startswith("myad:"))
+async def my_ad_details(callback: CallbackQuery):
+    """Карточка своего объявления с действиями"""
+    try:
+        ad = await _own_ad(callback.from_user.id, int(callback.data.split(":")[1]))
+    except Exception as e:
+        print(f"Ошибка get_by_id: {e}")
+        await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+        return
+    if not ad:
+        await callback.answer("❌ Объявление не найдено", show_alert=True)
+        return
+
+    await callback.message.answer(_my_ad_text(ad), reply_markup=get_my_ad_actions_kb(ad.id, bool(ad.is_active)))
+    await callback.answer()
+
+
+async def _set_active(callback: CallbackQuery, active: Optional[bool] = None):
+    """Снять с публикации (подписчикам избранного — уведомление) или вернуть; None — переключить.
+    Карточка перерисовывается"""
+    try:
+        ad = await _own_ad(callback.from_user.id, int(callback.data.split(":")[1]))
+        if ad and active is None:
+            active = not ad.is_active
+        if ad and bool(ad.is_active) != active:
+            if active:
+                await AdModel.activate(ad.id)
+            else:
+                await AdModel.deactivate(ad.id)
+                favorite_notifier.submit(callback.bot, deactivated(ad.id, ad.title, ad.user_tg_id))
+            ad = await AdModel.get_by_id(ad.id)
+    except Exception as e:
+        print(f"Ошибка toggle ad: {e}")
+        await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+        return
+    if not ad:
+        await callback.answer("❌ Объявление не найдено", show_alert=True)
+        return
+
+    try:
+        await callback.message.edit_text(_my_ad_text(ad), reply_markup=get_my_ad_actions_kb(ad.id, bool(ad.is_active)))
+    except TelegramBadRequest:
+        pass  # карточка не изменилась
+    await callback.answer("✅ Активно" if ad.is_active else "⏸ Снято с публикации")
+
+
+@router.callback_query(F.data.startswith("toggle:"))
+async def toggle_my_ad(callback: CallbackQuery):
+    """Активировать / деактивировать"""
+    await _set_active(callback)
+
+
+@router.callback_query(F.data.startswith("delete:"))
+async def delete_my_ad(callback: CallbackQuery):
+    """Удаление — снятие с публикации: на объявление ссылаются обмены и отзывы"""
+    await _set_active(callback, False)
+
+
+@router.callback_query(F.data.startswith("edit:"))
+async def edit_my_ad_price(callback: CallbackQuery, state: FSMContext):
+    """Изменение цены"""
+    try:
+        ad = await _own_ad(callback.from_user.id, int(callback.data.split(":")[1]))
+    except Exception as e:
+        print(f"Ошибка get_by_id: {e}")
+        await callback.answer(f"❌ Ошибка: {str(e)}", show_alert=True)
+        return
+    if not ad:
+        await callback.answer("❌ Объявление не найдено", show_alert=True)
+        return
+
+    await state.set_state(ProfileStates.editing_price)
+    await state.update_data(editing_ad_id=ad.id)
+    await callback.message.answer(
+        f"💰 Сейчас: {format_price(ad.price)}\n\nВведите новую цену в рублях (0 — бесплатно):",
+        reply_markup=get_create_back_only()
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data == "back_to_my_ads")
+async def back_to_my_ads(callback: CallbackQuery):
+    """Закрыть карточку — список остаётся выше"""
+    try:
+        await callback.message.delete()
+    except TelegramBadRequest:
+        pass
+    await callback.answer()
 
 
 @router.message(F.text == "2")
@@ -220,9 +425,10 @@ async def cancel_edit_phone(message: Message, state: FSMContext):
 async def process_new_contact(message: Message, state: FSMContext):
     """Обработка нового контакта"""
     phone = message.contact.phone_number
+    verified = message.contact.user_id == message.from_user.id
 
     try:
-        await UserModel.update_phone(message.from_user.id, phone)
+        await UserModel.update_phone(message.from_user.id, phone, verified=verified)
     except Exception as e:
         print(f"Ошибка update_phone: {e}")
         await message.answer(f"❌ Ошибка: {str(e)}")
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+/search [условия] — сохранённые поиски и уведомления о новых объявлениях под них.
+
+    /search                          — список поисков, удаление кнопкой с номером (ssdel:…)
+    /search iphone до 30000          — слова и цена
+    /search electronics 10 км        — категория (ключ или название) и радиус от профиля
+    /search бесплатно                — только бесплатные
+
+Новые объявления сверяет app.services.saved_searches (ads.confirm_ad_creation).
+"""
+from typing import List, Optional, Tuple
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from app.config import constants
+from app.database.crud import SavedSearchModel, UserModel
+from app.services.saved_searches import describe, parse_query, saved_search_index
+
+USAGE = (
+    "Пример: <code>/search iphone до 30000 10 км</code>\n"
+    "Категория, слова, «от N»/«до N», «бесплатно», «N км» от вашего местоположения."
+)
+
+router = Router()
+
+
+async def _render(user_id: int) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    searches = await SavedSearchModel.get_user_searches(user_id)
+    if not searches:
+        return f"🔔 <b>Сохранённых поисков нет</b>\n\n{USAGE}", None
+    lines = [f"🔔 <b>Сохранённые поиски</b> ({len(searches)}/{constants.SAVED_SEARCHES_PER_USER})\n"]
+    buttons: List[InlineKeyboardButton] = []
+    for number, search in enumerate(searches, 1):
+        lines.append(f"{number}. {describe(search.filters)}")
+        buttons.append(InlineKeyboardButton(text=f"🗑 {number}", callback_data=f"ssdel:{search.id}"))
+    lines.append("\nО новых объявлениях под эти условия бот напишет сам. Удалить — кнопка с номером.")
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=[buttons[i:i + 5] for i in range(0, len(buttons), 5)])
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject):
+    user_id = message.from_user.id
+    if not command.args:
+        text, kb = await _render(user_id)
+        await message.answer(text, reply_markup=kb)
+        return
+
+    user = await UserModel.get_profile(user_id)
+    try:
+        filters = parse_query(command.args, user.latitude if user else None, user.longitude if user else None)
+    except ValueError as e:
+        await message.answer(f"{e}\n\n{USAGE}")
+        return
+
+    search_id = await saved_search_index.save(user_id, command.args.strip()[:64], filters)
+    if search_id is None:
+        await message.answer(
+            f"❌ Не больше {constants.SAVED_SEARCHES_PER_USER} поисков. Удалите лишние: /search"
+        )
+        return
+    await message.answer(f"🔔 Поиск сохранён: {describe(filters)}\n\nСообщу о новых объявлениях. Все поиски: /search")
+
+
+@router.callback_query(F.data.startswith("ssdel:"))
+async def delete_search(callback: CallbackQuery):
+    search_id = int(callback.data.split(":")[1])
+    deleted = await saved_search_index.delete(callback.from_user.id, search_id)
+    await callback.answer("🗑 Поиск удалён" if deleted else "Поиск уже удалён")
+    text, kb = await _render(callback.from_user.id)
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest:
+        pass
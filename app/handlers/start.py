@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 from aiogram import Router, F
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
-from app.database.models import UserModel
+from app.database.crud import UserModel
+from app.services.referrals import referral_queue
 from app.keyboards.main_menu import get_main_menu, get_location_request_kb, get_phone_request_kb
 from app.states.user_states import RegistrationStates
 from app.config import constants
@@ -16,8 +17,8 @@ router = Router()
 
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext):
-    """Команда /start"""
+async def cmd_start(message: Message, state: FSMContext, command: CommandObject = None):
+    """Команда /start (/start <реферальный код> — переход по приглашению)"""
     await state.clear()
 
     user = await UserModel.get_or_create(
@@ -26,8 +27,12 @@ async def cmd_start(message: Message, state: FSMContext):
         message.from_user.first_name or "Пользователь"
     )
 
+    if command and command.args:
+        # Бонусы начисляются пачками (referrals.ReferralQueue), /start не ждёт транзакции
+        referral_queue.submit(command.args, message.from_user.id)
+
     # Если пользователь новый и не указал местоположение
-    if not user['latitude']:
+    if not user.latitude:
         await message.answer(MESSAGES['welcome'])
         await message.answer(
             "📍 Пожалуйста, поделитесь своим местоположением, чтобы находить товары рядом с вами:",
@@ -36,7 +41,7 @@ async def cmd_start(message: Message, state: FSMContext):
         await state.set_state(RegistrationStates.waiting_for_location)
     else:
         await message.answer(
-            f"С возвращением, {user['name']}! 👋\n\n🏠 Главная страница",
+            f"С возвращением, {user.name}! 👋\n\n🏠 Главная страница",
             reply_markup=get_main_menu()
         )
 
@@ -83,8 +88,9 @@ async def back_from_reg_location(message: Message, state: FSMContext):
 async def process_contact(message: Message, state: FSMContext):
     """Обработка контакта"""
     phone = message.contact.phone_number
+    verified = message.contact.user_id == message.from_user.id
 
-    await UserModel.update_phone(message.from_user.id, phone)
+    await UserModel.update_phone(message.from_user.id, phone, verified=verified)
 
     await state.clear()
     await message.answer(
@@ -150,6 +156,8 @@ async def cmd_help(message: Message):
 🔥 <b>Смотреть объявления</b> - просмотр товаров для обмена
 ➕ <b>Создать объявление</b> - размещение своего товара
 💬 <b>Мои предложения</b> - входящие и исходящие предложения
+⭐ <b>Избранное</b> - сохранённые объявления
+🔔 <b>/search</b> - сохранённые поиски: бот сообщит о новых объявлениях
 👤 <b>Профиль</b> - управление вашими данными
 
 <b>Как это работает:</b>
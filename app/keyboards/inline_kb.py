@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from app.config import constants
+from app.database.records import Page
 
 CATEGORIES = constants.CATEGORIES
 
@@ -114,4 +115,43 @@ def get_pagination_kb(current_page: int, total_pages: int, prefix: str = "page")
     if nav_buttons:
         buttons.append(nav_buttons)
 
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
\ No newline at end of file
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def get_keyset_pagination_kb(page: Page, number: int, total_pages: int, prefix: str,
+                             item_buttons: List[InlineKeyboardButton] = None) -> Optional[InlineKeyboardMarkup]:
+    """Навигация по keyset-странице: в кнопке курсор соседней страницы и её номер (номер — только для подписи).
+    item_buttons — кнопки строк страницы, по 5 в ряд над навигацией"""
+    buttons = [item_buttons[i:i + 5] for i in range(0, len(item_buttons or ()), 5)]
+    if page.before is None and page.after is None:
+        return InlineKeyboardMarkup(inline_keyboard=buttons) if buttons else None
+
+    nav_buttons = []
+    if page.before is not None:
+        nav_buttons.append(InlineKeyboardButton(text="◀️", callback_data=f"{prefix}:b:{page.before}:{number - 1}"))
+
+    nav_buttons.append(InlineKeyboardButton(text=f"{number}/{max(total_pages, number)}", callback_data="ignore"))
+
+    if page.after is not None:
+        nav_buttons.append(InlineKeyboardButton(text="▶️", callback_data=f"{prefix}:a:{page.after}:{number + 1}"))
+
+    buttons.append(nav_buttons)
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def page_origin(after: Optional[int], before: Optional[int], number: int) -> str:
+    """Как получена страница — хвост callback_data для parse_page_callback (f — первая)"""
+    if after is not None:
+        return f"a:{after}:{number}"
+    if before is not None:
+        return f"b:{before}:{number}"
+    return f"f:0:{number}"
+
+
+def parse_page_callback(data: str) -> Tuple[Optional[int], Optional[int], int]:
+    """<prefix>:<a|b|f>:<курсор>:<номер> → (after, before, номер страницы)"""
+    _, direction, cursor, number = data.rsplit(":", 3)
+    if direction == "a":
+        return int(cursor), None, int(number)
+    if direction == "b":
+        return None, int(cursor), int(number)
+    return None, None, int(number)
@@ -14,7 +14,7 @@ def get_main_menu() -> ReplyKeyboardMarkup:
     kb = [
         [KeyboardButton(text="🔥 Смотреть объявления")],
         [KeyboardButton(text="➕ Создать объявление")],
-        [KeyboardButton(text="💬 Мои предложения")],
+        [KeyboardButton(text="💬 Мои предложения"), KeyboardButton(text="⭐ Избранное")],
         [KeyboardButton(text="👤 Профиль")]
     ]
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
@@ -46,7 +46,7 @@ def get_browse_menu() -> ReplyKeyboardMarkup:
     kb = [
         [KeyboardButton(text="👎 Далее"), KeyboardButton(text="❤️ Обмен")],
         [KeyboardButton(text="⭐ Избранное"), KeyboardButton(text="👤 Автор")],
-        [KeyboardButton(text="🏠 Главная")]
+        [KeyboardButton(text="🔎 Похожие"), KeyboardButton(text="🏠 Главная")]
     ]
     return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True)
 
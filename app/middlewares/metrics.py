@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Замер хендлеров и запросов к Bot API (регистрируется при METRICS_ENABLED)"""
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from app.utils.metrics import metrics
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware для dp.message / dp.callback_query: время и ошибки по хендлеру"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        labels = (("handler", data["handler"].callback.__name__),)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.inc("swapbot_handler_errors_total", labels)
+            raise
+        finally:
+            metrics.observe("swapbot_handler_seconds", labels, time.perf_counter() - started)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого вызова Bot API"""
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            metrics.observe("swapbot_telegram_request_seconds", (("method", method.__api_method__),),
+                            time.perf_counter() - started)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Упорядоченная обработка обновлений.
+
+Обновления одного чата выполняются строго по очереди (быстрые нажатия «👎 Далее»
+не гоняются за одним last_ad_id в FSM), разные чаты — параллельно, но не больше
+UPDATE_CONCURRENCY одновременно. Когда в работе UPDATE_MAX_PENDING обновлений,
+приём новых приостанавливается (backpressure для polling и webhook).
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class UpdateScheduler:
+    """Очереди по ключу (chat_id) с общим лимитом параллельности"""
+
+    def __init__(self, concurrency: int = 64, max_pending: int = 1000):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._queues: Dict[Hashable, Deque[Job]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._pending = 0
+        self._space = asyncio.Event()
+        self._space.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def submit(self, key: Hashable, job: Job):
+        """Поставить задачу в очередь ключа; ждёт, если очередь переполнена"""
+        while self._pending >= self.max_pending:
+            self._space.clear()
+            await self._space.wait()
+
+        self._pending += 1
+        self._idle.clear()
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append(job)
+            return
+
+        self._queues[key] = deque([job])
+        task = asyncio.create_task(self._run_key(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_key(self, key: Hashable):
+        queue = self._queues[key]
+        try:
+            while queue:
+                job = queue[0]
+                try:
+                    async with self._semaphore:
+                        await job()
+                except Exception as e:
+                    logger.exception(f"Ошибка обработки обновления (ключ {key}): {e}")
+                finally:
+                    queue.popleft()
+                    self._pending -= 1
+                    self._space.set()
+                    if not self._pending:
+                        self._idle.set()
+        finally:
+            # Между последней проверкой очереди и удалением нет await — гонки нет
+            del self._queues[key]
+
+    async def join(self, timeout: Optional[float] = None) -> bool:
+        """Дождаться выполнения всех задач; False — если не успели за timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class ChatOrderingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware для dp.update: передаёт обработку в UpdateScheduler.
+
+    Возвращается сразу после постановки в очередь, поэтому цикл приёма
+    обновлений не ждёт хендлеры, а упирается только в лимит UPDATE_MAX_PENDING.
+    Исключения хендлеров из очереди уходят в обработчики ошибок router
+    (dp.errors и errors роутеров), как при обычной обработке.
+    """
+
+    def __init__(self, scheduler: UpdateScheduler, router: Router):
+        self.scheduler = scheduler
+        self.errors = ErrorsMiddleware(router)
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any],
+    ) -> Any:
+        chat = data.get("event_chat")
+        user = data.get("event_from_user")
+        key = chat.id if chat else (user.id if user else None)
+        if key is None:
+            return await handler(event, data)
+
+        await self.scheduler.submit(key, lambda: self.errors(handler, event, data))
+        # Обновление принято в очередь — для dispatcher оно обработано; результат
+        # хендлера (ответ методом в webhook) при отложенной обработке не используется
+        return True
@@ -7,6 +7,13 @@ from app.services import (
     gamification,
     security,
     avito_parser,
+    dedup,
+    media,
+    events,
+    leaderboard,
+    referrals,
+    favorites,
+    saved_searches,
 )
 
 __all__ = [
@@ -17,4 +24,11 @@ __all__ = [
     "gamification",
     "security",
     "avito_parser",
+    "dedup",
+    "media",
+    "events",
+    "leaderboard",
+    "referrals",
+    "favorites",
+    "saved_searches",
 ]
@@ -9,7 +9,9 @@ from sentence_transformers import SentenceTransformer
 from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.crud import AdModel
 from app.database.models_orm import Ad, User, Like, AdView
+from app.database.records import AdRecord
 from app.config import settings
 
 
@@ -62,47 +64,39 @@ class AIRecommendationService:
 
     async def get_similar_ads(
             self,
-            ad_id: int,
-            session: AsyncSession,
-            limit: int = 10
-    ) -> List[Ad]:
-        """Поиск похожих объявлений по векторной близости"""
-
-        # Получаем объявление
-        result = await session.execute(
-            select(Ad).where(Ad.id == ad_id)
-        )
-        target_ad = result.scalar_one_or_none()
-
-        if not target_ad or not target_ad.embedding:
-            return []
-
-        target_embedding = np.array(target_ad.embedding.get("embedding", []))
-
-        # Получаем все активные объявления той же категории
-        result = await session.execute(
-            select(Ad).where(
-                and_(
-                    Ad.category == target_ad.category,
-                    Ad.status == "active",
-                    Ad.id != ad_id
-                )
+            ad: AdRecord,
+            viewer_tg_id: int,
+            limit: int = 5
+    ) -> List[AdRecord]:
+        """
+        Похожие активные объявления той же категории (кнопка «🔎 Похожие» в ленте).
+
+        Кандидаты — последние AI_SIMILAR_CANDIDATES чужих объявлений категории через crud
+        (любой DB_BACKEND); близость — косинус эмбеддингов с USE_AI_RECOMMENDATIONS,
+        без модели — доля общих ключевых слов (_extract_tags).
+        """
+        candidates = [
+            candidate for candidate in await AdModel.get_category_ads(
+                ad.category, viewer_tg_id, settings.AI_SIMILAR_CANDIDATES
             )
-        )
-        ads = result.scalars().all()
+            if candidate.id != ad.id
+        ]
+        if not candidates:
+            return []
 
-        # Вычисляем косинусное сходство
-        similarities = []
-        for ad in ads:
-            if ad.embedding and ad.embedding.get("embedding"):
-                ad_embedding = np.array(ad.embedding["embedding"])
-                similarity = self._cosine_similarity(target_embedding, ad_embedding)
-                similarities.append((ad, similarity))
+        texts = [f"{item.title}. {item.description or ''}" for item in (ad, *candidates)]
+        if self.model:
+            # Одним батчем: объявление и все кандидаты
+            vectors = self.model.encode(texts, convert_to_numpy=True)
+            scores = [self._cosine_similarity(vectors[0], vector) for vector in vectors[1:]]
+        else:
+            tags = [set(await self._extract_tags(text)) for text in texts]
+            scores = [len(tags[0] & other) / len(tags[0] | other) if tags[0] | other else 0.0 for other in tags[1:]]
 
         # Сортируем по сходству
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        ranked = sorted(zip(scores, candidates), key=lambda pair: pair[0], reverse=True)
 
-        return [ad for ad, _ in similarities[:limit]]
+        return [candidate for score, candidate in ranked[:limit] if score > 0]
 
     def _cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
         """Вычисление косинусного сходства"""
@@ -1,7 +1,29 @@
 # -*- coding: utf-8 -*-
-"""Аналитика (заглушка)."""
+"""
+Аналитика: дневные строки из счётчиков статистики.
+
+Счётчики ведут триггеры БД (app.database.db.STATS_TRIGGERS), здесь — только
+периодическая свёртка в таблицу analytics.
+"""
+import asyncio
+import logging
+
 from app.config import settings
+from app.database.models import StatsModel
+
+logger = logging.getLogger(__name__)
 
 
 def analytics_enabled() -> bool:
     return getattr(settings, "ANALYTICS_ENABLED", False)
+
+
+async def rollup_loop(interval: int = None):
+    """Свёртка дневных строк раз в interval секунд (строка текущего дня обновляется)"""
+    interval = interval or settings.ANALYTICS_ROLLUP_INTERVAL
+    while True:
+        try:
+            await StatsModel.rollup()
+        except Exception as e:
+            logger.warning(f"Не удалось свернуть аналитику: {e}")
+        await asyncio.sleep(interval)
@@ -9,10 +9,17 @@ import aiohttp
 from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
 import asyncio
+import logging
 import re
 from urllib.parse import urljoin
 
 from app.config import settings
+from app.services.dedup import dedup_service
+from app.services.media import media_service
+from app.services.saved_searches import ad_published
+from app.database.crud import AdModel
+
+logger = logging.getLogger(__name__)
 
 
 class AvitoParserService:
@@ -174,26 +181,102 @@ class AvitoParserService:
         Импорт объявления в бота
 
         Returns:
-            Подготовленные данные для создания объявления
+            Подготовленные данные для создания объявления.
+            Если такое объявление уже импортировано, в "duplicate_of" будет ID оригинала.
         """
-        # Загружаем изображение если есть
-        photo_data = None
-        if ad_data.get("image_url"):
-            photo_data = await self.download_image(ad_data["image_url"])
-
-        return {
+        title = ad_data["title"][:150]  # Ограничиваем длину
+        description = (
+            f"{ad_data['description']}\n\n"
+            f"🔗 Источник: {ad_data.get('link', 'Avito')}"
+        )[:500]
+        result = {
             "user_id": user_id,
             "category": category,
-            "title": ad_data["title"][:150],  # Ограничиваем длину
-            "description": (
-                f"{ad_data['description']}\n\n"
-                f"🔗 Источник: {ad_data.get('link', 'Avito')}"
-            )[:500],
+            "title": title,
+            "description": description,
             "price": ad_data.get("price"),
-            "photo_data": photo_data,
+            "photo_data": None,
+            "photo_hash": None,
+            "media": None,
             "location_name": ad_data.get("location"),
+            "duplicate_of": None,
         }
 
+        # Дубликат по тексту — фото даже не скачиваем
+        result["duplicate_of"] = await dedup_service.check(title, description)
+        if result["duplicate_of"]:
+            return result
+
+        # Загружаем и обрабатываем изображение (уже виденный URL не скачивается)
+        if ad_data.get("image_url"):
+            result["media"] = await media_service.fetch(ad_data["image_url"], self.download_image)
+        if result["media"]:
+            result["photo_data"] = await media_service.get(result["media"]["keys"]["telegram"])
+            result["photo_hash"] = result["media"]["photo_hash"]
+            if result["photo_hash"] is not None:
+                result["duplicate_of"] = await dedup_service.check(title, description, result["photo_hash"])
+
+        return result
+
+    async def publish_import(self, bot, imported: Dict) -> Optional[int]:
+        """
+        Создание объявления из результата import_ad_to_bot
+
+        Фото загружается в Telegram только если этой картинки ещё нет в реестре file_id;
+        полученный file_id (или None) записывается в imported["photo_file_id"].
+
+        Returns:
+            ID объявления (или оригинала, если это дубликат)
+        """
+        if imported.get("duplicate_of"):
+            return imported["duplicate_of"]
+
+        photo_file_id = None
+        if imported.get("photo_data"):
+            digest = imported["media"]["digest"] if imported.get("media") else None
+            try:
+                photo_file_id = await media_service.ensure_file_id(bot, imported["photo_data"], digest)
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить фото импорта «{imported['title']}»: {e}")
+            if photo_file_id is None and not settings.MEDIA_UPLOAD_CHAT_ID:
+                # Новую картинку загрузить некуда — объявление создаётся без фото
+                logger.warning(f"MEDIA_UPLOAD_CHAT_ID не задан: импорт «{imported['title']}» без фото")
+        imported["photo_file_id"] = photo_file_id
+
+        price = imported.get("price")
+        ad_id = await AdModel.create(
+            user_tg_id=imported["user_id"],
+            category=imported["category"],
+            title=imported["title"],
+            description=imported["description"],
+            price=str(price) if price else None,
+            photo_file_id=photo_file_id,
+            location_name=imported.get("location_name"),
+            photo_hash=imported.get("photo_hash"),
+        )
+        await ad_published(bot, ad_id)
+        return ad_id
+
+    async def import_search(self, bot, query: str, user_id: int, category: str, limit: int = 20) -> Dict[str, int]:
+        """
+        Поиск на Avito и публикация найденного от имени user_id
+
+        Returns:
+            {"found", "created", "duplicates", "without_photo"}
+        """
+        stats = {"found": 0, "created": 0, "duplicates": 0, "without_photo": 0}
+        for ad_data in await self.search_ads(query, category, limit=limit):
+            stats["found"] += 1
+            imported = await self.import_ad_to_bot(ad_data, user_id, category)
+            if imported["duplicate_of"]:
+                stats["duplicates"] += 1
+                continue
+            await self.publish_import(bot, imported)
+            stats["created"] += 1
+            if imported.get("photo_data") and not imported["photo_file_id"]:
+                stats["without_photo"] += 1
+        return stats
+
 
 # Singleton instance
 avito_parser = AvitoParserService()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Поиск и схлопывание почти-дубликатов объявлений.
+
+Сигнатуры (SimHash текста, dHash фото) хранятся в ads, LSH-корзины — в ad_signatures.
+Проверка при вставке — несколько точечных запросов по индексу корзин (AdModel обоих
+бэкендов); пакетные пересчёт и схлопывание читают файл SQLite — только DB_BACKEND=sqlite.
+"""
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from app.config import constants, get_db_path
+from app.utils.hashing import (
+    ad_text_hash, hamming, from_sqlite_int, to_sqlite_int,
+    TEXT_MAX_DISTANCE, PHOTO_MAX_DISTANCE,
+)
+from app.database.crud import AdModel, require_sqlite
+from app.database.models import write_ad_signatures
+
+logger = logging.getLogger(__name__)
+
+
+class DedupService:
+    """Сервис поиска дубликатов"""
+
+    async def backfill_signatures(self, batch_size: int = 1000) -> int:
+        """Расчёт текстовых сигнатур для объявлений, созданных до появления индекса"""
+        require_sqlite("Пересчёт сигнатур")
+        total = 0
+        async with aiosqlite.connect(get_db_path()) as db:
+            last_id = 0
+            while True:
+                cursor = await db.execute(
+                    "SELECT id, title, description, photo_hash FROM ads WHERE text_hash IS NULL AND id>? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                )
+                rows = await cursor.fetchall()
+                if not rows:
+                    break
+
+                updates = []
+                for ad_id, title, description, photo_hash in rows:
+                    text_hash = ad_text_hash(title, description)
+                    updates.append((to_sqlite_int(text_hash), ad_id))
+                    await write_ad_signatures(db, ad_id, text_hash, from_sqlite_int(photo_hash))
+
+                await db.executemany("UPDATE ads SET text_hash=? WHERE id=?", updates)
+                await db.commit()
+                total += len(rows)
+                last_id = rows[-1][0]
+
+        logger.info(f"Сигнатуры рассчитаны для {total} объявлений")
+        return total
+
+    async def find_duplicate_groups(self, same_user_only: bool = True) -> List[List[int]]:
+        """
+        Группы почти-дубликатов среди всех объявлений.
+
+        Кандидаты берутся только из общих LSH-корзин, затем проверяется
+        расстояние Хэмминга; группы объединяются через union-find.
+        """
+        require_sqlite("Поиск групп дубликатов")
+        async with aiosqlite.connect(get_db_path()) as db:
+            cursor = await db.execute("SELECT id, user_tg_id, text_hash, photo_hash FROM ads")
+            ads = {
+                row[0]: (row[1], from_sqlite_int(row[2]), from_sqlite_int(row[3]))
+                for row in await cursor.fetchall()
+            }
+            cursor = await db.execute(
+                "SELECT kind, GROUP_CONCAT(ad_id) FROM ad_signatures GROUP BY kind, band, bucket HAVING COUNT(*) > 1"
+            )
+            buckets = await cursor.fetchall()
+
+        parent: Dict[int, int] = {}
+
+        def find(x: int) -> int:
+            while parent.get(x, x) != x:
+                parent[x] = parent.get(parent[x], parent[x])
+                x = parent[x]
+            return x
+
+        def union(a: int, b: int):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+        for kind, ids in buckets:
+            index, max_distance = (1, TEXT_MAX_DISTANCE) if kind == "t" else (2, PHOTO_MAX_DISTANCE)
+            members = sorted(int(x) for x in ids.split(",") if int(x) in ads)
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    if same_user_only and ads[a][0] != ads[b][0]:
+                        continue
+                    sa, sb = ads[a][index], ads[b][index]
+                    if sa is not None and sb is not None and hamming(sa, sb) <= max_distance:
+                        union(a, b)
+
+        groups: Dict[int, List[int]] = {}
+        for ad_id in parent:
+            groups.setdefault(find(ad_id), []).append(ad_id)
+        return [sorted(set(members) | {root}) for root, members in groups.items()]
+
+    async def collapse_duplicates(self, dry_run: bool = False) -> List[Tuple[int, int]]:
+        """
+        Пакетное схлопывание: в каждой группе объявлений одного пользователя остаётся
+        самое старое, остальные деактивируются. Чужие объявления не трогаются никогда.
+
+        Returns:
+            Список пар (дубликат, оригинал)
+        """
+        collapsed = []
+        for group in await self.find_duplicate_groups(same_user_only=True):
+            original = group[0]
+            collapsed.extend((ad_id, original) for ad_id in group[1:])
+
+        if collapsed and not dry_run:
+            async with aiosqlite.connect(get_db_path()) as db:
+                await db.executemany(
+                    "UPDATE ads SET is_active=?, updated_at=CURRENT_TIMESTAMP WHERE id=?",
+                    [(constants.AD_STATUS_INACTIVE, ad_id) for ad_id, _ in collapsed],
+                )
+                await db.commit()
+
+        logger.info(f"Найдено дубликатов: {len(collapsed)}")
+        return collapsed
+
+    async def check(self, title: str, description: Optional[str], photo_hash: Optional[int] = None,
+                    user_tg_id: Optional[int] = None) -> Optional[int]:
+        """ID оригинала, если объявление — почти-дубликат"""
+        return await AdModel.find_duplicate(title, description, photo_hash, user_tg_id)
+
+
+# Singleton
+dedup_service = DedupService()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Шина событий для живой ленты админки (admin/feed.py).
+
+Бот и админка — разные процессы, поэтому источник событий — журнал events, который
+пишут триггеры БД (db.EVENT_TRIGGERS) на создании объявлений, предложений обмена,
+смене их статуса и жалобах. В процессе админки один цикл EventBus.run читает журнал
+по id раз в EVENTS_POLL_INTERVAL и раздаёт новые события подписчикам — сколько бы
+дашбордов ни было открыто, к БД идёт один запрос.
+
+У каждого подписчика своя ограниченная очередь (EVENTS_SUBSCRIBER_QUEUE). Медленный
+клиент, не успевший её разобрать, не тормозит остальных: очередь сбрасывается, ему
+приходит OVERFLOW, и он переподключается с Last-Event-ID, дочитывая пропущенное из журнала.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional, Set
+
+from app.config import settings
+from app.database.models import EventModel
+from app.database.pool import ReadOnlyPool
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("ad_created", "swap_proposed", "swap_status", "report_filed")
+BATCH = 500
+PRUNE_INTERVAL = 3600
+
+OVERFLOW = object()  # маркер в очереди: подписчик отстал и отключён
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    payload: str  # JSON-объект из журнала, отдаётся клиенту как есть
+    created_at: str
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {self.payload}\n\n"
+
+
+class Subscription:
+    """Очередь событий одного клиента"""
+
+    def __init__(self, types: Optional[FrozenSet[str]], size: int):
+        self.types = types
+        self.queue: asyncio.Queue = asyncio.Queue(size)
+
+    def wants(self, event: Event) -> bool:
+        return self.types is None or event.type in self.types
+
+
+class EventBus:
+    """Чтение журнала events и раздача событий подписчикам"""
+
+    def __init__(self, pool: ReadOnlyPool, poll_interval: float = None, queue_size: int = None):
+        self.pool = pool
+        self.poll_interval = poll_interval or settings.EVENTS_POLL_INTERVAL
+        self.queue_size = queue_size or settings.EVENTS_SUBSCRIBER_QUEUE
+        self.subscribers: Set[Subscription] = set()
+        self.last_id: Optional[int] = None
+
+    def subscribe(self, types: Optional[FrozenSet[str]] = None) -> Subscription:
+        subscription = Subscription(types, self.queue_size)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def publish(self, events: List[Event]):
+        for subscription in list(self.subscribers):
+            for event in events:
+                if not subscription.wants(event):
+                    continue
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self._evict(subscription)
+                    break
+
+    def _evict(self, subscription: Subscription):
+        self.unsubscribe(subscription)
+        queue = subscription.queue
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(OVERFLOW)
+        logger.info("Подписчик ленты не успевает читать события и отключён")
+
+    async def replay(self, after_id: int, types: Optional[FrozenSet[str]] = None, limit: int = BATCH) -> List[Event]:
+        """События журнала после after_id (для возобновления по курсору)"""
+        sql = "SELECT id, type, payload, created_at FROM events WHERE id > ?"
+        params: list = [after_id]
+        if types:
+            sql += f" AND type IN ({', '.join('?' * len(types))})"
+            params += sorted(types)
+        async with self.pool.acquire() as db:
+            async with db.execute(sql + " ORDER BY id LIMIT ?", params + [limit]) as rows:
+                return [Event(*row) for row in await rows.fetchall()]
+
+    async def _start_id(self) -> int:
+        async with self.pool.acquire() as db:
+            async with db.execute("SELECT COALESCE(MAX(id), 0) FROM events") as rows:
+                return (await rows.fetchone())[0]
+
+    async def poll(self) -> int:
+        """Один проход по журналу; возвращает число разосланных событий"""
+        if self.last_id is None:
+            self.last_id = await self._start_id()
+        total = 0
+        while True:
+            events = await self.replay(self.last_id)
+            if not events:
+                return total
+            self.last_id = events[-1].id
+            self.publish(events)
+            total += len(events)
+            if len(events) < BATCH:
+                return total
+
+    async def run(self):
+        """Цикл чтения журнала; раз в час удаляет события старше EVENTS_RETENTION_DAYS"""
+        pruned_at = 0.0
+        while True:
+            try:
+                await self.poll()
+                if time.monotonic() - pruned_at > PRUNE_INTERVAL:
+                    pruned_at = time.monotonic()
+                    await EventModel.prune(settings.EVENTS_RETENTION_DAYS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать журнал событий: {e}")
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Избранное: наборы пользователей в памяти и рассылка изменений объявлений.
+
+Карточка ленты отмечает объявления из избранного без запроса на каждую карточку:
+набор ad_id пользователя читается одним запросом при первом обращении и дальше живёт
+в памяти процесса (LRU на FAVORITES_CACHED_USERS пользователей). Добавление и удаление
+идут через сервис и сразу правят набор. Обновления одного пользователя обрабатывает
+один процесс (app.cluster раздаёт их по user_id); за балансировщиком webhook набор
+перечитывается не реже раза в FAVORITES_CACHE_TTL секунд.
+
+Смена цены и снятие объявления ставятся в очередь (FavoriteNotifier.submit). Цикл
+рассылки собирает пачку изменений (до FAVORITES_NOTIFY_BATCH или за
+FAVORITES_NOTIFY_INTERVAL), одним запросом находит всех, у кого эти объявления в
+избранном (индекс favorites(ad_id)), и отправляет каждому одно сообщение на пачку —
+не чаще FAVORITES_NOTIFY_RATE сообщений в секунду (app.services.notifications).
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.database.crud import FavoriteModel
+from app.services.notifications import BatchNotifier
+from app.utils.formatters import escape_html, format_price
+
+
+class FavoritesService:
+    """Кеш наборов избранного процесса"""
+
+    def __init__(self, max_users: int = None, ttl: float = None):
+        self.max_users = max_users or settings.FAVORITES_CACHED_USERS
+        self.ttl = ttl if ttl is not None else settings.FAVORITES_CACHE_TTL
+        self.cache: OrderedDict[int, Tuple[float, Set[int]]] = OrderedDict()
+
+    async def ids(self, user_id: int) -> Set[int]:
+        """Набор ad_id избранного пользователя"""
+        cached = self.cache.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            self.cache.move_to_end(user_id)
+            return cached[1]
+        ids = set(await FavoriteModel.ad_ids(user_id))
+        self.cache[user_id] = (time.monotonic(), ids)
+        self.cache.move_to_end(user_id)
+        while len(self.cache) > self.max_users:
+            self.cache.popitem(last=False)
+        return ids
+
+    async def contains(self, user_id: int, ad_id: int) -> bool:
+        return ad_id in await self.ids(user_id)
+
+    async def add(self, user_id: int, ad_id: int) -> bool:
+        """False — уже в избранном"""
+        added = await FavoriteModel.add(user_id, ad_id)
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            cached[1].add(ad_id)
+        return added
+
+    async def remove(self, user_id: int, ad_id: int) -> bool:
+        """False — не было в избранном"""
+        removed = await FavoriteModel.remove(user_id, ad_id)
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            cached[1].discard(ad_id)
+        return removed
+
+
+@dataclass(frozen=True)
+class AdChange:
+    """Изменение объявления для подписчиков: text — строка уведомления"""
+    ad_id: int
+    text: str
+    owner_id: Optional[int] = None  # владельцу не отправляется
+
+
+def price_changed(ad_id: int, title: str, old_price: Optional[str], new_price: Optional[str],
+                  owner_id: Optional[int] = None) -> AdChange:
+    return AdChange(ad_id, f"{escape_html(title)}: {format_price(old_price)} → {format_price(new_price)}", owner_id)
+
+
+def deactivated(ad_id: int, title: str, owner_id: Optional[int] = None) -> AdChange:
+    return AdChange(ad_id, f"🔴 {escape_html(title)}: снято с публикации", owner_id)
+
+
+class FavoriteNotifier(BatchNotifier):
+    """Очередь изменений объявлений с пакетной рассылкой подписчикам"""
+
+    HEADER = "⭐ <b>Изменения в избранном</b>"
+    NAME = "уведомлений избранного"
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None, rate: int = None,
+                 max_pending: int = None):
+        super().__init__(
+            batch_size or settings.FAVORITES_NOTIFY_BATCH,
+            flush_interval or settings.FAVORITES_NOTIFY_INTERVAL,
+            rate or settings.FAVORITES_NOTIFY_RATE,
+            max_pending or settings.FAVORITES_QUEUE_SIZE,
+        )
+
+    async def recipients(self, batch: List[AdChange]) -> Dict[int, List[str]]:
+        """{пользователь: строки уведомления} по всем объявлениям пачки — один запрос"""
+        changes: Dict[int, List[AdChange]] = {}
+        for change in batch:
+            changes.setdefault(change.ad_id, []).append(change)
+        messages: Dict[int, List[str]] = {}
+        for ad_id, user_id in await FavoriteModel.subscribers(list(changes)):
+            for change in changes[ad_id]:
+                if user_id != change.owner_id:
+                    messages.setdefault(user_id, []).append(change.text)
+        return messages
+
+
+# Singleton
+favorites_service = FavoritesService()
+favorite_notifier = FavoriteNotifier()
@@ -2,217 +2,307 @@
 """
 Геймификация: уровни, достижения, реферальная программа (Идея #6)
 """
+from bisect import bisect_right
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime
-from sqlalchemy import select, and_, func
+from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.models_orm import User, Swap, Ad, Rating
-from app.config import settings
+from app.database.models_orm import User, AchievementProgress, UserAchievement
+from app.services.referrals import apply_referrals
+
+
+# Порог XP уровня: LEVEL_THRESHOLDS[level - 1]; уровень по XP — бинарный поиск
+LEVEL_THRESHOLDS = (0, 50, 150, 300, 500, 800, 1200, 1700, 2300, 3000)
+MAX_LEVEL = len(LEVEL_THRESHOLDS)
+
+LEVEL_PERKS = (
+    [],
+    ["🎁 Бесплатное поднятие 1 раз в неделю"],
+    ["🎁 2 бесплатных поднятия в неделю"],
+    ["⭐ Значок верифицированного", "🎁 3 поднятия в неделю"],
+    ["👑 VIP значок", "🎯 Приоритет в поиске", "🎁 5 поднятий"],
+    ["💎 Премиум на месяц бесплатно"],
+    ["🔥 Выделение объявлений цветом"],
+    ["⚡ Безлимитные поднятия"],
+    ["🎖 Статус легенды", "💰 Скидка 50% на все услуги"],
+    ["👑 Пожизненный Premium", "🌟 Уникальный значок"],
+)
+
+
+def level_for_xp(xp: int) -> int:
+    """Уровень по опыту (1..MAX_LEVEL)"""
+    return max(1, bisect_right(LEVEL_THRESHOLDS, xp))
+
+
+# Пороги достижений, от которых зависят запросы на горячих путях:
+# номер пользователя считается не дальше EARLY_ADOPTERS + 1, а просмотр учитывается
+# в достижениях только на AD_VIEW_MILESTONES (просмотры растут по одному — порог не проскочить)
+EARLY_ADOPTERS = 100
+POPULAR_AD_VIEWS = 100
+AD_VIEW_MILESTONES = frozenset({POPULAR_AD_VIEWS})
+
+# Счётчики прогресса по событиям: событие → (счётчик, как обновлять)
+#   add — прибавить amount, max — максимум из значения и value, set — записать value
+EVENT_COUNTERS = {
+    "swap_completed": ("swaps_completed", "add"),
+    "ad_viewed": ("max_ad_views", "max"),  # value — просмотры объявления, достигшие AD_VIEW_MILESTONES
+    "rating_received": ("ratings_received", "add"),
+    "referral": ("referrals", "add"),
+    "registered": ("registration_rank", "set"),  # value — номер пользователя, не больше EARLY_ADOPTERS + 1
+}
+
+
+def swap_completion_xp(rating: float, successful_swaps: int) -> int:
+    """XP за завершённый обмен: база, бонус за рейтинг и за каждый пятый обмен (successful_swaps — уже с ним)"""
+    xp = 20
+    if rating >= 4.5:
+        xp += 5
+    if successful_swaps > 0 and successful_swaps % 5 == 0:
+        xp += 10
+    return xp
+
+
+def _index_by_event(achievements: Dict[str, Dict]) -> Dict[str, List[str]]:
+    """Событие → id достижений, проверяемых после него"""
+    index: Dict[str, List[str]] = {}
+    for achievement_id, achievement in achievements.items():
+        for event in achievement["events"]:
+            index.setdefault(event, []).append(achievement_id)
+    return index
 
 
 class GamificationService:
     """Сервис геймификации"""
 
-    # Достижения
+    # Достижения: events — события, после которых условие проверяется,
+    # requirement(user, value) — условие по значению счётчика события
     ACHIEVEMENTS = {
         "first_swap": {
             "name_ru": "Первый обмен",
             "name_en": "First Swap",
             "description_ru": "Совершите первый обмен",
             "emoji": "🎉",
-            "points": 10
+            "points": 10,
+            "events": ("swap_completed",),
+            "requirement": lambda user, value: value >= 1
         },
         "swap_master_3": {
             "name_ru": "Обменщик",
             "emoji": "🔥",
             "points": 25,
-            "requirement": lambda user: user.successful_swaps >= 3
+            "events": ("swap_completed",),
+            "requirement": lambda user, value: value >= 3
         },
         "swap_master_10": {
             "name_ru": "Профи обменов",
             "emoji": "⭐",
             "points": 50,
-            "requirement": lambda user: user.successful_swaps >= 10
+            "events": ("swap_completed",),
+            "requirement": lambda user, value: value >= 10
         },
         "swap_master_50": {
             "name_ru": "Мастер обменов",
             "emoji": "👑",
             "points": 200,
-            "requirement": lambda user: user.successful_swaps >= 50
+            "events": ("swap_completed",),
+            "requirement": lambda user, value: value >= 50
         },
         "popular_ad": {
             "name_ru": "Популярный",
             "emoji": "👁",
             "description_ru": "100 просмотров объявления",
-            "points": 25
+            "points": 25,
+            "events": ("ad_viewed",),
+            "requirement": lambda user, value: value >= POPULAR_AD_VIEWS
         },
         "verified": {
             "name_ru": "Верифицирован",
             "emoji": "✅",
             "description_ru": "Подтвердите телефон",
-            "points": 30
+            "points": 30,
+            "events": ("phone_verified",),
+            "requirement": lambda user, value: bool(user.phone_verified)
         },
         "five_star": {
             "name_ru": "5 звёзд",
             "emoji": "⭐",
             "description_ru": "Получите рейтинг 5.0 с 10+ отзывами",
-            "points": 50
+            "points": 50,
+            "events": ("rating_received",),
+            "requirement": lambda user, value: value >= 10 and user.rating >= 5.0
         },
         "helpful": {
             "name_ru": "Полезный",
             "emoji": "💚",
             "description_ru": "Помогите 5 пользователям",
-            "points": 20
+            "points": 20,
+            "events": (),
+            "requirement": lambda user, value: False
         },
         "referral_5": {
             "name_ru": "Амбассадор",
             "emoji": "🎯",
             "description_ru": "Пригласите 5 друзей",
-            "points": 100
+            "points": 100,
+            "events": ("referral",),
+            "requirement": lambda user, value: value >= 5
         },
         "early_adopter": {
             "name_ru": "Первопроходец",
             "emoji": "🚀",
             "description_ru": "Один из первых 100 пользователей",
-            "points": 50
+            "points": 50,
+            "events": ("registered",),
+            "requirement": lambda user, value: 0 < value <= EARLY_ADOPTERS
         },
     }
 
+    # Событие → достижения, которые от него зависят (строится один раз)
+    ACHIEVEMENTS_BY_EVENT = _index_by_event(ACHIEVEMENTS)
+
+    async def record_event(
+            self,
+            user: User,
+            event: str,
+            session: AsyncSession,
+            amount: int = 1,
+            value: Optional[int] = None
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Учёт события и выдача зависящих от него достижений.
+
+        Счётчик события обновляется одним upsert по первичному ключу, проверяются
+        только ещё не полученные достижения этого события, выдача — одна вставка
+        в user_achievements. Коммит — на вызывающем.
+
+        Args:
+            amount: приращение для событий-счётчиков (swap_completed, rating_received, referral)
+            value: новое значение для ad_viewed (просмотры объявления) и registered (номер пользователя)
+        """
+        if not user.achievements:
+            user.achievements = {}
+
+        progress = None
+        if event in EVENT_COUNTERS:
+            if event == "registered" and value is None:
+                # Важен только порог — считаем не больше EARLY_ADOPTERS + 1 строк, а не всю таблицу
+                first = select(User.id).limit(EARLY_ADOPTERS + 1).subquery()
+                value = (await session.execute(select(func.count()).select_from(first))).scalar()
+            progress = await self._update_counter(user.id, event, amount if value is None else value, session)
+
+        new_achievements = [
+            self._award(user, achievement_id, session)
+            for achievement_id in self.earned(user, event, progress or 0, user.achievements)
+        ]
+
+        level_up = await self._check_level_up(user)
+        return new_achievements, level_up
+
+    def earned(self, user, event: str, value: int, unlocked) -> List[str]:
+        """
+        Ещё не полученные (нет в unlocked) достижения события, условие которых выполнено.
+        user — любой объект с rating и phone_verified: ORM-пользователь или строка SQLite-схемы.
+        """
+        return [
+            achievement_id for achievement_id in self.ACHIEVEMENTS_BY_EVENT.get(event, ())
+            if achievement_id not in unlocked and self.ACHIEVEMENTS[achievement_id]["requirement"](user, value)
+        ]
+
     async def check_and_award_achievements(
             self,
             user: User,
             session: AsyncSession
-    ) -> List[Dict]:
-        """Проверка и выдача достижений"""
-
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Полная проверка всех не полученных достижений по сохранённым счётчикам
+        (одним запросом). В обычной работе достаточно record_event; это — сверка,
+        например после переноса данных.
+        """
         if not user.achievements:
             user.achievements = {}
 
-        new_achievements = []
+        result = await session.execute(
+            select(AchievementProgress.counter, AchievementProgress.value)
+            .where(AchievementProgress.user_id == user.id)
+        )
+        counters = dict(result.all())
 
-        # Проверяем каждое достижение
+        new_achievements = []
         for achievement_id, achievement_data in self.ACHIEVEMENTS.items():
-            # Если уже есть, пропускаем
             if achievement_id in user.achievements:
                 continue
+            value = max(
+                (counters.get(EVENT_COUNTERS[event][0], 0) for event in achievement_data["events"]
+                 if event in EVENT_COUNTERS),
+                default=0
+            )
+            if achievement_data["requirement"](user, value):
+                new_achievements.append(self._award(user, achievement_id, session))
 
-            # Проверяем условие
-            if await self._check_achievement_requirement(
-                    achievement_id,
-                    user,
-                    session
-            ):
-                # Выдаём достижение
-                user.achievements[achievement_id] = {
-                    "unlocked_at": datetime.utcnow().isoformat(),
-                    "points": achievement_data["points"]
-                }
-
-                # Добавляем очки опыта
-                user.experience_points += achievement_data["points"]
-
-                new_achievements.append({
-                    "id": achievement_id,
-                    **achievement_data
-                })
-
-        # Проверяем повышение уровня
         level_up = await self._check_level_up(user)
 
         await session.commit()
 
         return new_achievements, level_up
 
-    async def _check_achievement_requirement(
-            self,
-            achievement_id: str,
-            user: User,
-            session: AsyncSession
-    ) -> bool:
-        """Проверка условия достижения"""
-
-        # Первый обмен
-        if achievement_id == "first_swap":
-            return user.successful_swaps >= 1
-
-        # Обменщик (3 обмена)
-        elif achievement_id == "swap_master_3":
-            return user.successful_swaps >= 3
-
-        # Профи (10 обменов)
-        elif achievement_id == "swap_master_10":
-            return user.successful_swaps >= 10
-
-        # Мастер (50 обменов)
-        elif achievement_id == "swap_master_50":
-            return user.successful_swaps >= 50
-
-        # Популярное объявление
-        elif achievement_id == "popular_ad":
-            result = await session.execute(
-                select(Ad).where(
-                    and_(
-                        Ad.user_id == user.id,
-                        Ad.views >= 100
-                    )
-                )
-            )
-            return result.scalar_one_or_none() is not None
-
-        # Верификация
-        elif achievement_id == "verified":
-            return user.phone_verified
-
-        # 5 звёзд
-        elif achievement_id == "five_star":
-            result = await session.execute(
-                select(func.count(Rating.id)).where(
-                    Rating.to_user_id == user.id
-                )
-            )
-            rating_count = result.scalar()
-            return user.rating >= 5.0 and rating_count >= 10
-
-        # Реферальная программа
-        elif achievement_id == "referral_5":
-            return user.referral_count >= 5
-
-        # Первопроходец
-        elif achievement_id == "early_adopter":
-            result = await session.execute(
-                select(func.count(User.id))
-            )
-            total_users = result.scalar()
-            return total_users <= 100
+    async def get_progress(self, user_id: int, session: AsyncSession) -> Dict[str, int]:
+        """Счётчики прогресса пользователя: {счётчик: значение}"""
+        result = await session.execute(
+            select(AchievementProgress.counter, AchievementProgress.value)
+            .where(AchievementProgress.user_id == user_id)
+        )
+        return dict(result.all())
+
+    async def _update_counter(self, user_id: int, event: str, amount: int, session: AsyncSession) -> int:
+        """Upsert счётчика события; возвращает новое значение"""
+        counter, mode = EVENT_COUNTERS[event]
+        dialect = session.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+            greatest = func.greatest
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+            greatest = func.max
+
+        table = AchievementProgress.__table__
+        stmt = insert(table).values(user_id=user_id, counter=counter, value=amount, updated_at=datetime.utcnow())
+        new_value = {
+            "add": table.c.value + stmt.excluded.value,
+            "max": greatest(table.c.value, stmt.excluded.value),
+            "set": stmt.excluded.value,
+        }[mode]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.counter],
+            set_={"value": new_value, "updated_at": stmt.excluded.updated_at},
+        ).returning(table.c.value)
+        result = await session.execute(stmt)
+        return result.scalar_one()
+
+    def _award(self, user: User, achievement_id: str, session: AsyncSession) -> Dict:
+        """Выдача достижения: строка user_achievements и отметка в user.achievements"""
+        achievement_data = self.ACHIEVEMENTS[achievement_id]
+        unlocked_at = datetime.utcnow()
+        session.add(UserAchievement(
+            user_id=user.id,
+            achievement_id=achievement_id,
+            points=achievement_data["points"],
+            unlocked_at=unlocked_at
+        ))
+
+        # Новый dict, а не изменение на месте: иначе SQLAlchemy не увидит изменения JSON
+        user.achievements = {
+            **user.achievements,
+            achievement_id: {"unlocked_at": unlocked_at.isoformat(), "points": achievement_data["points"]}
+        }
+        user.experience_points += achievement_data["points"]
 
-        return False
+        return {"id": achievement_id, **achievement_data}
 
     async def _check_level_up(self, user: User) -> Optional[Dict]:
         """Проверка повышения уровня"""
-
-        # Таблица уровней (опыт → уровень)
-        level_thresholds = {
-            1: 0,
-            2: 50,
-            3: 150,
-            4: 300,
-            5: 500,
-            6: 800,
-            7: 1200,
-            8: 1700,
-            9: 2300,
-            10: 3000,
-        }
-
         current_level = user.level
-        xp = user.experience_points
-
-        # Находим новый уровень
-        new_level = current_level
-        for level, threshold in level_thresholds.items():
-            if xp >= threshold:
-                new_level = level
+        new_level = level_for_xp(user.experience_points)
 
         if new_level > current_level:
             user.level = new_level
@@ -227,134 +317,80 @@ class GamificationService:
 
     def _get_level_perks(self, level: int) -> List[str]:
         """Получение привилегий уровня"""
-        perks_map = {
-            1: [],
-            2: ["🎁 Бесплатное поднятие 1 раз в неделю"],
-            3: ["🎁 2 бесплатных поднятия в неделю"],
-            4: ["⭐ Значок верифицированного", "🎁 3 поднятия в неделю"],
-            5: ["👑 VIP значок", "🎯 Приоритет в поиске", "🎁 5 поднятий"],
-            6: ["💎 Премиум на месяц бесплатно"],
-            7: ["🔥 Выделение объявлений цветом"],
-            8: ["⚡ Безлимитные поднятия"],
-            9: ["🎖 Статус легенды", "💰 Скидка 50% на все услуги"],
-            10: ["👑 Пожизненный Premium", "🌟 Уникальный значок"],
-        }
-
-        return perks_map.get(level, [])
+        return LEVEL_PERKS[level - 1] if 1 <= level <= MAX_LEVEL else []
 
     async def process_referral(
             self,
             referrer_code: str,
-            new_user_id: int,
-            session: AsyncSession
-    ) -> Tuple[bool, Optional[User]]:
-        """Обработка реферальной ссылки"""
-
-        # Находим пригласившего
-        result = await session.execute(
-            select(User).where(User.referral_code == referrer_code)
-        )
-        referrer = result.scalar_one_or_none()
-
-        if not referrer:
+            new_user_id: int
+    ) -> Tuple[bool, Optional[int]]:
+        """
+        Обработка реферальной ссылки сразу, одной транзакцией; возвращает номер пригласившего.
+        Для потока переходов по ссылкам — referrals.referral_queue (пачками).
+        """
+        applied = await apply_referrals([(referrer_code, new_user_id)])
+        if not applied:
             return False, None
+        return True, next(iter(applied))
 
-        # Обновляем данные пригласившего
-        referrer.referral_count += 1
-        referrer.bonus_points += settings.REFERRAL_BONUS
-        referrer.experience_points += settings.REFERRAL_BONUS
+    def level_progress(self, level: int, experience_points: int) -> Dict:
+        """Уровень, опыт и прогресс до следующего уровня (по полям записи профиля)"""
+        next_level_xp = self._get_xp_for_next_level(level)
+        current_level_xp = self._get_xp_for_level(level)
 
-        # Обновляем данные нового пользователя
-        result = await session.execute(
-            select(User).where(User.id == new_user_id)
-        )
-        new_user = result.scalar_one_or_none()
-
-        if new_user:
-            new_user.referred_by_id = referrer.id
-            new_user.bonus_points += settings.REFERRAL_BONUS
-
-        await session.commit()
+        if next_level_xp > current_level_xp:
+            progress = (experience_points - current_level_xp) / (next_level_xp - current_level_xp) * 100
+        else:
+            progress = 100.0
 
-        return True, referrer
+        return {
+            "level": level,
+            "experience_points": experience_points,
+            "next_level_xp": next_level_xp,
+            "progress_to_next_level": round(progress, 1),
+            "perks": self._get_level_perks(level)
+        }
 
     async def get_user_stats(
             self,
             user: User,
             session: AsyncSession
     ) -> Dict:
-        """Получение полной статистики пользователя"""
-
-        # Считаем просмотры объявлений
-        result = await session.execute(
-            select(func.sum(Ad.views)).where(Ad.user_id == user.id)
-        )
-        total_views = result.scalar() or 0
-
-        # Прогресс до следующего уровня
-        next_level_xp = self._get_xp_for_next_level(user.level)
-        current_level_xp = self._get_xp_for_level(user.level)
-
-        progress = (
-                (user.experience_points - current_level_xp) /
-                (next_level_xp - current_level_xp) * 100
-        )
-
+        """Получение полной статистики пользователя (только из полей user, без запросов)"""
         return {
-            "level": user.level,
-            "experience_points": user.experience_points,
-            "next_level_xp": next_level_xp,
-            "progress_to_next_level": round(progress, 1),
+            **self.level_progress(user.level, user.experience_points),
             "total_swaps": user.total_swaps,
             "successful_swaps": user.successful_swaps,
             "rating": user.rating,
-            "total_views": total_views,
+            "total_views": user.total_views or 0,
             "achievements": len(user.achievements or {}),
             "referrals": user.referral_count,
             "bonus_points": user.bonus_points,
-            "perks": self._get_level_perks(user.level)
         }
 
     def _get_xp_for_level(self, level: int) -> int:
         """XP для текущего уровня"""
-        xp_map = {
-            1: 0, 2: 50, 3: 150, 4: 300, 5: 500,
-            6: 800, 7: 1200, 8: 1700, 9: 2300, 10: 3000
-        }
-        return xp_map.get(level, 0)
+        return LEVEL_THRESHOLDS[level - 1] if 1 <= level <= MAX_LEVEL else 0
 
     def _get_xp_for_next_level(self, level: int) -> int:
         """XP для следующего уровня"""
-        return self._get_xp_for_level(level + 1) if level < 10 else 3000
+        return LEVEL_THRESHOLDS[min(level, MAX_LEVEL - 1)] if level >= 1 else 0
 
     async def award_swap_completion(
             self,
             user: User,
             session: AsyncSession
     ) -> Dict:
-        """Награда за завершение обмена"""
-
-        base_xp = 20
-        bonus_xp = 0
+        """Награда за завершение обмена. Коммит — на вызывающем: награды обоих участников — одна транзакция"""
 
-        # Бонус за рейтинг
-        if user.rating >= 4.5:
-            bonus_xp += 5
-
-        # Бонус за серию обменов
-        if user.successful_swaps > 0 and user.successful_swaps % 5 == 0:
-            bonus_xp += 10
-
-        total_xp = base_xp + bonus_xp
+        total_xp = swap_completion_xp(user.rating, user.successful_swaps)
         user.experience_points += total_xp
 
-        # Проверяем достижения
-        new_achievements, level_up = await self.check_and_award_achievements(
-            user, session
+        # Проверяем достижения, зависящие от обменов
+        new_achievements, level_up = await self.record_event(
+            user, "swap_completed", session
         )
 
-        await session.commit()
-
         return {
             "xp_earned": total_xp,
             "new_achievements": new_achievements,
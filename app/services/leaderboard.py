@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Таблицы лидеров: глобальные, по «городу» (гео-ячейке) и по категории.
+
+Источник — материализованная таблица leaderboard, которую обновляют при завершении
+обменов, новых отзывах, начислении опыта и переезде триггеры SQLite
+(db.LEADERBOARD_TRIGGERS) или транзакции записи repository (DB_BACKEND=sqlalchemy),
+поэтому её видят все процессы бота. Здесь — кеш в памяти: таблица загружается
+один раз (уже отсортированной по индексу), дальше раз в LEADERBOARD_REFRESH секунд
+подтягиваются только изменённые строки (seq > последнего). В памяти таблица —
+SortedList ключей (-score, user_id): и место пользователя, и обновление очков —
+O(log n), без COUNT(*) по всем, кто выше.
+
+Таблицы: swaps, rating, xp (глобальные), swaps:cell:<ячейка>, rating:cell:<ячейка>,
+xp:cell:<ячейка>, swaps:cat:<категория>.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from app.config import constants, settings
+from app.database.crud import LeaderboardModel
+
+METRICS = ("swaps", "rating", "xp")
+
+
+def cell_key(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    """Ячейка «города» — так же, как в триггерах (db._cell)"""
+    if latitude is None or longitude is None:
+        return None
+    size = constants.LEADERBOARD_CELL_DEG
+    return f"{math.floor(latitude / size)}:{math.floor(longitude / size)}"
+
+
+def board_name(metric: str, cell: Optional[str] = None, category: Optional[str] = None) -> str:
+    if category:
+        return f"{metric}:cat:{category}"
+    if cell:
+        return f"{metric}:cell:{cell}"
+    return metric
+
+
+class SortedBoard:
+    """Одна таблица лидеров: отсортированные ключи и текущие очки"""
+
+    __slots__ = ("keys", "scores")
+
+    def __init__(self, rows: List[Tuple[int, float]]):
+        # Ключ (-score, user_id): по убыванию очков, при равенстве — по user_id
+        self.keys = SortedList((-score, user_id) for user_id, score in rows)
+        self.scores: Dict[int, float] = {user_id: score for user_id, score in rows}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def set(self, user_id: int, score: Optional[float]):
+        """Новое значение очков (None — выбыл)"""
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            self.keys.remove((-old, user_id))
+        if score is not None:
+            self.scores[user_id] = score
+            self.keys.add((-score, user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Место (с 1) или None"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self.keys.bisect_left((-score, user_id)) + 1
+
+    def top(self, limit: int) -> List[Tuple[int, float]]:
+        return [(user_id, -negative) for negative, user_id in self.keys.islice(stop=limit)]
+
+
+class LeaderboardService:
+    """Кеш таблиц лидеров процесса"""
+
+    def __init__(self, refresh: float = None, max_boards: int = None):
+        self.refresh = refresh if refresh is not None else settings.LEADERBOARD_REFRESH
+        self.max_boards = max_boards or settings.LEADERBOARD_CACHED_BOARDS
+        self.boards: "OrderedDict[str, SortedBoard]" = OrderedDict()
+        self.seq: Optional[int] = None
+        self._synced_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _sync(self):
+        """Подтянуть изменения загруженных таблиц (не чаще раза в refresh секунд)"""
+        if time.monotonic() - self._synced_at < self.refresh:
+            return
+        self._synced_at = time.monotonic()
+        max_seq = await LeaderboardModel.max_seq()
+        if self.seq is None or max_seq < self.seq:
+            # Первый запуск или таблицу пересчитали (LEADERBOARD_REBUILD) — загружаем заново
+            self.boards.clear()
+            self.seq = max_seq
+            return
+        if max_seq == self.seq:
+            return
+        for board, user_id, score, seq in await LeaderboardModel.changes(self.seq):
+            loaded = self.boards.get(board)
+            if loaded is not None:
+                loaded.set(user_id, score)
+            self.seq = max(self.seq, seq)
+
+    async def board(self, name: str) -> SortedBoard:
+        async with self._lock:
+            await self._sync()
+            loaded = self.boards.get(name)
+            if loaded is None:
+                # Изменения после self.seq применятся при следующем _sync; повтор уже
+                # загруженных значений безвреден
+                loaded = SortedBoard(await LeaderboardModel.board(name))
+                self.boards[name] = loaded
+                while len(self.boards) > self.max_boards:
+                    self.boards.popitem(last=False)
+            else:
+                self.boards.move_to_end(name)
+            return loaded
+
+    async def top(self, name: str, limit: int = None) -> List[Dict]:
+        """Первые limit мест: [{"rank", "user_id", "name", "score"}]"""
+        entries = (await self.board(name)).top(limit or settings.LEADERBOARD_TOP)
+        names = await LeaderboardModel.names([user_id for user_id, _ in entries])
+        return [
+            {"rank": rank, "user_id": user_id, "name": names.get(user_id) or "Пользователь", "score": score}
+            for rank, (user_id, score) in enumerate(entries, start=1)
+        ]
+
+    async def position(self, name: str, user_id: int) -> Optional[Dict]:
+        """Место пользователя: {"rank", "score", "total"} или None, если его нет в таблице"""
+        loaded = await self.board(name)
+        rank = loaded.rank(user_id)
+        if rank is None:
+            return None
+        return {"rank": rank, "score": loaded.scores[user_id], "total": len(loaded)}
+
+
+# Singleton
+leaderboard_service = LeaderboardService()
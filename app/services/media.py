@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Обработка фото объявлений (Идея #17: До 3 фото)
+
+Исходник декодируется один раз, ужимается до стандартных размеров и перекодируется
+в WebP/JPEG в пуле потоков. Файлы адресуются sha256 исходника, поэтому повторный
+импорт той же картинки не требует ни скачивания, ни обработки.
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.config import settings, constants
+from app.database.crud import MediaModel, MediaRegistryModel
+from app.utils.hashing import image_dhash
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def media_key(digest: str, size: str) -> str:
+    """Ключ файла: ab/abcdef..._medium.webp"""
+    _, fmt = constants.MEDIA_SIZES[size]
+    ext = "jpg" if fmt == "jpeg" else fmt
+    return f"{digest[:2]}/{digest}_{size}.{ext}"
+
+
+def content_type(key: str) -> str:
+    return "image/jpeg" if key.endswith(".jpg") else CONTENT_TYPES.get(key.rsplit(".", 1)[-1], "application/octet-stream")
+
+
+class LocalMediaStorage:
+    """
+    Дисковый кеш под MEDIA_PATH с ограничением размера (LRU).
+
+    Индекс строится один раз сканированием каталога, дальше поддерживается в памяти.
+    Методы синхронные — вызываются из пула потоков MediaService.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._loaded:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = Path(dirpath) / name
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, path.relative_to(self.root).as_posix(), st.st_size))
+        for _, key, size in sorted(files):
+            self._index[key] = size
+            self._total += size
+        self._loaded = True
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        with self._lock:
+            self._load()
+            return key in self._index
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            self._load()
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # для порядка LRU после перезапуска
+            return data
+        except OSError:
+            with self._lock:
+                self._total -= self._index.pop(key, 0)
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._load()
+            self._total += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                self.path(key).unlink()
+            except OSError:
+                pass
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            self._load()
+            return self._total
+
+
+class S3MediaStorage:
+    """S3-совместимое хранилище (AWS, MinIO и т.п. через S3_ENDPOINT_URL)"""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 access_key: Optional[str] = None, secret_key: Optional[str] = None):
+        import boto3
+
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception:
+            return False
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except Exception:
+            return None
+
+    def put(self, key: str, data: bytes):
+        self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=data,
+            ContentType=content_type(key), CacheControl="public, max-age=31536000, immutable",
+        )
+
+
+def render_variants(data: bytes) -> Dict:
+    """Декодирование и перекодирование во все стандартные размеры (CPU, без IO)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as src:
+        img = ImageOps.exif_transpose(src).convert("RGB")
+
+    variants = {}
+    for size, (max_side, fmt) in constants.MEDIA_SIZES.items():
+        resized = img.copy()
+        resized.thumbnail((max_side, max_side), Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == "webp":
+            resized.save(out, "WEBP", quality=80, method=4)
+        else:
+            resized.save(out, "JPEG", quality=85, optimize=True, progressive=True)
+        variants[size] = out.getvalue()
+
+    return {"width": img.width, "height": img.height, "variants": variants}
+
+
+class MediaService:
+    """Сервис обработки и хранения изображений"""
+
+    def __init__(self):
+        self.local = LocalMediaStorage(settings.MEDIA_PATH, settings.MEDIA_CACHE_MAX_MB * 1024 * 1024)
+        self.remote: Optional[S3MediaStorage] = None
+        if settings.USE_S3 and settings.S3_BUCKET:
+            self.remote = S3MediaStorage(
+                settings.S3_BUCKET, settings.S3_ENDPOINT_URL, settings.S3_REGION,
+                settings.S3_ACCESS_KEY, settings.S3_SECRET_KEY,
+            )
+        self._executor = ThreadPoolExecutor(max_workers=settings.MEDIA_WORKERS, thread_name_prefix="media")
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _stored(self, keys: Dict[str, str]) -> bool:
+        """Все размеры есть в локальном кеше или (вытесненные из него) в S3"""
+        for key in keys.values():
+            if await self._run(self.local.exists, key):
+                continue
+            if not self.remote or not await self._run(self.remote.exists, key):
+                return False
+        return True
+
+    async def process(self, data: bytes, source_url: Optional[str] = None) -> Dict:
+        """
+        Обработка изображения
+
+        Returns:
+            {"digest", "width", "height", "photo_hash", "keys": {size: key}}
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        keys = {size: media_key(digest, size) for size in constants.MEDIA_SIZES}
+
+        # Одна и та же картинка, пришедшая параллельно, обрабатывается один раз
+        if digest in self._inflight:
+            return await asyncio.shield(self._inflight[digest])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            info = await MediaModel.get(digest)
+            if not info or not await self._stored(keys):
+                rendered = await self._run(render_variants, data)
+                for size, blob in rendered["variants"].items():
+                    await self._run(self.local.put, keys[size], blob)
+                    if self.remote:
+                        await self._run(self.remote.put, keys[size], blob)
+                photo_hash = info["photo_hash"] if info else await self._run(image_dhash, data)
+                info = {"width": rendered["width"], "height": rendered["height"], "photo_hash": photo_hash}
+            await MediaModel.save(digest, info["width"], info["height"], len(data), info["photo_hash"], source_url)
+
+            result = {"digest": digest, "width": info["width"], "height": info["height"],
+                      "photo_hash": info["photo_hash"], "keys": keys}
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # помечаем как полученное, если никто не ждал
+            raise
+        finally:
+            self._inflight.pop(digest, None)
+
+    async def fetch(self, url: str, downloader: Callable[[str], Awaitable[Optional[bytes]]]) -> Optional[Dict]:
+        """Обработка картинки по URL; уже известный URL повторно не скачивается"""
+        info = await MediaModel.get_by_url(url)
+        if info:
+            keys = {size: media_key(info["digest"], size) for size in constants.MEDIA_SIZES}
+            # Вытесненные из локального кеша файлы get() дочитает из S3
+            if await self._stored(keys):
+                return {"digest": info["digest"], "width": info["width"], "height": info["height"],
+                        "photo_hash": info["photo_hash"], "keys": keys}
+
+        data = await downloader(url)
+        if not data:
+            return None
+        try:
+            return await self.process(data, source_url=url)
+        except Exception as e:
+            logger.warning(f"Не удалось обработать изображение {url}: {e}")
+            return None
+
+    async def send_photo(self, bot, chat_id: int, data: bytes, digest: Optional[str] = None, **kwargs):
+        """
+        Отправка фото с переиспользованием file_id.
+
+        Если эта картинка уже загружалась в Telegram, отправляется file_id (без загрузки байтов),
+        иначе байты загружаются один раз, а file_id из ответа запоминается.
+        """
+        from aiogram.exceptions import TelegramBadRequest
+        from aiogram.types import BufferedInputFile
+
+        digest = digest or hashlib.sha256(data).hexdigest()
+        file_id = await MediaRegistryModel.get_file_id(digest)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id, file_id, **kwargs)
+            except TelegramBadRequest:
+                # file_id протух (например, сменился токен бота) — загружаем заново
+                await MediaRegistryModel.forget(digest)
+
+        message = await bot.send_photo(chat_id, BufferedInputFile(data, filename=f"{digest[:16]}.jpg"), **kwargs)
+        if message.photo:
+            await MediaRegistryModel.save(digest, message.photo[-1].file_id, message.photo[-1].file_unique_id)
+        return message
+
+    async def ensure_file_id(self, bot, data: bytes, digest: Optional[str] = None) -> Optional[str]:
+        """file_id для картинки: из реестра или загрузкой в MEDIA_UPLOAD_CHAT_ID"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        file_id = await MediaRegistryModel.get_file_id(digest)
+        if file_id or not settings.MEDIA_UPLOAD_CHAT_ID:
+            return file_id
+
+        message = await self.send_photo(bot, settings.MEDIA_UPLOAD_CHAT_ID, data, digest, disable_notification=True)
+        return message.photo[-1].file_id if message.photo else None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Файл из локального кеша, при промахе — из S3 с повторным кешированием"""
+        data = await self._run(self.local.get, key)
+        if data is None and self.remote:
+            data = await self._run(self.remote.get, key)
+            if data is not None:
+                await self._run(self.local.put, key, data)
+        return data
+
+
+# Singleton
+media_service = MediaService()
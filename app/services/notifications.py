@@ -1,2 +1,85 @@
 # -*- coding: utf-8 -*-
-"""Уведомления (заглушка). Отправка через aiogram в handlers."""
+"""
+Пакетная рассылка уведомлений пользователям.
+
+BatchNotifier — очередь событий с циклом рассылки: цикл собирает пачку (до batch_size
+событий или за flush_interval секунд), подкласс в recipients превращает её в
+{пользователь: строки} (обычно одним запросом на пачку), и каждому пользователю уходит
+одно сообщение на пачку — не чаще rate сообщений в секунду (лимит Bot API — около 30).
+Используют app.services.favorites и app.services.saved_searches.
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from app.utils.batching import next_batch
+
+logger = logging.getLogger(__name__)
+
+
+class BatchNotifier(ABC):
+    """Очередь событий с пакетной рассылкой; HEADER — заголовок сообщения"""
+
+    HEADER = ""
+    NAME = "уведомлений"  # для логов
+
+    def __init__(self, batch_size: int, flush_interval: float, rate: int, max_pending: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rate = rate
+        self.queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, bot: Bot, event: Any) -> bool:
+        """Поставить событие в очередь (цикл рассылки запускается при первом); False — очередь переполнена"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(f"Очередь {self.NAME} переполнена, событие не разослано: {event!r}")
+            return False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(bot))
+        return True
+
+    @abstractmethod
+    async def recipients(self, batch: List[Any]) -> Dict[int, List[str]]:
+        """{пользователь: строки сообщения} по пачке событий"""
+
+    async def _send(self, bot: Bot, user_id: int, lines: List[str]) -> bool:
+        text = self.HEADER + "\n\n" + "\n".join(lines)
+        for _ in range(2):
+            try:
+                await bot.send_message(user_id, text)
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                return False  # пользователь остановил бота
+            except Exception as e:
+                logger.info(f"Сообщение {self.NAME} для {user_id} не отправлено: {e}")
+                return False
+        return False
+
+    async def deliver(self, bot: Bot, batch: List[Any]) -> int:
+        """Разослать пачку; возвращает число отправленных сообщений"""
+        messages = await self.recipients(batch)
+        tasks = []
+        for user_id, lines in messages.items():
+            # Отправки стартуют не чаще rate в секунду и идут параллельно
+            tasks.append(asyncio.create_task(self._send(bot, user_id, lines)))
+            await asyncio.sleep(1 / self.rate)
+        return sum(await asyncio.gather(*tasks))
+
+    async def run(self, bot: Bot):
+        """Цикл рассылки пачек"""
+        while True:
+            batch = await next_batch(self.queue, self.batch_size, self.flush_interval)
+            try:
+                sent = await self.deliver(bot, batch)
+                logger.info(f"Рассылка {self.NAME}: {sent} сообщений по {len(batch)} событиям")
+            except Exception as e:
+                logger.error(f"Не удалось разослать пачку {self.NAME} ({len(batch)}): {e}")
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Реферальные коды и пакетное начисление бонусов (Идея #6).
+
+Код — base32 номера пользователя и 5 символов HMAC(SECRET_KEY): номера уникальны,
+поэтому коды не сталкиваются и не требуют проверки в БД при выдаче, а подпись
+не даёт подобрать чужой код перебором. Пригласивший определяется из самого кода
+(поиск по первичному ключу); старые коды без подписи ищутся по уникальному
+индексу users.referral_code (ReferralModel.legacy_referrers).
+
+Всплеск переходов по ссылкам /start=<код> не превращается в транзакцию на каждого:
+ReferralQueue собирает приглашения и применяет их пачками до REFERRAL_BATCH_SIZE
+(или раз в REFERRAL_FLUSH_INTERVAL) — одна выборка пользователей, одно обновление
+счётчика достижения referral на пригласившего и один коммит на пачку
+(ReferralModel.apply, на любом DB_BACKEND).
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.database.crud import ReferralModel
+from app.utils.batching import next_batch
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+TAG_LENGTH = 5
+_DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+
+
+def _base32(number: int) -> str:
+    digits = []
+    while True:
+        number, digit = divmod(number, 32)
+        digits.append(ALPHABET[digit])
+        if not number:
+            return "".join(reversed(digits))
+
+
+def _tag(body: str) -> str:
+    digest = hmac.new(settings.SECRET_KEY.encode(), body.encode(), hashlib.sha256).digest()
+    return _base32(int.from_bytes(digest[:4], "big")).rjust(TAG_LENGTH, "A")[-TAG_LENGTH:]
+
+
+def make_code(user_id: int) -> str:
+    """Реферальный код пользователя (всегда один и тот же)"""
+    body = _base32(user_id)
+    return body + _tag(body)
+
+
+def parse_code(code: str) -> Optional[int]:
+    """Номер пригласившего или None, если код не подписан этим SECRET_KEY"""
+    code = (code or "").strip().upper()
+    body, tag = code[:-TAG_LENGTH], code[-TAG_LENGTH:]
+    if not body or any(char not in _DIGITS for char in body) or (len(body) > 1 and body[0] == "A"):
+        return None
+    if not hmac.compare_digest(tag, _tag(body)):
+        return None
+    number = 0
+    for char in body:
+        number = number * 32 + _DIGITS[char]
+    return number
+
+
+async def apply_referrals(pairs: List[Tuple[str, int]]) -> Dict[int, List[int]]:
+    """
+    Начислить бонусы за пачку приглашений [(код, новый пользователь)] в одной транзакции.
+
+    Пользователя засчитывают один раз (первое приглашение), самоприглашения
+    и неизвестные коды пропускаются. Возвращает {пригласивший: [приглашённые]}.
+    """
+    referrer_ids: Dict[str, Optional[int]] = {code: parse_code(code) for code, _ in pairs}
+    legacy = [code for code, referrer_id in referrer_ids.items() if referrer_id is None and code]
+    if legacy:
+        referrer_ids.update(await ReferralModel.legacy_referrers(legacy))
+
+    invites: Dict[int, int] = {}
+    for code, new_user_id in pairs:
+        referrer_id = referrer_ids.get(code)
+        if referrer_id is not None and referrer_id != new_user_id and new_user_id not in invites:
+            invites[new_user_id] = referrer_id
+    if not invites:
+        return {}
+    return await ReferralModel.apply(invites)
+
+
+class ReferralQueue:
+    """Очередь приглашений с пакетным применением"""
+
+    def __init__(self, batch_size: int = None, flush_interval: float = None, max_pending: int = None):
+        self.batch_size = batch_size or settings.REFERRAL_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.REFERRAL_FLUSH_INTERVAL
+        self.queue: asyncio.Queue = asyncio.Queue(max_pending or settings.REFERRAL_QUEUE_SIZE)
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, code: str, new_user_id: int) -> bool:
+        """
+        Поставить приглашение в очередь; False — очередь переполнена.
+
+        Цикл применения запускается при первом приглашении в процессе (как у
+        notifications.BatchNotifier) — в кластере у каждого воркера свой.
+        """
+        try:
+            self.queue.put_nowait((code, new_user_id))
+        except asyncio.QueueFull:
+            logger.warning(f"Очередь приглашений переполнена, приглашение {new_user_id} не учтено")
+            return False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return True
+
+    async def run(self):
+        """Цикл применения пачек"""
+        while True:
+            batch: List[Tuple[str, int]] = await next_batch(self.queue, self.batch_size, self.flush_interval)
+            try:
+                applied = await apply_referrals(batch)
+                logger.info(f"Приглашений применено: {sum(map(len, applied.values()))} из {len(batch)}")
+            except Exception as e:
+                logger.error(f"Не удалось применить пачку приглашений ({len(batch)}): {e}")
+
+
+# Singleton
+referral_queue = ReferralQueue()
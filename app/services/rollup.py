@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Офлайн-свёртка аналитики: python -m app.services.rollup [--format parquet|csv]
+
+Читает строки users, ads, ad_views и swap_proposals за свёртываемые дни кусками
+(pandas chunksize; категорию и координаты объявления подтягивает JOIN в SQL), считает
+векторно метрики по дню (UTC), категории и гео-ячейке ANALYTICS_CELL_DEG градусов
+и пишет их в таблицу analytics_cells и партиции ANALYTICS_EXPORT_DIR/day=YYYY-MM-DD/.
+Обрабатываются только завершённые дни после последнего свёрнутого — повторный
+запуск дописывает новые дни, --full пересчитывает всё.
+
+Дневные итоги (строки analytics) ведёт StatsModel.rollup по счётчикам; здесь —
+детализация для дашбордов, которые не должны ходить в живую БД.
+
+Метрики строки (day, category, cell):
+    new_users, active_users (смотревшие ленту) — по ячейке пользователя, category = ''
+    new_ads, views, swaps_proposed, swaps_completed — по категории и ячейке объявления
+    (для обменов — объявления, на которое предложен обмен)
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.config import constants, settings, get_db_path
+
+logger = logging.getLogger(__name__)
+
+CHUNK = 200_000
+KEYS = ["day", "category", "cell"]
+METRICS = ["new_users", "active_users", "new_ads", "views", "swaps_proposed", "swaps_completed"]
+
+
+def cell_keys(lat: np.ndarray, lon: np.ndarray, size: float) -> np.ndarray:
+    """Ключ ячейки «широта:долгота» юго-западного угла; '' — без координат"""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    known = ~(np.isnan(lat) | np.isnan(lon))
+    keys = np.full(len(lat), "", dtype=object)
+    if known.any():
+        south = pd.Series(np.round(np.floor(lat[known] / size) * size, 6)).astype(str)
+        west = pd.Series(np.round(np.floor(lon[known] / size) * size, 6)).astype(str)
+        keys[known] = (south + ":" + west).to_numpy()
+    return keys
+
+
+def _read(conn: sqlite3.Connection, sql: str, params=()) -> Iterator[pd.DataFrame]:
+    yield from pd.read_sql_query(sql, conn, params=params, chunksize=CHUNK)
+
+
+def _count(frame: pd.DataFrame, metric: str) -> pd.DataFrame:
+    return frame.groupby(KEYS, sort=False).size().rename(metric).reset_index()
+
+
+class Rollup:
+    """Один проход свёртки по диапазону дней [start, end)"""
+
+    def __init__(self, conn: sqlite3.Connection, start: str, end: str, cell_size: float):
+        self.conn = conn
+        self.start = start
+        self.end = end
+        self.cell_size = cell_size
+        self.parts: List[pd.DataFrame] = []
+
+    def _in_range(self, column: pd.Series) -> pd.Series:
+        column = column.fillna("")
+        return (column >= self.start) & (column < self.end)
+
+    def _cells(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        chunk["cell"] = cell_keys(chunk.latitude, chunk.longitude, self.cell_size)
+        return chunk
+
+    def run(self) -> pd.DataFrame:
+        self._users()
+        self._ads()
+        self._views()
+        self._active_users()
+        self._swaps()
+        if not self.parts:
+            return pd.DataFrame(columns=KEYS + METRICS)
+        result = pd.concat(self.parts, ignore_index=True).groupby(KEYS, sort=True).sum(min_count=1)
+        return result.reindex(columns=METRICS).fillna(0).astype("int64").reset_index()
+
+    def _users(self):
+        sql = "SELECT latitude, longitude, created_at FROM users WHERE created_at >= ? AND created_at < ?"
+        for chunk in _read(self.conn, sql, (self.start, self.end)):
+            chunk = self._cells(chunk).assign(day=chunk.created_at.str.slice(0, 10), category="")
+            self.parts.append(_count(chunk, "new_users"))
+
+    def _ads(self):
+        sql = "SELECT category, latitude, longitude, created_at FROM ads WHERE created_at >= ? AND created_at < ?"
+        for chunk in _read(self.conn, sql, (self.start, self.end)):
+            chunk = self._cells(chunk).assign(day=chunk.created_at.str.slice(0, 10))
+            self.parts.append(_count(chunk, "new_ads"))
+
+    def _views(self):
+        # Категорию и координаты объявления подтягивает JOIN — справочник ads в память не читается
+        sql = ("SELECT v.viewed_at, COALESCE(a.category, '') AS category, a.latitude, a.longitude "
+               "FROM ad_views v LEFT JOIN ads a ON a.id = v.ad_id "
+               "WHERE v.viewed_at >= ? AND v.viewed_at < ?")
+        for chunk in _read(self.conn, sql, (self.start, self.end)):
+            chunk = self._cells(chunk).assign(day=chunk.viewed_at.str.slice(0, 10))
+            self.parts.append(_count(chunk, "views"))
+
+    def _active_users(self):
+        # DISTINCT в SQL: один зритель за день считается один раз, сколько бы кусков ни было
+        sql = ("SELECT d.day, u.latitude, u.longitude FROM ("
+               "SELECT DISTINCT substr(viewed_at, 1, 10) AS day, viewer_id FROM ad_views "
+               "WHERE viewed_at >= ? AND viewed_at < ?) d "
+               "LEFT JOIN users u ON u.tg_id = d.viewer_id")
+        for chunk in _read(self.conn, sql, (self.start, self.end)):
+            self.parts.append(_count(self._cells(chunk).assign(category=""), "active_users"))
+
+    def _swaps(self):
+        sql = ("SELECT s.status, s.proposed_at, s.responded_at, COALESCE(a.category, '') AS category, "
+               "a.latitude, a.longitude FROM swap_proposals s LEFT JOIN ads a ON a.id = s.liked_ad_id "
+               "WHERE (s.proposed_at >= ? AND s.proposed_at < ?) OR (s.responded_at >= ? AND s.responded_at < ?)")
+        for chunk in _read(self.conn, sql, (self.start, self.end) * 2):
+            chunk = self._cells(chunk)
+            proposed = chunk[self._in_range(chunk.proposed_at)]
+            if len(proposed):
+                self.parts.append(_count(proposed.assign(day=proposed.proposed_at.str.slice(0, 10)), "swaps_proposed"))
+            completed = chunk[(chunk.status == constants.SWAP_STATUS_COMPLETED) & self._in_range(chunk.responded_at)]
+            if len(completed):
+                self.parts.append(_count(completed.assign(day=completed.responded_at.str.slice(0, 10)),
+                                         "swaps_completed"))
+
+
+def _first_day(conn: sqlite3.Connection) -> Optional[str]:
+    row = conn.execute(
+        "SELECT MIN(day) FROM ("
+        "SELECT MIN(date(created_at)) AS day FROM users UNION ALL "
+        "SELECT MIN(date(created_at)) FROM ads UNION ALL "
+        "SELECT MIN(date(viewed_at)) FROM ad_views UNION ALL "
+        "SELECT MIN(date(proposed_at)) FROM swap_proposals)"
+    ).fetchone()
+    return row[0]
+
+
+def export(frame: pd.DataFrame, out_dir: Path, fmt: str) -> List[Path]:
+    """Партиции out_dir/day=YYYY-MM-DD/cells.<fmt> (перезаписываются целиком)"""
+    paths = []
+    for day, part in frame.groupby("day", sort=True):
+        directory = out_dir / f"day={day}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"cells.{fmt}"
+        tmp = path.with_suffix(".tmp")
+        part = part.drop(columns="day")
+        if fmt == "parquet":
+            part.to_parquet(tmp, index=False)
+        else:
+            part.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        paths.append(path)
+    return paths
+
+
+def run(db_path: str, out_dir: Optional[Path] = None, fmt: str = "parquet", cell_size: Optional[float] = None,
+        until: Optional[str] = None, full: bool = False) -> Dict[str, int]:
+    """
+    Свернуть новые завершённые дни.
+
+    Args:
+        until: последний день (включительно), по умолчанию — вчера (UTC)
+        full: пересчитать всё с первого дня
+    """
+    from app.database.db import init_db
+
+    settings.DB_PATH = os.path.abspath(db_path)
+    asyncio.run(init_db())  # analytics_cells в старых БД
+    cell_size = cell_size or settings.ANALYTICS_CELL_DEG
+
+    conn = sqlite3.connect(db_path)
+    try:
+        if full:
+            with conn:
+                conn.execute("DELETE FROM analytics_cells")
+        last = conn.execute("SELECT MAX(day) FROM analytics_cells").fetchone()[0]
+        start = (date.fromisoformat(last) + timedelta(days=1)).isoformat() if last else _first_day(conn)
+        end_day = date.fromisoformat(until) if until else datetime.utcnow().date() - timedelta(days=1)
+        end = (end_day + timedelta(days=1)).isoformat()
+        if start is None or start >= end:
+            return {"days": 0, "rows": 0, "files": 0}
+
+        frame = Rollup(conn, start, end, cell_size).run()
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO analytics_cells ({', '.join(KEYS + METRICS)}) "
+                f"VALUES ({', '.join('?' * (len(KEYS) + len(METRICS)))})",
+                frame.itertuples(index=False, name=None),
+            )
+    finally:
+        conn.close()
+
+    files = export(frame, Path(out_dir or settings.ANALYTICS_EXPORT_DIR), fmt)
+    logger.info(f"Аналитика свёрнута: {start} — {end_day}, строк {len(frame)}, файлов {len(files)}")
+    return {"days": frame.day.nunique(), "rows": len(frame), "files": len(files)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Свёртка аналитики по дням, категориям и гео-ячейкам")
+    parser.add_argument("--db", default=None, help="файл БД (по умолчанию DB_PATH)")
+    parser.add_argument("--out", type=Path, default=None, help="каталог партиций (по умолчанию ANALYTICS_EXPORT_DIR)")
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet")
+    parser.add_argument("--cell", type=float, default=None, help="размер гео-ячейки, градусы")
+    parser.add_argument("--until", help="последний день YYYY-MM-DD (по умолчанию вчера, UTC)")
+    parser.add_argument("--full", action="store_true", help="пересчитать все дни")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise SystemExit("Для Parquet нужен pyarrow (pip install pyarrow) или --format csv")
+
+    started = time.perf_counter()
+    result = run(args.db or get_db_path(), args.out, args.format, args.cell, args.until, args.full)
+    print(f"Дней: {result['days']}, строк: {result['rows']}, {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
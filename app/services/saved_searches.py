@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""
+Сохранённые поиски: сверка новых объявлений через инвертированный индекс.
+
+Поиск — словарь filters: category, keywords (все слова должны быть в заголовке или
+описании), price_min/price_max (бесплатное — цена 0), lat/lon/radius_km (объявление без
+координат под поиск с радиусом не подходит).
+
+Вместо прогона всех поисков по каталогу процесс держит в памяти индекс: ключ —
+(категория, гео-ячейка, ценовая полоса, слово), любой элемент — None («не важно»).
+Поиск записывается под ключами всех ячеек, которые задевает его круг, всех полос своего
+диапазона цен (полоса — степень двойки) и под самым длинным из своих слов; ключей у
+поиска не больше SAVED_SEARCH_MAX_KEYS — сверх того он индексируется без полос, а затем
+и без ячеек (эти условия проверяются при сверке). Новое объявление даёт не больше
+2 × 2 × 2 × (слов текста + 1) ключей; по ним достаются только кандидаты, и каждый
+проверяется точным условием. Стоимость сверки растёт с числом подходящих поисков и
+длиной текста объявления, а не с числом всех поисков.
+
+Индекс загружается кусками при первой сверке и раз в SAVED_SEARCH_REFRESH секунд
+догружает поиски с большим id (созданные другими процессами); удалённые в других
+процессах отсеиваются одним запросом на пачку перед рассылкой.
+
+Новые объявления ставятся в очередь (saved_search_notifier.submit): пачка сверяется
+целиком, и каждый пользователь получает одно сообщение на пачку (app.services.notifications).
+Все пути публикации — анкета, повторная публикация снятого объявления и импорт —
+сообщают о ней через ad_published.
+"""
+import itertools
+import logging
+import math
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.config import constants, settings
+from app.database.crud import AdModel, SavedSearchModel
+from app.database.records import AdRecord, SavedSearchRecord
+from app.services.notifications import BatchNotifier
+from app.utils.formatters import escape_html, format_price
+
+logger = logging.getLogger(__name__)
+
+MAX_BAND = 40  # цены от 2^40 — в одной полосе
+EARTH_RADIUS_KM = 6371
+
+Key = Tuple[Optional[str], Optional[Tuple[int, int]], Optional[int], Optional[str]]
+
+
+def words(text: Optional[str]) -> Set[str]:
+    """Слова текста в нижнем регистре (ё → е)"""
+    return set(re.findall(r"\w+", (text or "").lower().replace("ё", "е")))
+
+
+def price_value(price: Optional[str]) -> int:
+    """Цена объявления числом; без цены — 0 (бесплатно)"""
+    digits = re.sub(r"\D", "", str(price or ""))
+    return int(digits) if digits else 0
+
+
+def price_band(price: int) -> int:
+    return min(price.bit_length(), MAX_BAND) if price > 0 else 0
+
+
+def geo_cell(latitude: float, longitude: float) -> Tuple[int, int]:
+    size = constants.SAVED_SEARCH_CELL_DEG
+    return math.floor(latitude / size), math.floor(longitude / size)
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Как в геопоиске ленты (models.AdModel.get_next_ad)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    cos = math.cos(lat1) * math.cos(lat2) * math.cos(lon2 - lon1) + math.sin(lat1) * math.sin(lat2)
+    return EARTH_RADIUS_KM * math.acos(max(-1.0, min(1.0, cos)))
+
+
+def matches(filters: Dict[str, Any], ad: AdRecord, ad_words: Set[str]) -> bool:
+    """Точная проверка объявления поиском"""
+    if filters.get("category") and filters["category"] != ad.category:
+        return False
+    price = price_value(ad.price)
+    if filters.get("price_min") is not None and price < filters["price_min"]:
+        return False
+    if filters.get("price_max") is not None and price > filters["price_max"]:
+        return False
+    if filters.get("radius_km") is not None:
+        if ad.latitude is None or ad.longitude is None:
+            return False
+        if distance_km(filters["lat"], filters["lon"], ad.latitude, ad.longitude) > filters["radius_km"]:
+            return False
+    return all(word in ad_words for word in filters.get("keywords") or ())
+
+
+def _cells(filters: Dict[str, Any]) -> List[Optional[Tuple[int, int]]]:
+    """Ячейки, которые задевает круг поиска; [None] — без гео-ключа"""
+    if filters.get("radius_km") is None:
+        return [None]
+    lat, lon, radius = filters["lat"], filters["lon"], filters["radius_km"]
+    dlat = radius / 111.0
+    dlon = radius / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    (lat_lo, lon_lo), (lat_hi, lon_hi) = geo_cell(lat - dlat, lon - dlon), geo_cell(lat + dlat, lon + dlon)
+    if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > constants.SAVED_SEARCH_MAX_KEYS:
+        return [None]
+    return list(itertools.product(range(lat_lo, lat_hi + 1), range(lon_lo, lon_hi + 1)))
+
+
+def _bands(filters: Dict[str, Any]) -> List[Optional[int]]:
+    low, high = filters.get("price_min"), filters.get("price_max")
+    if low is None and high is None:
+        return [None]
+    return list(range(price_band(low or 0), (price_band(high) if high is not None else MAX_BAND) + 1))
+
+
+def index_keys(filters: Dict[str, Any]) -> List[Key]:
+    """Ключи индекса поиска; по одному объявлению находится не больше одного из них"""
+    keywords = filters.get("keywords") or ()
+    # Самое длинное слово обычно самое редкое — меньше лишних кандидатов
+    keyword = max(sorted(keywords), key=len) if keywords else None
+    cells, bands = _cells(filters), _bands(filters)
+    if len(cells) * len(bands) > constants.SAVED_SEARCH_MAX_KEYS:
+        bands = [None]  # широкий диапазон цен отсекает меньше, чем ячейки
+    return [(filters.get("category"), cell, band, keyword) for cell in cells for band in bands]
+
+
+class SavedSearchIndex:
+    """Инвертированный индекс сохранённых поисков процесса"""
+
+    def __init__(self, refresh_interval: float = None, chunk: int = 1000):
+        self.refresh_interval = refresh_interval if refresh_interval is not None else settings.SAVED_SEARCH_REFRESH
+        self.chunk = chunk
+        self.postings: Dict[Key, Set[int]] = {}
+        self.searches: Dict[int, Tuple[int, str, Dict[str, Any], List[Key]]] = {}
+        self.keyword_refs: Dict[str, int] = {}  # слово → число ключей с ним
+        self.last_id = 0
+        self.loaded_at: Optional[float] = None
+
+    def add(self, search: SavedSearchRecord):
+        if search.id in self.searches or not search.notify_on_new:
+            return
+        keys = index_keys(search.filters)
+        self.searches[search.id] = (search.user_id, search.name, search.filters, keys)
+        for key in keys:
+            self.postings.setdefault(key, set()).add(search.id)
+            if key[3] is not None:
+                self.keyword_refs[key[3]] = self.keyword_refs.get(key[3], 0) + 1
+
+    def remove(self, search_id: int):
+        entry = self.searches.pop(search_id, None)
+        if entry is None:
+            return
+        for key in entry[3]:
+            ids = self.postings.get(key)
+            if ids is not None:
+                ids.discard(search_id)
+                if not ids:
+                    del self.postings[key]
+            if key[3] is not None:
+                self.keyword_refs[key[3]] -= 1
+                if not self.keyword_refs[key[3]]:
+                    del self.keyword_refs[key[3]]
+
+    async def refresh(self, force: bool = False):
+        """Догрузить поиски с id больше последнего загруженного (первый раз — все)"""
+        if not force and self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_interval:
+            return
+        self.loaded_at = time.monotonic()
+        while True:
+            searches = await SavedSearchModel.load(self.last_id, self.chunk)
+            for search in searches:
+                self.add(search)
+            if searches:
+                self.last_id = searches[-1].id
+            if len(searches) < self.chunk:
+                break
+
+    def match(self, ad: AdRecord) -> Iterator[Tuple[int, int, str]]:
+        """(search_id, user_id, name) поисков, под которые подходит объявление (кроме поисков владельца)"""
+        ad_words = words(ad.title) | words(ad.description)
+        cells = (geo_cell(ad.latitude, ad.longitude), None) if ad.latitude is not None and ad.longitude is not None \
+            else (None,)
+        keywords = [None] + [word for word in ad_words if word in self.keyword_refs]
+        for key in itertools.product((ad.category, None), cells, (price_band(price_value(ad.price)), None), keywords):
+            for search_id in self.postings.get(key, ()):
+                user_id, name, filters, _ = self.searches[search_id]
+                if user_id != ad.user_tg_id and matches(filters, ad, ad_words):
+                    yield search_id, user_id, name
+
+    async def save(self, user_id: int, name: str, filters: Dict[str, Any]) -> Optional[int]:
+        """Сохранить поиск; None — превышен SAVED_SEARCHES_PER_USER"""
+        if len(await SavedSearchModel.get_user_searches(user_id)) >= constants.SAVED_SEARCHES_PER_USER:
+            return None
+        search_id = await SavedSearchModel.create(user_id, name, filters)
+        if self.loaded_at is not None:
+            self.add(SavedSearchRecord(id=search_id, user_id=user_id, name=name, filters=filters, notify_on_new=True))
+        return search_id
+
+    async def delete(self, user_id: int, search_id: int) -> bool:
+        deleted = await SavedSearchModel.delete(user_id, search_id)
+        if deleted:
+            self.remove(search_id)
+        return deleted
+
+
+def parse_query(args: str, latitude: Optional[float] = None, longitude: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Условия поиска из текста команды: «iphone до 30000 10 км electronics».
+
+    Ключ или название категории — категория, «до N»/«от N» — цена, «бесплатно» — цена 0,
+    «N км» — радиус от (latitude, longitude), остальное — слова. ValueError — текст для пользователя.
+    """
+    filters: Dict[str, Any] = {}
+    keywords: List[str] = []
+    text = re.sub(r"(\d+)\s+км\b", r"\1км", (args or "").lower().replace("ё", "е"))
+    tokens = iter(text.split())
+    for token in tokens:
+        radius = re.fullmatch(r"(\d+)км", token)
+        if token in ("до", "от"):
+            value = next(tokens, "")
+            if not value.isdigit():
+                raise ValueError(f"После «{token}» укажите цену числом.")
+            filters["price_max" if token == "до" else "price_min"] = int(value)
+        elif token == "бесплатно":
+            filters["price_max"] = 0
+        elif radius:
+            if latitude is None or longitude is None:
+                raise ValueError("📍 Для поиска по радиусу укажите местоположение в профиле.")
+            filters.update(lat=latitude, lon=longitude, radius_km=int(radius.group(1)))
+        elif _category(token):
+            filters["category"] = _category(token)
+        else:
+            keywords.extend(sorted(words(token) - set(keywords)))
+    if keywords:
+        filters["keywords"] = keywords
+    if not filters:
+        raise ValueError("Укажите хотя бы одно условие поиска.")
+    if filters.get("price_min") is not None and filters.get("price_max") is not None \
+            and filters["price_min"] > filters["price_max"]:
+        raise ValueError("Цена «от» больше цены «до».")
+    return filters
+
+
+def _category(word: str) -> Optional[str]:
+    for key, info in constants.CATEGORIES.items():
+        if word in (key, info["title_ru"].lower()):
+            return key
+    return None
+
+
+def describe(filters: Dict[str, Any]) -> str:
+    """Условия поиска одной строкой для списка"""
+    parts = []
+    if filters.get("category"):
+        parts.append(constants.CATEGORIES.get(filters["category"], {}).get("title", filters["category"]))
+    if filters.get("keywords"):
+        parts.append("«" + " ".join(filters["keywords"]) + "»")
+    if filters.get("price_max") == 0:
+        parts.append("бесплатно")
+    else:
+        if filters.get("price_min") is not None:
+            parts.append(f"от {filters['price_min']} ₽")
+        if filters.get("price_max") is not None:
+            parts.append(f"до {filters['price_max']} ₽")
+    if filters.get("radius_km") is not None:
+        parts.append(f"до {filters['radius_km']} км")
+    return escape_html(", ".join(parts))
+
+
+class SavedSearchNotifier(BatchNotifier):
+    """Очередь новых объявлений со сверкой по индексу и пакетной рассылкой"""
+
+    HEADER = "🔔 <b>Новое по сохранённым поискам</b>"
+    NAME = "уведомлений поисков"
+
+    def __init__(self, index: SavedSearchIndex, batch_size: int = None, flush_interval: float = None,
+                 rate: int = None, max_pending: int = None):
+        super().__init__(
+            batch_size or settings.SAVED_SEARCH_NOTIFY_BATCH,
+            flush_interval or settings.SAVED_SEARCH_NOTIFY_INTERVAL,
+            rate or settings.SAVED_SEARCH_NOTIFY_RATE,
+            max_pending or settings.SAVED_SEARCH_QUEUE_SIZE,
+        )
+        self.index = index
+
+    async def recipients(self, batch: List[AdRecord]) -> Dict[int, List[str]]:
+        """Сверка пачки объявлений; одно упоминание объявления на пользователя"""
+        await self.index.refresh()
+        hits = [(search_id, user_id, name, ad) for ad in batch for search_id, user_id, name in self.index.match(ad)]
+        # Поиски, удалённые другими процессами, — одним запросом на пачку
+        search_ids = {search_id for search_id, _, _, _ in hits}
+        alive = set(await SavedSearchModel.existing(list(search_ids)))
+        for search_id in search_ids - alive:
+            self.index.remove(search_id)
+
+        messages: Dict[int, List[str]] = {}
+        seen: Set[Tuple[int, int]] = set()
+        for search_id, user_id, name, ad in hits:
+            if search_id in alive and (user_id, ad.id) not in seen:
+                seen.add((user_id, ad.id))
+                messages.setdefault(user_id, []).append(
+                    f"«{escape_html(name)}»: {escape_html(ad.title)} — {format_price(ad.price)}"
+                )
+        return messages
+
+
+# Singleton
+saved_search_index = SavedSearchIndex()
+saved_search_notifier = SavedSearchNotifier(saved_search_index)
+
+
+async def ad_published(bot, ad_id: int) -> bool:
+    """
+    Объявление опубликовано (создано, импортировано или снова опубликовано) — в очередь
+    сверки с сохранёнными поисками. Запись читается из БД: у повторной публикации фото
+    и место могли остаться прежними. Публикацию не прерывает: ошибка только в лог.
+    """
+    try:
+        ad = await AdModel.get_by_id(ad_id)
+    except Exception as e:
+        logger.warning(f"Объявление #{ad_id} не поставлено в сверку с поисками: {e}")
+        return False
+    return ad is not None and saved_search_notifier.submit(bot, ad)
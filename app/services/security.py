@@ -10,8 +10,10 @@ from datetime import datetime, timedelta
 from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.database.crud import AdModel
 from app.database.models_orm import User, Ad, Report, AdStatus
 from app.config import settings
+from app.services.referrals import make_code
 
 
 class SecurityService:
@@ -31,17 +33,24 @@ class SecurityService:
         r'(?:https?://|www\.)[^\s]+',  # Ссылки
     ]
 
+    # Столько объявлений за час — подозрение на спам
+    SPAM_ADS_PER_HOUR = 5
+
     def __init__(self):
         self.auto_moderation = settings.AUTO_MODERATION
         self.manual_moderation = settings.MANUAL_MODERATION_REQUIRED
 
     async def moderate_ad(
             self,
-            ad: Ad,
-            session: AsyncSession
+            title: str,
+            description: Optional[str],
+            user_id: int
     ) -> Tuple[bool, Optional[str]]:
         """
-        Модерация объявления
+        Модерация объявления перед публикацией (на любом DB_BACKEND)
+
+        Очереди ручной модерации у схемы бота нет: с MANUAL_MODERATION_REQUIRED
+        подозрительное объявление не публикуется, автор получает причину.
 
         Returns:
             (approved: bool, reason: Optional[str])
@@ -51,51 +60,34 @@ class SecurityService:
             return True, None
 
         # Проверка на запрещённые слова
-        text = f"{ad.title} {ad.description}".lower()
+        text = f"{title} {description or ''}".lower()
 
         for word in self.PROHIBITED_WORDS:
             if word in text:
                 return False, f"Запрещённое слово: {word}"
 
         # Проверка подозрительных паттернов
-        for pattern in self.SUSPICIOUS_PATTERNS:
-            if re.search(pattern, text, re.IGNORECASE):
-                # Отправляем на ручную модерацию
-                if self.manual_moderation:
-                    ad.status = AdStatus.MODERATION
-                    ad.moderation_status = "pending_review"
-                    await session.commit()
-                    return False, "Отправлено на ручную модерацию"
+        if self.manual_moderation:
+            for pattern in self.SUSPICIOUS_PATTERNS:
+                if re.search(pattern, text, re.IGNORECASE):
+                    return False, "Уберите из объявления контакты, ссылки и платёжные реквизиты"
 
         # Проверка на спам (слишком много объявлений за короткий период)
-        is_spam = await self._check_spam(ad.user_id, session)
+        is_spam = await self._check_spam(user_id)
         if is_spam:
             return False, "Подозрение на спам. Подождите перед созданием новых объявлений."
 
         return True, None
 
-    async def _check_spam(
-            self,
-            user_id: int,
-            session: AsyncSession
-    ) -> bool:
-        """Проверка на спам"""
+    async def _check_spam(self, user_id: int) -> bool:
+        """Проверка на спам: SPAM_ADS_PER_HOUR объявлений за последний час"""
 
-        # Считаем объявления за последний час
-        hour_ago = datetime.utcnow() - timedelta(hours=1)
+        # Первая страница «Моих объявлений» — новые первыми, даже снятые
+        page = await AdModel.get_user_ads_page(user_id, limit=self.SPAM_ADS_PER_HOUR)
+        hour_ago = (datetime.utcnow() - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+        recent = [ad for ad in page.items if ad.created_at and ad.created_at >= hour_ago]
 
-        result = await session.execute(
-            select(Ad).where(
-                and_(
-                    Ad.user_id == user_id,
-                    Ad.created_at >= hour_ago
-                )
-            )
-        )
-        recent_ads = result.scalars().all()
-
-        # Если больше 5 объявлений за час - подозрение на спам
-        return len(recent_ads) >= 5
+        return len(recent) >= self.SPAM_ADS_PER_HOUR
 
     async def verify_phone(
             self,
@@ -273,13 +265,8 @@ class SecurityService:
         return True, max_requests
 
     async def generate_referral_code(self, user_id: int) -> str:
-        """Генерация уникального реферального кода"""
-
-        # Используем user_id + random для уникальности
-        random_part = secrets.token_urlsafe(6)
-        code = f"REF{user_id}_{random_part}".upper()
-
-        return code
+        """Генерация уникального реферального кода (base32 номера + HMAC, см. referrals.make_code)"""
+        return make_code(user_id)
 
     def sanitize_input(self, text: str, max_length: int = 500) -> str:
         """Очистка пользовательского ввода"""
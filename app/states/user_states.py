@@ -29,6 +29,7 @@ class BrowseAdStates(StatesGroup):
 class ProfileStates(StatesGroup):
     viewing_profile = State()
     viewing_ads = State()
+    editing_price = State()
     editing_menu = State()
     editing_name = State()
     editing_phone = State()
@@ -18,6 +18,12 @@ from .formatters import (
     format_ad_text,
     format_profile_text,
 )
+from .hashing import (
+    simhash,
+    ad_text_hash,
+    image_dhash,
+    hamming,
+)
 
 __all__ = [
     "validate_text",
@@ -35,4 +41,8 @@ __all__ = [
     "format_phone",
     "format_ad_text",
     "format_profile_text",
+    "simhash",
+    "ad_text_hash",
+    "image_dhash",
+    "hamming",
 ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Сбор пачки из очереди: ждём первый элемент, затем добираем до size элементов,
+но не дольше interval секунд от первого. Общий цикл пакетной обработки
+(notifications.BatchNotifier, referrals.ReferralQueue).
+"""
+import asyncio
+from typing import Any, List
+
+
+async def next_batch(queue: asyncio.Queue, size: int, interval: float) -> List[Any]:
+    """Следующая пачка из queue: от 1 до size элементов"""
+    loop = asyncio.get_running_loop()
+    batch = [await queue.get()]
+    deadline = loop.time() + interval
+    while len(batch) < size:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
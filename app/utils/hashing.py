@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Сигнатуры для поиска почти-дубликатов объявлений.
+
+SimHash (64 бита) по нормализованному заголовку+описанию и dHash (64 бита) по фото.
+Для индекса сигнатура режется на LSH-полосы: две сигнатуры с расстоянием Хэмминга
+меньше числа полос обязательно совпадают хотя бы в одной полосе.
+"""
+import hashlib
+import io
+import re
+from typing import List, Optional, Tuple
+
+SIGNATURE_BITS = 64
+LSH_BANDS = 4
+BAND_BITS = SIGNATURE_BITS // LSH_BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Порог «почти одинаковых» сигнатур (должен быть < LSH_BANDS)
+TEXT_MAX_DISTANCE = 3
+PHOTO_MAX_DISTANCE = 3
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_URL_RE = re.compile(r"(?:https?://|www\.)\S+")
+
+
+def normalize_text(text: str) -> List[str]:
+    """Нормализация текста: нижний регистр, без ссылок и пунктуации, ё → е"""
+    text = _URL_RE.sub(" ", (text or "").lower()).replace("ё", "е")
+    return _WORD_RE.findall(text)
+
+
+def _shingles(tokens: List[str], size: int = 2) -> List[str]:
+    if len(tokens) < size:
+        return tokens
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def simhash(text: str) -> int:
+    """64-битный SimHash по биграммам слов"""
+    weights = [0] * SIGNATURE_BITS
+    for shingle in _shingles(normalize_text(text)):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        for bit in range(SIGNATURE_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def ad_text_hash(title: str, description: Optional[str]) -> int:
+    """Сигнатура текста объявления"""
+    return simhash(f"{title} {description or ''}")
+
+
+def image_dhash(image_bytes: bytes) -> Optional[int]:
+    """Перцептивный dHash фото (8x8 градиентов по яркости)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = value << 1 | (left > right)
+    # Однотонная картинка (заглушка) — сигнатура неинформативна
+    return value or None
+
+
+def hamming(a: int, b: int) -> int:
+    """Расстояние Хэмминга между сигнатурами"""
+    return bin((a ^ b) & (1 << SIGNATURE_BITS) - 1).count("1")
+
+
+def lsh_bands(signature: int) -> List[Tuple[int, int]]:
+    """Разбиение сигнатуры на (номер полосы, корзина)"""
+    signature &= (1 << SIGNATURE_BITS) - 1
+    return [(band, signature >> (band * BAND_BITS) & BAND_MASK) for band in range(LSH_BANDS)]
+
+
+def to_sqlite_int(signature: Optional[int]) -> Optional[int]:
+    """Беззнаковые 64 бита → знаковый INTEGER SQLite"""
+    if signature is None:
+        return None
+    return signature - (1 << SIGNATURE_BITS) if signature >= 1 << (SIGNATURE_BITS - 1) else signature
+
+
+def from_sqlite_int(value: Optional[int]) -> Optional[int]:
+    """Знаковый INTEGER SQLite → беззнаковые 64 бита"""
+    if value is None:
+        return None
+    return value & (1 << SIGNATURE_BITS) - 1
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики процесса: гистограммы задержек и счётчики в формате Prometheus.
+
+Включаются METRICS_ENABLED. Когда выключены, instrument() возвращает класс без
+изменений, а middleware не регистрируются — накладных расходов нет.
+
+Бот и админка — разные процессы (а в кластере воркеров несколько), поэтому каждый
+процесс периодически сбрасывает снимок в METRICS_DIR/<pid>.json, а админка на
+/metrics складывает снимки живых процессов со своими метриками.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+HELP = {
+    "swapbot_db_query_seconds": ("histogram", "Время выполнения запроса к БД по методу модели"),
+    "swapbot_db_query_rows_total": ("counter", "Строк возвращено методом модели"),
+    "swapbot_db_slow_queries_total": ("counter", "Запросов дольше METRICS_SLOW_QUERY_MS"),
+    "swapbot_handler_seconds": ("histogram", "Время выполнения хендлера"),
+    "swapbot_handler_errors_total": ("counter", "Исключений в хендлере"),
+    "swapbot_telegram_request_seconds": ("histogram", "Время запроса к Bot API по методу"),
+    "swapbot_loop_blocked_seconds": ("histogram", "Длительность блокировок event loop дольше LOOP_SLOW_CALLBACK_MS"),
+    "swapbot_loop_blocked_total": ("counter", "Блокировок event loop дольше LOOP_SLOW_CALLBACK_MS"),
+}
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (счётчики не накопительные)"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Хранилище метрик процесса"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+
+    def observe(self, name: str, labels: Labels, value: float):
+        series = self.histograms.setdefault(name, {})
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, labels: Labels, amount: float = 1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "histograms": {
+                name: [[list(labels), h.counts, h.sum, h.count] for labels, h in series.items()]
+                for name, series in self.histograms.items()
+            },
+            "counters": {
+                name: [[list(labels), value] for labels, value in series.items()]
+                for name, series in self.counters.items()
+            },
+        }
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """Прибавить снимок другого процесса"""
+        for name, series in snapshot.get("histograms", {}).items():
+            target = self.histograms.setdefault(name, {})
+            for labels, counts, total, count in series:
+                key = tuple(tuple(pair) for pair in labels)
+                histogram = target.get(key)
+                if histogram is None:
+                    histogram = target[key] = Histogram()
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+        for name, series in snapshot.get("counters", {}).items():
+            for labels, value in series:
+                self.inc(name, tuple(tuple(pair) for pair in labels), value)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines: List[str] = []
+        for name in sorted(set(self.histograms) | set(self.counters)):
+            kind, help_text = HELP.get(name, ("histogram" if name in self.histograms else "counter", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, histogram in sorted(self.histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for labels, value in sorted(self.counters.get(name, {}).items()):
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    pairs = [f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for key, value in labels]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _row_count(result: Any) -> int:
+    if isinstance(result, list):
+        return len(result)
+    return 0 if result is None or result is False else 1
+
+
+def _describe_arg(value: Any) -> str:
+    if isinstance(value, (str, bytes, list, tuple, dict, set)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def _describe_args(args: tuple, kwargs: dict) -> str:
+    """Типы и длины аргументов — сами значения (тексты, телефоны) в лог не пишем"""
+    parts = [_describe_arg(v) for v in args]
+    parts += [f"{k}={_describe_arg(v)}" for k, v in kwargs.items()]
+    return "(" + ", ".join(parts) + ")"
+
+
+def instrument(cls):
+    """
+    Декоратор класса модели: замер всех async-методов (staticmethod).
+
+    Имя запроса — «Класс.метод». При выключенных метриках класс возвращается как есть.
+    """
+    if not metrics.enabled:
+        return cls
+
+    slow = settings.METRICS_SLOW_QUERY_MS / 1000
+    for attr, value in list(vars(cls).items()):
+        if not isinstance(value, staticmethod) or not inspect.iscoroutinefunction(value.__func__):
+            continue
+        setattr(cls, attr, staticmethod(_timed(value.__func__, f"{cls.__name__}.{attr}", slow)))
+    return cls
+
+
+def _timed(func, name: str, slow: float):
+    labels = (("query", name),)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        result = await func(*args, **kwargs)
+        elapsed = time.perf_counter() - started
+        metrics.observe("swapbot_db_query_seconds", labels, elapsed)
+        metrics.inc("swapbot_db_query_rows_total", labels, _row_count(result))
+        if elapsed >= slow:
+            metrics.inc("swapbot_db_slow_queries_total", labels)
+            logger.warning(f"Медленный запрос {name}: {elapsed * 1000:.0f} мс, аргументы {_describe_args(args, kwargs)}")
+        return result
+
+    return wrapper
+
+
+def _snapshot_path(pid: Optional[int] = None) -> Path:
+    return Path(settings.METRICS_DIR) / f"{pid or os.getpid()}.json"
+
+
+def dump():
+    """Снимок метрик процесса на диск (атомарно)"""
+    path = _snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(metrics.snapshot()), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+async def export_loop(interval: Optional[float] = None):
+    """Периодический сброс снимка; при отмене — последний сброс и выход"""
+    interval = interval or settings.METRICS_EXPORT_INTERVAL
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            dump()
+    except asyncio.CancelledError:
+        dump()
+        raise
+
+
+def start_exporter() -> Optional[asyncio.Task]:
+    """Запуск export_loop, если метрики включены"""
+    if not metrics.enabled:
+        return None
+    return asyncio.create_task(export_loop())
+
+
+def collect() -> str:
+    """Метрики этого процесса и свежих снимков других процессов в формате Prometheus"""
+    registry = MetricsRegistry(enabled=True)
+    registry.merge(metrics.snapshot())
+
+    directory = Path(settings.METRICS_DIR)
+    stale_after = settings.METRICS_EXPORT_INTERVAL * 4
+    now = time.time()
+    if directory.is_dir():
+        for path in directory.glob("*.json"):
+            if path == _snapshot_path():
+                continue
+            try:
+                if now - path.stat().st_mtime > stale_after:
+                    continue  # процесс завершился
+                registry.merge(json.loads(path.read_text(encoding="utf-8")))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Не удалось прочитать снимок метрик {path}: {e}")
+    return registry.render()
+
+
+# Singleton
+metrics = MetricsRegistry(enabled=settings.METRICS_ENABLED)
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Профилирование живого процесса бота.
+
+SamplingProfiler — сэмплирующий профилировщик: отдельный поток каждые несколько
+миллисекунд снимает стек потока event loop. Каждый сэмпл помечается корневым кадром:
+«cpu» — поток занимал процессор, «off-cpu» — стоял в блокирующем вызове (sleep,
+синхронный ввод-вывод), «idle» — loop ждал событий в selector. Результат — collapsed
+stacks («кадр;кадр;кадр число»), понятный flamegraph.pl и speedscope. Параллельно
+внутри loop отмечается, какие задачи дольше всего стояли на одном await.
+
+LoopWatchdog — детектор медленных колбэков: если loop не отвечает дольше
+LOOP_SLOW_CALLBACK_MS, в лог пишется длительность и стек, на котором он застрял.
+
+Профиль запускается командой /profile в боте или через POST /profile админки.
+Админка — другой процесс, поэтому она кладёт запрос в PROFILER_DIR/requests, а
+процессы бота (все воркеры кластера) подхватывают его и пишут результат рядом.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+REQUEST_MAX_AGE = 10  # запросы старше, секунды, считаются устаревшими
+REQUEST_POLL_INTERVAL = 1.0
+ASYNCIO_DIR = os.path.dirname(asyncio.__file__)
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    path = Path(filename)
+    try:
+        return path.resolve().relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return "/".join(path.parts[-2:])
+
+
+def _frame_label(code, line: Optional[int] = None) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{line or code.co_firstlineno})"
+
+
+def _stack_labels(frame) -> List[str]:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_idle(frame) -> bool:
+    # run_forever → _run_once → selector.select: loop ждёт событий
+    return frame is not None and frame.f_code.co_name == "select" and frame.f_code.co_filename.endswith("selectors.py")
+
+
+def _cpu_clock(thread_id: int) -> Optional[int]:
+    try:
+        return time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):  # не Linux/BSD
+        return None
+
+
+@dataclass
+class Profile:
+    """Результат профилирования"""
+
+    seconds: float
+    interval: float
+    # стек → миллисекунды: сэмпл весит столько, сколько прошло с предыдущего,
+    # иначе CPU-нагрузка, реже отпускающая GIL потоку-сэмплеру, недооценивается
+    stacks: Dict[Tuple[str, ...], int] = field(default_factory=dict)
+    samples: int = 0
+    waits: Dict[Tuple[str, str], float] = field(default_factory=dict)
+    max_lag: float = 0.0
+    cpu_measured: bool = True
+
+    def collapsed(self, prefix: str = "") -> str:
+        """Collapsed stacks: одна строка на уникальный стек, вес — миллисекунды"""
+        head = f"{prefix};" if prefix else ""
+        return "".join(f"{head}{';'.join(stack)} {count}\n"
+                       for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]))
+
+    def summary(self, top: int = 10) -> str:
+        """Краткий текстовый отчёт: доля cpu/off-cpu/idle, горячие функции, долгие await"""
+        total = sum(self.stacks.values()) or 1
+        by_state: Dict[str, int] = {}
+        self_time: Dict[str, int] = {}
+        for stack, count in self.stacks.items():
+            by_state[stack[0]] = by_state.get(stack[0], 0) + count
+            if stack[0] != "idle" and len(stack) > 1:
+                self_time[stack[-1]] = self_time.get(stack[-1], 0) + count
+
+        lines = [f"{self.seconds:.1f} с, {self.samples} сэмплов по {self.interval * 1000:.0f} мс"]
+        states = ("cpu", "off-cpu", "idle") if self.cpu_measured else ("busy", "idle")
+        lines.append(", ".join(f"{state} {by_state.get(state, 0) / total:.0%}" for state in states))
+        lines.append(f"Макс. задержка loop: {self.max_lag * 1000:.0f} мс")
+        if self_time:
+            lines.append("\nГорячие функции (собственное время):")
+            for label, count in sorted(self_time.items(), key=lambda item: -item[1])[:top]:
+                lines.append(f"  {count:8d} мс  {label}")
+        if self.waits:
+            lines.append("\nДольше всего ждали на одном await:")
+            for (task, where), waited in sorted(self.waits.items(), key=lambda item: -item[1])[:top]:
+                lines.append(f"  {waited * 1000:8.0f} мс  {task} @ {where}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик потока event loop"""
+
+    def __init__(self, interval: float = 0.005, task_interval: float = 0.02):
+        self.interval = interval
+        self.task_interval = task_interval
+
+    async def run(self, seconds: float) -> Profile:
+        """Профилировать текущий loop seconds секунд (остальные задачи работают как обычно)"""
+        profile = Profile(seconds=seconds, interval=self.interval)
+        thread_id = threading.get_ident()
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample, args=(thread_id, profile, stop), name="profiler", daemon=True,
+        )
+        sampler.start()
+        started = time.monotonic()
+        try:
+            await self._watch_tasks(profile, started + seconds)
+        finally:
+            stop.set()
+            await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+        profile.seconds = time.monotonic() - started
+        return profile
+
+    def _sample(self, thread_id: int, profile: Profile, stop: threading.Event):
+        clock = _cpu_clock(thread_id)
+        profile.cpu_measured = clock is not None
+        last_wall = time.monotonic()
+        last_cpu = time.clock_gettime(clock) if clock is not None else 0.0
+
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            wall = time.monotonic()
+            if _is_idle(frame):
+                state = "idle"
+            elif clock is None:
+                state = "busy"
+            else:
+                cpu = time.clock_gettime(clock)
+                state = "cpu" if cpu - last_cpu >= (wall - last_wall) / 2 else "off-cpu"
+                last_cpu = cpu
+            weight = max(1, round((wall - last_wall) * 1000))
+            last_wall = wall
+            stack = (state, *_stack_labels(frame))
+            profile.stacks[stack] = profile.stacks.get(stack, 0) + weight
+            profile.samples += 1
+            del frame
+
+    async def _watch_tasks(self, profile: Profile, deadline: float):
+        """Внутри loop: на каком await стоит каждая задача и сколько; задержка самого loop"""
+        current = asyncio.current_task()
+        suspended: Dict[int, Tuple[Tuple[str, object], float]] = {}
+        while True:
+            expected = time.monotonic() + self.task_interval
+            await asyncio.sleep(self.task_interval)
+            now = time.monotonic()
+            profile.max_lag = max(profile.max_lag, now - expected)
+
+            alive = set()
+            for task in asyncio.all_tasks():
+                if task is current or task.done():
+                    continue
+                waiting = _awaiting(task)
+                if waiting is None:
+                    continue
+                alive.add(id(task))
+                previous = suspended.get(id(task))
+                # Ожидаемый объект держим до следующей проверки, чтобы сравнивать по is, а не по id
+                since = previous[1] if previous and previous[0][1] is waiting[1] else now
+                suspended[id(task)] = (waiting, since)
+                key = (task.get_name(), waiting[0])
+                profile.waits[key] = max(profile.waits.get(key, 0.0), now - since)
+            for task_id in set(suspended) - alive:
+                del suspended[task_id]
+
+            if now >= deadline:
+                return
+
+
+def _awaiting(task: asyncio.Task) -> Optional[Tuple[str, object]]:
+    """
+    Где стоит задача: (место await в нашем коде, ожидаемый объект).
+
+    Один и тот же await в цикле каждый раз ждёт новый future — по нему видно,
+    что задача успела проснуться между проверками.
+    """
+    coro = task.get_coro()
+    frame = getattr(coro, "cr_frame", None)
+    if frame is None or frame.f_code.co_filename == __file__:
+        return None  # не корутина или задачи самого профилировщика
+    awaited = coro
+    while getattr(awaited, "cr_await", None) is not None:
+        awaited = awaited.cr_await
+        inner = getattr(awaited, "cr_frame", None)
+        if inner is not None and not inner.f_code.co_filename.startswith(ASYNCIO_DIR):
+            frame = inner
+    return _frame_label(frame.f_code, frame.f_lineno), awaited
+
+
+class LoopWatchdog:
+    """
+    Детектор медленных колбэков.
+
+    Задача в loop отмечается каждые threshold/2; поток-сторож, увидев, что отметки
+    нет дольше threshold, снимает стек потока loop. Когда loop оживает, в лог уходит
+    длительность блокировки и этот стек.
+    """
+
+    def __init__(self, threshold_ms: int):
+        self.threshold = threshold_ms / 1000
+        self._beat = time.monotonic()
+        self._blocked_stack: Optional[str] = None
+        self._thread_id = 0
+
+    async def run(self):
+        self._thread_id = threading.get_ident()
+        stop = threading.Event()
+        threading.Thread(target=self._watch, args=(stop,), name="loop-watchdog", daemon=True).start()
+        period = self.threshold / 2
+        try:
+            while True:
+                self._beat = time.monotonic()
+                await asyncio.sleep(period)
+                lag = time.monotonic() - self._beat - period
+                if lag >= self.threshold:
+                    self._report(lag)
+        finally:
+            stop.set()
+
+    def _report(self, lag: float):
+        stack, self._blocked_stack = self._blocked_stack, None
+        if metrics.enabled:
+            metrics.inc("swapbot_loop_blocked_total", ())
+            metrics.observe("swapbot_loop_blocked_seconds", (), lag)
+        logger.warning(f"Event loop заблокирован на {lag * 1000:.0f} мс"
+                       + (f", стек во время блокировки:\n{stack}" if stack else ""))
+
+    def _watch(self, stop: threading.Event):
+        beat_seen = None
+        while not stop.wait(self.threshold / 4):
+            beat = self._beat
+            if beat == beat_seen or time.monotonic() - beat < self.threshold:
+                continue
+            beat_seen = beat  # один стек на одну блокировку
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None:
+                stack = traceback.extract_stack(frame)
+                del frame
+                # Кадры самого loop (run_forever → _run_once → Handle._run) неинтересны
+                start = max((i + 1 for i, entry in enumerate(stack)
+                             if entry.name == "_run" and entry.filename.endswith("events.py")), default=0)
+                self._blocked_stack = "".join(traceback.format_list(stack[start:]))
+
+
+# ==================== ЗАПРОСЫ ИЗ АДМИНКИ ====================
+
+def _requests_dir() -> Path:
+    return Path(settings.PROFILER_DIR) / "requests"
+
+
+def request_profile(seconds: int) -> str:
+    """Попросить все процессы бота снять профиль (вызывается из админки). Возвращает id запроса"""
+    request_id = uuid.uuid4().hex
+    directory = _requests_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / f"{request_id}.tmp"
+    tmp.write_text(json.dumps({"seconds": seconds}), encoding="utf-8")
+    os.replace(tmp, directory / f"{request_id}.json")
+    return request_id
+
+
+def read_results(request_id: str, suffix: str) -> List[Tuple[str, str]]:
+    """Результаты процессов по запросу: [(pid, текст)]"""
+    directory = Path(settings.PROFILER_DIR) / request_id
+    if not directory.is_dir():
+        return []
+    return [(path.stem, path.read_text(encoding="utf-8")) for path in sorted(directory.glob(f"*{suffix}"))]
+
+
+def cleanup_request(request_id: str):
+    (_requests_dir() / f"{request_id}.json").unlink(missing_ok=True)
+    directory = Path(settings.PROFILER_DIR) / request_id
+    if directory.is_dir():
+        for path in directory.iterdir():
+            path.unlink(missing_ok=True)
+        directory.rmdir()
+
+
+async def _serve_requests():
+    """Процесс бота: подхватить запросы профилирования из PROFILER_DIR/requests"""
+    seen = set()
+    profiler = SamplingProfiler()
+    while True:
+        await asyncio.sleep(REQUEST_POLL_INTERVAL)
+        directory = _requests_dir()
+        if not directory.is_dir():
+            continue
+        for path in directory.glob("*.json"):
+            if path.stem in seen:
+                continue
+            seen.add(path.stem)
+            try:
+                if time.time() - path.stat().st_mtime > REQUEST_MAX_AGE:
+                    continue
+                seconds = min(float(json.loads(path.read_text(encoding="utf-8"))["seconds"]),
+                              settings.PROFILER_MAX_SECONDS)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Некорректный запрос профилирования {path}: {e}")
+                continue
+
+            logger.info(f"Профилирование по запросу {path.stem}: {seconds:.0f} с")
+            profile = await profiler.run(seconds)
+            out = Path(settings.PROFILER_DIR) / path.stem
+            out.mkdir(parents=True, exist_ok=True)
+            (out / f"{os.getpid()}.collapsed").write_text(profile.collapsed(f"pid {os.getpid()}"), encoding="utf-8")
+            (out / f"{os.getpid()}.txt").write_text(profile.summary(), encoding="utf-8")
+
+
+def start_profiler() -> Optional[asyncio.Task]:
+    """Фоновые задачи профилирования процесса бота (если что-то из них включено)"""
+    jobs = []
+    if settings.LOOP_SLOW_CALLBACK_MS > 0:
+        jobs.append(LoopWatchdog(settings.LOOP_SLOW_CALLBACK_MS).run())
+    if settings.PROFILER_ENABLED:
+        jobs.append(_serve_requests())
+    if not jobs:
+        return None
+    return asyncio.create_task(_run_all(jobs))
+
+
+async def _run_all(jobs):
+    await asyncio.gather(*jobs)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Режим webhook: python -m app.webhook
+
+Telegram сам присылает обновления на WEBHOOK_URL + WEBHOOK_PATH. Запрос проверяется
+по X-Telegram-Bot-Api-Secret-Token, кладётся в ограниченную очередь и сразу
+подтверждается. Из очереди обновления по порядку передаются в диспетчер, а
+параллельность (UPDATE_CONCURRENCY) и порядок внутри чата обеспечивает UpdateScheduler.
+Реплик может быть несколько за балансировщиком (webhook выставляет только одна:
+WEBHOOK_SET_ON_STARTUP).
+
+При SIGTERM сервер перестаёт принимать обновления (503 — Telegram повторит позже),
+дожидается обработки очереди (не дольше WEBHOOK_DRAIN_TIMEOUT) и завершается.
+"""
+import asyncio
+import logging
+import secrets
+import signal
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.bot import create_bot, create_dispatcher, prepare
+from app.config import settings
+from app.utils.metrics import start_exporter
+from app.utils.profiler import start_profiler
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """aiohttp-приложение, принимающее обновления от Telegram"""
+
+    def __init__(self, bot: Bot, dp: Dispatcher, secret: str = "", path: str = "/webhook",
+                 queue_size: int = 1000, feed: Optional[Callable[[Update], Awaitable]] = None):
+        self.bot = bot
+        self.dp = dp
+        # По умолчанию обновление обрабатывает dp; кластер подставляет маршрутизацию по воркерам
+        self.feed = feed or (lambda update: dp.feed_update(bot, update))
+        self.secret = secret
+        self.path = path
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.draining = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle_update)
+        self.app.router.add_get("/health", self.handle_health)
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_shutdown.append(self._on_shutdown)
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.draining:
+            return web.Response(status=503)
+        if self.secret and not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate_json(await request.read(), context={"bot": self.bot})
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram повторит доставку — естественный backpressure
+            return web.Response(status=503)
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "draining" if self.draining else "ok",
+            "queued": self.queue.qsize(),
+        }, status=503 if self.draining else 200)
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.feed(update)
+            except Exception as e:
+                logger.exception(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _on_startup(self, app: web.Application):
+        self._task = asyncio.create_task(self._worker())
+
+    async def _on_shutdown(self, app: web.Application):
+        await self.drain(settings.WEBHOOK_DRAIN_TIMEOUT)
+
+    async def drain(self, timeout: float):
+        """Перестать принимать обновления и дождаться обработки очереди"""
+        self.draining = True
+        if not self._task:
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не успели обработать {self.queue.qsize()} обновлений за {timeout} с")
+        scheduler = self.dp.get("update_scheduler")
+        if scheduler and not await scheduler.join(max(deadline - loop.time(), 0)):
+            logger.warning(f"Не успели обработать {scheduler.pending} обновлений за {timeout} с")
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+async def main(host: Optional[str] = None, port: Optional[int] = None) -> None:
+    await prepare()
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    server = WebhookServer(
+        bot, dp,
+        secret=settings.WEBHOOK_SECRET,
+        path=settings.WEBHOOK_PATH,
+        queue_size=settings.WEBHOOK_QUEUE_SIZE,
+    )
+
+    if not settings.WEBHOOK_SECRET:
+        logger.warning("WEBHOOK_SECRET не задан — запросы к webhook не проверяются")
+
+    if settings.WEBHOOK_SET_ON_STARTUP:
+        if not settings.WEBHOOK_URL:
+            raise SystemExit("WEBHOOK_URL не задан. Укажите публичный адрес бота или WEBHOOK_SET_ON_STARTUP=false")
+        await bot.set_webhook(
+            settings.WEBHOOK_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        )
+
+    runner = web.AppRunner(server.app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host or settings.WEBHOOK_HOST, port or settings.WEBHOOK_PORT)
+    await site.start()
+    logging.info(f"🤖 SwapBot запущен (webhook, до {settings.UPDATE_CONCURRENCY} обновлений параллельно)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    exporter = start_exporter()
+    profiler = start_profiler()
+    try:
+        await stop.wait()
+        logging.info("Остановка: дожидаемся обработки очереди")
+        await server.drain(settings.WEBHOOK_DRAIN_TIMEOUT)
+    finally:
+        for task in (exporter, profiler):
+            if task:
+                task.cancel()
+        await runner.cleanup()
+        await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import pytest_asyncio
+
+from app.config import settings
+
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path, monkeypatch):
+    """Пустая SQLite-база бота со схемой и триггерами init_db"""
+    from app.database.db import init_db
+
+    monkeypatch.setattr(settings, "DB_PATH", str(tmp_path / "bot.db"))
+    await init_db()
+    return settings.DB_PATH
+
+
+@pytest_asyncio.fixture
+async def orm_db(tmp_path, monkeypatch):
+    """Пустая база репозитория SQLAlchemy (sqlite+aiosqlite) со схемой init_models"""
+    from app.database import repository
+
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'orm.db'}")
+    await repository.init_models()
+    yield settings.DATABASE_URL
+    await repository.dispose()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""REST API модератора (admin/api.py): общий кеш ответов и keyset-пагинация"""
+import asyncio
+
+import aiosqlite
+import pytest
+import pytest_asyncio
+
+from admin import api
+from admin.exports import iter_rows
+from app.database.pool import ReadOnlyPool
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_cancelled_first_request_does_not_cancel_waiters():
+    cache = api.ResponseCache(ttl=60)
+    release = asyncio.Event()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await release.wait()
+        return {"ok": True}
+
+    first = asyncio.create_task(cache.get("k", produce))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(cache.get("k", produce))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    body, etag = await asyncio.wait_for(second, 1)
+    assert body == b'{"ok": true}'
+    assert first.cancelled()
+    assert calls == [1]
+    # Результат заполнения остался в кеше
+    assert await cache.get("k", produce) == (body, etag)
+    assert calls == [1]
+
+
+@pytest_asyncio.fixture
+async def pool(sqlite_db, monkeypatch):
+    pool = ReadOnlyPool(size=1, path=sqlite_db)
+    monkeypatch.setattr(api, "pool", pool)
+    yield pool
+    await pool.close()
+
+
+async def test_users_pages_include_null_created_at(sqlite_db, pool):
+    async with aiosqlite.connect(sqlite_db) as db:
+        await db.executemany("INSERT INTO users (tg_id, name, created_at) VALUES (?, ?, ?)", [
+            (1, "a", "2024-01-01 00:00:00"),
+            (2, "b", "2024-01-02 00:00:00"),
+            (3, "c", None),
+            (4, "d", None),
+            (5, "e", "2024-01-02 00:00:00"),
+        ])
+        await db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page = await api.fetch_page(api.USERS, [], [], cursor, limit=2)
+        seen += [item["tg_id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # Новые первыми, строки без даты — в конце, без пропусков и повторов
+    assert seen == [5, 2, 1, 4, 3]
+
+
+async def test_users_export_includes_null_created_at(sqlite_db, pool):
+    async with aiosqlite.connect(sqlite_db) as db:
+        await db.executemany("INSERT INTO users (tg_id, name, created_at) VALUES (?, ?, ?)",
+                             [(1, "a", "2024-01-01 00:00:00"), (2, "b", None), (3, "c", None)])
+        await db.commit()
+
+    db = await pool.connect()
+    try:
+        exported = [row["tg_id"] async for rows in iter_rows(db, api.USERS, 1) for row in rows]
+    finally:
+        await db.close()
+    assert exported == [2, 3, 1]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Доступ к админке по ADMIN_TOKEN (admin/auth.py)"""
+import httpx
+import pytest
+
+from admin.main import app
+from app.config import settings
+
+pytestmark = pytest.mark.asyncio
+
+TOKEN = "t0ken"
+PROTECTED = [
+    ("GET", "/stats"),
+    ("GET", "/api/users"),
+    ("GET", "/export/users.csv"),
+    ("GET", "/events/stream"),
+    ("POST", "/profile"),
+    ("POST", "/media"),
+    ("GET", "/media/ab/" + "a" * 64 + "_thumb.webp"),
+]
+
+
+@pytest.fixture
+def client(sqlite_db):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://admin")
+
+
+@pytest.mark.parametrize("method,path", PROTECTED)
+async def test_protected_without_token(client, monkeypatch, method, path):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", TOKEN)
+    async with client:
+        assert (await client.request(method, path)).status_code == 401
+        wrong = await client.request(method, path, headers={"Authorization": "Bearer nope"})
+        assert wrong.status_code == 401
+
+
+async def test_closed_when_token_not_set(client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    async with client:
+        response = await client.get("/stats", headers={"Authorization": "Bearer "})
+        assert response.status_code == 503
+        assert (await client.get("/health")).status_code == 200
+
+
+async def test_token_opens_panel(client, monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", TOKEN)
+    async with client:
+        response = await client.get("/stats", headers={"Authorization": f"Bearer {TOKEN}"})
+        assert response.status_code == 200
+        assert "counters" in response.json()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Совместимость бэкендов: сценарий app.devtools.conformance на aiosqlite-моделях
+и на repository.py даёт одинаковые ответы.
+
+sqlite — временный sqlite+aiosqlite; postgres — DATABASE_URL из окружения
+(postgresql+asyncpg://…, пустая база), без него тест пропускается.
+"""
+import os
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import settings
+from app.devtools import conformance
+
+pytestmark = pytest.mark.asyncio
+
+POSTGRES_URL = os.environ.get("DATABASE_URL", "")
+
+
+async def _has_users(url: str) -> bool:
+    engine = create_async_engine(url)
+    try:
+        async with engine.connect() as conn:
+            tables = await conn.run_sync(lambda sync: inspect(sync).get_table_names())
+            return "users" in tables and bool(await conn.scalar(text("SELECT COUNT(*) FROM users")))
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.parametrize("backend", [
+    "sqlite",
+    pytest.param("postgres", marks=pytest.mark.skipif(
+        not POSTGRES_URL.startswith("postgresql"), reason="DATABASE_URL не указывает на Postgres")),
+])
+async def test_backends_agree(backend, monkeypatch):
+    # run() переключает DB_PATH и DATABASE_URL — вернуть после теста
+    monkeypatch.setattr(settings, "DB_PATH", settings.DB_PATH)
+    monkeypatch.setattr(settings, "DATABASE_URL", settings.DATABASE_URL)
+    url = None
+    if backend == "postgres":
+        if await _has_users(POSTGRES_URL):
+            pytest.skip("Сценарию нужна пустая база, в DATABASE_URL уже есть пользователи")
+        url = POSTGRES_URL
+
+    assert await conformance.run(url) == []
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""События достижений из записей моделей бота на обоих бэкендах (app/services/gamification.py)"""
+import pytest
+
+from app.config import settings
+from app.database import models, repository
+from app.database.models_orm import Swap, User
+from app.services import gamification
+from app.services.gamification import gamification_service
+from app.services.referrals import apply_referrals, make_code
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _users(*ids):
+    for tg_id in ids:
+        await repository.UserModel.get_or_create(tg_id)
+
+
+async def _completed_swap() -> int:
+    await _users(1, 2)
+    ad1 = await repository.AdModel.create(1, "electronics", "Телефон", "Почти новый", None, None)
+    ad2 = await repository.AdModel.create(2, "electronics", "Планшет", "С чехлом", None, None)
+    _, swap_id = await repository.SwapModel.create(ad2, ad1, 1, 2)
+    return swap_id
+
+
+async def _state(swap_id: int):
+    async with repository.session() as s:
+        users = [await s.get(User, tg_id) for tg_id in (1, 2)]
+        swap = await s.get(Swap, swap_id)
+        return [(u.experience_points, u.successful_swaps) for u in users], swap.status
+
+
+async def test_swap_awards_both_users_once(orm_db):
+    swap_id = await _completed_swap()
+    for _ in range(2):
+        await repository.SwapModel.update_status(swap_id, "completed")
+
+    users, _ = await _state(swap_id)
+    # 50 за early_adopter при регистрации, затем 20 за обмен, +5 за рейтинг 5.0, +10 за first_swap
+    assert users == [(85, 1), (85, 1)]
+
+
+async def test_swap_awards_are_one_transaction(orm_db, monkeypatch):
+    swap_id = await _completed_swap()
+    before = await _state(swap_id)
+    award = gamification_service.award_swap_completion
+
+    async def fail_second(user, session):
+        if user.id == 2:
+            raise RuntimeError("сбой")
+        return await award(user, session)
+
+    monkeypatch.setattr(gamification_service, "award_swap_completion", fail_second)
+    with pytest.raises(RuntimeError):
+        await repository.SwapModel.update_status(swap_id, "completed")
+
+    # Ни награды первого участника, ни смены статуса
+    assert await _state(swap_id) == before
+
+
+async def test_registration_rank_is_bounded(orm_db, monkeypatch):
+    monkeypatch.setattr(gamification, "EARLY_ADOPTERS", 2)
+    await _users(1, 2, 3, 4)
+
+    async with repository.session() as s:
+        ranks = [(await gamification_service.get_progress(tg_id, s))["registration_rank"] for tg_id in (1, 2, 3, 4)]
+    assert ranks == [1, 2, 3, 3]
+
+
+async def test_sqlite_swap_awards_both_users_once(sqlite_db):
+    for tg_id in (1, 2):
+        await models.UserModel.get_or_create(tg_id)
+    ad1 = await models.AdModel.create(1, "electronics", "Телефон", "Почти новый", None, None)
+    ad2 = await models.AdModel.create(2, "electronics", "Планшет", "С чехлом", None, None)
+    _, swap_id = await models.SwapModel.create(ad2, ad1, 1, 2)
+    for _ in range(2):
+        await models.SwapModel.update_status(swap_id, "completed")
+
+    profiles = [await models.UserModel.get_profile(tg_id) for tg_id in (1, 2)]
+    # Те же правила, что у репозитория: 50 + 20 + 5 + 10
+    assert [(p.experience_points, p.level, p.achievements) for p in profiles] == [(85, 2, 2), (85, 2, 2)]
+
+
+async def test_sqlite_referrals_apply_once(sqlite_db):
+    for tg_id in (1, 2, 3):
+        await models.UserModel.get_or_create(tg_id)
+
+    applied = await apply_referrals([(make_code(1), 2), (make_code(1), 3), (make_code(3), 2), ("bogus", 3)])
+    assert applied == {1: [2, 3]}
+    assert await apply_referrals([(make_code(3), 2)]) == {}
+
+    referrer = await models.UserModel.get_profile(1)
+    assert referrer.experience_points == 50 + 2 * settings.REFERRAL_BONUS
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Таблицы лидеров (db.LEADERBOARD_TRIGGERS) и их копия в памяти (SortedBoard)"""
+import pytest
+
+from app.config import constants
+from app.database.models import LeaderboardModel, RatingModel, UserModel
+from app.services.leaderboard import SortedBoard
+
+pytestmark = pytest.mark.asyncio
+
+RIGA = (56.95, 24.11)
+
+
+async def _rate(user_id: int, stars: list) -> None:
+    await UserModel.get_or_create(user_id)
+    for rater, value in enumerate(stars, 1):
+        await UserModel.get_or_create(rater)
+        assert await RatingModel.add_rating(rater, user_id, value)
+
+
+@pytest.mark.parametrize("stars", [5, 4])
+async def test_enters_board_when_average_does_not_change(sqlite_db, stars):
+    # Три пятёрки не меняют рейтинг по умолчанию, три четвёрки — после первой
+    await _rate(100, [stars] * constants.LEADERBOARD_MIN_RATINGS)
+
+    assert await LeaderboardModel.board("rating") == [(100, float(stars))]
+
+
+async def test_not_on_board_below_min_ratings(sqlite_db):
+    await _rate(100, [5] * (constants.LEADERBOARD_MIN_RATINGS - 1))
+
+    assert await LeaderboardModel.board("rating") == []
+
+
+async def test_score_follows_average(sqlite_db):
+    await _rate(100, [5, 5, 5, 1])
+
+    assert await LeaderboardModel.board("rating") == [(100, 4.0)]
+
+
+async def test_city_board(sqlite_db):
+    await UserModel.get_or_create(100)
+    await UserModel.update_location(100, *RIGA, "Рига")
+    await _rate(100, [5] * constants.LEADERBOARD_MIN_RATINGS)
+
+    boards = {board for board, user_id, score, _ in await LeaderboardModel.changes(0) if user_id == 100}
+    assert "rating" in boards
+    assert any(board.startswith("rating:cell:") for board in boards)
+
+
+async def test_xp_board(sqlite_db):
+    await UserModel.get_or_create(100)
+    await UserModel.update_location(100, *RIGA, "Рига")
+    xp = (await UserModel.get_profile(100)).experience_points
+    assert xp > 0
+
+    assert await LeaderboardModel.board("xp") == [(100, float(xp))]
+    boards = {board for board, user_id, score, _ in await LeaderboardModel.changes(0) if user_id == 100 and score}
+    assert any(board.startswith("xp:cell:") for board in boards)
+
+
+async def test_sorted_board_updates():
+    board = SortedBoard([(1, 10.0), (2, 30.0), (3, 20.0)])
+    assert board.top(2) == [(2, 30.0), (3, 20.0)]
+
+    board.set(1, 40.0)
+    board.set(2, None)
+    assert board.top(10) == [(1, 40.0), (3, 20.0)]
+    assert board.rank(1) == 1 and board.rank(3) == 2
+    assert board.rank(2) is None
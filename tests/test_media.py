@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Медиа-хранилище: загрузка в S3, вытеснение из локального кеша и дочитывание из S3"""
+import io
+
+import pytest
+
+from app.config import settings
+from app.services import media
+
+pytestmark = pytest.mark.asyncio
+
+
+class InMemoryS3:
+    """Замена boto3-клиента S3: бакеты — словари в памяти"""
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = 0
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise KeyError(Key)
+        return {"ContentLength": len(self.objects[Bucket, Key])}
+
+    def get_object(self, Bucket, Key):
+        self.gets += 1
+        return {"Body": io.BytesIO(self.objects[Bucket, Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Bucket, Key] = Body
+
+
+def _png(color) -> bytes:
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new("RGB", (400, 300), color).save(out, "PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    import boto3
+
+    client = InMemoryS3()
+    monkeypatch.setattr(boto3, "client", lambda *args, **kwargs: client)
+    return client
+
+
+@pytest.fixture
+def service(sqlite_db, s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEDIA_PATH", tmp_path / "media")
+    monkeypatch.setattr(settings, "USE_S3", True)
+    monkeypatch.setattr(settings, "S3_BUCKET", "photos")
+    return media.MediaService()
+
+
+async def _download(data: bytes) -> bytes:
+    return data
+
+
+async def _no_download(url):
+    raise AssertionError(f"{url} уже обработан, скачивать не нужно")
+
+
+async def test_upload_evict_refetch(service, s3):
+    first = await service.fetch("https://example.com/1.png", lambda url: _download(_png("red")))
+    keys = first["keys"]
+    assert {key for _, key in s3.objects} == set(keys.values())
+
+    # Кеш вмещает один файл — вторая картинка вытесняет все размеры первой
+    service.local.max_bytes = 1
+    await service.process(_png("blue"))
+    assert not any(service.local.exists(key) for key in keys.values())
+
+    again = await service.fetch("https://example.com/1.png", _no_download)
+    assert again["digest"] == first["digest"]
+
+    service.local.max_bytes = 10 ** 9
+    gets = s3.gets
+    data = await service.get(keys["telegram"])
+    assert data == s3.objects["photos", keys["telegram"]]
+    assert s3.gets == gets + 1
+    # Дочитанный из S3 файл снова в локальном кеше
+    assert await service.get(keys["telegram"]) == data
+    assert s3.gets == gets + 1
+
+
+async def test_download_when_missing_everywhere(service, s3):
+    first = await service.fetch("https://example.com/1.png", lambda url: _download(_png("red")))
+    service.local.max_bytes = 1
+    await service.process(_png("blue"))
+    s3.objects.clear()
+
+    downloads = []
+
+    async def download(url):
+        downloads.append(url)
+        return _png("red")
+
+    again = await service.fetch("https://example.com/1.png", download)
+    assert downloads == ["https://example.com/1.png"]
+    assert again["digest"] == first["digest"]
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Упорядоченная обработка обновлений (app/middlewares/ordering.py)"""
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import ErrorEvent, Message, Update
+
+from app.middlewares.ordering import ChatOrderingMiddleware, UpdateScheduler
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_same_key_runs_in_order():
+    scheduler = UpdateScheduler(concurrency=8, max_pending=100)
+    done = []
+
+    def job(key, n, delay):
+        async def run():
+            await asyncio.sleep(delay)
+            done.append((key, n))
+        return run
+
+    # Первое обновление чата 1 самое медленное, но второе всё равно ждёт его
+    await scheduler.submit(1, job(1, 1, 0.05))
+    await scheduler.submit(1, job(1, 2, 0))
+    await scheduler.submit(2, job(2, 1, 0))
+    assert await scheduler.join(1)
+
+    assert [n for key, n in done if key == 1] == [1, 2]
+    # Чат 2 не ждал чат 1
+    assert done.index((2, 1)) < done.index((1, 1))
+
+
+async def test_max_pending_blocks_submit():
+    scheduler = UpdateScheduler(concurrency=8, max_pending=2)
+    release = asyncio.Event()
+
+    async def blocked():
+        await release.wait()
+
+    await scheduler.submit(1, blocked)
+    await scheduler.submit(2, blocked)
+    third = asyncio.create_task(scheduler.submit(3, blocked))
+    await asyncio.sleep(0.01)
+    assert not third.done()
+    assert scheduler.pending == 2
+
+    release.set()
+    await asyncio.wait_for(third, 1)
+    assert await scheduler.join(1)
+    assert scheduler.pending == 0
+
+
+def _update(update_id: int, chat_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+        },
+    })
+
+
+async def test_dispatcher_order_and_errors():
+    scheduler = UpdateScheduler(concurrency=8, max_pending=100)
+    dp = Dispatcher(disable_fsm=True)
+    dp.update.outer_middleware(ChatOrderingMiddleware(scheduler, dp))
+    router = Router()
+    seen, errors = [], []
+
+    @router.message()
+    async def handle(message: Message):
+        if message.text == "fail":
+            raise ValueError(message.message_id)
+        await asyncio.sleep(0.01 if message.message_id == 1 else 0)
+        seen.append(message.message_id)
+
+    @router.errors()
+    async def on_error(event: ErrorEvent):
+        errors.append(event.exception.args[0])
+        return True
+
+    dp.include_router(router)
+    bot = Bot("42:TEST")
+    for update_id, text in ((1, "a"), (2, "fail"), (3, "b")):
+        assert await dp.feed_update(bot, _update(update_id, 7, text)) is True
+    assert await scheduler.join(1)
+    await bot.session.close()
+
+    assert seen == [1, 3]
+    assert errors == [2]
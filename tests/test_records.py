@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""Записи моделей (app/database/records.py): сравнение по типу и полям"""
+from app.database.records import AdRecord, SwapRecord, USER_AD_FIELDS, row_factory
+
+
+def test_equal_by_type_and_fields():
+    ad = AdRecord(id=1, title="Велосипед", views=3)
+    # Тот же объект из строки курсора с другим набором колонок
+    row = row_factory(AdRecord, ("title", "id", "views"))(None, ("Велосипед", 1, 3))
+    assert ad == row and hash(ad) == hash(row)
+    assert ad != AdRecord(id=1, title="Велосипед", views=4)
+    assert len({ad, row}) == 1
+
+
+def test_not_equal_to_other_types():
+    ad = AdRecord(id=1)
+    swap = SwapRecord(id=1)
+    assert ad != swap
+    assert ad != (1,)
+    assert tuple.__eq__(ad, (1,))  # под капотом — строка курсора
+    row = row_factory(AdRecord, USER_AD_FIELDS)(None, (1,) + (None,) * (len(USER_AD_FIELDS) - 1))
+    assert row != tuple(row)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Репозиторий SQLAlchemy (app/database/repository.py): счётчики, статистика и таблицы лидеров"""
+import pytest
+from sqlalchemy import delete
+
+from app.config import constants
+from app.database import repository
+from app.database.models_orm import LeaderboardEntry, StatsCounter, StatsDaily, UserCounter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def _fill():
+    await repository.UserModel.get_or_create(1, "alice")
+    await repository.UserModel.get_or_create(2, "bob")
+    first = await repository.AdModel.create(1, "sport", "Велосипед", "Горный", None, None)
+    second = await repository.AdModel.create(2, "sport", "Палатка", "Трёхместная", None, None)
+    await repository.AdModel.create(2, "sport", "Котелок", "Походный", None, None)
+    await repository.AdModel.deactivate(second)
+    await repository.AdModel.increment_views(first, 2)
+    _, swap_id = await repository.SwapModel.create(first, second, 2, 1, "Меняю")
+    await repository.SwapModel.update_status(swap_id, constants.SWAP_STATUS_ACCEPTED)
+    await repository.FavoriteModel.add(2, first)
+
+
+async def test_counters_follow_writes(orm_db):
+    await _fill()
+    assert await repository.UserCounterModel.get(1) == {
+        "ads": 1, "ads_active": 1, "views": 1, "swaps_in:accepted": 1,
+    }
+    assert await repository.UserCounterModel.get(2) == {
+        "ads": 2, "ads_active": 1, "swaps_out": 1, "favorites": 1,
+    }
+    await repository.FavoriteModel.remove(2, 1)
+    await repository.FavoriteModel.remove(2, 1)
+    assert "favorites" not in await repository.UserCounterModel.get(2)
+
+
+async def test_backfill_matches_maintained(orm_db):
+    await _fill()
+    maintained = [await repository.UserCounterModel.get(user_id) for user_id in (1, 2)]
+    async with repository.session() as s:
+        await s.execute(delete(UserCounter))
+        await s.commit()
+    await repository.init_models()
+
+    assert [await repository.UserCounterModel.get(user_id) for user_id in (1, 2)] == maintained
+
+
+async def test_stats_and_leaderboard_backfill_match_maintained(orm_db):
+    await _fill()
+    await repository.UserModel.update_location(1, 56.95, 24.1, "Рига")
+    # Котелок Боба (#3) на велосипед Алисы (#1)
+    _, swap_id = await repository.SwapModel.create(3, 1, 1, 2)
+    await repository.SwapModel.update_status(swap_id, constants.SWAP_STATUS_COMPLETED)
+    for rating in (5, 4, 3):
+        await repository.RatingModel.add_rating(2, 1, rating)
+
+    async def snapshot():
+        boards = [await repository.LeaderboardModel.board(board)
+                  for board in ("swaps", "swaps:cat:sport", "swaps:cell:113:48", "rating", "rating:cell:113:48")]
+        # Обнулившиеся итоги остаются строками с 0, пересчёт их не создаёт
+        counters = {name: value for name, value in (await repository.StatsModel.counters()).items() if value}
+        daily = {day: {name: value for name, value in values.items() if value}
+                 for day, values in (await repository.StatsModel.daily(1)).items()}
+        return counters, daily, boards
+
+    maintained = await snapshot()
+    assert maintained[2] == [[(1, 1), (2, 1)], [(1, 1), (2, 1)], [(1, 1)], [(1, 4.0)], [(1, 4.0)]]
+    async with repository.session() as s:
+        for model in (StatsCounter, StatsDaily, LeaderboardEntry):
+            await s.execute(delete(model))
+        await s.commit()
+    await repository.init_models()
+
+    assert await snapshot() == maintained
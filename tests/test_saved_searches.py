@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Сохранённые поиски (app/services/saved_searches.py): все пути публикации ставят объявление в сверку"""
+import pytest
+
+from app.database.crud import AdModel
+from app.services import saved_searches
+from app.services.avito_parser import avito_parser
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    ads = []
+    monkeypatch.setattr(saved_searches.saved_search_notifier, "submit", lambda bot, ad: ads.append(ad) or True)
+    return ads
+
+
+async def test_republished_ad_is_matched_with_stored_fields(sqlite_db, submitted):
+    ad_id = await AdModel.create(1, "electronics", "Монитор Dell", "27 дюймов", "5000", "photo-1")
+    await AdModel.deactivate(ad_id)
+    await AdModel.republish(ad_id, "Монитор Dell 27", "IPS, с кабелем", "4500")
+
+    assert await saved_searches.ad_published(None, ad_id)
+    ad, = submitted
+    assert (ad.id, ad.title, ad.price, ad.category) == (ad_id, "Монитор Dell 27", "4500", "electronics")
+    assert ad.photo_file_id == "photo-1"  # фото из новой анкеты не было — осталось прежнее
+
+
+async def test_imported_ad_is_matched(sqlite_db, submitted):
+    ad_id = await avito_parser.publish_import(None, {
+        "user_id": 1, "category": "electronics", "title": "Ноутбук Lenovo", "description": "ThinkPad",
+        "price": 30000, "duplicate_of": None,
+    })
+    assert [(ad.id, ad.title, ad.price) for ad in submitted] == [(ad_id, "Ноутбук Lenovo", "30000")]
+
+
+async def test_missing_ad_is_not_submitted(sqlite_db, submitted):
+    assert not await saved_searches.ad_published(None, 404)
+    assert submitted == []
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Webhook-сервер (app/webhook.py) и раздача обновлений воркерам кластера (app/cluster.py)"""
+import asyncio
+import json
+import socket
+
+import pytest
+import pytest_asyncio
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.cluster import Cluster, shard_of
+from app.middlewares.ordering import UpdateScheduler
+from app.webhook import SECRET_HEADER, WebhookServer
+
+pytestmark = pytest.mark.asyncio
+
+SECRET = "s3cret"
+
+
+def _update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": "hi",
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+        },
+    }
+
+
+class FakeTelegram:
+    """Шлёт обновления в webhook так же, как Telegram"""
+
+    def __init__(self, client: TestClient, secret: str = SECRET):
+        self.client = client
+        self.secret = secret
+
+    async def send(self, update: dict, secret: str = None) -> int:
+        response = await self.client.post(
+            "/webhook", data=json.dumps(update),
+            headers={SECRET_HEADER: self.secret if secret is None else secret, "Content-Type": "application/json"},
+        )
+        return response.status
+
+
+@pytest_asyncio.fixture
+async def bot():
+    bot = Bot("42:TEST")
+    yield bot
+    await bot.session.close()
+
+
+async def _serve(server: WebhookServer):
+    client = TestClient(TestServer(server.app))
+    await client.start_server()
+    return client
+
+
+async def test_secret_and_bad_body(bot):
+    fed = []
+
+    async def feed(update):
+        fed.append(update.update_id)
+
+    server = WebhookServer(bot, Dispatcher(), secret=SECRET, feed=feed)
+    client = await _serve(server)
+    telegram = FakeTelegram(client)
+    try:
+        assert await telegram.send(_update(1, 10), secret="wrong") == 401
+        assert await telegram.send(_update(2, 10), secret="") == 401
+        response = await client.post("/webhook", data=b"{", headers={SECRET_HEADER: SECRET})
+        assert response.status == 400
+        assert await telegram.send(_update(3, 10)) == 200
+        await asyncio.wait_for(server.queue.join(), 1)
+    finally:
+        await client.close()
+
+    assert fed == [3]
+
+
+async def test_full_queue_returns_503(bot):
+    release = asyncio.Event()
+
+    async def feed(update):
+        await release.wait()
+
+    server = WebhookServer(bot, Dispatcher(), secret=SECRET, queue_size=1, feed=feed)
+    client = await _serve(server)
+    telegram = FakeTelegram(client)
+    try:
+        assert await telegram.send(_update(1, 10)) == 200
+        await asyncio.sleep(0.01)  # первое забрал обработчик, второе ляжет в очередь
+        assert await telegram.send(_update(2, 10)) == 200
+        assert await telegram.send(_update(3, 10)) == 503
+        release.set()
+    finally:
+        await client.close()
+
+
+async def test_drain_finishes_queue_and_rejects_new(bot):
+    dp = Dispatcher()
+    dp["update_scheduler"] = scheduler = UpdateScheduler()
+    done = []
+
+    async def feed(update):
+        # Как ChatOrderingMiddleware: обработка в планировщике, feed возвращается сразу
+        async def job():
+            await asyncio.sleep(0.01)
+            done.append(update.update_id)
+        await scheduler.submit(update.message.chat.id, job)
+
+    server = WebhookServer(bot, dp, secret=SECRET, feed=feed)
+    client = await _serve(server)
+    telegram = FakeTelegram(client)
+    try:
+        for update_id in range(1, 6):
+            assert await telegram.send(_update(update_id, 10 + update_id % 2)) == 200
+        await server.drain(timeout=1)
+
+        assert sorted(done) == [1, 2, 3, 4, 5]
+        assert await telegram.send(_update(6, 10)) == 503
+        response = await client.get("/health")
+        assert response.status == 503
+        assert (await response.json())["status"] == "draining"
+    finally:
+        await client.close()
+
+
+async def _attach_workers(cluster: Cluster):
+    """Воркеры кластера без процессов: фронт пишет в socketpair, тест читает другой конец"""
+    readers = []
+    for _ in range(cluster.size):
+        front, child = socket.socketpair()
+        _, writer = await asyncio.open_connection(sock=front)
+        # Писатель стороны воркера держим, иначе сборщик мусора закроет сокет
+        readers.append(await asyncio.open_connection(sock=child))
+        cluster.writers.append(writer)
+    return readers
+
+
+async def test_webhook_routes_to_workers_by_user(bot):
+    cluster = Cluster(3)
+    readers = await _attach_workers(cluster)
+    server = WebhookServer(bot, Dispatcher(), secret=SECRET, feed=cluster.feed)
+    client = await _serve(server)
+    telegram = FakeTelegram(client)
+    users = [10, 11, 12, 13, 10, 14, 11, 10]
+    try:
+        for update_id, user_id in enumerate(users, 1):
+            assert await telegram.send(_update(update_id, user_id)) == 200
+        await asyncio.wait_for(server.queue.join(), 1)
+    finally:
+        await client.close()
+
+    received = {}
+    for index, count in enumerate(cluster.routed):
+        for _ in range(count):
+            # Воркер разбирает строку так же
+            update = Update.model_validate_json(await asyncio.wait_for(readers[index][0].readline(), 1))
+            received.setdefault(index, []).append((update.update_id, update.message.from_user.id))
+    for writer in cluster.writers + [writer for _, writer in readers]:
+        writer.close()
+
+    assert sum(cluster.routed) == len(users)
+    for index, updates in received.items():
+        assert all(user_id % 3 == index for _, user_id in updates)
+        # Внутри воркера — в порядке прихода
+        assert [update_id for update_id, _ in updates] == sorted(update_id for update_id, _ in updates)
+    assert [update_id for update_id, user_id in received[10 % 3] if user_id == 10] == [1, 5, 8]
+
+
+async def test_shard_without_user_falls_back_to_chat():
+    update = Update.model_validate({
+        "update_id": 7,
+        "channel_post": {"message_id": 1, "date": 0, "text": "x", "chat": {"id": -1005, "type": "channel"}},
+    })
+    assert shard_of(update, 4) == -1005 % 4